@@ -0,0 +1,20 @@
+"""
+上传文件去重表（blobs）的迁移脚本
+"""
+from database import engine, Blob
+
+def add_blobs_table():
+    """创建blobs表"""
+    try:
+        Blob.__table__.create(bind=engine, checkfirst=True)
+        print("✓ blobs 表已就绪")
+        return True
+    except Exception as e:
+        print(f"✗ 迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("上传文件去重 - 数据库迁移")
+    print("=" * 60)
+    add_blobs_table()
@@ -0,0 +1,20 @@
+"""
+邮件发件箱表（mail_outbox）的迁移脚本
+"""
+from database import engine, MailOutbox
+
+def add_mail_outbox_table():
+    """创建mail_outbox表"""
+    try:
+        MailOutbox.__table__.create(bind=engine, checkfirst=True)
+        print("✓ mail_outbox 表已就绪")
+        return True
+    except Exception as e:
+        print(f"✗ 迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("邮件发送队列 - 数据库迁移")
+    print("=" * 60)
+    add_mail_outbox_table()
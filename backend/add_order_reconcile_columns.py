@@ -0,0 +1,28 @@
+"""
+添加orders表的对账字段（check_count、next_check_at）的迁移脚本
+"""
+from database import engine
+from sqlalchemy import text
+
+def add_order_reconcile_columns():
+    """给orders表添加check_count和next_check_at字段"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS check_count INTEGER DEFAULT 0"))
+            conn.execute(text("ALTER TABLE orders ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMP"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_orders_next_check_at ON orders(next_check_at)"))
+            # 已有的未支付订单立即进入对账
+            conn.execute(text("UPDATE orders SET next_check_at = (NOW() AT TIME ZONE 'utc') WHERE status = 'created' AND next_check_at IS NULL"))
+            conn.commit()
+            print("✓ orders 表对账字段已就绪")
+            return True
+            
+    except Exception as e:
+        print(f"✗ 添加字段失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("订单表添加对账字段")
+    print("=" * 60)
+    add_order_reconcile_columns()
@@ -0,0 +1,20 @@
+"""
+充值订单表（orders）的迁移脚本
+"""
+from database import engine, Order
+
+def add_orders_table():
+    """创建orders表"""
+    try:
+        Order.__table__.create(bind=engine, checkfirst=True)
+        print("✓ orders 表已就绪")
+        return True
+    except Exception as e:
+        print(f"✗ 迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("充值订单 - 数据库迁移")
+    print("=" * 60)
+    add_orders_table()
@@ -0,0 +1,21 @@
+"""
+邮箱验证码表（verification_codes）和限流计数表（rate_limit_counters）的迁移脚本
+"""
+from database import engine, VerificationCode, RateLimitCounter
+
+def add_verification_codes_table():
+    """创建verification_codes和rate_limit_counters表"""
+    try:
+        VerificationCode.__table__.create(bind=engine, checkfirst=True)
+        RateLimitCounter.__table__.create(bind=engine, checkfirst=True)
+        print("✓ verification_codes、rate_limit_counters 表已就绪")
+        return True
+    except Exception as e:
+        print(f"✗ 迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("邮箱验证码共享存储 - 数据库迁移")
+    print("=" * 60)
+    add_verification_codes_table()
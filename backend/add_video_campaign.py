@@ -0,0 +1,47 @@
+"""
+批量视频生成活动的迁移脚本
+- 创建 video_campaigns 表
+- 给 videos 表添加 campaign_id 字段
+"""
+from database import engine, VideoCampaign
+from sqlalchemy import text
+
+def add_video_campaign_support():
+    """创建活动表并给videos表添加campaign_id字段"""
+    try:
+        VideoCampaign.__table__.create(bind=engine, checkfirst=True)
+        print("✓ video_campaigns 表已就绪")
+
+        with engine.connect() as conn:
+            # 检查字段是否已存在
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name='videos' AND column_name='campaign_id'
+            """))
+
+            if result.fetchone():
+                print("✓ campaign_id 字段已存在，无需添加")
+                return True
+
+            # 添加字段和索引
+            conn.execute(text("""
+                ALTER TABLE videos
+                ADD COLUMN campaign_id VARCHAR(36)
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_videos_campaign_id ON videos(campaign_id)
+            """))
+            conn.commit()
+            print("✓ 成功添加 campaign_id 字段到 videos 表")
+            return True
+
+    except Exception as e:
+        print(f"✗ 迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("批量视频生成活动 - 数据库迁移")
+    print("=" * 60)
+    add_video_campaign_support()
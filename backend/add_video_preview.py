@@ -0,0 +1,39 @@
+"""
+添加video表的preview_url字段（动态预览）的迁移脚本
+"""
+from database import engine
+from sqlalchemy import text
+
+def add_preview_url_column():
+    """给videos表添加preview_url字段"""
+    try:
+        with engine.connect() as conn:
+            # 检查字段是否已存在
+            result = conn.execute(text("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name='videos' AND column_name='preview_url'
+            """))
+            
+            if result.fetchone():
+                print("✓ preview_url 字段已存在，无需添加")
+                return True
+            
+            # 添加字段
+            conn.execute(text("""
+                ALTER TABLE videos 
+                ADD COLUMN preview_url TEXT
+            """))
+            conn.commit()
+            print("✓ 成功添加 preview_url 字段到 videos 表")
+            return True
+            
+    except Exception as e:
+        print(f"✗ 添加字段失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("视频表添加动态预览字段")
+    print("=" * 60)
+    add_preview_url_column()
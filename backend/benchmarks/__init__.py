@@ -0,0 +1,7 @@
+"""
+压测与性能基准工具（不随服务部署）
+- fake_upstreams: 本地上游模拟服务
+- loadgen: 流量生成与统计
+- run_benchmark: 端到端压测入口
+- bench_image: 图片处理微基准（pytest-benchmark）
+"""
@@ -0,0 +1,208 @@
+"""
+图片处理热点的微基准（pytest-benchmark）
+- 宫格拼接 compose_grid：2~9 张输入 × 多种原图分辨率，另比较缩放滤镜和 JPEG draft 解码
+- 九宫格 Gemini 请求/响应：原图 base64 编码 + JSON 序列化、响应 JSON 解析 + base64 解码
+- 上传请求体：blob_service.read_upload 分块读取并计算 SHA-256
+
+每个用例额外记录一次调用的内存峰值（extra_info）：
+- tracemalloc_peak_kb: Python 层分配峰值（bytes、BytesIO 等）
+- rss_peak_kb: 进程常驻内存高水位增量（仅 Linux，包含 Pillow 的像素缓冲区）
+
+用法（在 backend 目录下，需要 requirements-dev.txt）:
+    python -m pytest benchmarks/bench_image.py --benchmark-only
+    python -m pytest benchmarks/bench_image.py --benchmark-autosave
+    python -m pytest benchmarks/bench_image.py --benchmark-compare --benchmark-compare-fail=mean:10%
+"""
+
+import io
+import os
+import sys
+import json
+import base64
+import random
+import asyncio
+import tracemalloc
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+from typing import Callable, Dict, Optional
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("pytest_benchmark")
+
+from PIL import Image
+
+from utils.image_grid import compose_grid
+
+# 原图分辨率（长边）：手机截图 / 常见商品图 / 相机原图
+RESOLUTIONS = [640, 1600, 4000]
+IMAGE_COUNTS = [2, 4, 6, 9]
+
+
+# ======================
+# 测试数据（固定随机种子，结果可复现）
+# ======================
+
+@lru_cache(maxsize=None)
+def sample_jpeg(long_side: int, seed: int = 0) -> bytes:
+    """4:3 的类照片 JPEG：渐变背景 + 噪点块，避免纯色图让编解码显得过快"""
+    width, height = long_side, long_side * 3 // 4
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.frombytes("RGB", (64, 48), rng.randbytes(64 * 48 * 3)).resize((width, height), Image.Resampling.BILINEAR)
+    image = Image.blend(image, noise, 0.5)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def sample_inputs(count: int, long_side: int):
+    return [sample_jpeg(long_side, seed) for seed in range(count)]
+
+
+def gemini_response(image: bytes) -> str:
+    """与 Gemini generateContent 响应结构一致的 JSON 文本"""
+    return json.dumps({"candidates": [{"content": {"parts": [
+        {"text": "九宫格已生成"},
+        {"inlineData": {"mimeType": "image/jpeg", "data": base64.b64encode(image).decode()}},
+    ]}}]})
+
+
+# ======================
+# 内存峰值
+# ======================
+
+def _rss_high_water_kb() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_rss_high_water() -> bool:
+    """把 VmHWM 重置为当前 RSS（Linux 4.0+），不支持时返回 False"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_peak(fn: Callable[[], object]) -> Dict[str, Optional[float]]:
+    """单独执行一次 fn，返回内存峰值（KB）"""
+    rss_supported = _reset_rss_high_water()
+    rss_before = _rss_high_water_kb() if rss_supported else None
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    rss_after = _rss_high_water_kb() if rss_supported else None
+    return {
+        "tracemalloc_peak_kb": round(peak / 1024, 1),
+        "rss_peak_kb": (rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+    }
+
+
+def run(benchmark, fn: Callable[[], object]):
+    """计时后另跑一次测内存（tracemalloc 会拖慢执行，不与计时混在一起）"""
+    result = benchmark(fn)
+    benchmark.extra_info.update(measure_peak(fn))
+    return result
+
+
+# ======================
+# 宫格拼接
+# ======================
+
+@pytest.mark.parametrize("long_side", RESOLUTIONS)
+@pytest.mark.parametrize("count", IMAGE_COUNTS)
+def test_compose_grid(benchmark, count, long_side):
+    benchmark.group = f"compose_grid {long_side}px"
+    contents = sample_inputs(count, long_side)
+
+    grid, grid_size = run(benchmark, lambda: compose_grid(contents))
+
+    assert grid_size == (2 if count <= 4 else 3)
+    with Image.open(io.BytesIO(grid)) as image:
+        assert image.size == (400 * grid_size, 400 * grid_size)
+
+
+@pytest.mark.parametrize("variant", ["lanczos", "bicubic", "lanczos+draft", "bicubic+draft"])
+def test_compose_grid_variants(benchmark, variant):
+    """9 张相机原图：缩放滤镜与 draft 解码的取舍"""
+    benchmark.group = "compose_grid 9x4000px variants"
+    contents = sample_inputs(9, 4000)
+    resample = Image.Resampling.BICUBIC if variant.startswith("bicubic") else Image.Resampling.LANCZOS
+    draft = variant.endswith("+draft")
+
+    grid, _ = run(benchmark, lambda: compose_grid(contents, resample=resample, draft=draft))
+    assert grid[:2] == b"\xff\xd8"
+
+
+# ======================
+# 九宫格 base64
+# ======================
+
+@pytest.mark.parametrize("long_side", RESOLUTIONS)
+def test_nine_grid_encode_request(benchmark, long_side):
+    """原图 → base64 → Gemini 请求体 JSON"""
+    benchmark.group = "nine_grid base64"
+    source = sample_jpeg(long_side)
+
+    def encode():
+        image_base64 = base64.b64encode(source).decode("utf-8")
+        return json.dumps({"contents": [{"parts": [
+            {"text": "prompt"},
+            {"inline_data": {"mime_type": "image/jpeg", "data": image_base64}},
+        ]}]})
+
+    assert len(run(benchmark, encode)) > len(source)
+
+
+def test_nine_grid_decode_response(benchmark):
+    """Gemini 响应（2K 宫格图，约 1~2MB）→ JSON 解析 → base64 解码"""
+    benchmark.group = "nine_grid base64"
+    grid, _ = compose_grid(sample_inputs(9, 1600), cell_size=640, quality=95)
+    text = gemini_response(grid)
+
+    def decode():
+        result = json.loads(text)
+        for part in result["candidates"][0]["content"]["parts"]:
+            if "inlineData" in part:
+                return base64.b64decode(part["inlineData"]["data"])
+
+    assert run(benchmark, decode) == grid
+
+
+# ======================
+# 上传请求体
+# ======================
+
+@pytest.mark.parametrize("size_mb", [1, 8, 32])
+def test_read_upload(benchmark, size_mb):
+    """multipart 上传文件（超过 1MB 时落盘的 SpooledTemporaryFile）的分块读取与哈希"""
+    from fastapi import UploadFile
+    from services.blob_service import blob_service
+
+    benchmark.group = "upload body"
+    payload = random.Random(size_mb).randbytes(size_mb * 1024 * 1024)
+    spooled = SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(payload)
+
+    def read():
+        spooled.seek(0)
+        return asyncio.run(blob_service.read_upload(UploadFile(file=spooled, filename="bench.bin")))
+
+    content, digest = run(benchmark, read)
+    assert len(content) == len(payload) and len(digest) == 64
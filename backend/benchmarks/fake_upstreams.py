@@ -0,0 +1,247 @@
+"""
+压测用的本地上游模拟服务（只依赖标准库）
+
+一个HTTP服务按路径模拟所有外部依赖：
+- OpenAI 兼容对话接口   POST /v1/chat/completions
+- 云雾视频生成          POST /v1/video/generations、GET /v1/video/query、GET /v1/video/generations/{id}
+- Gemini 生图           POST /v1beta/models/{model}:generateContent
+- 微信支付 V3           /v3/pay/transactions/*、/v3/certificates
+- 图片下载              GET /images/{name}.png
+- TOS（自定义域名模式） 其余 PUT / POST / DELETE / GET 按对象存储处理，只记录大小不保存内容
+
+每类上游可以配置固定延迟，用来模拟真实的网络耗时
+"""
+
+import json
+import time
+import uuid
+import zlib
+import base64
+import struct
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+
+def make_png(width: int, height: int) -> bytes:
+    """生成一张渐变PNG（不依赖PIL）"""
+    rows = []
+    for y in range(height):
+        row = bytearray([0])
+        for x in range(width):
+            row.extend(((x * 255) // max(1, width - 1), (y * 255) // max(1, height - 1), 128))
+        rows.append(bytes(row))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b""))
+
+
+# 上游类别（延迟配置和请求计数的键）
+PROVIDERS = ("llm", "video", "gemini", "wechat", "image", "tos")
+
+
+class FakeUpstreams:
+    """
+    本地上游模拟服务
+
+    Example:
+        fake = FakeUpstreams(latency={"llm": 0.8, "tos": 0.05}).start()
+        ...  # LLM_BASE_URL=fake.base_url 等
+        fake.stop()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Optional[Dict[str, float]] = None,
+                 image_size: int = 768, video_polls_to_complete: int = 3, gemini_image_kb: int = 1024):
+        self.latency = {name: 0.0 for name in PROVIDERS}
+        self.latency.update(latency or {})
+        self.video_polls_to_complete = video_polls_to_complete
+        self.requests = Counter()
+        self.tos_bytes = 0
+        self._tasks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.image_png = make_png(image_size, image_size)
+        # 生图响应只需要大小接近真实（base64 后约 1MB），内容不必是合法图片
+        self.gemini_b64 = base64.b64encode(self.image_png * max(1, gemini_image_kb * 1024 // len(self.image_png))).decode()
+
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeUpstreams":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    # ======================
+    # 各上游的响应
+    # ======================
+
+    def _poll_task(self, task_id: str) -> Dict:
+        with self._lock:
+            polls = self._tasks.get(task_id, 0) + 1
+            self._tasks[task_id] = polls
+        if polls >= self.video_polls_to_complete:
+            return {"id": task_id, "status": "completed",
+                    "video_url": f"{self.base_url}/videos/{task_id}.mp4",
+                    "thumbnail_url": f"{self.base_url}/images/{task_id}.png"}
+        return {"id": task_id, "status": "processing" if polls > 1 else "queued"}
+
+    def _chat_completion(self, body: Dict) -> Dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": "好的，已为您生成分镜方案。\n```json\n{\"shots\": [{\"shot\": 1, \"desc\": \"产品特写\"}]}\n```",
+                },
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 60, "total_tokens": 180},
+        }
+
+    def _gemini(self) -> Dict:
+        return {"candidates": [{"content": {"parts": [
+            {"text": "九宫格已生成"},
+            {"inlineData": {"mimeType": "image/png", "data": self.gemini_b64}},
+        ]}}]}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _send(self, status: int, payload=None, content_type: str = "application/json",
+                      headers: Optional[Dict[str, str]] = None) -> None:
+                if isinstance(payload, (dict, list)):
+                    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                else:
+                    data = payload or b""
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("x-tos-request-id", uuid.uuid4().hex)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if data and self.command != "HEAD":
+                    self.wfile.write(data)
+
+            def _provider(self, path: str) -> str:
+                if path.startswith("/v1/chat/"):
+                    return "llm"
+                if path.startswith("/v1/video/"):
+                    return "video"
+                if path.startswith("/v1beta/"):
+                    return "gemini"
+                if path.startswith("/v3/"):
+                    return "wechat"
+                if path.startswith(("/images/", "/videos/")) and self.command == "GET":
+                    return "image"
+                return "tos"
+
+            def _handle(self) -> None:
+                url = urlparse(self.path)
+                path, query = url.path, parse_qs(url.query)
+                body = self._body()
+                provider = self._provider(path)
+                fake.requests[provider] += 1
+                if fake.latency.get(provider):
+                    time.sleep(fake.latency[provider])
+
+                handler = getattr(self, f"_{provider}")
+                handler(path, query, body)
+
+            def _llm(self, path, query, body):
+                self._send(200, fake._chat_completion(json.loads(body or b"{}")))
+
+            def _video(self, path, query, body):
+                if self.command == "POST":
+                    task_id = f"task-{uuid.uuid4().hex[:12]}"
+                    self._send(200, {"id": task_id, "task_id": task_id, "status": "queued"})
+                elif path == "/v1/video/query":
+                    self._send(200, fake._poll_task((query.get("id") or [""])[0]))
+                else:
+                    self._send(200, fake._poll_task(path.rsplit("/", 1)[-1]))
+
+            def _gemini(self, path, query, body):
+                self._send(200, fake._gemini())
+
+            def _wechat(self, path, query, body):
+                if path == "/v3/pay/transactions/native":
+                    self._send(200, {"code_url": f"weixin://wxpay/bizpayurl?pr={uuid.uuid4().hex[:10]}"})
+                elif path == "/v3/certificates":
+                    self._send(200, {"data": []})
+                elif path.endswith("/close"):
+                    self._send(204)
+                elif path.startswith("/v3/pay/transactions/out-trade-no/"):
+                    order_no = path.rsplit("/", 1)[-1]
+                    self._send(200, {"out_trade_no": order_no, "trade_state": "NOTPAY", "amount": {"total": 1000}})
+                else:
+                    self._send(404, {"code": "NOT_FOUND", "message": path})
+
+            def _image(self, path, query, body):
+                self._send(200, fake.image_png, content_type="image/png")
+
+            def _tos(self, path, query, body):
+                key = path.lstrip("/")
+                if self.command == "PUT":
+                    with fake._lock:
+                        fake.tos_bytes += len(body)
+                    self._send(200, headers={"ETag": f'"{uuid.uuid4().hex}"'})
+                elif self.command == "POST" and "uploads" in query:
+                    self._send(200, {"Bucket": "bench", "Key": key, "UploadId": uuid.uuid4().hex})
+                elif self.command == "POST":
+                    self._send(200, {"Bucket": "bench", "Key": key, "ETag": f'"{uuid.uuid4().hex}"',
+                                     "Location": f"{fake.base_url}/{key}"})
+                elif self.command == "DELETE":
+                    self._send(204)
+                else:
+                    self._send(200, fake.image_png, content_type="image/png")
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="启动本地上游模拟服务")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    server = FakeUpstreams(port=args.port).start()
+    print(f"上游模拟服务: {server.base_url}（Ctrl+C 退出）")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,233 @@
+"""
+压测流量生成和统计
+- 按权重混合多种请求（对话、上传、九宫格、视频轮询、列表、下单）
+- 固定并发的线程池持续发请求，记录每个请求的耗时和结果
+- 报告吞吐量和 p50 / p95 / p99，可与基线结果比较
+"""
+
+import math
+import time
+import uuid
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.fake_upstreams import make_png
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """解析 "chat=30,upload=15" 格式的流量权重"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"未知的请求类型: {', '.join(sorted(unknown))}（可选: {', '.join(SCENARIOS)}）")
+    return mix
+
+
+class BenchContext:
+    """压测共享数据：后端地址、测试用户、上游模拟服务地址"""
+
+    def __init__(self, base_url: str, upstream_url: str, user_ids: List[str], unique_uploads: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.upstream_url = upstream_url.rstrip("/")
+        self.user_ids = user_ids
+        self.unique_uploads = unique_uploads
+        self.upload_body = make_png(1024, 1024)
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """每个线程一个连接池"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def user(self) -> str:
+        return random.choice(self.user_ids)
+
+
+# ======================
+# 请求类型
+# ======================
+
+def scenario_chat(ctx: BenchContext) -> requests.Response:
+    image_url = f"{ctx.upstream_url}/images/{uuid.uuid4().hex[:8]}.png" if random.random() < 0.3 else None
+    return ctx.session.post(f"{ctx.base_url}/api/chat", json={
+        "content": "帮我为这款保温杯设计一个15秒的带货视频分镜",
+        "image_url": image_url,
+        "history": [{"role": "user", "content": "你好"}, {"role": "assistant", "content": "你好，请描述商品"}],
+    }, timeout=60)
+
+
+def scenario_upload(ctx: BenchContext) -> requests.Response:
+    body = ctx.upload_body
+    if ctx.unique_uploads:
+        # 内容不同才会真正上传（相同内容按哈希去重）；PNG 结尾之后的附加字节不影响解码
+        body = body + uuid.uuid4().bytes
+    files = {"file": (f"{uuid.uuid4().hex[:8]}.png", body, "image/png")}
+    return ctx.session.post(f"{ctx.base_url}/api/upload-image", files=files, timeout=60)
+
+
+def scenario_nine_grid(ctx: BenchContext) -> requests.Response:
+    return ctx.session.post(f"{ctx.base_url}/api/generate-nine-grid", json={
+        "user_id": ctx.user(),
+        "imageUrl": f"{ctx.upstream_url}/images/product.png",
+    }, timeout=120)
+
+
+def scenario_video_poll(ctx: BenchContext) -> requests.Response:
+    return ctx.session.get(f"{ctx.base_url}/api/video-task/task-{random.randint(1, 500)}", timeout=30)
+
+
+def scenario_list(ctx: BenchContext) -> requests.Response:
+    if random.random() < 0.5:
+        return ctx.session.get(f"{ctx.base_url}/api/videos/{ctx.user()}", timeout=30)
+    return ctx.session.get(f"{ctx.base_url}/api/public-videos", timeout=30)
+
+
+def scenario_order(ctx: BenchContext) -> requests.Response:
+    return ctx.session.post(f"{ctx.base_url}/api/wechat/create-order", json={
+        "user_id": ctx.user(),
+        "package_id": "small",
+    }, timeout=30)
+
+
+SCENARIOS: Dict[str, Callable[[BenchContext], requests.Response]] = {
+    "chat": scenario_chat,
+    "upload": scenario_upload,
+    "nine_grid": scenario_nine_grid,
+    "video_poll": scenario_video_poll,
+    "list": scenario_list,
+    "order": scenario_order,
+}
+
+DEFAULT_MIX = "chat=25,upload=15,nine_grid=10,video_poll=25,list=20,order=5"
+
+
+# ======================
+# 执行与统计
+# ======================
+
+def run_load(ctx: BenchContext, mix: Dict[str, float], duration: float, concurrency: int,
+             warmup: float = 2.0, seed: Optional[int] = None) -> Dict:
+    """
+    固定并发持续压测
+
+    Args:
+        mix: 请求类型 -> 权重
+        duration: 统计时长（秒），不含预热
+        concurrency: 并发线程数
+        warmup: 预热时长（秒），期间的请求不计入结果
+
+    Returns:
+        报告字典（见 summarize）
+    """
+    if seed is not None:
+        random.seed(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results: List[Tuple[str, float, bool]] = []
+    results_lock = threading.Lock()
+
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    def worker() -> None:
+        local: List[Tuple[str, float, bool]] = []
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            name = random.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                ok = SCENARIOS[name](ctx).status_code < 400
+            except requests.RequestException:
+                ok = False
+            t1 = time.perf_counter()
+            if t0 >= measure_from:
+                local.append((name, t1 - t0, ok))
+        with results_lock:
+            results.extend(local)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+
+    return summarize(results, duration, concurrency)
+
+
+def summarize(results: List[Tuple[str, float, bool]], duration: float, concurrency: int) -> Dict:
+    """按请求类型汇总：次数、错误数、吞吐量、平均值和百分位（毫秒）"""
+
+    def stats(items: List[Tuple[str, float, bool]]) -> Dict:
+        latencies = sorted(latency for _, latency, _ in items)
+        return {
+            "count": len(items),
+            "errors": sum(1 for _, _, ok in items if not ok),
+            "rps": round(len(items) / duration, 2) if duration else 0,
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+
+    by_name: Dict[str, List] = {}
+    for item in results:
+        by_name.setdefault(item[0], []).append(item)
+
+    return {
+        "duration": duration,
+        "concurrency": concurrency,
+        "total": stats(results),
+        "scenarios": {name: stats(items) for name, items in sorted(by_name.items())},
+    }
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"时长 {report['duration']:g}s，并发 {report['concurrency']}",
+        f"{'请求类型':<12}{'次数':>8}{'错误':>7}{'RPS':>9}{'平均ms':>10}{'p50ms':>10}{'p95ms':>10}{'p99ms':>10}",
+    ]
+    rows = list(report["scenarios"].items()) + [("total", report["total"])]
+    for name, s in rows:
+        lines.append(f"{name:<12}{s['count']:>10}{s['errors']:>8}{s['rps']:>10}"
+                     f"{s['mean_ms']:>11}{s['p50_ms']:>11}{s['p95_ms']:>11}{s['p99_ms']:>11}")
+    return "\n".join(lines)
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """
+    与基线比较，返回退化项（p95 变慢或吞吐下降超过 max_regression 比例）
+    """
+    problems = []
+    pairs = [("total", report["total"], baseline.get("total"))]
+    pairs += [(name, s, baseline.get("scenarios", {}).get(name)) for name, s in report["scenarios"].items()]
+    for name, current, base in pairs:
+        if not base or not base.get("count"):
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            problems.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - max_regression):
+            problems.append(f"{name}: RPS {base['rps']} -> {current['rps']}")
+        base_error_rate = base["errors"] / base["count"]
+        if current["count"] and current["errors"] / current["count"] > base_error_rate + 0.01:
+            problems.append(f"{name}: 错误率 {base_error_rate:.1%} -> {current['errors'] / current['count']:.1%}")
+    return problems
@@ -0,0 +1,235 @@
+"""
+端到端压测：本地上游模拟服务 + 独立进程的后端 + 混合流量
+
+用法（在 backend 目录下）:
+    python -m benchmarks.run_benchmark --duration 30 --concurrency 16
+    python -m benchmarks.run_benchmark --database-url postgresql://postgres:密码@localhost/bench --workers 4
+    python -m benchmarks.run_benchmark --json result.json --baseline baseline.json --max-regression 0.15
+
+默认使用临时 SQLite 数据库；与基线比较出现退化时以退出码 1 结束
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import argparse
+import subprocess
+from typing import Dict, List
+
+import requests
+
+from benchmarks.fake_upstreams import FakeUpstreams
+from benchmarks.loadgen import BenchContext, DEFAULT_MIX, parse_mix, run_load, format_report, compare
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(BACKEND_DIR, "test_fixtures")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def backend_env(upstream_url: str, database_url: str, work_dir: str, log_level: str) -> Dict[str, str]:
+    """后端进程的环境变量：所有外部依赖指向本地模拟服务"""
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": database_url,
+        "JWT_SECRET_KEY": "bench-jwt-secret-0123456789abcdef0123456789",
+        "LLM_API_KEY": "bench-llm-key",
+        "LLM_BASE_URL": upstream_url,
+        "VIDEO_GENERATION_API_KEY": "bench-video-key",
+        "VIDEO_GENERATION_ENDPOINT": upstream_url,
+        "CHARACTER_VIDEO_ENDPOINT": upstream_url,
+        "IMAGE_GEN_BASE_URL": upstream_url,
+        "TOS_ACCESS_KEY": "bench-ak",
+        "TOS_SECRET_KEY": "bench-sk",
+        "TOS_ENDPOINT": upstream_url,
+        "TOS_CUSTOM_DOMAIN": "true",
+        "WECHAT_PAY_BASE_URL": upstream_url,
+        "WECHAT_APP_ID": "wxbench",
+        "WECHAT_MCH_ID": "1900000000",
+        "WECHAT_API_V3_KEY": "0123456789abcdef0123456789abcdef",
+        "WECHAT_CERT_SERIAL_NO": "BENCH",
+        "WECHAT_PRIVATE_KEY_PATH": os.path.join(FIXTURES, "wechat_platform_key.pem"),
+        "WECHAT_PLATFORM_CERT_DIR": os.path.join(work_dir, "wechat_certs"),
+        "ORDER_RECONCILE_ENABLED": "false",
+        "MAIL_SINK": "file",
+        "MAIL_FILE_PATH": os.path.join(work_dir, "mail_outbox.jsonl"),
+        "LOG_LEVEL": log_level,
+    })
+    return env
+
+
+def start_backend(env: Dict[str, str], port: int, workers: int, log_path: str) -> subprocess.Popen:
+    # 建表（SQLite / 空数据库）
+    subprocess.run([sys.executable, "-c", "import database; database.init_database()"],
+                   cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    log = open(log_path, "wb")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"后端进程已退出（退出码 {process.returncode}）")
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("等待后端启动超时")
+
+
+# 提升为管理员（直接改库，后端没有开放该接口）
+PROMOTE_ADMIN = (
+    "import sys, database\n"
+    "db = database.SessionLocal()\n"
+    "db.query(database.User).filter(database.User.email == sys.argv[1]).update({database.User.role: 'admin'})\n"
+    "db.commit()\n"
+)
+
+
+def admin_session(base_url: str, env: Dict[str, str], run_id: int) -> requests.Session:
+    """注册压测管理员并登录，返回带管理员令牌的会话（补积分走管理员接口）"""
+    email = f"benchadmin{run_id}@example.com"
+    password = "bench-admin-password"
+    resp = requests.post(f"{base_url}/api/register", json={
+        "username": "benchadmin",
+        "email": email,
+        "password": password,
+    }, timeout=30)
+    resp.raise_for_status()
+    subprocess.run([sys.executable, "-c", PROMOTE_ADMIN, email], cwd=BACKEND_DIR, env=env, check=True)
+
+    # 重新登录，令牌中的角色才是 admin
+    resp = requests.post(f"{base_url}/api/login", json={"email": email, "password": password}, timeout=30)
+    resp.raise_for_status()
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {resp.json()['token']}"
+    return session
+
+
+def seed_data(base_url: str, env: Dict[str, str], users: int, videos_per_user: int) -> List[str]:
+    """注册测试用户、补足积分并写入视频记录（列表接口有数据可读）"""
+    session = requests.Session()
+    run_id = int(time.time())
+    admin = admin_session(base_url, env, run_id)
+    user_ids = []
+    for i in range(users):
+        resp = session.post(f"{base_url}/api/register", json={
+            "username": f"bench{i}",
+            "email": f"bench{run_id}_{i}@example.com",
+            "password": "bench-password",
+        }, timeout=30)
+        resp.raise_for_status()
+        user_id = resp.json()["user"]["id"]
+        user_ids.append(user_id)
+
+        resp = admin.put(f"{base_url}/api/admin/user/{user_id}/credits", json={"credits": 10_000_000}, timeout=30)
+        resp.raise_for_status()
+        for j in range(videos_per_user):
+            resp = session.post(f"{base_url}/api/videos", json={
+                "user_id": user_id,
+                "video_url": f"https://example.com/{user_id}/{j}.mp4",
+                "product_name": f"商品{j}",
+                "prompt": "压测视频",
+                "status": "completed",
+                "is_public": j % 3 == 0,
+                "script": [{"shot": k, "desc": "镜头描述" * 20} for k in range(8)],
+            }, timeout=30)
+            resp.raise_for_status()
+    return user_ids
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("--duration", type=float, default=30, help="统计时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒）")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker 数")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"请求权重，默认 {DEFAULT_MIX}")
+    parser.add_argument("--database-url", default="", help="默认使用临时 SQLite")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--videos-per-user", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="模拟LLM耗时（秒）")
+    parser.add_argument("--video-latency", type=float, default=0.15)
+    parser.add_argument("--tos-latency", type=float, default=0.03)
+    parser.add_argument("--wechat-latency", type=float, default=0.1)
+    parser.add_argument("--image-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="结果写入JSON文件")
+    parser.add_argument("--baseline", help="与基线JSON比较")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="允许的退化比例")
+    parser.add_argument("--log-level", default="WARNING", help="后端日志级别")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+
+    fake = FakeUpstreams(latency={
+        "llm": args.llm_latency,
+        "video": args.video_latency,
+        "tos": args.tos_latency,
+        "wechat": args.wechat_latency,
+        "image": args.image_latency,
+    }).start()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    log_path = os.path.join(work_dir, "backend.log")
+    env = backend_env(fake.base_url, database_url, work_dir, args.log_level)
+    process = start_backend(env, port, args.workers, log_path)
+    try:
+        wait_ready(base_url, process)
+        user_ids = seed_data(base_url, env, args.users, args.videos_per_user)
+        print(f"后端 {base_url}，上游模拟 {fake.base_url}，数据库 {database_url}")
+        print(f"已准备 {len(user_ids)} 个用户；开始压测 {args.duration:g}s（预热 {args.warmup:g}s）...")
+
+        ctx = BenchContext(base_url, fake.base_url, user_ids)
+        report = run_load(ctx, mix, args.duration, args.concurrency, warmup=args.warmup, seed=args.seed)
+        report["mix"] = mix
+        report["upstreamRequests"] = dict(fake.requests)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        fake.stop()
+
+    print()
+    print(format_report(report))
+    print(f"\n上游请求数: {report['upstreamRequests']}")
+    print(f"后端日志: {log_path}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        if problems:
+            print("\n❌ 相比基线出现退化:")
+            for problem in problems:
+                print(f"  - {problem}")
+            return 1
+        print(f"\n✅ 未超出基线 {args.max_regression:.0%} 的退化阈值")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,16 @@
 """
 
 import os
+import ipaddress
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+# 签名密钥的最小长度（字节），以及不允许使用的示例值（.env.example 曾公开的占位密钥）
+JWT_SECRET_MIN_BYTES = 32
+WEAK_JWT_SECRETS = {"your-super-secret-jwt-key-change-this-in-production"}
+
 
 class Settings:
     """应用配置类"""
@@ -17,6 +22,7 @@ class Settings:
     # 火山云 TOS 存储配置
     # ======================
     TOS_ENDPOINT: str = os.getenv("TOS_ENDPOINT", "https://tos-cn-beijing.volces.com")
+    TOS_CUSTOM_DOMAIN: bool = os.getenv("TOS_CUSTOM_DOMAIN", "false").lower() == "true"  # 终端节点是自定义域名（不加bucket子域名）
     TOS_REGION: str = os.getenv("TOS_REGION", "cn-beijing")
     TOS_BUCKET: str = os.getenv("TOS_BUCKET", "sora-2")
     TOS_ACCESS_KEY: str = os.getenv("TOS_ACCESS_KEY", "")
@@ -52,7 +58,40 @@ class Settings:
     CREDITS_PER_VIDEO: int = int(os.getenv("CREDITS_PER_VIDEO", "70"))
     INITIAL_CREDITS: int = int(os.getenv("INITIAL_CREDITS", "100"))
     MAX_UPLOAD_SIZE_MB: int = int(os.getenv("MAX_UPLOAD_SIZE_MB", "10"))
-    
+
+    # 批量脚本生成（商品目录）
+    SCRIPT_BATCH_MAX_PRODUCTS: int = int(os.getenv("SCRIPT_BATCH_MAX_PRODUCTS", "50"))
+    SCRIPT_BATCH_CONCURRENCY: int = int(os.getenv("SCRIPT_BATCH_CONCURRENCY", "4"))
+    SCRIPT_BATCH_RPM: int = int(os.getenv("SCRIPT_BATCH_RPM", "60"))  # 每分钟最多调用LLM次数，0表示不限
+
+    # 批量视频生成活动
+    CAMPAIGN_MAX_TASKS: int = int(os.getenv("CAMPAIGN_MAX_TASKS", "200"))  # 单个活动最多视频数
+    CAMPAIGN_PER_KEY_CONCURRENCY: int = int(os.getenv("CAMPAIGN_PER_KEY_CONCURRENCY", "2"))  # 每个API Key同时提交数
+    CAMPAIGN_SUBMIT_BATCH: int = int(os.getenv("CAMPAIGN_SUBMIT_BATCH", "20"))  # 每轮调度最多提交数
+    CAMPAIGN_POLL_INTERVAL: int = int(os.getenv("CAMPAIGN_POLL_INTERVAL", "15"))  # 轮询间隔（秒）
+
+    # 生成视频转存到TOS（云雾URL 3天后失效）
+    VIDEO_PERSIST_ENABLED: bool = os.getenv("VIDEO_PERSIST_ENABLED", "true").lower() == "true"
+    VIDEO_PERSIST_CONCURRENCY: int = int(os.getenv("VIDEO_PERSIST_CONCURRENCY", "3"))  # 同时转存的视频数
+    VIDEO_PERSIST_PART_SIZE_MB: int = int(os.getenv("VIDEO_PERSIST_PART_SIZE_MB", "8"))  # 分片大小，不能小于5
+
+    # 视频封面和动态预览
+    THUMBNAIL_ENABLED: bool = os.getenv("THUMBNAIL_ENABLED", "true").lower() == "true"
+    THUMBNAIL_DECODER: str = os.getenv("THUMBNAIL_DECODER", "ffmpeg")  # ffmpeg 或 stub（测试用）
+    FFMPEG_PATH: str = os.getenv("FFMPEG_PATH", "ffmpeg")
+    THUMBNAIL_WORKERS: int = int(os.getenv("THUMBNAIL_WORKERS", "2"))  # 解码进程数
+    THUMBNAIL_WIDTH: int = int(os.getenv("THUMBNAIL_WIDTH", "320"))  # 动态预览宽度
+    THUMBNAIL_POSTER_WIDTH: int = int(os.getenv("THUMBNAIL_POSTER_WIDTH", "720"))  # 封面宽度
+    THUMBNAIL_PREVIEW_FRAMES: int = int(os.getenv("THUMBNAIL_PREVIEW_FRAMES", "12"))
+    THUMBNAIL_PREVIEW_SECONDS: float = float(os.getenv("THUMBNAIL_PREVIEW_SECONDS", "3"))
+    THUMBNAIL_POSTER_AT: float = float(os.getenv("THUMBNAIL_POSTER_AT", "1"))  # 封面截取位置（秒）
+
+    # 图片衍生图（上传图片和宫格图的WebP/AVIF缩放版本）
+    IMAGE_DERIVATIVES_ENABLED: bool = os.getenv("IMAGE_DERIVATIVES_ENABLED", "true").lower() == "true"
+    IMAGE_DERIVATIVE_WIDTHS: str = os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,640,1280")
+    IMAGE_DERIVATIVE_QUALITY: int = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "75"))
+    IMAGE_DERIVATIVE_WORKERS: int = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", "2"))  # 编码进程数
+
     # ======================
     # 微信支付配置
     # ======================
@@ -61,6 +100,24 @@ class Settings:
     WECHAT_NOTIFY_URL: str = os.getenv("WECHAT_NOTIFY_URL", "")
     WECHAT_BODY: str = os.getenv("WECHAT_BODY", "Semopic积分充值")
     
+    # 订单对账（主动查询未收到回调的订单）
+    ORDER_RECONCILE_ENABLED: bool = os.getenv("ORDER_RECONCILE_ENABLED", "true").lower() == "true"
+    ORDER_RECONCILE_INTERVAL: int = int(os.getenv("ORDER_RECONCILE_INTERVAL", "10"))  # 扫描间隔（秒）
+    ORDER_RECONCILE_BATCH: int = int(os.getenv("ORDER_RECONCILE_BATCH", "50"))  # 每轮最多查询订单数
+    ORDER_RECONCILE_CONCURRENCY: int = int(os.getenv("ORDER_RECONCILE_CONCURRENCY", "4"))  # 同时查询数
+    ORDER_RECONCILE_BACKOFF_BASE: int = int(os.getenv("ORDER_RECONCILE_BACKOFF_BASE", "5"))  # 首次查询延迟（秒），之后翻倍
+    ORDER_RECONCILE_BACKOFF_MAX: int = int(os.getenv("ORDER_RECONCILE_BACKOFF_MAX", "300"))  # 最长查询间隔（秒）
+    ORDER_EXPIRE_MINUTES: int = int(os.getenv("ORDER_EXPIRE_MINUTES", "30"))  # 超过该时间未支付的订单自动关闭
+
+    # 按月分区维护（credit_history / videos，需先执行 alembic 迁移 0002，仅 PostgreSQL）
+    PARTITION_MAINTENANCE_ENABLED: bool = os.getenv("PARTITION_MAINTENANCE_ENABLED", "true").lower() == "true"
+    PARTITION_MAINTENANCE_INTERVAL: int = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "21600"))  # 维护间隔（秒）
+    PARTITION_PREMAKE_MONTHS: int = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))  # 提前创建的未来月份数
+    PARTITION_ARCHIVE_ENABLED: bool = os.getenv("PARTITION_ARCHIVE_ENABLED", "false").lower() == "true"  # 冷分区导出到TOS后删除
+    PARTITION_ARCHIVE_AFTER_MONTHS: str = os.getenv("PARTITION_ARCHIVE_AFTER_MONTHS", "credit_history=24,videos=12")  # 表=保留月数
+    PARTITION_ARCHIVE_BUCKET: str = os.getenv("PARTITION_ARCHIVE_BUCKET", "")  # 归档桶（留空使用 TOS_BUCKET），对象为私有读写
+    PARTITION_ARCHIVE_PREFIX: str = os.getenv("PARTITION_ARCHIVE_PREFIX", "db-archive")  # 归档对象键前缀
+
     # ======================
     # 服务器配置
     # ======================
@@ -68,14 +125,75 @@ class Settings:
     APP_PORT: int = int(os.getenv("APP_PORT", "8000"))
     APP_DEBUG: bool = os.getenv("APP_DEBUG", "false").lower() == "true"
     
+    # 密码加密（bcrypt）
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # cost因子，修改后用户下次登录时自动重新加密
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))  # bcrypt线程数
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # 排队上限，超出返回503
+    
     # JWT配置
-    JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your-super-secret-jwt-key-change-this-in-production")
+    JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "")  # 必填，至少32字节，为空/示例值/过短时拒绝启动
+    JWT_EXPIRE_MINUTES: int = int(os.getenv("JWT_EXPIRE_MINUTES", "10080"))  # 访问令牌有效期，默认7天
+    AUTH_REQUIRE_TOKEN: bool = os.getenv("AUTH_REQUIRE_TOKEN", "false").lower() == "true"  # 是否强制携带令牌
+    AUTH_PRINCIPAL_CACHE_SIZE: int = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000"))
+    AUTH_PRINCIPAL_CACHE_TTL: int = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30"))  # 秒
+    
+    # 邮件（SMTP）
+    SMTP_HOST: str = os.getenv("SMTP_HOST", "smtp.qq.com")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))  # 465 使用SSL，其他端口使用STARTTLS
+    SMTP_USER: str = os.getenv("SMTP_USER", "")
+    SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD", "")
+    SENDER_EMAIL: str = os.getenv("SENDER_EMAIL", os.getenv("SMTP_FROM", "")) or os.getenv("SMTP_USER", "")
+    SENDER_NAME: str = os.getenv("SENDER_NAME", "SemoPic AI视频平台")
+    SMTP_TIMEOUT: int = int(os.getenv("SMTP_TIMEOUT", "15"))  # 秒
+    SMTP_IDLE_SECONDS: int = int(os.getenv("SMTP_IDLE_SECONDS", "60"))  # 空闲超过该时间的连接在下次发送前重建
+    
+    # 邮件队列
+    MAIL_QUEUE_BACKEND: str = os.getenv("MAIL_QUEUE_BACKEND", "memory")  # memory（进程内）或 database（mail_outbox表）
+    MAIL_SINK: str = os.getenv("MAIL_SINK", "auto")  # auto / smtp / file / stdout；auto 时未配置SMTP则输出到控制台
+    MAIL_FILE_PATH: str = os.getenv("MAIL_FILE_PATH", "mail_outbox.jsonl")  # file 发送端的输出文件
+    MAIL_BATCH_SIZE: int = int(os.getenv("MAIL_BATCH_SIZE", "20"))  # 每批最多发送数
+    MAIL_MAX_RETRIES: int = int(os.getenv("MAIL_MAX_RETRIES", "5"))  # 最多尝试次数
+    MAIL_RETRY_BASE_SECONDS: int = int(os.getenv("MAIL_RETRY_BASE_SECONDS", "5"))  # 重试间隔基数（指数退避）
+    MAIL_POLL_INTERVAL: float = float(os.getenv("MAIL_POLL_INTERVAL", "2"))  # 队列为空时的轮询间隔（秒）
+    MAIL_SHUTDOWN_TIMEOUT: float = float(os.getenv("MAIL_SHUTDOWN_TIMEOUT", "5"))  # 关闭时等待发完剩余邮件的时间（秒）
+    
+    # 邮箱验证码
+    VERIFICATION_CODE_BACKEND: str = os.getenv("VERIFICATION_CODE_BACKEND", "memory")  # memory（单进程）或 database（多worker共享）
+    VERIFICATION_CODE_TTL: int = int(os.getenv("VERIFICATION_CODE_TTL", "600"))  # 有效期（秒）
+    VERIFICATION_CODE_MAX_ATTEMPTS: int = int(os.getenv("VERIFICATION_CODE_MAX_ATTEMPTS", "5"))  # 输错次数上限，超出后作废
+    VERIFICATION_SEND_COOLDOWN: int = int(os.getenv("VERIFICATION_SEND_COOLDOWN", "60"))  # 同一邮箱两次发送的间隔（秒）
+    VERIFICATION_SEND_PER_EMAIL_HOURLY: int = int(os.getenv("VERIFICATION_SEND_PER_EMAIL_HOURLY", "5"))
+    VERIFICATION_SEND_PER_IP_HOURLY: int = int(os.getenv("VERIFICATION_SEND_PER_IP_HOURLY", "20"))
+    REGISTER_REQUIRE_EMAIL_CODE: bool = os.getenv("REGISTER_REQUIRE_EMAIL_CODE", "false").lower() == "true"  # 注册是否必须提供验证码
+    
+    # 受信任的反向代理（逗号分隔的IP或网段）：只有来自这些地址的请求才读取 X-Forwarded-For 获取客户端IP
+    TRUSTED_PROXIES: str = os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1")
     
     # CORS配置
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173")
     
-    # 日志级别
+    # 日志
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS: str = os.getenv("LOG_LEVELS", "")  # 按模块覆盖级别，如 "routers.video=WARNING,services.campaign_service=DEBUG"
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text")  # text 或 json（结构化，一行一条）
+    LOG_SAMPLE_RATES: str = os.getenv("LOG_SAMPLE_RATES", "")  # 按模块采样 INFO 及以下日志，如 "routers.video=0.1"
+    LOG_MAX_FIELD_LENGTH: int = int(os.getenv("LOG_MAX_FIELD_LENGTH", "500"))  # 单个字段/消息最大长度，超出截断
+    
+    # 指标（GET /metrics，Prometheus 格式）
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")  # 设置后抓取时需携带 Authorization: Bearer <token>
+    
+    # SQL 性能分析（调试/压测用）
+    SQL_PROFILE_ENABLED: bool = os.getenv("SQL_PROFILE_ENABLED", "false").lower() == "true"  # 记录每个请求的SQL并返回 X-Query-Count 头
+    SQL_PROFILE_REPEAT_THRESHOLD: int = int(os.getenv("SQL_PROFILE_REPEAT_THRESHOLD", "5"))  # 同一语句在一个请求内执行达到该次数视为N+1
+    SQL_PROFILE_SLOW_MS: int = int(os.getenv("SQL_PROFILE_SLOW_MS", "500"))  # 单个请求SQL总耗时超过该值时打印最耗时的语句
+    
+    # 在线 CPU 采样分析（管理员接口 /api/admin/profiler/*）
+    PROFILER_ENABLED: bool = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    PROFILER_INTERVAL_MS: int = int(os.getenv("PROFILER_INTERVAL_MS", "10"))  # 采样间隔（毫秒）
+    PROFILER_MAX_SECONDS: int = int(os.getenv("PROFILER_MAX_SECONDS", "60"))  # 单次采样最长时间
+    PROFILER_KEEP: int = int(os.getenv("PROFILER_KEEP", "20"))  # 内存中保留的结果数
+    PROFILER_REQUEST_TOKEN: str = os.getenv("PROFILER_REQUEST_TOKEN", "")  # 请求头 X-Profile 等于该值时单独采样该请求；留空则关闭
     
     @classmethod
     def get_api_key_pool(cls) -> list[str]:
@@ -89,6 +207,32 @@ class Settings:
         """获取CORS允许的源列表"""
         return [origin.strip() for origin in cls.CORS_ORIGINS.split(",") if origin.strip()]
     
+    @classmethod
+    def get_trusted_proxies(cls) -> list:
+        """获取受信任代理的网段列表（无效项忽略）"""
+        networks = []
+        for item in cls.TRUSTED_PROXIES.split(","):
+            try:
+                networks.append(ipaddress.ip_network(item.strip(), strict=False))
+            except ValueError:
+                continue
+        return networks
+    
+    @classmethod
+    def get_jwt_secret(cls) -> bytes:
+        """
+        获取访问令牌和验证码摘要的签名密钥
+
+        Raises:
+            RuntimeError: JWT_SECRET_KEY 为空、是示例占位值或不足32字节
+        """
+        secret = cls.JWT_SECRET_KEY.encode("utf-8")
+        if not secret or cls.JWT_SECRET_KEY in WEAK_JWT_SECRETS:
+            raise RuntimeError("JWT_SECRET_KEY 未配置或仍为示例值，请设置随机生成的密钥")
+        if len(secret) < JWT_SECRET_MIN_BYTES:
+            raise RuntimeError(f"JWT_SECRET_KEY 长度不足 {JWT_SECRET_MIN_BYTES} 字节")
+        return secret
+    
     @classmethod
     def validate(cls) -> None:
         """验证必需的配置项"""
@@ -68,6 +68,7 @@ CREATE TABLE IF NOT EXISTS videos (
     project_id VARCHAR(36),
     video_url TEXT,
     thumbnail_url TEXT,
+    preview_url TEXT,
     prompt TEXT,
     script TEXT,
     product_name VARCHAR(200),
@@ -79,6 +80,7 @@ CREATE TABLE IF NOT EXISTS videos (
     resolution VARCHAR(20),
     duration INTEGER,
     is_public BOOLEAN DEFAULT FALSE,
+    campaign_id VARCHAR(36),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     completed_at TIMESTAMP
 );
@@ -86,6 +88,7 @@ CREATE TABLE IF NOT EXISTS videos (
 CREATE INDEX IF NOT EXISTS idx_videos_user_id ON videos(user_id);
 CREATE INDEX IF NOT EXISTS idx_videos_project_id ON videos(project_id);
 CREATE INDEX IF NOT EXISTS idx_videos_task_id ON videos(task_id);
+CREATE INDEX IF NOT EXISTS idx_videos_campaign_id ON videos(campaign_id);
 
 -- 5. 角色表
 CREATE TABLE IF NOT EXISTS characters (
@@ -130,6 +133,101 @@ CREATE TABLE IF NOT EXISTS credit_history (
 
 CREATE INDEX IF NOT EXISTS idx_credit_history_user_id ON credit_history(user_id);
 
+-- 8. 批量视频生成活动表
+CREATE TABLE IF NOT EXISTS video_campaigns (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL,
+    name VARCHAR(200),
+    status VARCHAR(20) DEFAULT 'running',
+    total_tasks INTEGER DEFAULT 0,
+    submitted_tasks INTEGER DEFAULT 0,
+    completed_tasks INTEGER DEFAULT 0,
+    failed_tasks INTEGER DEFAULT 0,
+    credits_per_video INTEGER DEFAULT 0,
+    credits_spent INTEGER DEFAULT 0,
+    config JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_campaigns_user_id ON video_campaigns(user_id);
+
+-- 9. 上传文件去重表（按内容哈希，引用计数）
+CREATE TABLE IF NOT EXISTS blobs (
+    id VARCHAR(36) PRIMARY KEY,
+    sha256 VARCHAR(64) NOT NULL UNIQUE,
+    object_key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    size INTEGER,
+    content_type VARCHAR(100),
+    derivatives JSONB,
+    ref_count INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_blobs_url ON blobs(url);
+
+-- 10. 邮箱验证码表和限流计数表（VERIFICATION_CODE_BACKEND=database 时使用）
+CREATE TABLE IF NOT EXISTS verification_codes (
+    email VARCHAR(100) PRIMARY KEY,
+    code_hash VARCHAR(64) NOT NULL,
+    attempts INTEGER DEFAULT 0,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_verification_codes_expires_at ON verification_codes(expires_at);
+
+CREATE TABLE IF NOT EXISTS rate_limit_counters (
+    key VARCHAR(200) PRIMARY KEY,
+    count INTEGER DEFAULT 0,
+    window_start TIMESTAMP NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_counters_expires_at ON rate_limit_counters(expires_at);
+
+-- 11. 邮件发件箱表（MAIL_QUEUE_BACKEND=database 时使用）
+CREATE TABLE IF NOT EXISTS mail_outbox (
+    id VARCHAR(36) PRIMARY KEY,
+    to_email VARCHAR(100) NOT NULL,
+    subject VARCHAR(200) NOT NULL,
+    html TEXT NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending',  -- pending, sending, sent, failed
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_mail_outbox_status_next ON mail_outbox(status, next_attempt_at);
+
+-- 12. 充值订单表（order_no 唯一，支付回调按订单号原子更新）
+CREATE TABLE IF NOT EXISTS orders (
+    id VARCHAR(36) PRIMARY KEY,
+    order_no VARCHAR(64) NOT NULL UNIQUE,
+    user_id VARCHAR(36) NOT NULL,
+    package_id VARCHAR(20),
+    amount_fen INTEGER NOT NULL,
+    credits INTEGER NOT NULL,
+    status VARCHAR(20) DEFAULT 'created',  -- created, paid, credited, closed
+    transaction_id VARCHAR(64),
+    check_count INTEGER DEFAULT 0,
+    next_check_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    paid_at TIMESTAMP,
+    credited_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
+CREATE INDEX IF NOT EXISTS idx_orders_next_check_at ON orders(next_check_at);
+
 -- ================================================================
 -- 执行完成后，查看创建的表
 -- ================================================================
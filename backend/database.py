@@ -4,12 +4,15 @@
 """
 
 import os
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Boolean, Text, JSON, Float
+from sqlalchemy import event, text, Index, Column, String, Integer, DateTime, Boolean, Text, JSON, Float
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, deferred
 from datetime import datetime
 from dotenv import load_dotenv
 
+from utils.db_pool import create_pooled_engine
+from utils.replica_router import ReplicaRouter
+
 # 加载环境变量
 load_dotenv()
 
@@ -20,26 +23,43 @@ DB_NAME = os.getenv("DB_NAME", "AIvdeo")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 
-# 构建数据库连接字符串
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# 构建数据库连接字符串（设置 DATABASE_URL 时直接使用，如压测用的 sqlite:///bench.db）
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 print(f"[DATABASE] 正在连接到数据库...")
 print(f"[DATABASE] Host: {DB_HOST}:{DB_PORT}")
 print(f"[DATABASE] Database: {DB_NAME}")
 print(f"[DATABASE] User: {DB_USER}")
 
-# 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
-    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
-    pool_pre_ping=True,  # 启用连接池预检测
-    echo=False  # 设置为 True 可以看到所有 SQL 语句
+# 创建数据库引擎（连接池参数见 .env.example，echo=True 可以看到所有 SQL 语句）
+engine = create_pooled_engine(DATABASE_URL, name="primary", echo=False)
+
+# 只读副本（可选，逗号分隔），只读接口通过 get_read_db 使用，连接池参数与主库相同
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+replica_engines = [
+    create_pooled_engine(url, name=f"replica{i + 1}", echo=False)
+    for i, url in enumerate(DATABASE_REPLICA_URLS)
+]
+replica_router = ReplicaRouter(
+    engine,
+    replica_engines,
+    max_lag=float(os.getenv("DB_REPLICA_MAX_LAG", 5)),
+    check_interval=float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5)),
 )
+if replica_engines:
+    print(f"[DATABASE] 只读副本: {len(replica_engines)} 个")
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 只读会话工厂（每次创建时由 replica_router 选择引擎）
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+@event.listens_for(ReadSessionLocal, "before_flush")
+def _reject_writes(session, flush_context, instances):
+    raise RuntimeError("只读会话不能写入数据，请改用 get_db")
+
 # 创建基类
 Base = declarative_base()
 
@@ -47,6 +67,8 @@ Base = declarative_base()
 # ======================
 # 数据库表模型定义
 # ======================
+# 大字段（脚本、提示词、图片列表）用 deferred 声明，列表查询不读取；
+# 首次访问时同一 group 的字段一起加载，列表中确实需要时用 .options(undefer(...))，避免逐行补查
 
 class User(Base):
     """用户表"""
@@ -81,7 +103,7 @@ class Product(Base):
     selling_points = Column(Text)  # 卖点
     
     # 商品图片（存储JSON数组）
-    image_urls = Column(JSON)  # ["url1", "url2", ...]
+    image_urls = deferred(Column(JSON), group="detail")  # ["url1", "url2", ...]
     
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -109,13 +131,13 @@ class Project(Base):
     character_prompt = Column(Text)
     
     # 脚本设定（存储JSON）
-    script_json = Column(JSON)  # [{time: '0-5s', audio: '...', action: '...'}, ...]
+    script_json = deferred(Column(JSON), group="detail")  # [{time: '0-5s', audio: '...', action: '...'}, ...]
     
     # 视频配置
     video_config = Column(JSON)  # 存储视频配置信息
     
     # 结果
-    final_sora_prompt = Column(Text)  # 最终的Sora提示词
+    final_sora_prompt = deferred(Column(Text), group="detail")  # 最终的Sora提示词
     sora_video_url = Column(Text)  # 生成的视频URL
     sora_task_id = Column(String(100))  # Sora任务ID
     
@@ -127,6 +149,15 @@ class Project(Base):
 class Video(Base):
     """视频表 - 用户生成的所有视频"""
     __tablename__ = "videos"
+    __table_args__ = (
+        # 用户视频列表（按创建时间倒序）
+        Index("ix_videos_user_id_created_at", "user_id", "created_at"),
+        # 内容广场：只索引公开视频
+        Index("ix_videos_public_created_at", "created_at",
+              postgresql_where=text("is_public"), sqlite_where=text("is_public = 1")),
+        # 按状态筛选（活动进度统计、待转存视频按过期时间排序）
+        Index("ix_videos_status_url_expires_at", "status", "url_expires_at"),
+    )
     
     id = Column(String(36), primary_key=True)
     user_id = Column(String(36), nullable=False, index=True)
@@ -135,16 +166,17 @@ class Video(Base):
     # 视频基本信息
     video_url = Column(Text)
     thumbnail_url = Column(Text)
+    preview_url = Column(Text)  # 动态预览（动画WebP）
     
     # 生成参数
-    prompt = Column(Text)  # 生成提示词
-    script = Column(Text)  # 脚本内容
+    prompt = deferred(Column(Text), group="detail")  # 生成提示词
+    script = deferred(Column(Text), group="detail")  # 脚本内容
     product_name = Column(String(200))
     product_category = Column(String(100))  # 新增：商品类目
     
     # 任务信息
     task_id = Column(String(100), index=True)  # Sora任务ID
-    status = Column(String(20), default='processing')  # processing, completed, failed, url_expired
+    status = Column(String(20), default='processing')  # queued, submitting, processing, completed, failed, url_expired
     progress = Column(Integer, default=0)  # 0-100
     error = Column(Text)  # 错误信息
     
@@ -160,6 +192,10 @@ class Video(Base):
     # 公开设置
     is_public = Column(Boolean, default=False)  # 是否在广场公开
     
+    # 批量生成活动
+    campaign_id = Column(String(36), index=True)  # 关联的批量生成活动ID
+    submitted_at = Column(DateTime)  # 批量任务被调度器认领（submitting）的时间
+    
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime)
 
@@ -205,6 +241,13 @@ class SavedPrompt(Base):
 class CreditHistory(Base):
     """积分历史记录表"""
     __tablename__ = "credit_history"
+    __table_args__ = (
+        # 用户积分记录（按时间倒序）
+        Index("ix_credit_history_user_id_created_at", "user_id", "created_at"),
+        # 按关联订单/视频查找记录
+        Index("ix_credit_history_related_id", "related_id",
+              postgresql_where=text("related_id IS NOT NULL"), sqlite_where=text("related_id IS NOT NULL")),
+    )
     
     id = Column(String(36), primary_key=True)
     user_id = Column(String(36), nullable=False, index=True)
@@ -247,6 +290,10 @@ class GeneratedImage(Base):
 class FeaturedVideo(Base):
     """精选视频表 - 用于官网展示的精选案例"""
     __tablename__ = "featured_videos"
+    __table_args__ = (
+        # 官网展示：启用的视频按分类、顺序读取
+        Index("ix_featured_videos_active_category_order", "is_active", "category", "display_order"),
+    )
     
     id = Column(String(36), primary_key=True)
     
@@ -277,6 +324,120 @@ class FeaturedVideo(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class VideoCampaign(Base):
+    """批量视频生成活动表 - 一次提交多个视频任务（商品 × 方向 × 时长）"""
+    __tablename__ = "video_campaigns"
+    
+    id = Column(String(36), primary_key=True)
+    user_id = Column(String(36), nullable=False, index=True)
+    
+    name = Column(String(200))
+    status = Column(String(20), default='running')  # running, completed, partial, failed, cancelled
+    
+    # 任务统计
+    total_tasks = Column(Integer, default=0)
+    submitted_tasks = Column(Integer, default=0)
+    completed_tasks = Column(Integer, default=0)
+    failed_tasks = Column(Integer, default=0)
+    
+    # 成本统计
+    credits_per_video = Column(Integer, default=0)
+    credits_spent = Column(Integer, default=0)
+    
+    # 活动配置（商品提示词、图片、视频ID与商品的对应关系等）
+    config = Column(JSON)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+
+class Blob(Base):
+    """上传文件内容表 - 按内容哈希去重，引用计数归零时才删除TOS对象"""
+    __tablename__ = "blobs"
+    
+    id = Column(String(36), primary_key=True)
+    sha256 = Column(String(64), nullable=False, unique=True, index=True)  # 内容SHA-256
+    
+    # TOS对象信息
+    object_key = Column(Text, nullable=False)
+    url = Column(Text, nullable=False, index=True)
+    size = Column(Integer)  # 字节
+    content_type = Column(String(100))
+    derivatives = Column(JSON)  # 衍生图 {"webp": {"320": url, ...}}
+    
+    ref_count = Column(Integer, default=1)  # 引用次数（每次上传+1，每次删除-1）
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Order(Base):
+    """充值订单表 - 状态流转：created（已下单）→ paid（已支付）→ credited（已到账）；closed（已关闭）"""
+    __tablename__ = "orders"
+    
+    id = Column(String(36), primary_key=True)
+    order_no = Column(String(64), nullable=False, unique=True, index=True)  # 商户订单号（幂等键）
+    user_id = Column(String(36), nullable=False, index=True)
+    
+    package_id = Column(String(20))  # 套餐ID
+    amount_fen = Column(Integer, nullable=False)  # 订单金额（分）
+    credits = Column(Integer, nullable=False)  # 到账积分
+    
+    status = Column(String(20), default="created", index=True)
+    transaction_id = Column(String(64))  # 微信支付订单号
+    
+    # 对账：未收到回调时主动查询，按指数退避
+    check_count = Column(Integer, default=0)
+    next_check_at = Column(DateTime, index=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    paid_at = Column(DateTime)
+    credited_at = Column(DateTime)
+
+
+class VerificationCode(Base):
+    """邮箱验证码表 - VERIFICATION_CODE_BACKEND=database 时使用，多个worker共享"""
+    __tablename__ = "verification_codes"
+    
+    email = Column(String(100), primary_key=True)
+    code_hash = Column(String(64), nullable=False)  # 验证码的HMAC，不保存明文
+    attempts = Column(Integer, default=0)  # 已输错次数
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class RateLimitCounter(Base):
+    """限流计数表 - 固定窗口计数（验证码发送限流等）"""
+    __tablename__ = "rate_limit_counters"
+    
+    key = Column(String(200), primary_key=True)  # 例如 email:a@b.com、ip:1.2.3.4
+    count = Column(Integer, default=0)
+    window_start = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class MailOutbox(Base):
+    """邮件发件箱表 - MAIL_QUEUE_BACKEND=database 时使用，后台worker按批发送"""
+    __tablename__ = "mail_outbox"
+    
+    id = Column(String(36), primary_key=True)
+    to_email = Column(String(100), nullable=False)
+    subject = Column(String(200), nullable=False)
+    html = Column(Text, nullable=False)
+    
+    # 状态：pending（待发送）、sending（发送中）、sent（已发送）、failed（超过重试次数）
+    status = Column(String(20), default="pending", index=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    locked_at = Column(DateTime)  # 被worker取出的时间
+    last_error = Column(Text)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+
 # ======================
 # 数据库工具函数
 # ======================
@@ -290,6 +451,20 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    """
+    获取只读数据库会话（用于依赖注入）
+
+    配置了只读副本时发往延迟在阈值内的副本，否则使用主库；
+    数据可能比主库落后几秒，刚写入的数据需要立即读到时用 get_db
+    """
+    db = ReadSessionLocal(bind=replica_router.pick())
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def init_database():
     """初始化数据库（创建所有表）"""
     print("[DATABASE] 正在创建数据库表...")
@@ -306,6 +481,12 @@ def init_database():
         print("  - credit_history (积分历史表)")
         print("  - generated_images (九宫格图片表)")
         print("  - featured_videos (精选视频表)")
+        print("  - video_campaigns (批量视频生成活动表)")
+        print("  - blobs (上传文件去重表)")
+        print("  - orders (充值订单表)")
+        print("  - verification_codes (邮箱验证码表)")
+        print("  - rate_limit_counters (限流计数表)")
+        print("  - mail_outbox (邮件发件箱表)")
         return True
     except Exception as e:
         print(f"[DATABASE] ✗ 创建数据库表失败: {e}")
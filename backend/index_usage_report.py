@@ -0,0 +1,112 @@
+"""
+索引使用情况报告（PostgreSQL）
+- 各索引的扫描次数和大小，以及从未使用过的非唯一索引（可考虑删除）
+- 各表顺序扫描 vs 索引扫描次数
+- 热点查询的执行计划：是否用上索引、是否还需要排序
+
+统计数据从上次 pg_stat_reset() 开始累计，生产库运行一段时间后再看
+用法: python index_usage_report.py
+"""
+from sqlalchemy import text
+
+from database import engine
+
+INDEX_SQL = """
+SELECT s.relname AS table_name, s.indexrelname AS index_name, s.idx_scan,
+       s.idx_tup_read, s.idx_tup_fetch, pg_relation_size(s.indexrelid) AS size_bytes,
+       i.indisunique OR i.indisprimary AS is_unique
+FROM pg_stat_user_indexes s
+JOIN pg_index i ON i.indexrelid = s.indexrelid
+ORDER BY s.relname, s.idx_scan DESC
+"""
+
+TABLE_SQL = """
+SELECT relname AS table_name, seq_scan, seq_tup_read, COALESCE(idx_scan, 0) AS idx_scan, n_live_tup
+FROM pg_stat_user_tables
+ORDER BY seq_tup_read DESC
+"""
+
+# (说明, SQL)；:user_id 取一个真实用户
+HOT_QUERIES = [
+    ("用户视频列表", "SELECT * FROM videos WHERE user_id = :user_id ORDER BY created_at DESC"),
+    ("内容广场", "SELECT * FROM videos WHERE is_public = true ORDER BY created_at DESC LIMIT 50"),
+    ("待转存视频", "SELECT id FROM videos WHERE status = 'completed' ORDER BY url_expires_at LIMIT 100"),
+    ("积分记录", "SELECT * FROM credit_history WHERE user_id = :user_id ORDER BY created_at DESC"),
+    ("按关联ID查积分记录", "SELECT id FROM credit_history WHERE related_id = 'sample'"),
+    ("官网精选视频", "SELECT * FROM featured_videos WHERE is_active = true AND category = 'sample' ORDER BY display_order"),
+]
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def plan_nodes(plan: dict):
+    """展开执行计划树，返回 (节点类型, 索引名) 列表"""
+    nodes = [(plan["Node Type"], plan.get("Index Name"))]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def print_index_usage(conn):
+    print("\n[索引使用情况]")
+    print(f"{'表':<20}{'索引':<45}{'扫描次数':>12}{'大小':>10}")
+    unused = []
+    for row in conn.execute(text(INDEX_SQL)).mappings():
+        print(f"{row['table_name']:<20}{row['index_name']:<45}{row['idx_scan']:>12}{format_size(row['size_bytes']):>10}")
+        if row["idx_scan"] == 0 and not row["is_unique"]:
+            unused.append(row)
+
+    print("\n[从未使用的非唯一索引]")
+    if not unused:
+        print("  无")
+    for row in unused:
+        print(f"  {row['table_name']}.{row['index_name']}（{format_size(row['size_bytes'])}）")
+
+
+def print_table_scans(conn):
+    print("\n[表扫描方式]")
+    print(f"{'表':<20}{'顺序扫描':>10}{'顺序读取行数':>16}{'索引扫描':>12}{'行数':>10}")
+    for row in conn.execute(text(TABLE_SQL)).mappings():
+        flag = "  ⚠️" if row["seq_scan"] > row["idx_scan"] and row["n_live_tup"] > 1000 else ""
+        print(f"{row['table_name']:<20}{row['seq_scan']:>10}{row['seq_tup_read']:>16}"
+              f"{row['idx_scan']:>12}{row['n_live_tup']:>10}{flag}")
+
+
+def print_hot_query_plans(conn):
+    print("\n[热点查询执行计划]")
+    user_id = conn.execute(text("SELECT user_id FROM videos GROUP BY user_id ORDER BY count(*) DESC LIMIT 1")).scalar()
+    for title, sql in HOT_QUERIES:
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), {"user_id": user_id or ""}).scalar()
+        nodes = plan_nodes(plan[0]["Plan"])
+        summary = " → ".join(f"{node}({index})" if index else node for node, index in nodes)
+        warn = any(node in ("Seq Scan", "Sort") for node, _ in nodes)
+        print(f"  {'⚠️' if warn else '✓'} {title}: {summary}")
+
+
+def index_usage_report():
+    """打印索引使用情况报告"""
+    if engine.dialect.name != "postgresql":
+        print(f"✗ 仅支持 PostgreSQL（当前为 {engine.dialect.name}）")
+        return False
+    try:
+        with engine.connect() as conn:
+            print_index_usage(conn)
+            print_table_scans(conn)
+            print_hot_query_plans(conn)
+        return True
+    except Exception as e:
+        print(f"✗ 生成报告失败: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("索引使用情况报告")
+    print("=" * 60)
+    index_usage_report()
@@ -56,13 +56,16 @@ import json
 import asyncio
 import requests
 import base64
-import bcrypt  # 新增：密码加密
-import random
-import string
 from typing import Any, List, Optional, Union
 from io import BytesIO
 from datetime import datetime, timedelta
 
+# 日志必须先于服务和路由模块导入配置，否则它们导入时打印的日志会因根 logger 未配置而丢失；
+# 格式化和写 stdout 在后台线程完成
+from utils.logger import setup_logging, shutdown_logging, get_logger
+setup_logging()
+logger = get_logger(__name__)
+
 
 import boto3
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Request
@@ -78,7 +81,7 @@ from sqlalchemy.orm import Session
 
 # 导入数据库模块
 from database import (
-    get_db, test_connection, init_database,
+    engine, replica_engines, get_db, test_connection, init_database,
     User, Product, Project, Video, Character, SavedPrompt, CreditHistory, GeneratedImage, FeaturedVideo
 )
 
@@ -96,11 +99,25 @@ from prompts import (
 )
 
 # 导入微信支付模块
-from wechat_pay import create_native_order, verify_callback_signature, query_order, decrypt_callback_resource
+from wechat_pay import (
+    create_native_order, verify_callback_signature, decrypt_callback_resource,
+    platform_certificates
+)
 
 # 导入新架构模块（渐进式重构）
 from config import settings
-from services import tos_service, credit_service, ai_service
+from services import (
+    tos_service, credit_service, ai_service,
+    campaign_service, thumbnail_service, image_derivative_service, blob_service,
+    password_service, auth_service, verification_service, mail_service, order_service,
+    partition_service
+)
+from services.order_service import PACKAGES
+from services.auth_service import require_admin
+from utils.helpers import get_client_ip
+from utils.metrics import MetricsMiddleware, instrument_engine
+from utils.sql_profiler import QueryProfilerMiddleware, install_query_profiler
+from services.profiler_service import RequestProfilerMiddleware
 from routers.health import router as health_router
 from routers.user import router as user_router
 from routers.admin import router as admin_router
@@ -112,6 +129,8 @@ from routers.project import router as project_router
 from routers.image import router as image_router
 from routers.ai_chat import router as ai_chat_router
 from routers.ai_generation import router as ai_generation_router
+from routers.campaign import router as campaign_router
+from routers.metrics import router as metrics_router
 
 # 加载环境变量
 load_dotenv()
@@ -142,7 +161,7 @@ api_key_pool_str = os.getenv("API_KEY_POOL", "")
 API_KEY_POOL = [key.strip() for key in api_key_pool_str.split(",") if key.strip()]  # 用逗号分隔
 current_api_key_index = 0  # 当前API Key索引
 
-print(f"[API Pool] 加载了 {len(API_KEY_POOL)} 个API令牌")
+logger.info(f"[API Pool] 加载了 {len(API_KEY_POOL)} 个API令牌")
 
 def get_next_api_key():
     """
@@ -176,19 +195,19 @@ IMAGE_GEN_BASE_URL = os.getenv("IMAGE_GEN_BASE_URL", "https://yunwu.ai")
 
 
 if not TOS_ACCESS_KEY or not TOS_SECRET_KEY:
-    print("WARNING: TOS_ACCESS_KEY / TOS_SECRET_KEY 未配置,上传接口会失败。")
+    logger.error("WARNING: TOS_ACCESS_KEY / TOS_SECRET_KEY 未配置,上传接口会失败。")
 else:
-    print(f"[TOS Config] AK: {TOS_ACCESS_KEY[:15]}...")
-    print(f"[TOS Config] SK: {TOS_SECRET_KEY[:15]}...")
-    print(f"[TOS Config] Bucket: {TOS_BUCKET}")
-    print(f"[TOS Config] Region: {TOS_REGION}")
-    print(f"[TOS Config] Endpoint: {TOS_ENDPOINT}")
+    logger.info(f"[TOS Config] AK: {TOS_ACCESS_KEY[:15]}...")
+    logger.info(f"[TOS Config] SK: {TOS_SECRET_KEY[:15]}...")
+    logger.info(f"[TOS Config] Bucket: {TOS_BUCKET}")
+    logger.info(f"[TOS Config] Region: {TOS_REGION}")
+    logger.info(f"[TOS Config] Endpoint: {TOS_ENDPOINT}")
 
 if not LLM_API_KEY:
-    print("WARNING: LLM_API_KEY 未配置，聊天功能将使用模拟模式。")
+    logger.warning("WARNING: LLM_API_KEY 未配置，聊天功能将使用模拟模式。")
 
 if not VIDEO_API_KEY:
-    print("WARNING: VIDEO_GENERATION_API_KEY 未配置，视频生成功能将使用模拟模式。")
+    logger.warning("WARNING: VIDEO_GENERATION_API_KEY 未配置，视频生成功能将使用模拟模式。")
 
 # TOS 客户端（火山云原生SDK）
 import tos
@@ -203,88 +222,19 @@ tos_client = tos.TosClientV2(
     enable_crc=False
 )
 
-print(f"[TOS] SDK初始化成功")
-print(f"[TOS] Endpoint: {TOS_ENDPOINT}")
-print(f"[TOS] Region: {TOS_REGION}")
-print(f"[TOS] Bucket: {TOS_BUCKET}")
-print(f"[TOS] Virtual-Host模式: 自动启用")
-
-print("="*80)
-print("[SERVER INFO] SoraDirector Backend Starting")
-print("[SERVER INFO] Build Version: 2025-12-19-v4-character-support")
-print("[SERVER INFO] 核心功能：")
-print("  - 脚本生成：使用Sora 2标准模板结构")
-print("  - 视频生成：添加产品材质和几何描述")
-print("  - 角色创建：支持sora-2-characters模型")
-print("[SERVER INFO] API Endpoints: /upload-image, /generate-script, /generate-video, /query-video-task, /create-character")
-print("="*80)
-
-# ======================
-# 邮箱验证码配置
-# ======================
+logger.info(f"[TOS] SDK初始化成功")
+logger.info(f"[TOS] Endpoint: {TOS_ENDPOINT}")
+logger.info(f"[TOS] Region: {TOS_REGION}")
+logger.info(f"[TOS] Bucket: {TOS_BUCKET}")
+logger.info(f"[TOS] Virtual-Host模式: 自动启用")
 
-# 验证码存储（内存，生产环境建议使用Redis）
-verification_codes = {}
-
-# 邮件配置
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.qq.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USER = os.getenv("SMTP_USER", "")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
-SENDER_EMAIL = os.getenv("SENDER_EMAIL", SMTP_USER)
-SENDER_NAME = os.getenv("SENDER_NAME", "SemoPic AI视频平台")
-
-def generate_verification_code():
-    """生成6位数字验证码"""
-    return ''.join(random.choices(string.digits, k=6))
-
-def send_verification_email(email: str, code: str):
-    """发送验证码邮件"""
-    if not SMTP_USER or not SMTP_PASSWORD:
-        print("[邮件] SMTP未配置，验证码将打印到控制台")
-        print(f"[验证码] {email}: {code}")
-        return True
-    
-    try:
-        import smtplib
-        from email.mime.text import MIMEText
-        from email.mime.multipart import MIMEMultipart
-        
-        message = MIMEMultipart()
-        message['From'] = f"{SENDER_NAME} <{SENDER_EMAIL}>"
-        message['To'] = email
-        message['Subject'] = "【SemoPic】邮箱验证码"
-        
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; padding: 20px;">
-            <h2 style="color: #7c3aed;">SemoPic AI视频平台</h2>
-            <p>您好！</p>
-            <p>您的邮箱验证码是：</p>
-            <h1 style="color: #7c3aed; font-size: 32px; letter-spacing: 5px;">{code}</h1>
-            <p style="color: #666;">验证码有效期为10分钟，请及时使用。</p>
-            <p style="color: #999; font-size: 12px; margin-top: 30px;">
-                如果这不是您的操作，请忽略此邮件。
-            </p>
-        </body>
-        </html>
-        """
-        
-        message.attach(MIMEText(html_content, 'html'))
-        
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(message)
-        
-        print(f"[邮件] 验证码已发送到 {email}")
-        return True
-    except Exception as e:
-        print(f"[邮件] 发送失败: {e}")
-        print(f"[验证码] {email}: {code}")
-        import traceback
-        traceback.print_exc()
-        return False
+logger.info("[SERVER INFO] SoraDirector Backend Starting")
+logger.info("[SERVER INFO] Build Version: 2025-12-19-v4-character-support")
+logger.info("[SERVER INFO] 核心功能：")
+logger.info("  - 脚本生成：使用Sora 2标准模板结构")
+logger.info("  - 视频生成：添加产品材质和几何描述")
+logger.info("  - 角色创建：支持sora-2-characters模型")
+logger.info("[SERVER INFO] API Endpoints: /upload-image, /generate-script, /generate-video, /query-video-task, /create-character")
 
 # AI 客户端（用于对话和视频生成）
 ai_client = None
@@ -427,57 +377,88 @@ from contextlib import asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
-    print("\n" + "="*80)
-    print("[DATABASE] 正在初始化数据库连接...")
-    print("="*80)
+    # 签名密钥不安全时拒绝启动（任何人都能用公开的示例密钥伪造管理员令牌）
+    settings.get_jwt_secret()
+    
+    logger.info("[DATABASE] 正在初始化数据库连接...")
     
     if test_connection():
-        print("[DATABASE] [OK] 数据库连接成功！")
-        print("[DATABASE] 数据将保存到 PostgreSQL")
+        logger.info("[DATABASE] [OK] 数据库连接成功！")
+        logger.info("[DATABASE] 数据将保存到 PostgreSQL")
     else:
-        print("[DATABASE] [ERROR] 数据库连接失败！")
-        print("[DATABASE] 应用将继续运行，但数据不会持久化")
+        logger.error("[DATABASE] [ERROR] 数据库连接失败！")
+        logger.info("[DATABASE] 应用将继续运行，但数据不会持久化")
+    
+    
+    # 启动批量视频活动调度器（会继续处理重启前未完成的活动）
+    campaign_service.start()
+    
+    # 启动邮件发送worker
+    mail_service.start()
+    
+    # 加载微信支付平台证书并启动后台刷新（回调验签只使用缓存的证书）
+    platform_certificates.start()
+    
+    # 启动订单对账（主动查询未收到回调的订单）
+    order_service.start()
+    
+    # 启动按月分区维护（提前建分区，可选归档冷分区）
+    partition_service.start()
     
-    print("="*80 + "\n")
     yield
     # 关闭时执行
-    print("[DATABASE] 关闭数据库连接...")
+    await campaign_service.stop()
+    thumbnail_service.shutdown()
+    image_derivative_service.shutdown()
+    password_service.shutdown()
+    await mail_service.stop()
+    await platform_certificates.stop()
+    await order_service.stop()
+    await partition_service.stop()
+    logger.info("[DATABASE] 关闭数据库连接...")
+    shutdown_logging()
 
 app = FastAPI(title="SoraDirector Backend", version="0.1.0", docs_url=None, redoc_url=None, openapi_url="/openapi.json", lifespan=lifespan)
 
 # 注册新架构路由（渐进式重构 - 阶段1&2&3&4&5&6&7）
 app.include_router(health_router, tags=["Health Check"])
-print("[ROUTER] ✅ 健康检查路由已注册: /api/health")
+logger.info("[ROUTER] ✅ 健康检查路由已注册: /api/health")
 
 app.include_router(user_router, tags=["User Management"])
-print("[ROUTER] ✅ 用户管理路由已注册: /api/register, /api/login, /api/user")
+logger.info("[ROUTER] ✅ 用户管理路由已注册: /api/register, /api/login, /api/user")
 
 app.include_router(admin_router, tags=["Admin Management"])
-print("[ROUTER] ✅ 管理员路由已注册: /api/admin/*")
+logger.info("[ROUTER] ✅ 管理员路由已注册: /api/admin/*")
 
 app.include_router(video_router, tags=["Video Management"])
-print("[ROUTER] ✅ 视频管理路由已注册: /api/videos, /api/public-videos")
+logger.info("[ROUTER] ✅ 视频管理路由已注册: /api/videos, /api/public-videos")
 
 app.include_router(product_router, tags=["Product Management"])
-print("[ROUTER] ✅ 商品管理路由已注册: /api/products, /api/product")
+logger.info("[ROUTER] ✅ 商品管理路由已注册: /api/products, /api/product")
 
 app.include_router(prompt_router, tags=["Prompt Management"])
-print("[ROUTER] ✅ 提示词管理路由已注册: /api/prompts")
+logger.info("[ROUTER] ✅ 提示词管理路由已注册: /api/prompts")
 
 app.include_router(character_router, tags=["Character Management"])
-print("[ROUTER] ✅ 角色管理路由已注册: /api/characters")
+logger.info("[ROUTER] ✅ 角色管理路由已注册: /api/characters")
 
 app.include_router(project_router, tags=["Project Management"])
-print("[ROUTER] ✅ 项目管理路由已注册: /api/projects")
+logger.info("[ROUTER] ✅ 项目管理路由已注册: /api/projects")
 
 app.include_router(image_router, tags=["Image Processing"])
-print("[ROUTER] ✅ 图片处理路由已注册: /api/upload-image, /api/combine-images, /api/generate-nine-grid")
+logger.info("[ROUTER] ✅ 图片处理路由已注册: /api/upload-image, /api/combine-images, /api/generate-nine-grid")
 
 app.include_router(ai_chat_router, tags=["AI Chat & Script"])
-print("[ROUTER] ✅ AI聊天和脚本路由已注册: /api/chat, /api/generate-script, /api/generate-script-ai")
+logger.info("[ROUTER] ✅ AI聊天和脚本路由已注册: /api/chat, /api/generate-script, /api/generate-script-ai, /api/generate-script-ai/batch")
 
 app.include_router(ai_generation_router, tags=["AI Generation"])
-print("[ROUTER] ✅ AI生成路由已注册: /api/generate-video, /api/generate-character, /api/create-character")
+logger.info("[ROUTER] ✅ AI生成路由已注册: /api/generate-video, /api/generate-character, /api/create-character")
+
+app.include_router(campaign_router, tags=["Video Campaigns"])
+logger.info("[ROUTER] ✅ 批量视频活动路由已注册: /api/campaigns")
+
+app.include_router(metrics_router)
+logger.info("[ROUTER] ✅ 指标路由已注册: /metrics")
 
 # CORS：开发阶段先全放开
 app.add_middleware(
@@ -486,23 +467,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Query-Count", "X-Query-Time-Ms", "X-Profile-Id"],
 )
 
+# 单请求 CPU 采样（请求头 X-Profile）
+if settings.PROFILER_ENABLED and settings.PROFILER_REQUEST_TOKEN:
+    app.add_middleware(RequestProfilerMiddleware)
+
+# SQL 性能分析（调试/压测用）
+if settings.SQL_PROFILE_ENABLED:
+    app.add_middleware(QueryProfilerMiddleware)
+    for db_engine in [engine, *replica_engines]:
+        install_query_profiler(db_engine)
+    logger.warning("[SQL] SQL性能分析已开启（X-Query-Count 响应头、N+1 告警）")
+
+# 请求指标（最外层，耗时包含其他中间件）
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    for db_engine in [engine, *replica_engines]:
+        instrument_engine(db_engine)
+
 # 添加Pydantic验证错误处理
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    print("="*80)
-    print("[❗ 422错误] Pydantic验证失败:")
-    print(f"  请求路径: {request.url.path}")
-    print(f"  请求方法: {request.method}")
-    print(f"  错误详情:")
+    logger.error("[❗ 422错误] Pydantic验证失败:")
+    logger.info(f"  请求路径: {request.url.path}")
+    logger.info(f"  请求方法: {request.method}")
+    logger.error(f"  错误详情:")
     for error in exc.errors():
-        print(f"    - 字段: {error['loc']}")
-        print(f"      类型: {error['type']}")
-        print(f"      消息: {error['msg']}")
+        logger.info(f"    - 字段: {error['loc']}")
+        logger.info(f"      类型: {error['type']}")
+        logger.info(f"      消息: {error['msg']}")
         if 'input' in error:
-            print(f"      输入值: {error['input']}")
-    print("="*80)
+            logger.info(f"      输入值: {error['input']}")
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors(), "body": str(exc.body)}
@@ -576,7 +573,7 @@ def url_to_base64(image_url: str) -> str:
         content_type = response.headers.get('Content-Type', 'image/jpeg')
         return f"data:{content_type};base64,{base64_str}"
     except Exception as e:
-        print(f"[ERROR] 图片转换base64失败: {e}")
+        logger.error(f"[ERROR] 图片转换base64失败: {e}")
         return None
 
 async def chat_with_ai(prompt: str, system_prompt: Optional[str] = None, image_url: Optional[str] = None, history: Optional[List[dict]] = None) -> str:
@@ -604,17 +601,17 @@ async def chat_with_ai(prompt: str, system_prompt: Optional[str] = None, image_u
             if image_url.startswith('data:image'):
                 # 已经是base64，直接使用
                 base64_image = image_url
-                print(f"[DEBUG] 使用前端传入的base64图片，长度: {len(base64_image)}")
+                logger.debug(f"[DEBUG] 使用前端传入的base64图片，长度: {len(base64_image)}")
             else:
                 # 是URL，需要转换
                 base64_image = url_to_base64(image_url)
                 if not base64_image:
                     # 转换失败，仅发送文本
                     messages.append({"role": "user", "content": prompt})
-                    print(f"[DEBUG] 图片转换失败，仅发送文本")
+                    logger.error(f"[DEBUG] 图片转换失败，仅发送文本")
                     base64_image = ""  # 设置为空字符串而非None
                 else:
-                    print(f"[DEBUG] URL转换为base64，长度: {len(base64_image)}")
+                    logger.debug(f"[DEBUG] URL转换为base64，长度: {len(base64_image)}")
             
             if base64_image:
                 messages.append({
@@ -627,7 +624,7 @@ async def chat_with_ai(prompt: str, system_prompt: Optional[str] = None, image_u
         else:
             messages.append({"role": "user", "content": prompt})
         
-        print(f"[DEBUG] 调用AI，模型: {LLM_MODEL_NAME}, 消息: {messages}")
+        logger.debug("[DEBUG] 调用AI，模型: %s, 消息: %s", LLM_MODEL_NAME, messages)
         
         response = ai_client.chat.completions.create(
             model=LLM_MODEL_NAME,
@@ -636,45 +633,45 @@ async def chat_with_ai(prompt: str, system_prompt: Optional[str] = None, image_u
             max_tokens=2000  # 增加token限制
         )
         
-        print(f"[DEBUG] AI原始响应类型: {type(response)}")
-        print(f"[DEBUG] AI原始响应: {response}")
+        logger.debug(f"[DEBUG] AI原始响应类型: {type(response)}")
+        logger.debug("[DEBUG] AI原始响应: %s", response)
         
         # 详细检查choices
         if hasattr(response, 'choices'):
-            print(f"[DEBUG] choices数量: {len(response.choices)}")
+            logger.debug(f"[DEBUG] choices数量: {len(response.choices)}")
             if len(response.choices) > 0:
                 first_choice = response.choices[0]
-                print(f"[DEBUG] 第一个choice: {first_choice}")
-                print(f"[DEBUG] message: {first_choice.message}")
-                print(f"[DEBUG] message.content: {first_choice.message.content}")
-                print(f"[DEBUG] content类型: {type(first_choice.message.content)}")
-                print(f"[DEBUG] content长度: {len(first_choice.message.content) if first_choice.message.content else 0}")
+                logger.debug(f"[DEBUG] 第一个choice: {first_choice}")
+                logger.debug(f"[DEBUG] message: {first_choice.message}")
+                logger.debug(f"[DEBUG] message.content: {first_choice.message.content}")
+                logger.debug(f"[DEBUG] content类型: {type(first_choice.message.content)}")
+                logger.debug(f"[DEBUG] content长度: {len(first_choice.message.content) if first_choice.message.content else 0}")
         
         # 处理云雾API的响应格式
         # 检查是否有 choices 属性
         if hasattr(response, 'choices') and len(response.choices) > 0:
             content = response.choices[0].message.content
-            print(f"[DEBUG] 提取内容(方式1): {content}")
+            logger.debug("[DEBUG] 提取内容(方式1): %s", content)
             return content or "AI返回了空内容"
         # 如果是字典格式
         elif isinstance(response, dict):
             if 'choices' in response and len(response['choices']) > 0:
                 content = response['choices'][0]['message']['content']
-                print(f"[DEBUG] 提取内容(方式2): {content}")
+                logger.debug("[DEBUG] 提取内容(方式2): %s", content)
                 return content or "AI返回了空内容"
             elif 'content' in response:
-                print(f"[DEBUG] 提取内容(方式3): {response['content']}")
+                logger.debug(f"[DEBUG] 提取内容(方式3): {response['content']}")
                 return response['content'] or "AI返回了空内容"
         # 如果直接返回字符串
         elif isinstance(response, str):
-            print(f"[DEBUG] 提取内容(方式4): {response}")
+            logger.debug("[DEBUG] 提取内容(方式4): %s", response)
             return response or "AI返回了空内容"
         else:
-            print(f"[ERROR] AI 响应格式异常: {type(response)}, {response}")
+            logger.error("[ERROR] AI 响应格式异常: %s, %s", type(response), response)
             return "收到。正在分析您的请求..."
             
     except Exception as e:
-        print(f"[ERROR] AI 对话错误: {e}")
+        logger.error(f"[ERROR] AI 对话错误: {e}")
         import traceback
         traceback.print_exc()  # 打印详细堆栈
         return f"抱歉，AI 服务暂时不可用。请稍后再试。"
@@ -683,23 +680,7 @@ async def chat_with_ai(prompt: str, system_prompt: Optional[str] = None, image_u
 # 密码加密工具函数
 # ======================
 
-def hash_password(password: str) -> str:
-    """
-    使用 bcrypt 加密密码
-    """
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    验证密码是否正确
-    """
-    try:
-        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-    except Exception as e:
-        print(f"[密码验证错误] {str(e)}")
-        return False
+# 密码加密已移至 services/password_service.py（线程池执行，支持cost调整和自动重新加密）
 
 
 async def generate_video_with_ai(prompt: str, images: Optional[List[str]] = None, orientation: Optional[str] = "portrait", 
@@ -766,7 +747,7 @@ async def generate_video_with_ai(prompt: str, images: Optional[List[str]] = None
             "private": private  # 布尔值 - 重要！必须传递
         }
         
-        print(f"[VIDEO GENERATION] 前端传入size: {size}, 实际使用: {size}")
+        logger.info(f"[VIDEO GENERATION] 前端传入size: {size}, 实际使用: {size}")
         
         # 根据是否有角色ID添加参数
         # 注意：带角色的API使用 character_url 和 character_timestamps，不是character_id
@@ -782,11 +763,11 @@ async def generate_video_with_ai(prompt: str, images: Optional[List[str]] = None
         # - 普通视频：https://yunwu.apifox.cn/api-358068907.md
         # - 带角色：https://yunwu.apifox.cn/api-369666077.md
         
-        print(f"[VIDEO GENERATION] Enhanced Prompt: {enhanced_prompt[:200]}...")  # 打印前200个字符
-        print(f"[VIDEO GENERATION] API Endpoint: {api_endpoint}")
-        print(f"[VIDEO GENERATION] Payload: {payload}")  # 打印完整payload用于调试
+        logger.info(f"[VIDEO GENERATION] Enhanced Prompt: {enhanced_prompt[:200]}...")  # 打印前200个字符
+        logger.info(f"[VIDEO GENERATION] API Endpoint: {api_endpoint}")
+        logger.debug("[VIDEO GENERATION] Payload: %s", payload)
         if character_id:
-            print(f"[VIDEO GENERATION] Character ID: {character_id}")
+            logger.info(f"[VIDEO GENERATION] Character ID: {character_id}")
         
         # 调用创建视频任务接口（云雾 API - 统一视频格式）
         # 参考文档：https://yunwu.apifox.cn/api-358068907.md (普通)
@@ -803,13 +784,13 @@ async def generate_video_with_ai(prompt: str, images: Optional[List[str]] = None
         
         result = response.json()
         
-        print(f"[VIDEO GENERATION] API返回: {result}")
+        logger.debug("[VIDEO GENERATION] API返回: %s", result)
         
         # 根据实际 API 响应结构提取数据
         # 情兵1：直接返回结果（同步模式）
         if "url" in result or "video_url" in result:
             video_url = result.get("video_url") or result.get("url")
-            print(f"[VIDEO GENERATION] ✅ 视频立即生成完成: {video_url}")
+            logger.info(f"[VIDEO GENERATION] ✅ 视频立即生成完成: {video_url}")
             return {
                 "url": video_url,
                 "thumbnail": result.get("thumbnail"),
@@ -820,7 +801,7 @@ async def generate_video_with_ai(prompt: str, images: Optional[List[str]] = None
         # 情兵2：返回任务ID（异步模式）- 立即返回，不要轮询
         elif "id" in result or "task_id" in result:
             task_id = result.get("id") or result.get("task_id")
-            print(f"[VIDEO GENERATION] 🔄 异步任务创建成功: {task_id}")
+            logger.info(f"[VIDEO GENERATION] 🔄 异步任务创建成功: {task_id}")
             return {
                 "status": "processing",
                 "task_id": task_id,
@@ -829,14 +810,14 @@ async def generate_video_with_ai(prompt: str, images: Optional[List[str]] = None
         
         # 情兵3：未知响应格式
         else:
-            print(f"[VIDEO GENERATION] ⚠️ 未知响应格式: {result}")
+            logger.warning("[VIDEO GENERATION] ⚠️ 未知响应格式: %s", result)
             return {
                 "status": "unknown",
                 "raw_response": result
             }
             
     except Exception as e:
-        print(f"视频生成错误: {e}")
+        logger.error(f"视频生成错误: {e}")
         # 如果失败，返回模拟 URL
         return {
             "url": "https://media.w3.org/2010/05/sintel/trailer_hd.mp4",
@@ -871,7 +852,7 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    print("[HEALTH CHECK] Server version: 2025-12-17-v3-sora2-optimized")
+    logger.info("[HEALTH CHECK] Server version: 2025-12-17-v3-sora2-optimized")
     return {"status": "ok", "version": "2025-12-17-v3-sora2-optimized"}
 
 
@@ -891,26 +872,26 @@ async def upload_image(file: UploadFile = File(...)):
     ext = os.path.splitext(file.filename)[1] if file.filename else ""
     key = f"uploads/{time.strftime('%Y%m%d')}/{int(time.time()*1000)}-{uuid.uuid4().hex}{ext}"
 
-    print(f"[Upload] 开始上传: {file.filename}")
-    print(f"[Upload] Content-Type: {file.content_type}")
-    print(f"[Upload] Bucket: {TOS_BUCKET}")
-    print(f"[Upload] Key: {key}")
-    print(f"[Upload] Endpoint: {TOS_ENDPOINT}")
-    print(f"[Upload] Region: {TOS_REGION}")
-    print(f"[Upload] AK: {TOS_ACCESS_KEY[:10] if TOS_ACCESS_KEY else 'None'}...")
+    logger.info(f"[Upload] 开始上传: {file.filename}")
+    logger.info(f"[Upload] Content-Type: {file.content_type}")
+    logger.info(f"[Upload] Bucket: {TOS_BUCKET}")
+    logger.info(f"[Upload] Key: {key}")
+    logger.info(f"[Upload] Endpoint: {TOS_ENDPOINT}")
+    logger.info(f"[Upload] Region: {TOS_REGION}")
+    logger.info(f"[Upload] AK: {TOS_ACCESS_KEY[:10] if TOS_ACCESS_KEY else 'None'}...")
 
     try:
         # 读取文件内容
         content = await file.read()
         file_size = len(content)
-        print(f"[Upload] 文件大小: {file_size} bytes ({file_size/1024:.2f} KB)")
+        logger.info(f"[Upload] 文件大小: {file_size} bytes ({file_size/1024:.2f} KB)")
         
         if file_size == 0:
             raise HTTPException(status_code=400, detail="文件为空")
         
         # 使用TOS SDK上传（Virtual-Host模式）
-        print(f"[Upload] 调用TOS SDK put_object...")
-        print(f"[Upload] 将上传 {file_size} 字节的数据")
+        logger.info(f"[Upload] 调用TOS SDK put_object...")
+        logger.info(f"[Upload] 将上传 {file_size} 字节的数据")
         
         # 使用BytesIO包装以确保完整传输
         from io import BytesIO
@@ -922,40 +903,37 @@ async def upload_image(file: UploadFile = File(...)):
             content_type=file.content_type
         )
         
-        print(f"[Upload] ✅ 上传成功!")
-        print(f"[Upload] RequestID: {result.request_id}")
-        print(f"[Upload] ETag: {result.etag if hasattr(result, 'etag') else 'N/A'}")
+        logger.info(f"[Upload] ✅ 上传成功!")
+        logger.info(f"[Upload] RequestID: {result.request_id}")
+        logger.info(f"[Upload] ETag: {result.etag if hasattr(result, 'etag') else 'N/A'}")
         
     except tos.exceptions.TosServerError as e:
-        print(f"[Upload Error] ❌ TOS服务器错误")
-        print("="*80)
-        print(f"Status Code: {e.status_code}")
-        print(f"RequestID: {e.request_id}")
-        print(f"Code: {e.code}")
-        print(f"Message: {e.message}")
-        print(f"HostID: {e.host_id}")
-        print("="*80)
+        logger.error(f"[Upload Error] ❌ TOS服务器错误")
+        logger.info(f"Status Code: {e.status_code}")
+        logger.info(f"RequestID: {e.request_id}")
+        logger.info(f"Code: {e.code}")
+        logger.info(f"Message: {e.message}")
+        logger.info(f"HostID: {e.host_id}")
         raise HTTPException(status_code=500, detail=f"上传失败: {e.message}")
         
     except tos.exceptions.TosClientError as e:
-        print(f"[Upload Error] ❌ TOS客户端错误: {e.message}")
+        logger.error(f"[Upload Error] ❌ TOS客户端错误: {e.message}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"上传失败: {e.message}")
         
     except Exception as e:
-        print(f"[Upload Error] ❌ 未知错误: {type(e).__name__}")
-        print(f"[Upload Error] 错误详情: {str(e)}")
+        logger.error(f"[Upload Error] ❌ 未知错误: {type(e).__name__}")
+        logger.error(f"[Upload Error] 错误详情: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
     # 构建Virtual-Host访问URL
     url = build_public_url(TOS_BUCKET, key)
-    print(f"[Upload] 返回URL: {url}")
-    print(f"[Upload] Virtual-Host格式: {TOS_BUCKET}.{TOS_ENDPOINT.replace('https://', '')}")
-    print(f"[Upload] 完成！文件大小: {file_size} bytes")
-    print("="*80)
+    logger.info(f"[Upload] 返回URL: {url}")
+    logger.info(f"[Upload] Virtual-Host格式: {TOS_BUCKET}.{TOS_ENDPOINT.replace('https://', '')}")
+    logger.info(f"[Upload] 完成！文件大小: {file_size} bytes")
     
     return {"url": url, "size": file_size}
 
@@ -986,7 +964,7 @@ async def combine_images(req: CombineImagesRequest):
     
     # 1张图不需要拼接
     if image_count == 1:
-        print('[拼接] 只有1张图片，无需拼接')
+        logger.info('[拼接] 只有1张图片，无需拼接')
         return {"gridUrl": req.imageUrls[0], "originalUrls": req.imageUrls}
     
     if image_count > 9:
@@ -996,19 +974,19 @@ async def combine_images(req: CombineImagesRequest):
     grid_size = 2 if image_count <= 4 else 3
     max_images = grid_size * grid_size
     
-    print(f"[拼接] 开始拼接 {image_count} 张图片为 {grid_size}x{grid_size} 宫格...")
+    logger.info(f"[拼接] 开始拼接 {image_count} 张图片为 {grid_size}x{grid_size} 宫格...")
     
     try:
         # 下载所有图片
         images = []
         for url in req.imageUrls:
-            print(f"[拼接] 下载图片: {url}")
+            logger.info(f"[拼接] 下载图片: {url}")
             response = requests.get(url, timeout=30)
             response.raise_for_status()
             img = Image.open(BytesIO(response.content))
             images.append(img)
         
-        print('[拼接] 所有图片下载完成')
+        logger.info('[拼接] 所有图片下载完成')
         
         # 创建画布
         cell_width = 400
@@ -1040,9 +1018,9 @@ async def combine_images(req: CombineImagesRequest):
             
             # 粘贴到画布
             canvas.paste(img_cropped, (x, y))
-            print(f"[拼接] 绘制第{i + 1}张图片: 位置({row}, {col})")
+            logger.info(f"[拼接] 绘制第{i + 1}张图片: 位置({row}, {col})")
         
-        print('[拼接] 所有图片绘制完成，开始压缩...')
+        logger.info('[拼接] 所有图片绘制完成，开始压缩...')
         
         # 保存为JPEG（压缩）
         output = BytesIO()
@@ -1050,13 +1028,13 @@ async def combine_images(req: CombineImagesRequest):
         output.seek(0)
         
         file_size = len(output.getvalue())
-        print(f"[拼接] 拼接完成，大小: {file_size / 1024:.2f} KB")
+        logger.info(f"[拼接] 拼接完成，大小: {file_size / 1024:.2f} KB")
         
         # 上传到TOS
         ext = ".jpg"
         key = f"uploads/{time.strftime('%Y%m%d')}/{int(time.time()*1000)}-grid-{grid_size}x{grid_size}{ext}"
         
-        print(f"[拼接] 开始上传到TOS: {key}")
+        logger.info(f"[拼接] 开始上传到TOS: {key}")
         result = tos_client.put_object(
             bucket=TOS_BUCKET,
             key=key,
@@ -1066,10 +1044,10 @@ async def combine_images(req: CombineImagesRequest):
         )
         
         grid_url = build_public_url(TOS_BUCKET, key)
-        print(f"[拼接] 上传成功: {grid_url}")
+        logger.info(f"[拼接] 上传成功: {grid_url}")
         
         # 删除原图
-        print(f"[清理] 开始从桶中删除 {len(req.imageUrls)} 张原图...")
+        logger.info(f"[清理] 开始从桶中删除 {len(req.imageUrls)} 张原图...")
         for url in req.imageUrls:
             try:
                 # 从 URL提取对象键
@@ -1077,11 +1055,11 @@ async def combine_images(req: CombineImagesRequest):
                 if len(parts) >= 2:
                     object_key = parts[1]
                     tos_client.delete_object(bucket=TOS_BUCKET, key=object_key)
-                    print(f"[清理] ✅ 删除成功: {object_key}")
+                    logger.info(f"[清理] ✅ 删除成功: {object_key}")
             except Exception as e:
-                print(f"[清理] ⚠️ 删除失败: {url}, 错误: {str(e)}")
+                logger.warning(f"[清理] ⚠️ 删除失败: {url}, 错误: {str(e)}")
         
-        print(f"✅ {grid_size}x{grid_size}宫格拼接并上传成功！")
+        logger.info(f"✅ {grid_size}x{grid_size}宫格拼接并上传成功！")
         
         return {
             "gridUrl": grid_url,
@@ -1090,10 +1068,10 @@ async def combine_images(req: CombineImagesRequest):
         }
         
     except requests.RequestException as e:
-        print(f"[拼接] 下载图片失败: {str(e)}")
+        logger.error(f"[拼接] 下载图片失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"下载图片失败: {str(e)}")
     except Exception as e:
-        print(f"[拼接] 拼接失败: {str(e)}")
+        logger.error(f"[拼接] 拼接失败: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"图片拼接失败: {str(e)}")
@@ -1127,13 +1105,13 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
             detail=f"积分不足！当前积分：{user.credits}，需要：{CREDITS_COST}"
         )
     
-    print(f"[九宫格] 开始生成九宫格图片...")
-    print(f"[九宫格] 用户ID: {req.user_id}, 当前积分: {user.credits}")
-    print(f"[九宫格] 原始图片: {req.imageUrl}")
+    logger.info(f"[九宫格] 开始生成九宫格图片...")
+    logger.info(f"[九宫格] 用户ID: {req.user_id}, 当前积分: {user.credits}")
+    logger.info(f"[九宫格] 原始图片: {req.imageUrl}")
     
     try:
         # 下载原始图片并转换为base64
-        print(f"[九宫格] 下载原始图片...")
+        logger.info(f"[九宫格] 下载原始图片...")
         img_response = requests.get(req.imageUrl, timeout=30)
         img_response.raise_for_status()
         
@@ -1160,9 +1138,9 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
 
 请生成一张完整的3x3宫格图片，不要分开生成。"""
         
-        print(f"[九宫格] 调用Gemini API...")
-        print(f"[九宫格] 模型: {IMAGE_GEN_MODEL_NAME}")
-        print(f"[九宫格] Base URL: {IMAGE_GEN_BASE_URL}")
+        logger.info(f"[九宫格] 调用Gemini API...")
+        logger.info(f"[九宫格] 模型: {IMAGE_GEN_MODEL_NAME}")
+        logger.info(f"[九宫格] Base URL: {IMAGE_GEN_BASE_URL}")
         
         # 根据API文档，使用正确的调用格式
         api_url = f"{IMAGE_GEN_BASE_URL}/v1beta/models/{IMAGE_GEN_MODEL_NAME}:generateContent"
@@ -1200,34 +1178,34 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
             }
         }
         
-        print(f"[九宫格] 发送请求到: {api_url}")
+        logger.info(f"[九宫格] 发送请求到: {api_url}")
         response = requests.post(api_url, headers=headers, params=params, json=payload, timeout=120)
         
         if response.status_code != 200:
             error_text = response.text
-            print(f"[九宫格] API错误: {error_text}")
+            logger.error(f"[九宫格] API错误: {error_text}")
             raise HTTPException(status_code=response.status_code, detail=f"Gemini API调用失败: {error_text}")
         
         result = response.json()
-        print(f"[九宫格] API完整响应: {json.dumps(result, indent=2, ensure_ascii=False)}")
+        logger.debug("[九宫格] API完整响应: %s", result)
         
         # 解析返回的图片数据
         if 'candidates' in result and len(result['candidates']) > 0:
             candidate = result['candidates'][0]
-            print(f"[九宫格] candidate结构: {json.dumps(candidate, indent=2, ensure_ascii=False)}")
+            logger.debug("[九宫格] candidate结构: %s", candidate)
             
             if 'content' in candidate and 'parts' in candidate['content']:
                 parts = candidate['content']['parts']
-                print(f"[九宫格] parts数量: {len(parts)}")
+                logger.info(f"[九宫格] parts数量: {len(parts)}")
                 
                 for i, part in enumerate(parts):
-                    print(f"[九宫格] part[{i}]的keys: {part.keys()}")
+                    logger.info(f"[九宫格] part[{i}]的keys: {part.keys()}")
                     
                     # Gemini API返回的是 inlineData（驼峰命名），不是 inline_data
                     if 'inlineData' in part:
                         # 获取生成的图片base64数据
                         generated_image_base64 = part['inlineData']['data']
-                        print(f"[九宫格] 获取到base64数据，长度: {len(generated_image_base64)}")
+                        logger.info(f"[九宫格] 获取到base64数据，长度: {len(generated_image_base64)}")
                         
                         # 解码base64为二进制
                         img_data = base64.b64decode(generated_image_base64)
@@ -1237,8 +1215,8 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
                         ext = ".jpg"
                         key = f"uploads/{time.strftime('%Y%m%d')}/{int(time.time()*1000)}-nine-grid{ext}"
                         
-                        print(f"[九宫格] 上传到TOS: {key}")
-                        print(f"[九宫格] 文件大小: {file_size / 1024:.2f} KB")
+                        logger.info(f"[九宫格] 上传到TOS: {key}")
+                        logger.info(f"[九宫格] 文件大小: {file_size / 1024:.2f} KB")
                         
                         tos_result = tos_client.put_object(
                             bucket=TOS_BUCKET,
@@ -1249,7 +1227,7 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
                         )
                         
                         grid_url = build_public_url(TOS_BUCKET, key)
-                        print(f"[九宫格] 上传成功: {grid_url}")
+                        logger.info(f"[九宫格] 上传成功: {grid_url}")
                         
                         # 2. 图片生成成功，扣除积分
                         old_credits = user.credits
@@ -1279,9 +1257,9 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
                         db.add(generated_image)
                         db.commit()
                         
-                        print(f"[九宫格] 积分扣除成功: {old_credits} -> {user.credits}")
-                        print(f"[九宫格] 图片记录已保存: {generated_image.id}")
-                        print(f"✅ 九宫格图片生成并上传成功！")
+                        logger.info(f"[九宫格] 积分扣除成功: {old_credits} -> {user.credits}")
+                        logger.info(f"[九宫格] 图片记录已保存: {generated_image.id}")
+                        logger.info(f"✅ 九宫格图片生成并上传成功！")
                         
                         return {
                             "success": True,
@@ -1294,20 +1272,20 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
                         }
 
         # 如果没有找到图片数据，打印完整响应帮助调试
-        print(f"[九宫格] 未找到图片数据，完整响应结构:")
-        print(f"  - 是否有candidates: {'candidates' in result}")
+        logger.debug(f"[九宫格] 未找到图片数据，完整响应结构:")
+        logger.info(f"  - 是否有candidates: {'candidates' in result}")
         if 'candidates' in result:
-            print(f"  - candidates数量: {len(result['candidates'])}")
+            logger.info(f"  - candidates数量: {len(result['candidates'])}")
         raise HTTPException(status_code=500, detail="Gemini API返回格式异常，未找到生成的图片")
         
     except requests.exceptions.Timeout:
-        print(f"[九宫格] API请求超时")
+        logger.info(f"[九宫格] API请求超时")
         raise HTTPException(status_code=504, detail="Gemini API请求超时，请稍后重试")
     except requests.exceptions.RequestException as e:
-        print(f"[九宫格] 网络请求错误: {e}")
+        logger.error(f"[九宫格] 网络请求错误: {e}")
         raise HTTPException(status_code=500, detail=f"网络请求失败: {str(e)}")
     except Exception as e:
-        print(f"[九宫格] 生成失败: {e}")
+        logger.error(f"[九宫格] 生成失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"九宫格图片生成失败: {str(e)}")
@@ -1318,7 +1296,7 @@ async def get_generated_images(user_id: str, db: Session = Depends(get_db)):
     """
     获取用户生成的九宫格图片列表
     """
-    print(f"[API] 获取用户 {user_id} 的九宫格图片列表")
+    logger.info(f"[API] 获取用户 {user_id} 的九宫格图片列表")
     
     try:
         # 查询用户的所有成功生成的九宫格图片
@@ -1327,7 +1305,7 @@ async def get_generated_images(user_id: str, db: Session = Depends(get_db)):
             GeneratedImage.status == 'completed'
         ).order_by(GeneratedImage.created_at.desc()).all()
         
-        print(f"[API] 找到 {len(images)} 张九宫格图片")
+        logger.info(f"[API] 找到 {len(images)} 张九宫格图片")
         
         return {
             "success": True,
@@ -1346,7 +1324,7 @@ async def get_generated_images(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[API] 获取九宫格图片列表失败: {e}")
+        logger.error(f"[API] 获取九宫格图片列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1355,7 +1333,7 @@ async def delete_generated_image(image_id: str, user_id: str, db: Session = Depe
     """
     删除生成的九宫格图片记录（可选功能）
     """
-    print(f"[API] 删除九宫格图片: {image_id}")
+    logger.info(f"[API] 删除九宫格图片: {image_id}")
     
     try:
         # 查询图片记录
@@ -1371,7 +1349,7 @@ async def delete_generated_image(image_id: str, user_id: str, db: Session = Depe
         db.delete(image)
         db.commit()
         
-        print(f"[API] 九宫格图片记录已删除")
+        logger.info(f"[API] 九宫格图片记录已删除")
         return {
             "success": True,
             "message": "图片记录已删除"
@@ -1379,25 +1357,25 @@ async def delete_generated_image(image_id: str, user_id: str, db: Session = Depe
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[API] 删除失败: {e}")
+        logger.error(f"[API] 删除失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
         
         # 如果没有找到图片数据，打印完整响应帮助调试
-        print(f"[九宫格] 未找到图片数据，完整响应结构:")
-        print(f"  - 是否有candidates: {'candidates' in result}")
+        logger.debug(f"[九宫格] 未找到图片数据，完整响应结构:")
+        logger.info(f"  - 是否有candidates: {'candidates' in result}")
         if 'candidates' in result:
-            print(f"  - candidates数量: {len(result['candidates'])}")
+            logger.info(f"  - candidates数量: {len(result['candidates'])}")
             if len(result['candidates']) > 0:
-                print(f"  - candidate[0]的keys: {result['candidates'][0].keys()}")
+                logger.info(f"  - candidate[0]的keys: {result['candidates'][0].keys()}")
         raise HTTPException(status_code=500, detail="Gemini API返回格式异常，未找到生成的图片")
         
     except requests.RequestException as e:
-        print(f"[九宫格] 网络请求失败: {str(e)}")
+        logger.error(f"[九宫格] 网络请求失败: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"网络请求失败: {str(e)}")
     except Exception as e:
-        print(f"[九宫格] 生成失败: {str(e)}")
+        logger.error(f"[九宫格] 生成失败: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"九宫格图片生成失败: {str(e)}")
@@ -1471,7 +1449,7 @@ async def send_chat(req: ChatRequest):
         )
         return ChatResponse(message=msg)
     except Exception as e:
-        print(f"聊天错误: {e}")
+        logger.error(f"聊天错误: {e}")
         import traceback
         traceback.print_exc()
         # 如果 AI 调用失败，返回默认回复
@@ -1532,10 +1510,10 @@ async def generate_script(req: GenerateScriptRequest):
         }
         
     except json.JSONDecodeError as e:
-        print(f"JSON解析错误: {e}")
+        logger.error(f"JSON解析错误: {e}")
         raise HTTPException(status_code=500, detail=f"AI返回数据解析失败: {str(e)}")
     except Exception as e:
-        print(f"脚本生成错误: {e}")
+        logger.error(f"脚本生成错误: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"生成脚本失败: {str(e)}")
@@ -1611,12 +1589,12 @@ async def generate_script_from_product(req: GenerateScriptFromProductRequest):
     except HTTPException as e:
         raise e
     except json.JSONDecodeError as e:
-        print(f"JSON解析错误: {e}")
+        logger.error(f"JSON解析错误: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"AI返回数据解析失败: {str(e)}")
     except Exception as e:
-        print(f"脚本生成错误: {e}")
+        logger.error(f"脚本生成错误: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"生成脚本失败: {str(e)}")
@@ -1652,17 +1630,15 @@ async def generate_video(req: GenerateVideoRequest):
         orientation = 'landscape'
     
     # 打印前端传来的所有参数
-    print("="*80)
-    print("[视频生成] 前端请求参数:")
-    print(f"  prompt: {req.prompt[:100]}..." if len(req.prompt) > 100 else f"  prompt: {req.prompt}")
-    print(f"  images: {req.images}")
-    print(f"  orientation: {req.orientation} -> 转换为: {orientation}")
-    print(f"  size: {req.size} <- 重点检查！")
-    print(f"  duration: {req.duration}")
-    print(f"  watermark: {req.watermark}")
-    print(f"  private: {req.private}")
-    print(f"  character_id: {req.character_id}")
-    print("="*80)
+    logger.info("[视频生成] 前端请求参数:")
+    logger.info(f"  prompt: {req.prompt[:100]}..." if len(req.prompt) > 100 else f"  prompt: {req.prompt}")
+    logger.info(f"  images: {req.images}")
+    logger.info(f"  orientation: {req.orientation} -> 转换为: {orientation}")
+    logger.info(f"  size: {req.size} <- 重点检查！")
+    logger.info(f"  duration: {req.duration}")
+    logger.info(f"  watermark: {req.watermark}")
+    logger.info(f"  private: {req.private}")
+    logger.info(f"  character_id: {req.character_id}")
     
     try:
         # 调用 AI 视频生成
@@ -1678,7 +1654,7 @@ async def generate_video(req: GenerateVideoRequest):
         )
         return result
     except Exception as e:
-        print(f"视频生成错误: {e}")
+        logger.error(f"视频生成错误: {e}")
         raise HTTPException(status_code=500, detail=f"视频生成失败: {str(e)}")
 
 
@@ -1728,7 +1704,7 @@ async def query_video_task_get(task_id: str):
         raise HTTPException(status_code=400, detail="视频生成服务未配置")
     
     try:
-        print(f"[查询任务] Task ID: {task_id}")
+        logger.info(f"[查询任务] Task ID: {task_id}")
         
         headers = {
             "Authorization": f"Bearer {VIDEO_API_KEY}",
@@ -1741,8 +1717,8 @@ async def query_video_task_get(task_id: str):
         api_url = f"{VIDEO_BASE_URL}/v1/video/query"
         params = {"id": task_id}
         
-        print(f"[查询任务] 请求URL: {api_url}")
-        print(f"[查询任务] 查询参数: id={task_id}")
+        logger.info(f"[查询任务] 请求URL: {api_url}")
+        logger.info(f"[查询任务] 查询参数: id={task_id}")
         
         response = requests.get(
             api_url,
@@ -1751,12 +1727,12 @@ async def query_video_task_get(task_id: str):
             timeout=10
         )
         
-        print(f"[查询任务] 云雾API响应状态码: {response.status_code}")
-        print(f"[查询任务] 原始响应内容: {response.text}")
+        logger.info(f"[查询任务] 云雾API响应状态码: {response.status_code}")
+        logger.debug(f"[查询任务] 原始响应内容: {response.text}")
         
         # 如果状态码不是200，返回一个默认的processing状态
         if response.status_code != 200:
-            print(f"[查询任务] 云雾API错误: {response.text}")
+            logger.error(f"[查询任务] 云雾API错误: {response.text}")
             return {
                 "id": task_id,
                 "status": "processing",
@@ -1767,8 +1743,8 @@ async def query_video_task_get(task_id: str):
         # 解析JSON
         try:
             result = response.json()
-            print(f"[查询任务] ✅ 成功获取数据: {result}")
-            print(f"[查询任务] status={result.get('status')}, video_url={result.get('video_url')}")
+            logger.debug("[查询任务] ✅ 成功获取数据: %s", result)
+            logger.info(f"[查询任务] status={result.get('status')}, video_url={result.get('video_url')}")
             
             # 根据API文档，返回字段包括：
             # - id: 任务ID
@@ -1781,22 +1757,22 @@ async def query_video_task_get(task_id: str):
             if result.get('video_url'):
                 result['status'] = 'completed'
                 result['progress'] = 100
-                print(f"[查询任务] 检测到video_url，标记为完成")
+                logger.info(f"[查询任务] 检测到video_url，标记为完成")
             elif result.get('status') == 'failed':
                 result['progress'] = 0
-                print(f"[查询任务] 任务失败")
+                logger.error(f"[查询任务] 任务失败")
             elif result.get('status') == 'processing' or result.get('status') == 'queued':
                 # 根据状态设置进度
                 if result.get('status') == 'queued':
                     result['progress'] = 5
                 else:
                     result['progress'] = 50
-                print(f"[查询任务] 任务处理中: {result.get('status')}")
+                logger.info(f"[查询任务] 任务处理中: {result.get('status')}")
             
             return result
             
         except Exception as json_error:
-            print(f"[查询任务] JSON解析失败: {json_error}")
+            logger.error(f"[查询任务] JSON解析失败: {json_error}")
             return {
                 "id": task_id,
                 "status": "processing",
@@ -1805,7 +1781,7 @@ async def query_video_task_get(task_id: str):
             }
         
     except requests.RequestException as e:
-        print(f"[查询任务] 请求异常: {str(e)}")
+        logger.error(f"[查询任务] 请求异常: {str(e)}")
         return {
             "id": task_id,
             "status": "processing",
@@ -1820,17 +1796,15 @@ async def generate_character(req: GenerateCharacterRequest):
     使用AI生成角色信息
     使用配置的LLM模型（ChatGPT/Gemini等）
     """
-    print("="*80)
-    print("[API] /api/generate-character 收到请求")
-    print(f"[请求数据] model: {req.model}")
-    print(f"[请求数据] country: {req.country}")
-    print(f"[请求数据] ethnicity: {req.ethnicity}")
-    print(f"[请求数据] age: {req.age}")
-    print(f"[请求数据] gender: {req.gender}")
-    print("="*80)
+    logger.info("[API] /api/generate-character 收到请求")
+    logger.info(f"[请求数据] model: {req.model}")
+    logger.info(f"[请求数据] country: {req.country}")
+    logger.info(f"[请求数据] ethnicity: {req.ethnicity}")
+    logger.info(f"[请求数据] age: {req.age}")
+    logger.info(f"[请求数据] gender: {req.gender}")
     
     if not ai_client:
-        print("[错误] AI服务未配置")
+        logger.error("[错误] AI服务未配置")
         raise HTTPException(status_code=400, detail="AI服务未配置")
     
     # 使用prompt配置文件生成prompt（如果前端传了就用前端的）
@@ -1842,7 +1816,7 @@ async def generate_character(req: GenerateCharacterRequest):
     )
     
     try:
-        print(f"[AI调用] 开始调用AI，模型: {LLM_MODEL_NAME}")
+        logger.info(f"[AI调用] 开始调用AI，模型: {LLM_MODEL_NAME}")
         response = ai_client.chat.completions.create(
             model=LLM_MODEL_NAME,
             messages=[
@@ -1854,8 +1828,8 @@ async def generate_character(req: GenerateCharacterRequest):
         )
         
         content = response.choices[0].message.content.strip()
-        print(f"[AI响应] 原始内容长度: {len(content)}")
-        print(f"[AI响应] 内容预览: {content[:300]}...")
+        logger.info(f"[AI响应] 原始内容长度: {len(content)}")
+        logger.info(f"[AI响应] 内容预览: {content[:300]}...")
         
         # 解析JSON（去除可能的markdown代码块）
         import json
@@ -1863,21 +1837,19 @@ async def generate_character(req: GenerateCharacterRequest):
         json_match = re.search(r'```(?:json)?\s*({[^`]+})\s*```', content)
         if json_match:
             json_str = json_match.group(1)
-            print("[解析] 从markdown代码块中提取JSON")
+            logger.info("[解析] 从markdown代码块中提取JSON")
         else:
             json_str = content
-            print("[解析] 直接解析内容")
+            logger.info("[解析] 直接解析内容")
         
         character_data = json.loads(json_str)
-        print(f"[成功] 解析角色数据: {json.dumps(character_data, ensure_ascii=False)}")
-        print("="*80)
+        logger.debug("[成功] 解析角色数据: %s", character_data)
         return character_data
         
     except Exception as e:
-        print(f"[AI生成角色错误] {str(e)}")
+        logger.error(f"[AI生成角色错误] {str(e)}")
         import traceback
         traceback.print_exc()
-        print("="*80)
         raise HTTPException(status_code=500, detail=f"生成角色失败: {str(e)}")
 
 
@@ -1910,8 +1882,8 @@ async def generate_script_ai(req: GenerateScriptAIRequest):
         }
         target_language = language_map.get(req.language, req.language)  # 如果找不到，就直接使用原值
         
-        print(f"[脚本生成] 请求语言代码: {req.language}")
-        print(f"[脚本生成] 映射后语言: {target_language}")
+        logger.info(f"[脚本生成] 请求语言代码: {req.language}")
+        logger.info(f"[脚本生成] 映射后语言: {target_language}")
         
         # 解析时长
         duration_seconds = int(req.duration.replace('s', ''))
@@ -1942,7 +1914,7 @@ async def generate_script_ai(req: GenerateScriptAIRequest):
         )
         
         content = response.choices[0].message.content.strip()
-        print(f"[AI生成脚本] 原始响应: {content[:200]}...")
+        logger.debug(f"[AI生成脚本] 原始响应: {content[:200]}...")
         
         # 解析JSON
         import json
@@ -1967,11 +1939,11 @@ async def generate_script_ai(req: GenerateScriptAIRequest):
         }
         
     except json.JSONDecodeError as e:
-        print(f"JSON解析错误: {e}")
-        print(f"原始内容: {content}")
+        logger.error(f"JSON解析错误: {e}")
+        logger.error("原始内容: %s", content)
         raise HTTPException(status_code=500, detail=f"AI返回数据解析失败: {str(e)}")
     except Exception as e:
-        print(f"脚本生成错误: {e}")
+        logger.error(f"脚本生成错误: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"生成脚本失败: {str(e)}")
@@ -1997,10 +1969,10 @@ async def create_character(req: CreateCharacterRequest, db: Session = Depends(ge
         # 生成角色ID
         character_id = str(uuid.uuid4())
         
-        print(f"[创建角色] 用户ID: {req.user_id}")
-        print(f"[创建角色] 角色名称: {req.name}")
-        print(f"[创建角色] 角色ID: {character_id}")
-        print(f"[创建角色] 描述长度: {len(req.description)} 字")
+        logger.info(f"[创建角色] 用户ID: {req.user_id}")
+        logger.info(f"[创建角色] 角色名称: {req.name}")
+        logger.info(f"[创建角色] 角色ID: {character_id}")
+        logger.info(f"[创建角色] 描述长度: {len(req.description)} 字")
         
         # 保存到数据库
         new_character = Character(
@@ -2034,7 +2006,7 @@ async def create_character(req: CreateCharacterRequest, db: Session = Depends(ge
         
     except Exception as e:
         db.rollback()
-        print(f"[创建角色错误] {str(e)}")
+        logger.error(f"[创建角色错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"创建角色失败: {str(e)}")
@@ -2061,34 +2033,24 @@ class LoginRequest(BaseModel):
     password: str
 
 @app.post("/api/send-verification-code")
-async def send_verification_code(req: SendCodeRequest):
+async def send_verification_code(req: SendCodeRequest, request: Request):
     """
-    发送邮箱验证码
+    发送邮箱验证码（按邮箱和IP限流，验证码存储见 VERIFICATION_CODE_BACKEND）
     """
     try:
-        email = req.email
-        
-        # 生成验证码
-        code = generate_verification_code()
-        
-        # 存储验证码（有效期10分钟）
-        expiry_time = datetime.now() + timedelta(minutes=10)
-        verification_codes[email] = {
-            "code": code,
-            "expiry": expiry_time
-        }
-        
-        # 发送邮件
-        send_verification_email(email, code)
-        
-        print(f"[验证码] 已发送到 {email}: {code}")
+        client_ip = get_client_ip(
+            request.headers, request.client.host if request.client else None, settings.get_trusted_proxies()
+        )
+        await verification_service.issue(req.email, client_ip)
         
         return {
             "success": True,
             "message": "验证码已发送"
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[验证码] 发送失败: {e}")
+        logger.error(f"[验证码] 发送失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/register")
@@ -2097,26 +2059,8 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
     用户注册
     """
     try:
-        # 验证邮箱验证码
-        email = req.email
-        code = req.verification_code
-        
-        if email not in verification_codes:
-            raise HTTPException(status_code=400, detail="验证码已过期或未发送")
-        
-        stored_data = verification_codes[email]
-        
-        # 检查验证码是否过期
-        if datetime.now() > stored_data["expiry"]:
-            del verification_codes[email]
-            raise HTTPException(status_code=400, detail="验证码已过期")
-        
-        # 检查验证码是否正确
-        if code != stored_data["code"]:
-            raise HTTPException(status_code=400, detail="验证码错误")
-        
-        # 验证成功，删除验证码
-        del verification_codes[email]
+        # 验证邮箱验证码（成功后作废）
+        await verification_service.verify(req.email, req.verification_code)
         
         # 检查邮箱是否已存在
         existing_user = db.query(User).filter(User.email == req.email).first()
@@ -2127,7 +2071,7 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
         user_id = str(uuid.uuid4())
         
         # 加密密码
-        hashed_password = hash_password(req.password)
+        hashed_password = await password_service.hash(req.password)
         
         # 创建新用户
         new_user = User(
@@ -2155,7 +2099,7 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(new_user)
         
-        print(f"[用户注册] 成功 - 用户ID: {user_id}, 邮箱: {req.email}")
+        logger.info(f"[用户注册] 成功 - 用户ID: {user_id}, 邮箱: {req.email}")
         
         # 返回用户信息（不包含密码）
         return {
@@ -2175,7 +2119,7 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         db.rollback()
-        print(f"[用户注册错误] {str(e)}")
+        logger.error(f"[用户注册错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"注册失败: {str(e)}")
@@ -2191,15 +2135,15 @@ async def login_user(req: LoginRequest, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=401, detail="邮箱或密码错误")
         
-        # 验证密码（使用 bcrypt 验证）
-        if not verify_password(req.password, user.password_hash):
+        # 验证密码（bcrypt在线程池中执行，cost变更时自动重新加密）
+        if not await password_service.verify_user(user, req.password, db):
             raise HTTPException(status_code=401, detail="邮箱或密码错误")
         
         # 检查用户是否被禁用
         if not user.is_active:
             raise HTTPException(status_code=403, detail="账号已被禁用")
         
-        print(f"[用户登录] 成功 - 用户ID: {user.id}, 邮箱: {user.email}")
+        logger.info(f"[用户登录] 成功 - 用户ID: {user.id}, 邮箱: {user.email}")
         
         # 返回用户信息（不包含密码）
         return {
@@ -2218,7 +2162,7 @@ async def login_user(req: LoginRequest, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[用户登录错误] {str(e)}")
+        logger.error(f"[用户登录错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"登录失败: {str(e)}")
@@ -2253,7 +2197,7 @@ async def get_public_videos(db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取公开视频失败: {e}")
+        logger.error(f"获取公开视频失败: {e}")
         return {"videos": []}
 
 # ======================
@@ -2326,7 +2270,7 @@ async def get_featured_videos(
             ]
         }
     except Exception as e:
-        print(f"获取精选视频失败: {e}")
+        logger.error(f"获取精选视频失败: {e}")
         import traceback
         traceback.print_exc()
         return {"success": False, "videos": []}
@@ -2347,16 +2291,16 @@ async def get_featured_categories(db: Session = Depends(get_db)):
             "categories": [cat[0] for cat in categories if cat[0]]
         }
     except Exception as e:
-        print(f"获取分类失败: {e}")
+        logger.error(f"获取分类失败: {e}")
         return {"success": False, "categories": []}
 
-@app.post("/api/admin/featured-videos")
+@app.post("/api/admin/featured-videos", dependencies=[Depends(require_admin)])
 async def create_featured_video(req: FeaturedVideoRequest, db: Session = Depends(get_db)):
     """
     创建精选视频（管理员功能）
     """
     try:
-        print(f"[创建精选视频] 收到请求: title={req.title}, category={req.category}, tags={req.tags}")
+        logger.info(f"[创建精选视频] 收到请求: title={req.title}, category={req.category}, tags={req.tags}")
         
         video_id = str(uuid.uuid4())
         
@@ -2378,13 +2322,13 @@ async def create_featured_video(req: FeaturedVideoRequest, db: Session = Depends
             description=req.description or ""
         )
         
-        print(f"[创建精选视频] 准备插入: id={video_id}, tags={tags_value}")
+        logger.info(f"[创建精选视频] 准备插入: id={video_id}, tags={tags_value}")
         
         db.add(new_video)
         db.commit()
         db.refresh(new_video)
         
-        print(f"[创建精选视频] 成功: id={video_id}")
+        logger.info(f"[创建精选视频] 成功: id={video_id}")
         
         return {
             "success": True,
@@ -2396,12 +2340,12 @@ async def create_featured_video(req: FeaturedVideoRequest, db: Session = Depends
         }
     except Exception as e:
         db.rollback()
-        print(f"[创建精选视频] 失败: {e}")
+        logger.error(f"[创建精选视频] 失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.put("/api/admin/featured-videos/{video_id}")
+@app.put("/api/admin/featured-videos/{video_id}", dependencies=[Depends(require_admin)])
 async def update_featured_video(video_id: str, req: FeaturedVideoRequest, db: Session = Depends(get_db)):
     """
     更新精选视频（管理员功能）
@@ -2429,10 +2373,10 @@ async def update_featured_video(video_id: str, req: FeaturedVideoRequest, db: Se
         raise
     except Exception as e:
         db.rollback()
-        print(f"更新精选视频失败: {e}")
+        logger.error(f"更新精选视频失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.delete("/api/admin/featured-videos/{video_id}")
+@app.delete("/api/admin/featured-videos/{video_id}", dependencies=[Depends(require_admin)])
 async def delete_featured_video(video_id: str, db: Session = Depends(get_db)):
     """
     删除精选视频（管理员功能）
@@ -2449,7 +2393,7 @@ async def delete_featured_video(video_id: str, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         db.rollback()
-        print(f"删除精选视频失败: {e}")
+        logger.error(f"删除精选视频失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/stats")
@@ -2474,7 +2418,7 @@ async def get_admin_stats(db: Session = Depends(get_db)):
             "totalCreditsUsed": abs(total_credits_used)
         }
     except Exception as e:
-        print(f"获取统计数据失败: {e}")
+        logger.error(f"获取统计数据失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/users")
@@ -2499,7 +2443,7 @@ async def get_all_users(db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取用户列表失败: {e}")
+        logger.error(f"获取用户列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/videos")
@@ -2526,7 +2470,7 @@ async def get_all_videos(db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取视频列表失败: {e}")
+        logger.error(f"获取视频列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/prompts")
@@ -2549,7 +2493,7 @@ async def get_all_prompts(db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取提示词列表失败: {e}")
+        logger.error(f"获取提示词列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/admin/video/{video_id}/public")
@@ -2567,7 +2511,7 @@ async def toggle_video_public(video_id: str, isPublic: bool = True, db: Session
         return {"success": True}
     except Exception as e:
         db.rollback()
-        print(f"切换视频公开状态失败: {e}")
+        logger.error(f"切换视频公开状态失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/admin/video/{video_id}")
@@ -2585,7 +2529,7 @@ async def delete_video_admin(video_id: str, db: Session = Depends(get_db)):
         return {"success": True}
     except Exception as e:
         db.rollback()
-        print(f"删除视频失败: {e}")
+        logger.error(f"删除视频失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 class UpdateCreditsRequest(BaseModel):
@@ -2619,7 +2563,7 @@ async def update_user_credits(user_id: str, req: UpdateCreditsRequest, db: Sessi
         return {"success": True}
     except Exception as e:
         db.rollback()
-        print(f"更新用户积分失败: {e}")
+        logger.error(f"更新用户积分失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -2708,7 +2652,7 @@ async def create_project(req: CreateProjectRequest, db: Session = Depends(get_db
         }
     except Exception as e:
         db.rollback()
-        print(f"创建项目失败: {e}")
+        logger.error(f"创建项目失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/projects/{user_id}")
@@ -2732,7 +2676,7 @@ async def get_user_projects(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取项目列表失败: {e}")
+        logger.error(f"获取项目列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/videos")
@@ -2788,7 +2732,7 @@ async def save_video(req: SaveVideoRequest, db: Session = Depends(get_db)):
         }
     except Exception as e:
         db.rollback()
-        print(f"保存视频失败: {e}")
+        logger.error(f"保存视频失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -2831,7 +2775,7 @@ async def get_user_videos(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取视频列表失败: {e}")
+        logger.error(f"获取视频列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/videos/{video_id}")
@@ -2887,7 +2831,7 @@ async def update_video(video_id: str, req: UpdateVideoRequest, db: Session = Dep
         raise
     except Exception as e:
         db.rollback()
-        print(f"更新视频失败: {e}")
+        logger.error(f"更新视频失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -2909,7 +2853,7 @@ async def delete_user_video(video_id: str, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         db.rollback()
-        print(f"删除视频失败: {e}")
+        logger.error(f"删除视频失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/prompts")
@@ -2940,7 +2884,7 @@ async def save_prompt(req: SavePromptRequest, db: Session = Depends(get_db)):
         }
     except Exception as e:
         db.rollback()
-        print(f"保存提示词失败: {e}")
+        logger.error(f"保存提示词失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/prompts/{user_id}")
@@ -2962,7 +2906,7 @@ async def get_user_prompts(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取提示词列表失败: {e}")
+        logger.error(f"获取提示词列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/prompts/{prompt_id}")
@@ -2982,7 +2926,7 @@ async def delete_prompt(prompt_id: str, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         db.rollback()
-        print(f"删除提示词失败: {e}")
+        logger.error(f"删除提示词失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ======================
@@ -3030,7 +2974,7 @@ async def check_video_url(video_id: str, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"检查URL失败: {e}")
+        logger.error(f"检查URL失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -3088,8 +3032,9 @@ async def consume_credits(req: ConsumeCreditsRequest, db: Session = Depends(get_
         )
         db.add(credit_history)
         db.commit()
+        auth_service.invalidate(req.user_id)
         
-        print(f"[积分消费] 用户ID: {req.user_id}, 消耗: {req.amount}, 余额: {old_credits} -> {user.credits}")
+        logger.info(f"[积分消费] 用户ID: {req.user_id}, 消耗: {req.amount}, 余额: {old_credits} -> {user.credits}")
         
         return {
             "success": True,
@@ -3102,7 +3047,7 @@ async def consume_credits(req: ConsumeCreditsRequest, db: Session = Depends(get_
         raise
     except Exception as e:
         db.rollback()
-        print(f"[积分消费错误] {str(e)}")
+        logger.error(f"[积分消费错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"消费积分失败: {str(e)}")
@@ -3134,8 +3079,9 @@ async def recharge_credits(req: RechargeCreditsRequest, db: Session = Depends(ge
         )
         db.add(credit_history)
         db.commit()
+        auth_service.invalidate(req.user_id)
         
-        print(f"[积分充值] 用户ID: {req.user_id}, 充值: {req.credits}, 余额: {old_credits} -> {user.credits}")
+        logger.info(f"[积分充值] 用户ID: {req.user_id}, 充值: {req.credits}, 余额: {old_credits} -> {user.credits}")
         
         return {
             "success": True,
@@ -3149,7 +3095,7 @@ async def recharge_credits(req: RechargeCreditsRequest, db: Session = Depends(ge
         raise
     except Exception as e:
         db.rollback()
-        print(f"[积分充值错误] {str(e)}")
+        logger.error(f"[积分充值错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"充值失败: {str(e)}")
@@ -3174,7 +3120,7 @@ async def get_credits_balance(user_id: str, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"获取积分余额失败: {e}")
+        logger.error(f"获取积分余额失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/user/{user_id}")
@@ -3199,7 +3145,7 @@ async def get_user_info(user_id: str, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"获取用户信息失败: {e}")
+        logger.error(f"获取用户信息失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/user/{user_id}/stats")
@@ -3235,7 +3181,7 @@ async def get_user_stats(user_id: str, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"获取用户统计数据失败: {e}")
+        logger.error(f"获取用户统计数据失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -3261,7 +3207,7 @@ async def get_credit_history(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取积分历史失败: {e}")
+        logger.error(f"获取积分历史失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/characters/{user_id}")
@@ -3287,7 +3233,7 @@ async def get_user_characters(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取角色列表失败: {e}")
+        logger.error(f"获取角色列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -3336,7 +3282,7 @@ async def create_product(req: CreateProductRequest, db: Session = Depends(get_db
         }
     except Exception as e:
         db.rollback()
-        print(f"创建商品失败: {e}")
+        logger.error(f"创建商品失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -3364,7 +3310,7 @@ async def get_user_products(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"获取商品列表失败: {e}")
+        logger.error(f"获取商品列表失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -3392,7 +3338,7 @@ async def get_product_detail(product_id: str, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"获取商品详情失败: {e}")
+        logger.error(f"获取商品详情失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -3444,7 +3390,7 @@ async def update_product(product_id: str, req: UpdateProductRequest, db: Session
         raise
     except Exception as e:
         db.rollback()
-        print(f"更新商品失败: {e}")
+        logger.error(f"更新商品失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/product/{product_id}")
@@ -3464,7 +3410,7 @@ async def delete_product(product_id: str, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         db.rollback()
-        print(f"删除商品失败: {e}")
+        logger.error(f"删除商品失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -3476,9 +3422,10 @@ class DeleteImageRequest(BaseModel):
     url: str
 
 @app.post("/api/delete-image")
-async def delete_image(req: DeleteImageRequest):
+async def delete_image(req: DeleteImageRequest, db: Session = Depends(get_db)):
     """
     从 TOS 删除图片
+    去重存储的图片只释放一次引用，引用归零时才删除对象
     """
     try:
         # 从 URL提取对象键
@@ -3487,6 +3434,10 @@ async def delete_image(req: DeleteImageRequest):
         if not url:
             raise HTTPException(status_code=400, detail="图片URL不能为空")
         
+        released = blob_service.release(url, db)
+        if released is not None:
+            return {"success": True, "message": "图片删除成功" if released else "图片仍被其他内容引用，已释放引用"}
+        
         # 解析URL提取object_key
         # 例: https://soradirector-public.cn-beijing.tos.volces.com/uploads/xxx.jpg
         # 提取: uploads/xxx.jpg
@@ -3495,18 +3446,18 @@ async def delete_image(req: DeleteImageRequest):
             raise HTTPException(status_code=400, detail="无效的图片URL")
         
         object_key = parts[1]
-        print(f"[DELETE IMAGE] 开始删除图片: {object_key}")
+        logger.info(f"[DELETE IMAGE] 开始删除图片: {object_key}")
         
         # 从 TOS 删除
         tos_client.delete_object(bucket=TOS_BUCKET, key=object_key)
         
-        print(f"[DELETE IMAGE] ✅ 图片删除成功: {object_key}")
+        logger.info(f"[DELETE IMAGE] ✅ 图片删除成功: {object_key}")
         return {"success": True, "message": "图片删除成功"}
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[DELETE IMAGE] ❗ 删除图片失败: {str(e)}")
+        logger.error(f"[DELETE IMAGE] ❗ 删除图片失败: {str(e)}")
         import traceback
         traceback.print_exc()
         # 删除失败不抛出异常，返回false即可
@@ -3531,14 +3482,6 @@ class OrderResponse(BaseModel):
     credits: Optional[int] = None  # 获得积分
     error: Optional[str] = None
 
-# 充值套餐配置（按照 1元=100积分 的规则）
-PACKAGES = {
-    'small': {'amount': 10, 'credits': 1000, 'name': '尝鲜包'},  # 10元 = 1000积分
-    'medium': {'amount': 49, 'credits': 4900, 'name': '标准包'},  # 49元 = 4900积分
-    'large': {'amount': 99, 'credits': 9900, 'name': '旗舰包'},  # 99元 = 9900积分
-    'super': {'amount': 499, 'credits': 49900, 'name': '企业包'},  # 499元 = 49900积分
-}
-
 @app.post("/api/wechat/create-order")
 async def create_wechat_order(req: CreateOrderRequest, db: Session = Depends(get_db)):
     """
@@ -3566,19 +3509,13 @@ async def create_wechat_order(req: CreateOrderRequest, db: Session = Depends(get
     if not result['success']:
         raise HTTPException(status_code=500, detail=result.get('error', '创建订单失败'))
     
-    # 保存订单到数据库（需要先创建Order表）
-    # TODO: 添加到数据库
-    # order = Order(
-    #     id=str(uuid.uuid4()),
-    #     user_id=req.user_id,
-    #     order_no=order_no,
-    #     amount=package['amount'],
-    #     credits=package['credits'],
-    #     status='pending',
-    #     payment_method='wechat'
-    # )
-    # db.add(order)
-    # db.commit()
+    # 保存订单到数据库（支付回调按订单号原子更新）
+    try:
+        order_service.create_order(order_no, req.user_id, req.package_id, db)
+    except Exception as e:
+        # 订单记录失败不影响支付：回调时会按支付金额补建订单
+        db.rollback()
+        logger.warning(f"[WECHAT ORDER] ⚠️ 保存订单失败: {order_no}, {e}")
     
     return {
         'success': True,
@@ -3593,12 +3530,9 @@ async def wechat_pay_callback(request: Request, db: Session = Depends(get_db)):
     """
     微信支付回调通知（V3版本）
     """
-    # 读取JSON数据
+    # 读取原始请求体（验签使用原文）
     body_bytes = await request.body()
     body_str = body_bytes.decode('utf-8')
-    data = json.loads(body_str)
-    
-    print(f"[WECHAT CALLBACK V3] 收到回调: {data}")
     
     # 获取签名相关信息
     timestamp = request.headers.get('Wechatpay-Timestamp', '')
@@ -3606,14 +3540,17 @@ async def wechat_pay_callback(request: Request, db: Session = Depends(get_db)):
     signature = request.headers.get('Wechatpay-Signature', '')
     serial = request.headers.get('Wechatpay-Serial', '')
     
-    # 验证签名
+    # 验证签名（使用缓存的平台证书，不发起网络请求）
     if not verify_callback_signature(timestamp, nonce, body_str, signature, serial):
-        print("[WECHAT CALLBACK V3] 签名验证失败")
+        logger.error(f"[WECHAT CALLBACK V3] 签名验证失败, 证书序列号: {serial}")
         return JSONResponse(
             status_code=401,
             content={"code": "FAIL", "message": "签名验证失败"}
         )
     
+    data = json.loads(body_str)
+    logger.info("[WECHAT CALLBACK V3] 收到回调: %s", data.get("event_type"))
+    
     # 解密resource字段
     try:
         resource = data.get('resource', {})
@@ -3630,54 +3567,21 @@ async def wechat_pay_callback(request: Request, db: Session = Depends(get_db)):
             total_fee = decrypted_data.get('amount', {}).get('total', 0)
             user_id = decrypted_data.get('attach')  # 从附加数据获取user_id
             
-            print(f"[WECHAT CALLBACK V3] 支付成功: {order_no}, 用户: {user_id}, 金额: {total_fee}分")
-            
-            # 给用户充值积分（根据金额计算积分）
-            # 查找对应的套餐
-            amount_yuan = total_fee / 100
-            credits_to_add = 0
+            logger.info(f"[WECHAT CALLBACK V3] 支付成功: {order_no}, 用户: {user_id}, 金额: {total_fee}分")
             
-            for package in PACKAGES.values():
-                if package['amount'] == amount_yuan:
-                    credits_to_add = package['credits']
-                    break
-            
-            if credits_to_add > 0 and user_id:
-                try:
-                    # 检查是否已经处理过（幂等性检查）
-                    existing = db.query(CreditHistory).filter(
-                        CreditHistory.related_id == order_no
-                    ).first()
-                    
-                    if existing:
-                        print(f"[WECHAT CALLBACK V3] 订单已处理，跳过: {order_no}")
-                    else:
-                        # 给用户加积分
-                        user = db.query(User).filter(User.id == user_id).first()
-                        if user:
-                            old_credits = user.credits
-                            user.credits += credits_to_add
-                            
-                            # 记录积分历史
-                            history = CreditHistory(
-                                id=str(uuid.uuid4()),
-                                user_id=user_id,
-                                action='recharge',
-                                amount=credits_to_add,
-                                balance_after=user.credits,
-                                description=f"微信支付充值￥{amount_yuan}",
-                                related_id=order_no
-                            )
-                            db.add(history)
-                            db.commit()
-                            
-                            print(f"[WECHAT CALLBACK V3] ✅ 积分充值成功: {old_credits} -> {user.credits} (+{credits_to_add})")
-                except Exception as e:
-                    print(f"[WECHAT CALLBACK V3] 积分充值失败: {e}")
-                    db.rollback()
+            # 订单置为已到账并加积分（一次原子upsert，重复通知直接跳过）
+            try:
+                order_service.credit_paid_order(order_no, transaction_id, total_fee, user_id, db)
+            except Exception as e:
+                logger.error(f"[WECHAT CALLBACK V3] 积分充值失败: {e}")
+                # 返回失败，微信会重新通知
+                return JSONResponse(
+                    status_code=500,
+                    content={"code": "FAIL", "message": "处理失败"}
+                )
     
     except Exception as e:
-        print(f"[WECHAT CALLBACK V3] 处理回调失败: {e}")
+        logger.error(f"[WECHAT CALLBACK V3] 处理回调失败: {e}")
         import traceback
         traceback.print_exc()
     
@@ -3688,24 +3592,18 @@ async def wechat_pay_callback(request: Request, db: Session = Depends(get_db)):
     )
 
 @app.get("/api/wechat/query-order/{order_no}")
-async def query_wechat_order(order_no: str):
+async def query_wechat_order(order_no: str, db: Session = Depends(get_db)):
     """
-    查询订单支付状态
+    查询订单支付状态（只读本地订单，由支付回调和后台对账更新）
     """
-    result = query_order(order_no)
-    
-    if not result['success']:
+    order = order_service.get_order(order_no, db)
+    if not order:
         return {
             'success': False,
-            'error': result.get('error', '查询失败')
+            'error': '订单不存在'
         }
     
-    return {
-        'success': True,
-        'order_no': order_no,
-        'status': result['trade_state'],  # SUCCESS/NOTPAY/CLOSED/...
-        'paid': result['trade_state'] == 'SUCCESS'
-    }
+    return order_service.to_status(order)
 
 
 # ======================
@@ -3751,7 +3649,7 @@ async def get_admin_users(db: Session = Depends(get_db)):
         
         return {"users": user_list}
     except Exception as e:
-        print(f"获取用户列表失败: {e}")
+        logger.error(f"获取用户列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/prompts")
@@ -3793,7 +3691,7 @@ async def get_admin_prompts(
             "page_size": page_size
         }
     except Exception as e:
-        print(f"获取提示词列表失败: {e}")
+        logger.error(f"获取提示词列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/stats")
@@ -3830,7 +3728,7 @@ async def get_admin_stats(db: Session = Depends(get_db)):
             "totalRecharge": total_recharge
         }
     except Exception as e:
-        print(f"获取统计数据失败: {e}")
+        logger.error(f"获取统计数据失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/videos")
@@ -3858,7 +3756,7 @@ async def get_admin_videos(db: Session = Depends(get_db)):
         
         return {"videos": video_list}
     except Exception as e:
-        print(f"获取视频列表失败: {e}")
+        logger.error(f"获取视频列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/admin/video/{video_id}/public")
@@ -3881,7 +3779,7 @@ async def toggle_video_public(
         return {"success": True}
     except Exception as e:
         db.rollback()
-        print(f"切换视频公开状态失败: {e}")
+        logger.error(f"切换视频公开状态失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/admin/video/{video_id}")
@@ -3899,7 +3797,7 @@ async def delete_video_admin(video_id: str, db: Session = Depends(get_db)):
         return {"success": True}
     except Exception as e:
         db.rollback()
-        print(f"删除视频失败: {e}")
+        logger.error(f"删除视频失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 class UpdateCreditsRequest(BaseModel):
@@ -3933,7 +3831,7 @@ async def update_user_credits(user_id: str, req: UpdateCreditsRequest, db: Sessi
         return {"success": True}
     except Exception as e:
         db.rollback()
-        print(f"更新用户积分失败: {e}")
+        logger.error(f"更新用户积分失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -0,0 +1,66 @@
+"""热点查询的组合索引和部分索引
+
+- videos(user_id, created_at)：用户视频列表
+- videos(created_at) WHERE is_public：内容广场
+- videos(status, url_expires_at)：按状态统计、待转存视频按过期时间排序
+- credit_history(user_id, created_at)：积分记录
+- credit_history(related_id) WHERE related_id IS NOT NULL：按订单/视频查找积分记录
+- featured_videos(is_active, category, display_order)：官网精选视频
+
+PostgreSQL 上使用 CREATE INDEX CONCURRENTLY（不锁表，需在事务外执行）；
+索引已存在时跳过，init_database() 建的新库和旧库都可以直接升级
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (索引名, 表名, 列, 部分索引条件)
+INDEXES = [
+    ("ix_videos_user_id_created_at", "videos", ["user_id", "created_at"], None),
+    ("ix_videos_public_created_at", "videos", ["created_at"], "is_public"),
+    ("ix_videos_status_url_expires_at", "videos", ["status", "url_expires_at"], None),
+    ("ix_credit_history_user_id_created_at", "credit_history", ["user_id", "created_at"], None),
+    ("ix_credit_history_related_id", "credit_history", ["related_id"], "related_id IS NOT NULL"),
+    ("ix_featured_videos_active_category_order", "featured_videos", ["is_active", "category", "display_order"], None),
+]
+
+
+def _where(condition):
+    if condition is None:
+        return {}
+    if op.get_bind().dialect.name == "sqlite":
+        # SQLite 的布尔列存为 0/1
+        condition = "is_public = 1" if condition == "is_public" else condition
+        return {"sqlite_where": sa.text(condition)}
+    return {"postgresql_where": sa.text(condition)}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, condition in INDEXES:
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                **_where(condition)
+            )
+    # 新索引需要统计信息，规划器才会选用
+    if op.get_bind().dialect.name == "postgresql":
+        for table in sorted({table for _, table, _, _ in INDEXES}):
+            op.execute(f"ANALYZE {table}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
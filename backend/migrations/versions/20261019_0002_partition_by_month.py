@@ -0,0 +1,141 @@
+"""credit_history 和 videos 按月分区（created_at 范围分区）
+
+步骤（PostgreSQL，每张表）：
+1. 原表和它的索引、主键改名为 *_pre_partition，保留作回退用，确认无误后手动删除
+2. 按原表结构建分区表，主键改为 (id, created_at)（分区表的主键必须包含分区键）
+3. 从最早数据所在月份到未来 3 个月逐月建分区，另建 DEFAULT 分区兜底
+4. 在分区表上重建原有索引（自动建到每个分区）
+5. 复制数据（created_at 为空的行用当前时间补齐）
+
+之后的新月份分区和冷数据归档由 services/partition_service.py 维护；
+非 PostgreSQL 数据库不做任何修改
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+TABLES = ("credit_history", "videos")
+SUFFIX = "_pre_partition"
+# 迁移时预建的未来月份数
+PREMAKE_MONTHS = 3
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _is_partitioned(conn, table: str) -> bool:
+    return bool(conn.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :t"
+    ), {"t": table}).scalar())
+
+
+def _partition_table(conn, table: str) -> None:
+    legacy = f"{table}{SUFFIX}"
+    columns = [row[0] for row in conn.execute(sa.text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :t ORDER BY ordinal_position"
+    ), {"t": table})]
+    indexes = conn.execute(sa.text(
+        "SELECT i.indexname, i.indexdef FROM pg_indexes i "
+        "JOIN pg_class c ON c.relname = i.indexname "
+        "JOIN pg_index x ON x.indexrelid = c.oid "
+        "WHERE i.schemaname = current_schema() AND i.tablename = :t AND NOT x.indisprimary"
+    ), {"t": table}).fetchall()
+    pkey = conn.execute(sa.text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass) AND contype = 'p'"
+    ), {"t": table}).scalar()
+
+    # 1. 原表改名
+    op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    if pkey:
+        op.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {pkey} TO {pkey}{SUFFIX}")
+    for name, _ in indexes:
+        op.execute(f"ALTER INDEX {name} RENAME TO {name}{SUFFIX}")
+
+    # 2. 分区表
+    op.execute(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)")
+
+    # 3. 按月分区
+    first = conn.execute(sa.text(f"SELECT min(created_at) FROM {legacy}")).scalar() or datetime.utcnow()
+    month = datetime(first.year, first.month, 1)
+    now = datetime.utcnow()
+    last = _add_months(datetime(now.year, now.month, 1), PREMAKE_MONTHS)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {_partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        month = upper
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    # 4. 索引（原定义中的表名就是新的分区表）
+    for _, definition in indexes:
+        op.execute(definition)
+
+    # 5. 数据
+    column_list = ", ".join(columns)
+    select_list = ", ".join(
+        "COALESCE(created_at, now() AT TIME ZONE 'utc')" if column == "created_at" else column
+        for column in columns
+    )
+    op.execute(f"INSERT INTO {table} ({column_list}) SELECT {select_list} FROM {legacy}")
+    op.execute(f"ANALYZE {table}")
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != "postgresql":
+        return
+    for table in TABLES:
+        if not _is_partitioned(conn, table):
+            _partition_table(conn, table)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != "postgresql":
+        return
+    for table in TABLES:
+        legacy = f"{table}{SUFFIX}"
+        if not _is_partitioned(conn, table):
+            continue
+        if not conn.execute(sa.text("SELECT to_regclass(:t)"), {"t": legacy}).scalar():
+            raise RuntimeError(f"{legacy} 不存在，无法回退 {table} 的分区")
+
+        # 分区表是最新数据（含分区期间的新增、修改和删除），整表复制回原表
+        columns = ", ".join(row[0] for row in conn.execute(sa.text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = :t ORDER BY ordinal_position"
+        ), {"t": legacy}))
+        op.execute(f"TRUNCATE {legacy}")
+        op.execute(f"INSERT INTO {legacy} ({columns}) SELECT {columns} FROM {table}")
+        op.execute(f"DROP TABLE {table} CASCADE")
+        op.execute(f"ALTER TABLE {legacy} RENAME TO {table}")
+
+        indexes = conn.execute(sa.text(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t"
+        ), {"t": table}).fetchall()
+        for (name,) in indexes:
+            if name.endswith(SUFFIX):
+                op.execute(f"ALTER INDEX {name} RENAME TO {name[:-len(SUFFIX)]}")
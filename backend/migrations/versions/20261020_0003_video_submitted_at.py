@@ -0,0 +1,33 @@
+"""videos.submitted_at：批量任务被调度器认领的时间
+
+批量视频由各个 worker 的调度器先认领（status=submitting）再扣费提交，
+认领超时仍未拿到任务ID的视频按该时间判断后标记失败并退款；
+init_database() 建的新库已有该列时跳过（分区表上加列会同步到所有分区）
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _has_column() -> bool:
+    columns = sa.inspect(op.get_bind()).get_columns("videos")
+    return any(column["name"] == "submitted_at" for column in columns)
+
+
+def upgrade() -> None:
+    if not _has_column():
+        op.add_column("videos", sa.Column("submitted_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    if _has_column():
+        op.drop_column("videos", "submitted_at")
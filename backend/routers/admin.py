@@ -7,19 +7,33 @@
 - 视频管理
 - 提示词管理
 - 积分调整
+- 在线 CPU 分析
+- 按月分区维护
 """
-from typing import Optional
+from typing import Optional, Dict
 import uuid
+import asyncio
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+from sqlalchemy import func, case
 from sqlalchemy.orm import Session
 
-from database import get_db, User, Video, SavedPrompt, CreditHistory
+from database import get_db, get_read_db, User, Video, SavedPrompt, CreditHistory
+from services.video_persist_service import video_persist_service
+from services.thumbnail_service import thumbnail_service
+from services.auth_service import auth_service, require_admin
+from services.profiler_service import profiler_service
+from services.partition_service import partition_service
+from utils.logger import get_logger
 
+logger = get_logger(__name__)
 
-router = APIRouter(prefix="/api/admin", tags=["Admin Management"])
+
+# 必须携带管理员令牌（不受 AUTH_REQUIRE_TOKEN 影响）
+router = APIRouter(prefix="/api/admin", tags=["Admin Management"], dependencies=[Depends(require_admin)])
 
 
 # ======================
@@ -36,12 +50,20 @@ class ToggleVideoPublicRequest(BaseModel):
     isPublic: bool
 
 
+def _user_emails(db: Session, user_ids) -> Dict[str, str]:
+    """一次查询取出一批用户的邮箱（避免列表中逐行查询用户）"""
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if not user_ids:
+        return {}
+    return dict(db.query(User.id, User.email).filter(User.id.in_(user_ids)).all())
+
+
 # ======================
 # 平台统计接口
 # ======================
 
 @router.get("/stats")
-async def get_admin_stats(db: Session = Depends(get_db)):
+async def get_admin_stats(db: Session = Depends(get_read_db)):
     """
     获取平台统计数据
     
@@ -83,7 +105,7 @@ async def get_admin_stats(db: Session = Depends(get_db)):
             "totalRecharge": total_recharge
         }
     except Exception as e:
-        print(f"[管理员统计] 获取统计数据失败: {e}")
+        logger.error(f"[管理员统计] 获取统计数据失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -94,7 +116,7 @@ async def get_admin_stats(db: Session = Depends(get_db)):
 # ======================
 
 @router.get("/users")
-async def get_admin_users(db: Session = Depends(get_db)):
+async def get_admin_users(db: Session = Depends(get_read_db)):
     """
     获取所有用户列表（包括付费数据）
     
@@ -112,23 +134,24 @@ async def get_admin_users(db: Session = Depends(get_db)):
     try:
         users = db.query(User).order_by(User.created_at.desc()).all()
         
+        # 一次分组聚合统计所有用户的充值和消费（不再逐个用户查询积分记录）
+        is_recharge = (CreditHistory.amount > 0) & CreditHistory.action.in_(['recharge', '管理员调整积分'])
+        stats = {
+            row.user_id: row
+            for row in db.query(
+                CreditHistory.user_id,
+                func.coalesce(func.sum(case((is_recharge, CreditHistory.amount), else_=0)), 0).label("total_recharge"),
+                func.coalesce(func.sum(case(((CreditHistory.amount > 0) & (CreditHistory.action == 'recharge'), 1), else_=0)), 0).label("recharge_count"),
+                func.coalesce(func.sum(case((CreditHistory.amount < 0, CreditHistory.amount), else_=0)), 0).label("total_consume"),
+            ).group_by(CreditHistory.user_id).all()
+        }
+        
         user_list = []
         for user in users:
-            # 统计充值总额（amount > 0）
-            recharge_records = db.query(CreditHistory).filter(
-                CreditHistory.user_id == user.id,
-                CreditHistory.amount > 0,
-                CreditHistory.action.in_(['recharge', '管理员调整积分'])
-            ).all()
-            total_recharge = sum(record.amount for record in recharge_records)
-            recharge_count = len([r for r in recharge_records if r.action == 'recharge'])
-            
-            # 统计消费总额（amount < 0）
-            consume_records = db.query(CreditHistory).filter(
-                CreditHistory.user_id == user.id,
-                CreditHistory.amount < 0
-            ).all()
-            total_consume = abs(sum(record.amount for record in consume_records))
+            row = stats.get(user.id)
+            total_recharge = int(row.total_recharge) if row else 0
+            recharge_count = int(row.recharge_count) if row else 0
+            total_consume = abs(int(row.total_consume)) if row else 0
             
             user_list.append({
                 "id": user.id,
@@ -143,7 +166,7 @@ async def get_admin_users(db: Session = Depends(get_db)):
         
         return {"users": user_list}
     except Exception as e:
-        print(f"[管理员用户] 获取用户列表失败: {e}")
+        logger.error(f"[管理员用户] 获取用户列表失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -190,15 +213,16 @@ async def update_user_credits(
         )
         db.add(credit_history)
         db.commit()
+        auth_service.invalidate(user_id)
         
-        print(f"[管理员积分] 用户 {user.email} 积分调整: {old_credits} -> {req.credits}")
+        logger.info(f"[管理员积分] 用户 {user.email} 积分调整: {old_credits} -> {req.credits}")
         
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        print(f"[管理员积分] 更新用户积分失败: {e}")
+        logger.error(f"[管理员积分] 更新用户积分失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -212,7 +236,7 @@ async def update_user_credits(
 async def get_admin_prompts(
     page: int = 1,
     page_size: int = 50,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     获取所有提示词（分页）
@@ -241,14 +265,13 @@ async def get_admin_prompts(
             SavedPrompt.created_at.desc()
         ).offset(offset).limit(page_size).all()
         
+        emails = _user_emails(db, {prompt.user_id for prompt in prompts})
         prompt_list = []
         for prompt in prompts:
-            # 获取用户邮箱
-            user = db.query(User).filter(User.id == prompt.user_id).first()
             prompt_list.append({
                 "id": prompt.id,
                 "userId": prompt.user_id,
-                "userEmail": user.email if user else '未知',
+                "userEmail": emails.get(prompt.user_id, '未知'),
                 "productName": prompt.product_name or '未命名',
                 "content": prompt.content,
                 "createdAt": prompt.created_at.timestamp() * 1000 if prompt.created_at else None,
@@ -261,7 +284,7 @@ async def get_admin_prompts(
             "page_size": page_size
         }
     except Exception as e:
-        print(f"[管理员提示词] 获取提示词列表失败: {e}")
+        logger.error(f"[管理员提示词] 获取提示词列表失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -272,7 +295,7 @@ async def get_admin_prompts(
 # ======================
 
 @router.get("/videos")
-async def get_admin_videos(db: Session = Depends(get_db)):
+async def get_admin_videos(db: Session = Depends(get_read_db)):
     """
     获取所有视频列表
     
@@ -289,24 +312,77 @@ async def get_admin_videos(db: Session = Depends(get_db)):
     try:
         videos = db.query(Video).order_by(Video.created_at.desc()).all()
         
+        emails = _user_emails(db, {video.user_id for video in videos})
         video_list = []
         for video in videos:
-            user = db.query(User).filter(User.id == video.user_id).first()
             video_list.append({
                 "id": video.id,
                 "userId": video.user_id,
-                "userEmail": user.email if user else '未知',
+                "userEmail": emails.get(video.user_id, '未知'),
                 "title": video.product_name or '未命名视频',
                 "thumbnail": video.thumbnail_url or '',
+                "preview": video.preview_url or '',
                 "videoUrl": video.video_url,
-                "script": video.script,
                 "createdAt": video.created_at.timestamp() * 1000 if video.created_at else None,
                 "isPublic": video.is_public or False,
             })
         
         return {"videos": video_list}
     except Exception as e:
-        print(f"[管理员视频] 获取视频列表失败: {e}")
+        logger.error(f"[管理员视频] 获取视频列表失败: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/videos/persist")
+async def backfill_video_persist(limit: int = 100):
+    """
+    把尚未过期的历史视频转存到TOS
+    
+    Args:
+        limit: 本次最多处理的视频数（按过期时间从近到远）
+    
+    功能：
+    - 流式下载云雾视频并分片上传到TOS
+    - 改写视频URL和封面URL，清除过期时间
+    - 并发数受 VIDEO_PERSIST_CONCURRENCY 限制
+    
+    **权限要求**: 管理员
+    """
+    if not video_persist_service.enabled:
+        raise HTTPException(status_code=503, detail="视频转存未启用或TOS未配置")
+    
+    try:
+        return await video_persist_service.backfill(limit=max(1, min(limit, 1000)))
+    except Exception as e:
+        logger.error(f"[管理员视频] 视频转存回填失败: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/videos/thumbnails")
+async def backfill_video_thumbnails(limit: int = 100):
+    """
+    为还没有动态预览的视频生成封面和动态预览
+    
+    Args:
+        limit: 本次最多处理的视频数（按创建时间从新到旧）
+    
+    功能：
+    - 在进程池中截取封面帧（JPEG）和动态预览（动画WebP）
+    - 上传到TOS并写入 thumbnail_url / preview_url
+    
+    **权限要求**: 管理员
+    """
+    if not thumbnail_service.enabled:
+        raise HTTPException(status_code=503, detail="缩略图生成未启用、解码器不可用或TOS未配置")
+    
+    try:
+        return await thumbnail_service.backfill(limit=max(1, min(limit, 1000)))
+    except Exception as e:
+        logger.error(f"[管理员视频] 缩略图回填失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -340,14 +416,14 @@ async def toggle_video_public(
         video.is_public = request.isPublic
         db.commit()
         
-        print(f"[管理员视频] 视频 {video_id} 公开状态: {old_status} -> {request.isPublic}")
+        logger.info(f"[管理员视频] 视频 {video_id} 公开状态: {old_status} -> {request.isPublic}")
         
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        print(f"[管理员视频] 切换视频公开状态失败: {e}")
+        logger.error(f"[管理员视频] 切换视频公开状态失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -376,14 +452,101 @@ async def delete_video_admin(video_id: str, db: Session = Depends(get_db)):
         db.delete(video)
         db.commit()
         
-        print(f"[管理员视频] 删除视频: {video_id} ({video_title})")
+        logger.info(f"[管理员视频] 删除视频: {video_id} ({video_title})")
         
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        print(f"[管理员视频] 删除视频失败: {e}")
+        logger.error(f"[管理员视频] 删除视频失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ======================
+# 在线分析接口
+# ======================
+
+def _render_profile(profile_id: str, format: str):
+    profile = profiler_service.get(profile_id)
+    if format == "speedscope":
+        return JSONResponse(
+            profile.to_speedscope(),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'}
+        )
+    return PlainTextResponse(profile.to_collapsed(), headers={"X-Profile-Id": profile_id})
+
+
+@router.post("/profiler/capture")
+async def capture_profile(seconds: float = 10, format: str = "collapsed"):
+    """
+    对当前worker采样 CPU 调用栈
+    
+    Args:
+        seconds: 采样时长（秒，不超过 PROFILER_MAX_SECONDS）
+        format: collapsed（火焰图文本）或 speedscope（JSON，可在 speedscope.app 打开）
+    
+    注意：
+    - 多worker部署时只采样处理本请求的worker
+    - 结果同时保存在内存中，可通过 /profiler/profiles/{id} 再次下载
+    
+    **权限要求**: 管理员
+    """
+    if format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="format 只支持 collapsed 或 speedscope")
+    profile_id = await profiler_service.capture(seconds)
+    return _render_profile(profile_id, format)
+
+
+@router.get("/profiler/profiles")
+async def list_profiles():
+    """
+    最近的采样结果（含 X-Profile 请求头触发的单请求采样）
+    
+    **权限要求**: 管理员
+    """
+    return {"profiles": profiler_service.list()}
+
+
+@router.get("/profiler/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "collapsed"):
+    """
+    下载采样结果
+    
+    **权限要求**: 管理员
+    """
+    if format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="format 只支持 collapsed 或 speedscope")
+    return _render_profile(profile_id, format)
+
+
+# ======================
+# 分区维护接口
+# ======================
+
+@router.get("/partitions")
+async def list_partitions():
+    """
+    credit_history / videos 的各月分区（范围、行数估计、大小）
+    
+    未执行分区迁移或非 PostgreSQL 时返回空列表
+    
+    **权限要求**: 管理员
+    """
+    return {"partitions": await asyncio.to_thread(partition_service.list_partitions)}
+
+
+@router.post("/partitions/maintain")
+async def maintain_partitions():
+    """
+    立即执行一轮分区维护：补建未来月份的分区，开启归档时导出并删除冷分区
+    
+    **权限要求**: 管理员
+    """
+    try:
+        return await asyncio.to_thread(partition_service.maintain_once)
+    except Exception as e:
+        logger.error(f"[分区维护] 手动维护失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -10,17 +10,22 @@ import json
 import re
 from typing import Any, List, Optional, Dict
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 
+from database import get_db
 from services.ai_helper import chat_with_ai
+from services.script_batch_service import script_batch_service, generate_product_script
 from prompts import (
     AI_DIRECTOR_SYSTEM_PROMPT,
     FORM_BASED_SCRIPT_SYSTEM_PROMPT,
-    get_form_based_script_prompt,
-    IMAGE_BASED_SCRIPT_SYSTEM_PROMPT,
-    get_image_based_script_prompt
+    get_form_based_script_prompt
 )
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 router = APIRouter(prefix="/api")
 
@@ -83,6 +88,14 @@ class GenerateScriptFromProductRequest(BaseModel):
     duration: int
 
 
+class BatchGenerateScriptRequest(BaseModel):
+    """批量生成脚本请求（商品目录）"""
+    user_id: str
+    productIds: List[str]
+    language: str = 'zh-CN'
+    duration: int = 15
+
+
 # ==================== AI聊天接口 ====================
 
 @router.post("/chat", response_model=ChatResponse)
@@ -146,7 +159,7 @@ async def send_chat(req: ChatRequest):
         return ChatResponse(message=msg)
         
     except Exception as e:
-        print(f"[CHAT] 错误: {e}")
+        logger.error(f"[CHAT] 错误: {e}")
         import traceback
         traceback.print_exc()
         msg = Message(
@@ -200,10 +213,10 @@ async def generate_script(req: GenerateScriptRequest):
         }
         
     except json.JSONDecodeError as e:
-        print(f"[SCRIPT] JSON解析错误: {e}")
+        logger.error(f"[SCRIPT] JSON解析错误: {e}")
         raise HTTPException(status_code=500, detail=f"AI返回数据解析失败: {str(e)}")
     except Exception as e:
-        print(f"[SCRIPT] 错误: {e}")
+        logger.error(f"[SCRIPT] 错误: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"生成脚本失败: {str(e)}")
@@ -224,44 +237,16 @@ async def generate_script_ai(req: GenerateScriptFromProductRequest):
         if not req.sellingPoints or len(req.sellingPoints) == 0:
             raise HTTPException(status_code=400, detail="必须提供至少一个核心卖点")
         
-        language_map = {
-            'zh-CN': '中文',
-            'en-US': '英文',
-            'id-ID': '印尼语',
-            'vi-VN': '越南语',
-        }
-        target_language = language_map.get(req.language, '中文')
-        
-        prompt = get_image_based_script_prompt(
+        shots = await generate_product_script(
             product_name=req.productName,
             usage_method=req.usageMethod,
             selling_points=req.sellingPoints,
-            language=target_language,
+            language=req.language,
             duration=req.duration,
-            num_images=len(req.productImages)
+            product_images=req.productImages
         )
         
-        ai_response = await chat_with_ai(
-            prompt,
-            IMAGE_BASED_SCRIPT_SYSTEM_PROMPT,
-            image_url=req.productImages[0]
-        )
-        
-        json_match = re.search(r'\{[\s\S]*\}', ai_response)
-        if not json_match:
-            raise HTTPException(status_code=500, detail="AI生成脚本失败，格式错误")
-        
-        result = json.loads(json_match.group())
-        shots = result.get('shots', [])
-        
-        if not shots:
-            raise HTTPException(status_code=500, detail="生成的脚本为空")
-        
-        for i, shot in enumerate(shots):
-            if 'imageIndex' not in shot:
-                shot['imageIndex'] = i % len(req.productImages)
-        
-        print(f"[SCRIPT] 成功生成 {len(shots)} 个镜头")
+        logger.info(f"[SCRIPT] 成功生成 {len(shots)} 个镜头")
         
         return {
             "success": True,
@@ -269,10 +254,37 @@ async def generate_script_ai(req: GenerateScriptFromProductRequest):
         }
         
     except json.JSONDecodeError as e:
-        print(f"[SCRIPT] JSON解析错误: {e}")
+        logger.error(f"[SCRIPT] JSON解析错误: {e}")
         raise HTTPException(status_code=500, detail=f"AI返回数据解析失败: {str(e)}")
     except Exception as e:
-        print(f"[SCRIPT] 错误: {e}")
+        logger.error(f"[SCRIPT] 错误: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"生成脚本失败: {str(e)}")
+
+
+@router.post("/generate-script-ai/batch")
+async def generate_script_ai_batch(req: BatchGenerateScriptRequest, db: Session = Depends(get_db)):
+    """
+    为多个商品批量生成视频脚本
+    
+    并发调用LLM（受全局限流控制），每完成一个商品就以NDJSON格式推送一行结果，
+    并保存为提示词（SavedPrompt）和项目草稿（Project.script_json）
+    
+    每行格式:
+        {"productId": "...", "success": true, "shots": [...], "promptId": "...", "projectId": "..."}
+        {"productId": "...", "success": false, "error": "..."}
+    最后一行:
+        {"done": true, "total": N, "succeeded": M, "failed": K}
+    """
+    products = script_batch_service.load_products(req.user_id, req.productIds, db)
+    
+    logger.info(f"[批量脚本] 用户 {req.user_id} 批量生成 {len(products)} 个商品的脚本")
+    
+    async def result_lines():
+        async for result in script_batch_service.stream_scripts(
+            req.user_id, products, req.language, req.duration
+        ):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
@@ -6,6 +6,7 @@ AI生成服务路由模块
 
 import os
 import uuid
+import asyncio
 import requests
 import json
 import re
@@ -17,10 +18,16 @@ from pydantic import BaseModel
 
 from database import get_db, Character
 from services.ai_helper import generate_video_with_ai, ai_client, LLM_MODEL_NAME
+# 别名：本模块的 POST 路由函数也叫 query_video_task
+from services.ai_helper import query_video_task as query_upstream_task
 from prompts import (
     CHARACTER_GENERATION_SYSTEM_PROMPT,
     get_character_generation_prompt
 )
+from utils.logger import get_logger
+from utils.metrics import track_upstream
+
+logger = get_logger(__name__)
 
 # 配置
 VIDEO_API_KEY = os.getenv("VIDEO_GENERATION_API_KEY")
@@ -79,15 +86,13 @@ async def generate_video(req: GenerateVideoRequest):
     elif orientation == 'horizontal':
         orientation = 'landscape'
     
-    print("="*80)
-    print("[视频生成] 前端请求参数:")
-    print(f"  prompt: {req.prompt[:100]}..." if len(req.prompt) > 100 else f"  prompt: {req.prompt}")
-    print(f"  images: {req.images}")
-    print(f"  orientation: {req.orientation} -> {orientation}")
-    print(f"  size: {req.size}")
-    print(f"  duration: {req.duration}")
-    print(f"  character_id: {req.character_id}")
-    print("="*80)
+    logger.info("[视频生成] 前端请求参数:")
+    logger.info("  prompt: %s", req.prompt)
+    logger.info("  images: %s", req.images)
+    logger.info(f"  orientation: {req.orientation} -> {orientation}")
+    logger.info(f"  size: {req.size}")
+    logger.info(f"  duration: {req.duration}")
+    logger.info(f"  character_id: {req.character_id}")
     
     try:
         result = await generate_video_with_ai(
@@ -102,7 +107,7 @@ async def generate_video(req: GenerateVideoRequest):
         )
         return result
     except Exception as e:
-        print(f"[视频生成] 错误: {e}")
+        logger.error(f"[视频生成] 错误: {e}")
         raise HTTPException(status_code=500, detail=f"视频生成失败: {str(e)}")
 
 
@@ -120,11 +125,12 @@ async def query_video_task(req: VideoTaskRequest):
             "Content-Type": "application/json"
         }
         
-        response = requests.get(
-            f"{VIDEO_BASE_URL}/v1/video/generations/{req.task_id}",
-            headers=headers,
-            timeout=10
-        )
+        with track_upstream("yunwu_video", "query", key=VIDEO_API_KEY):
+            response = requests.get(
+                f"{VIDEO_BASE_URL}/v1/video/generations/{req.task_id}",
+                headers=headers,
+                timeout=10
+            )
         
         if response.status_code != 200:
             raise HTTPException(
@@ -146,65 +152,8 @@ async def query_video_task_get(task_id: str):
     if not VIDEO_API_KEY:
         raise HTTPException(status_code=400, detail="视频生成服务未配置")
     
-    try:
-        print(f"[查询任务] Task ID: {task_id}")
-        
-        headers = {
-            "Authorization": f"Bearer {VIDEO_API_KEY}",
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        
-        api_url = f"{VIDEO_BASE_URL}/v1/video/query"
-        params = {"id": task_id}
-        
-        response = requests.get(
-            api_url,
-            params=params,
-            headers=headers,
-            timeout=10
-        )
-        
-        print(f"[查询任务] 响应状态码: {response.status_code}")
-        
-        if response.status_code != 200:
-            return {
-                "id": task_id,
-                "status": "processing",
-                "progress": 10,
-                "message": f"查询错误: {response.status_code}"
-            }
-        
-        try:
-            result = response.json()
-            
-            if result.get('video_url'):
-                result['status'] = 'completed'
-                result['progress'] = 100
-            elif result.get('status') == 'failed':
-                result['progress'] = 0
-            elif result.get('status') in ['processing', 'queued']:
-                result['progress'] = 5 if result.get('status') == 'queued' else 50
-            
-            return result
-            
-        except Exception as json_error:
-            print(f"[查询任务] JSON解析失败: {json_error}")
-            return {
-                "id": task_id,
-                "status": "processing",
-                "progress": 15,
-                "message": "JSON解析失败"
-            }
-        
-    except requests.RequestException as e:
-        print(f"[查询任务] 请求异常: {str(e)}")
-        return {
-            "id": task_id,
-            "status": "processing",
-            "progress": 20,
-            "message": f"网络错误: {str(e)}"
-        }
+    logger.info(f"[查询任务] Task ID: {task_id}")
+    return await asyncio.to_thread(query_upstream_task, task_id)
 
 
 # ==================== 角色生成接口 ====================
@@ -214,13 +163,11 @@ async def generate_character(req: GenerateCharacterRequest):
     """
     使用AI生成角色信息
     """
-    print("="*80)
-    print("[API] /api/generate-character 收到请求")
-    print(f"  country: {req.country}")
-    print(f"  ethnicity: {req.ethnicity}")
-    print(f"  age: {req.age}")
-    print(f"  gender: {req.gender}")
-    print("="*80)
+    logger.info("[API] /api/generate-character 收到请求")
+    logger.info(f"  country: {req.country}")
+    logger.info(f"  ethnicity: {req.ethnicity}")
+    logger.info(f"  age: {req.age}")
+    logger.info(f"  gender: {req.gender}")
     
     if not ai_client:
         raise HTTPException(status_code=400, detail="AI服务未配置")
@@ -233,7 +180,7 @@ async def generate_character(req: GenerateCharacterRequest):
     )
     
     try:
-        print(f"[AI调用] 模型: {LLM_MODEL_NAME}")
+        logger.info(f"[AI调用] 模型: {LLM_MODEL_NAME}")
         response = ai_client.chat.completions.create(
             model=LLM_MODEL_NAME,
             messages=[
@@ -258,15 +205,13 @@ async def generate_character(req: GenerateCharacterRequest):
             json_str = content
         
         character_data = json.loads(json_str)
-        print(f"[成功] 解析角色数据")
-        print("="*80)
+        logger.info(f"[成功] 解析角色数据")
         return character_data
         
     except Exception as e:
-        print(f"[AI生成角色错误] {str(e)}")
+        logger.error(f"[AI生成角色错误] {str(e)}")
         import traceback
         traceback.print_exc()
-        print("="*80)
         raise HTTPException(status_code=500, detail=f"生成角色失败: {str(e)}")
 
 
@@ -278,9 +223,9 @@ async def create_character(req: CreateCharacterRequest, db: Session = Depends(ge
     try:
         character_id = str(uuid.uuid4())
         
-        print(f"[创建角色] 用户ID: {req.user_id}")
-        print(f"[创建角色] 角色名称: {req.name}")
-        print(f"[创建角色] 角色ID: {character_id}")
+        logger.info(f"[创建角色] 用户ID: {req.user_id}")
+        logger.info(f"[创建角色] 角色名称: {req.name}")
+        logger.info(f"[创建角色] 角色ID: {character_id}")
         
         new_character = Character(
             id=character_id,
@@ -312,7 +257,7 @@ async def create_character(req: CreateCharacterRequest, db: Session = Depends(ge
         
     except Exception as e:
         db.rollback()
-        print(f"[创建角色错误] {str(e)}")
+        logger.error(f"[创建角色错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"创建角色失败: {str(e)}")
@@ -0,0 +1,140 @@
+"""
+批量视频生成活动路由模块
+
+负责处理批量视频生成相关的API接口：
+- 创建活动（商品 × 方向 × 时长）
+- 查询活动进度和成本
+- 获取用户活动列表
+- 取消活动
+"""
+
+from typing import List, Optional, Dict
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from database import get_db, VideoCampaign
+from services.campaign_service import campaign_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 创建路由
+router = APIRouter(prefix="/api")
+
+# ==================== 请求体模型 ====================
+
+class CreateCampaignRequest(BaseModel):
+    """创建批量视频活动请求体"""
+    user_id: str
+    productIds: List[str]
+    orientations: List[str] = ["portrait"]
+    durations: List[int] = [10]
+    name: Optional[str] = None
+    promptTemplate: Optional[str] = None  # 可用占位符：{name} {usage} {selling_points}
+    prompts: Optional[Dict[str, str]] = None  # 商品ID -> 自定义提示词
+
+
+class CancelCampaignRequest(BaseModel):
+    """取消活动请求体"""
+    user_id: str
+
+# ==================== 活动管理接口 ====================
+
+@router.post("/campaigns")
+async def create_campaign(req: CreateCampaignRequest, db: Session = Depends(get_db)):
+    """
+    创建批量视频生成活动
+
+    为每个 商品 × 方向 × 时长 组合创建一个排队中的视频，由后台调度器分批提交到
+    API Key池并轮询状态。积分在每个视频提交时扣除，失败的视频会退还积分。
+
+    返回:
+        {"success": true, "campaign": {...活动汇总...}}
+    """
+    try:
+        campaign = campaign_service.create_campaign(
+            user_id=req.user_id,
+            product_ids=req.productIds,
+            orientations=req.orientations,
+            durations=req.durations,
+            db=db,
+            name=req.name,
+            prompt_template=req.promptTemplate,
+            prompts=req.prompts
+        )
+        return {
+            "success": True,
+            "campaign": campaign_service.get_summary(campaign, db, include_videos=False)
+        }
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"提示词模板包含未知占位符: {e}")
+    except Exception as e:
+        logger.error(f"[CAMPAIGN] ❌ 创建活动失败: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/campaigns/user/{user_id}")
+async def get_user_campaigns(user_id: str, db: Session = Depends(get_db)):
+    """
+    获取用户的所有批量活动（不含视频明细）
+
+    返回:
+        {"campaigns": [...活动汇总...]}
+    """
+    try:
+        campaigns = db.query(VideoCampaign).filter(
+            VideoCampaign.user_id == user_id
+        ).order_by(VideoCampaign.created_at.desc()).all()
+
+        return {
+            "campaigns": [
+                campaign_service.get_summary(c, db, include_videos=False)
+                for c in campaigns
+            ]
+        }
+    except Exception as e:
+        logger.error(f"[CAMPAIGN] ❌ 获取活动列表失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: str, db: Session = Depends(get_db)):
+    """
+    获取活动详情：整体进度、状态分布、积分成本和每个视频的状态
+
+    返回:
+        {"campaign": {..., "progress": 0-100, "creditsSpent": N, "videos": [...]}}
+    """
+    campaign = db.query(VideoCampaign).filter(VideoCampaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="活动不存在")
+
+    return {"campaign": campaign_service.get_summary(campaign, db)}
+
+
+@router.post("/campaigns/{campaign_id}/cancel")
+async def cancel_campaign(campaign_id: str, req: CancelCampaignRequest, db: Session = Depends(get_db)):
+    """
+    取消活动：尚未提交的视频不再提交（不扣积分），已提交的视频继续完成
+    """
+    campaign = db.query(VideoCampaign).filter(VideoCampaign.id == campaign_id).first()
+    if not campaign or campaign.user_id != req.user_id:
+        raise HTTPException(status_code=404, detail="活动不存在")
+
+    try:
+        campaign = campaign_service.cancel_campaign(campaign_id, db)
+        return {
+            "success": True,
+            "campaign": campaign_service.get_summary(campaign, db, include_videos=False)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"[CAMPAIGN] ❌ 取消活动失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
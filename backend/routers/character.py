@@ -12,6 +12,9 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from database import get_db, Character
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 router = APIRouter(prefix="/api", tags=["Character Management"])
@@ -55,7 +58,7 @@ async def get_user_characters(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[角色列表] 获取用户 {user_id} 角色列表失败: {e}")
+        logger.error(f"[角色列表] 获取用户 {user_id} 角色列表失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
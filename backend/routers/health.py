@@ -6,9 +6,10 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
-from database import get_db, test_connection
+from database import get_db, test_connection, replica_router
 from config import settings
 from services import tos_service, ai_service
+from wechat_pay import merchant_signer, platform_certificates
 
 router = APIRouter(prefix="/api/health", tags=["健康检查"])
 
@@ -43,7 +44,8 @@ async def check_database(db: Session = Depends(get_db)):
         test_connection()
         return {
             "status": "connected",
-            "message": "数据库连接正常"
+            "message": "数据库连接正常",
+            "replicas": replica_router.status()
         }
     except Exception as e:
         return {
@@ -79,6 +81,13 @@ async def check_services():
         "video_api_pool_size": ai_service.video_api_pool.size()
     }
     
+    # 微信支付商户签名器（私钥缓存、签名/验签吞吐）
+    services_status["wechat_signer"] = merchant_signer.metrics()
+    services_status["wechat_platform_certs"] = {
+        "serials": platform_certificates.serials(),
+        "lastRefresh": platform_certificates.last_refresh * 1000 if platform_certificates.last_refresh else None
+    }
+    
     return {
         "services": services_status
     }
@@ -16,6 +16,7 @@
 import os
 import time
 import uuid
+import asyncio
 import requests
 from io import BytesIO
 from typing import List, Optional
@@ -24,12 +25,19 @@ from datetime import datetime
 from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from PIL import Image
 import tos
 
 from database import get_db, GeneratedImage, User, CreditHistory
 from config import settings
 from services import tos_service
+from services.image_derivative_service import image_derivative_service
+from services.blob_service import blob_service
+from services.auth_service import auth_service
+from utils.logger import get_logger
+from utils.metrics import track_upstream
+from utils.image_grid import compose_grid, grid_size_for
+
+logger = get_logger(__name__)
 
 # 创建路由
 router = APIRouter(prefix="/api")
@@ -56,6 +64,10 @@ def build_public_url(bucket: str, key: str) -> str:
     return f"https://{bucket}.{domain}/{key}"
 
 
+# 不生成衍生图的图片类型（矢量图/动图）
+NON_RASTER_TYPES = {"image/svg+xml", "image/gif"}
+
+
 # ==================== 请求体模型 ====================
 
 class CombineImagesRequest(BaseModel):
@@ -72,17 +84,23 @@ class GenerateNineGridRequest(BaseModel):
 # ==================== 图片上传接口 ====================
 
 @router.post("/upload-image")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """
     上传图片或视频到火山云TOS
     
     参数:
         file: 上传的文件（支持图片和视频）
     
+    按内容SHA-256去重：相同内容已上传过时直接返回已有URL，不再重复上传
+    
+    图片会同时生成固定宽度的WebP衍生图（{url}@{宽度}w.webp），列表和缩略图应优先使用
+    
     返回:
         {
             "url": "TOS访问URL",
-            "size": 文件大小（字节）
+            "size": 文件大小（字节）,
+            "deduplicated": 是否命中已有内容,
+            "variants": {"webp": {"320": "衍生图URL", ...}}（仅图片）
         }
     """
     # 支持图片和视频上传
@@ -90,59 +108,53 @@ async def upload_image(file: UploadFile = File(...)):
     if not file.content_type or not any(file.content_type.startswith(t) for t in allowed_types):
         raise HTTPException(status_code=400, detail="只允许上传图片或视频文件")
 
-    # 生成唯一文件名
     ext = os.path.splitext(file.filename)[1] if file.filename else ""
-    key = f"uploads/{time.strftime('%Y%m%d')}/{int(time.time()*1000)}-{uuid.uuid4().hex}{ext}"
 
-    print(f"[IMAGE] 开始上传: {file.filename}")
-    print(f"[IMAGE] Content-Type: {file.content_type}")
-    print(f"[IMAGE] Key: {key}")
+    logger.info(f"[IMAGE] 开始上传: {file.filename}")
+    logger.info(f"[IMAGE] Content-Type: {file.content_type}")
 
     try:
-        # 读取文件内容
-        content = await file.read()
+        # 分块读取文件内容并计算哈希
+        content, digest = await blob_service.read_upload(file)
         file_size = len(content)
-        print(f"[IMAGE] 文件大小: {file_size} bytes ({file_size/1024:.2f} KB)")
+        logger.info(f"[IMAGE] 文件大小: {file_size} bytes ({file_size/1024:.2f} KB), SHA-256: {digest[:12]}")
         
         if file_size == 0:
             raise HTTPException(status_code=400, detail="文件为空")
         
-        # 使用TOS SDK上传
-        result = tos_client.put_object(
-            bucket=TOS_BUCKET,
-            key=key,
-            content=BytesIO(content),
-            content_length=file_size,
-            content_type=file.content_type
+        # 相同内容已存在时只增加引用，不重复上传
+        blob, created = await asyncio.to_thread(
+            blob_service.store, content, digest, file.content_type, ext, db
         )
+        logger.info(f"[IMAGE] ✅ {'上传成功' if created else '命中已有内容'}: {blob.object_key}")
         
-        print(f"[IMAGE] ✅ 上传成功! RequestID: {result.request_id}")
-        
-    except tos.exceptions.TosServerError as e:
-        print(f"[IMAGE] ❌ TOS服务器错误: {e.message}")
-        raise HTTPException(status_code=500, detail=f"上传失败: {e.message}")
-        
-    except tos.exceptions.TosClientError as e:
-        print(f"[IMAGE] ❌ TOS客户端错误: {e.message}")
-        raise HTTPException(status_code=500, detail=f"上传失败: {e.message}")
+    except HTTPException:
+        raise
         
     except Exception as e:
-        print(f"[IMAGE] ❌ 未知错误: {str(e)}")
+        db.rollback()
+        logger.error(f"[IMAGE] ❌ 未知错误: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
 
-    # 构建公共访问URL
-    url = build_public_url(TOS_BUCKET, key)
-    print(f"[IMAGE] 返回URL: {url}")
+    logger.info(f"[IMAGE] 返回URL: {blob.url}")
+    
+    response = {"url": blob.url, "size": file_size, "deduplicated": not created}
+    if file.content_type.startswith("image/") and file.content_type not in NON_RASTER_TYPES:
+        if blob.derivatives:
+            response["variants"] = blob.derivatives
+        else:
+            response["variants"] = await image_derivative_service.generate(blob.object_key, content, digest)
+            blob_service.set_derivatives(blob, response["variants"], db)
     
-    return {"url": url, "size": file_size}
+    return response
 
 
 # ==================== 图片拼接接口 ====================
 
 @router.post("/combine-images")
-async def combine_images(req: CombineImagesRequest):
+async def combine_images(req: CombineImagesRequest, db: Session = Depends(get_db)):
     """
     将多张图片拼接成宫格图（2-4张→2x2，5-9张→3x3）
     
@@ -154,84 +166,49 @@ async def combine_images(req: CombineImagesRequest):
     返回:
         {
             "gridUrl": "拼接后的图片URL",
-            "originalUrls": 原始图片URL列表
+            "originalUrls": 原始图片URL列表,
+            "variants": 宫格图的WebP衍生图
         }
     """
     image_count = len(req.imageUrls)
     
     # 1张图不需要拼接
     if image_count == 1:
-        print('[IMAGE] 只有1张图片，无需拼接')
+        logger.info('[IMAGE] 只有1张图片，无需拼接')
         return {"gridUrl": req.imageUrls[0], "originalUrls": req.imageUrls}
     
     if image_count > 9:
         raise HTTPException(status_code=400, detail="最多支持9张图片")
     
     # 2-4张 → 2x2宫格，5-9张 → 3x3宫格
-    grid_size = 2 if image_count <= 4 else 3
-    max_images = grid_size * grid_size
+    grid_size = grid_size_for(image_count)
     
-    print(f"[IMAGE] 开始拼接 {image_count} 张图片为 {grid_size}x{grid_size} 宫格...")
+    logger.info(f"[IMAGE] 开始拼接 {image_count} 张图片为 {grid_size}x{grid_size} 宫格...")
     
     try:
         # 下载所有图片
-        images = []
+        contents = []
         for url in req.imageUrls:
-            print(f"[IMAGE] 下载图片: {url}")
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            img = Image.open(BytesIO(response.content))
-            images.append(img)
+            logger.info(f"[IMAGE] 下载图片: {url}")
+            with track_upstream("image_fetch", "download"):
+                response = requests.get(url, timeout=30)
+                response.raise_for_status()
+            contents.append(response.content)
         
-        print('[IMAGE] 所有图片下载完成')
+        logger.info('[IMAGE] 所有图片下载完成，开始拼接...')
         
-        # 创建画布
-        cell_width = 400
-        cell_height = 400
-        canvas_width = cell_width * grid_size
-        canvas_height = cell_height * grid_size
+        # 解码、缩放和JPEG编码在线程中执行，不阻塞事件循环
+        grid_bytes, grid_size = await asyncio.to_thread(compose_grid, contents)
+        output = BytesIO(grid_bytes)
         
-        # 创建白色背景
-        canvas = Image.new('RGB', (canvas_width, canvas_height), (255, 255, 255))
-        
-        # 绘制图片
-        for i in range(min(image_count, max_images)):
-            row = i // grid_size
-            col = i % grid_size
-            x = col * cell_width
-            y = row * cell_height
-            
-            # 调整图片大小以适应单元格（保持比例，裁剪填充）
-            img = images[i]
-            scale = max(cell_width / img.width, cell_height / img.height)
-            scaled_width = int(img.width * scale)
-            scaled_height = int(img.height * scale)
-            img_resized = img.resize((scaled_width, scaled_height), Image.Resampling.LANCZOS)
-            
-            # 居中裁剪
-            offset_x = (scaled_width - cell_width) // 2
-            offset_y = (scaled_height - cell_height) // 2
-            img_cropped = img_resized.crop((offset_x, offset_y, offset_x + cell_width, offset_y + cell_height))
-            
-            # 粘贴到画布
-            canvas.paste(img_cropped, (x, y))
-            print(f"[IMAGE] 绘制第{i + 1}张图片: 位置({row}, {col})")
-        
-        print('[IMAGE] 所有图片绘制完成，开始压缩...')
-        
-        # 保存为JPEG（压缩）
-        output = BytesIO()
-        canvas.save(output, format='JPEG', quality=85)
-        output.seek(0)
-        
-        file_size = len(output.getvalue())
-        print(f"[IMAGE] 拼接完成，大小: {file_size / 1024:.2f} KB")
+        file_size = len(grid_bytes)
+        logger.info(f"[IMAGE] 拼接完成，大小: {file_size / 1024:.2f} KB")
         
         # 上传到TOS
         ext = ".jpg"
         key = f"uploads/{time.strftime('%Y%m%d')}/{int(time.time()*1000)}-grid-{grid_size}x{grid_size}{ext}"
         
-        print(f"[IMAGE] 开始上传到TOS: {key}")
+        logger.info(f"[IMAGE] 开始上传到TOS: {key}")
         result = tos_client.put_object(
             bucket=TOS_BUCKET,
             key=key,
@@ -241,25 +218,32 @@ async def combine_images(req: CombineImagesRequest):
         )
         
         grid_url = build_public_url(TOS_BUCKET, key)
-        print(f"[IMAGE] 上传成功: {grid_url}")
+        logger.info(f"[IMAGE] 上传成功: {grid_url}")
+        
+        variants = await image_derivative_service.generate(key, grid_bytes)
         
-        # 删除原图
-        print(f"[IMAGE] 开始从桶中删除 {len(req.imageUrls)} 张原图...")
+        # 删除原图（去重存储的图片只释放引用，其他地方仍在使用时保留对象）
+        logger.info(f"[IMAGE] 开始从桶中删除 {len(req.imageUrls)} 张原图...")
         for url in req.imageUrls:
             try:
+                released = blob_service.release(url, db)
+                if released is not None:
+                    continue
+                
                 # 从URL提取对象键
                 parts = url.split('.com/')
                 if len(parts) >= 2:
                     original_key = parts[1]
                     tos_client.delete_object(bucket=TOS_BUCKET, key=original_key)
-                    print(f"[IMAGE] 已删除原图: {original_key}")
+                    logger.info(f"[IMAGE] 已删除原图: {original_key}")
             except Exception as e:
-                print(f"[IMAGE] 删除原图失败: {url}, 错误: {e}")
+                db.rollback()
+                logger.error(f"[IMAGE] 删除原图失败: {url}, 错误: {e}")
         
-        return {"gridUrl": grid_url, "originalUrls": req.imageUrls}
+        return {"gridUrl": grid_url, "originalUrls": req.imageUrls, "variants": variants}
         
     except Exception as e:
-        print(f"[IMAGE] 拼接失败: {str(e)}")
+        logger.error(f"[IMAGE] 拼接失败: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"图片拼接失败: {str(e)}")
@@ -288,8 +272,8 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
     """
     CREDITS_COST = 70  # 九宫格生成消耗70积分
     
-    print(f"[NINE_GRID] 用户 {req.user_id} 请求生成九宫格")
-    print(f"[NINE_GRID] 原始图片: {req.imageUrl}")
+    logger.info(f"[NINE_GRID] 用户 {req.user_id} 请求生成九宫格")
+    logger.info(f"[NINE_GRID] 原始图片: {req.imageUrl}")
     
     # 1. 检查用户积分
     user = db.query(User).filter(User.id == req.user_id).first()
@@ -302,7 +286,7 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
             detail=f"积分不足，需要{CREDITS_COST}积分，当前仅有{user.credits}积分"
         )
     
-    print(f"[NINE_GRID] 用户当前积分: {user.credits}")
+    logger.info(f"[NINE_GRID] 用户当前积分: {user.credits}")
     
     try:
         # 2. 扣除积分
@@ -319,8 +303,9 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
         )
         db.add(credit_record)
         db.commit()
+        auth_service.invalidate(req.user_id)
         
-        print(f"[NINE_GRID] 已扣除 {CREDITS_COST} 积分，剩余: {user.credits}")
+        logger.info(f"[NINE_GRID] 已扣除 {CREDITS_COST} 积分，剩余: {user.credits}")
         
         # 3. TODO: 调用AI生图接口生成9张图
         # 这里需要实现实际的AI生图逻辑
@@ -340,7 +325,7 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
         db.add(new_image)
         db.commit()
         
-        print(f"[NINE_GRID] 生成成功，记录ID: {image_id}")
+        logger.info(f"[NINE_GRID] 生成成功，记录ID: {image_id}")
         
         return {
             "success": True,
@@ -356,7 +341,7 @@ async def generate_nine_grid(req: GenerateNineGridRequest, db: Session = Depends
     except Exception as e:
         # 其他异常也回滚
         db.rollback()
-        print(f"[NINE_GRID] 生成失败: {str(e)}")
+        logger.error(f"[NINE_GRID] 生成失败: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"九宫格图片生成失败: {str(e)}")
@@ -389,7 +374,7 @@ async def get_generated_images(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     """
-    print(f"[IMAGE] 获取用户 {user_id} 的九宫格图片列表")
+    logger.info(f"[IMAGE] 获取用户 {user_id} 的九宫格图片列表")
     
     try:
         # 查询用户的所有成功生成的九宫格图片
@@ -398,7 +383,7 @@ async def get_generated_images(user_id: str, db: Session = Depends(get_db)):
             GeneratedImage.status == 'completed'
         ).order_by(GeneratedImage.created_at.desc()).all()
         
-        print(f"[IMAGE] 找到 {len(images)} 张九宫格图片")
+        logger.info(f"[IMAGE] 找到 {len(images)} 张九宫格图片")
         
         return {
             "success": True,
@@ -417,7 +402,7 @@ async def get_generated_images(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[IMAGE] 获取九宫格图片列表失败: {e}")
+        logger.error(f"[IMAGE] 获取九宫格图片列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -438,7 +423,7 @@ async def delete_generated_image(image_id: str, user_id: str, db: Session = Depe
             "message": "图片记录已删除"
         }
     """
-    print(f"[IMAGE] 删除九宫格图片: {image_id}")
+    logger.info(f"[IMAGE] 删除九宫格图片: {image_id}")
     
     try:
         # 查询图片记录
@@ -454,7 +439,7 @@ async def delete_generated_image(image_id: str, user_id: str, db: Session = Depe
         db.delete(image)
         db.commit()
         
-        print(f"[IMAGE] 九宫格图片记录已删除")
+        logger.info(f"[IMAGE] 九宫格图片记录已删除")
         return {
             "success": True,
             "message": "图片记录已删除"
@@ -462,5 +447,5 @@ async def delete_generated_image(image_id: str, user_id: str, db: Session = Depe
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[IMAGE] 删除失败: {e}")
+        logger.error(f"[IMAGE] 删除失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
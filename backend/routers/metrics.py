@@ -0,0 +1,33 @@
+"""
+指标路由
+GET /metrics：Prometheus 文本格式的请求、SQL、上游和TOS耗时指标
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from config import settings
+from utils.metrics import render_metrics
+
+router = APIRouter(tags=["监控"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """
+    导出当前worker的指标
+
+    配置了 METRICS_TOKEN 时需携带 Authorization: Bearer <token>
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    if settings.METRICS_TOKEN:
+        token = (authorization or "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(token, settings.METRICS_TOKEN):
+            raise HTTPException(status_code=401, detail="无效的指标令牌")
+
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -13,13 +13,26 @@ from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 
 from database import get_db, Product
+from services.blob_service import blob_service
+from utils.helpers import image_variant_fields
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 router = APIRouter(prefix="/api", tags=["Product Management"])
 
+# 商品图显示宽度（CSS像素），按2倍屏挑选 imageVariants[].thumbnail
+LIST_IMAGE_WIDTH = 160
+DETAIL_IMAGE_WIDTH = 480
+
+
+def _image_variants(urls: Optional[List[str]], widths: dict, display_width: int) -> List[dict]:
+    return [image_variant_fields(url, widths.get(url, []), display_width) for url in urls or []]
+
 
 # ======================
 # Pydantic 数据模型
@@ -92,7 +105,7 @@ async def create_product(req: CreateProductRequest, db: Session = Depends(get_db
         # 返回时转换回列表格式
         selling_points_list = selling_points_text.split(', ') if selling_points_text else []
         
-        print(f"[商品创建] 用户 {req.user_id} 创建商品: {product_id} ({req.name})")
+        logger.info(f"[商品创建] 用户 {req.user_id} 创建商品: {product_id} ({req.name})")
         
         return {
             "success": True,
@@ -108,7 +121,7 @@ async def create_product(req: CreateProductRequest, db: Session = Depends(get_db
         }
     except Exception as e:
         db.rollback()
-        print(f"[商品创建] 创建商品失败: {e}")
+        logger.error(f"[商品创建] 创建商品失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -124,11 +137,13 @@ async def get_user_products(user_id: str, db: Session = Depends(get_db)):
     
     返回：
         - products: 商品列表（按创建时间倒序）
+          imageVariants: 每张图的 {url, thumbnail（适合列表的衍生图）, srcset}，没有衍生图时 thumbnail 为原图
     """
     try:
-        products = db.query(Product).filter(
+        products = db.query(Product).options(undefer(Product.image_urls)).filter(
             Product.user_id == user_id
         ).order_by(Product.created_at.desc()).all()
+        widths = blob_service.derivative_widths((url for p in products for url in p.image_urls or []), db)
         
         return {
             "products": [
@@ -139,6 +154,7 @@ async def get_user_products(user_id: str, db: Session = Depends(get_db)):
                     "usage": p.usage,
                     "sellingPoints": p.selling_points,
                     "imageUrls": p.image_urls,
+                    "imageVariants": _image_variants(p.image_urls, widths, LIST_IMAGE_WIDTH),
                     "createdAt": p.created_at.timestamp() * 1000 if p.created_at else None,
                     "updatedAt": p.updated_at.timestamp() * 1000 if p.updated_at else None
                 }
@@ -146,7 +162,7 @@ async def get_user_products(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[商品列表] 获取用户 {user_id} 商品列表失败: {e}")
+        logger.error(f"[商品列表] 获取用户 {user_id} 商品列表失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -167,6 +183,7 @@ async def get_product_detail(product_id: str, db: Session = Depends(get_db)):
         product = db.query(Product).filter(Product.id == product_id).first()
         if not product:
             raise HTTPException(status_code=404, detail="商品不存在")
+        widths = blob_service.derivative_widths(product.image_urls or [], db)
         
         return {
             "id": product.id,
@@ -175,13 +192,14 @@ async def get_product_detail(product_id: str, db: Session = Depends(get_db)):
             "usage": product.usage,
             "sellingPoints": product.selling_points,
             "imageUrls": product.image_urls,
+            "imageVariants": _image_variants(product.image_urls, widths, DETAIL_IMAGE_WIDTH),
             "createdAt": product.created_at.timestamp() * 1000 if product.created_at else None,
             "updatedAt": product.updated_at.timestamp() * 1000 if product.updated_at else None
         }
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[商品详情] 获取商品 {product_id} 详情失败: {e}")
+        logger.error(f"[商品详情] 获取商品 {product_id} 详情失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -224,7 +242,7 @@ async def update_product(
         db.commit()
         db.refresh(product)
         
-        print(f"[商品更新] 商品 {product_id} 更新成功")
+        logger.info(f"[商品更新] 商品 {product_id} 更新成功")
         
         return {
             "success": True,
@@ -244,7 +262,7 @@ async def update_product(
         raise
     except Exception as e:
         db.rollback()
-        print(f"[商品更新] 更新商品 {product_id} 失败: {e}")
+        logger.error(f"[商品更新] 更新商品 {product_id} 失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -267,14 +285,14 @@ async def delete_product(product_id: str, db: Session = Depends(get_db)):
         db.delete(product)
         db.commit()
         
-        print(f"[商品删除] 删除商品: {product_id} ({product_name})")
+        logger.info(f"[商品删除] 删除商品: {product_id} ({product_name})")
         
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        print(f"[商品删除] 删除商品 {product_id} 失败: {e}")
+        logger.error(f"[商品删除] 删除商品 {product_id} 失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -17,6 +17,9 @@ from typing import Optional
 from pydantic import BaseModel
 
 from database import get_db, Project
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 # 创建路由
 router = APIRouter(prefix="/api")
@@ -79,7 +82,7 @@ async def create_project(req: CreateProjectRequest, db: Session = Depends(get_db
         }
     except Exception as e:
         db.rollback()
-        print(f"[PROJECT] ❌ 创建项目失败: {e}")
+        logger.error(f"[PROJECT] ❌ 创建项目失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -124,5 +127,5 @@ async def get_user_projects(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[PROJECT] ❌ 获取项目列表失败: {e}")
+        logger.error(f"[PROJECT] ❌ 获取项目列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
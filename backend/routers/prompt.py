@@ -15,6 +15,9 @@ from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from database import get_db, SavedPrompt
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 router = APIRouter(prefix="/api", tags=["Prompt Management"])
@@ -64,7 +67,7 @@ async def save_prompt(req: SavePromptRequest, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(new_prompt)
         
-        print(f"[提示词保存] 用户 {req.user_id} 保存提示词: {prompt_id}")
+        logger.info(f"[提示词保存] 用户 {req.user_id} 保存提示词: {prompt_id}")
         
         return {
             "success": True,
@@ -77,7 +80,7 @@ async def save_prompt(req: SavePromptRequest, db: Session = Depends(get_db)):
         }
     except Exception as e:
         db.rollback()
-        print(f"[提示词保存] 保存提示词失败: {e}")
+        logger.error(f"[提示词保存] 保存提示词失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -113,7 +116,7 @@ async def get_user_prompts(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[提示词列表] 获取用户 {user_id} 提示词列表失败: {e}")
+        logger.error(f"[提示词列表] 获取用户 {user_id} 提示词列表失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -137,14 +140,14 @@ async def delete_prompt(prompt_id: str, db: Session = Depends(get_db)):
         db.delete(prompt)
         db.commit()
         
-        print(f"[提示词删除] 删除提示词: {prompt_id}")
+        logger.info(f"[提示词删除] 删除提示词: {prompt_id}")
         
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        print(f"[提示词删除] 删除提示词 {prompt_id} 失败: {e}")
+        logger.error(f"[提示词删除] 删除提示词 {prompt_id} 失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -11,9 +11,15 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
+from config import settings
 from database import get_db, User, CreditHistory
 from services.credit_service import CreditService
-import bcrypt
+from services.password_service import password_service
+from services.auth_service import auth_service, get_token_payload, ensure_same_user
+from services.verification_service import verification_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 router = APIRouter(prefix="/api", tags=["User Management"])
@@ -28,6 +34,7 @@ class RegisterRequest(BaseModel):
     username: str
     email: str
     password: str
+    verification_code: Optional[str] = None  # 邮箱验证码（REGISTER_REQUIRE_EMAIL_CODE=true 时必填）
 
 
 class LoginRequest(BaseModel):
@@ -47,29 +54,6 @@ class UserResponse(BaseModel):
     isActive: Optional[bool] = True
 
 
-# ======================
-# 密码加密工具函数
-# ======================
-
-def hash_password(password: str) -> str:
-    """加密密码"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    try:
-        return bcrypt.checkpw(
-            plain_password.encode('utf-8'),
-            hashed_password.encode('utf-8')
-        )
-    except Exception as e:
-        print(f"[密码验证错误] {str(e)}")
-        return False
-
-
 # ======================
 # 用户认证接口
 # ======================
@@ -79,12 +63,19 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
     """
     用户注册
     
+    - 校验邮箱验证码（提供时校验，REGISTER_REQUIRE_EMAIL_CODE=true 时必须提供）
     - 检查邮箱是否已存在
     - 加密存储密码
     - 新用户赠送100积分
     - 记录积分历史
     """
     try:
+        # 校验邮箱验证码（成功后作废）
+        if req.verification_code:
+            await verification_service.verify(req.email, req.verification_code)
+        elif settings.REGISTER_REQUIRE_EMAIL_CODE:
+            raise HTTPException(status_code=400, detail="请输入邮箱验证码")
+        
         # 检查邮箱是否已存在
         existing_user = db.query(User).filter(User.email == req.email).first()
         if existing_user:
@@ -94,7 +85,7 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
         user_id = str(uuid.uuid4())
         
         # 加密密码
-        hashed_password = hash_password(req.password)
+        hashed_password = await password_service.hash(req.password)
         
         # 创建新用户
         new_user = User(
@@ -122,9 +113,11 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(new_user)
         
-        print(f"[用户注册] 成功 - 用户ID: {user_id}, 邮箱: {req.email}")
+        logger.info(f"[用户注册] 成功 - 用户ID: {user_id}, 邮箱: {req.email}")
+        
+        auth_service.remember(auth_service.build_principal(new_user))
         
-        # 返回用户信息（不包含密码）
+        # 返回用户信息（不包含密码）和访问令牌
         return {
             "success": True,
             "user": {
@@ -135,6 +128,8 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
                 "role": "user",
                 "createdAt": int(new_user.created_at.timestamp() * 1000) if new_user.created_at else None
             },
+            "token": auth_service.create_access_token(new_user),
+            "tokenType": "bearer",
             "message": "注册成功！获得100积分奖励"
         }
         
@@ -142,7 +137,7 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         db.rollback()
-        print(f"[用户注册错误] {str(e)}")
+        logger.error(f"[用户注册错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"注册失败: {str(e)}")
@@ -155,7 +150,7 @@ async def login_user(req: LoginRequest, db: Session = Depends(get_db)):
     
     - 验证邮箱和密码
     - 检查账号是否被禁用
-    - 返回用户信息
+    - 返回用户信息和访问令牌（后续请求携带 Authorization: Bearer <token>）
     """
     try:
         # 查找用户
@@ -163,17 +158,19 @@ async def login_user(req: LoginRequest, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=401, detail="邮箱或密码错误")
         
-        # 验证密码（使用 bcrypt 验证）
-        if not verify_password(req.password, user.password_hash):
+        # 验证密码（bcrypt在线程池中执行，cost变更时自动重新加密）
+        if not await password_service.verify_user(user, req.password, db):
             raise HTTPException(status_code=401, detail="邮箱或密码错误")
         
         # 检查用户是否被禁用
         if not user.is_active:
             raise HTTPException(status_code=403, detail="账号已被禁用")
         
-        print(f"[用户登录] 成功 - 用户ID: {user.id}, 邮箱: {user.email}")
+        logger.info(f"[用户登录] 成功 - 用户ID: {user.id}, 邮箱: {user.email}")
         
-        # 返回用户信息（不包含密码）
+        auth_service.remember(auth_service.build_principal(user))
+        
+        # 返回用户信息（不包含密码）和访问令牌
         return {
             "success": True,
             "user": {
@@ -184,13 +181,15 @@ async def login_user(req: LoginRequest, db: Session = Depends(get_db)):
                 "role": user.role,
                 "createdAt": int(user.created_at.timestamp() * 1000) if user.created_at else None
             },
+            "token": auth_service.create_access_token(user),
+            "tokenType": "bearer",
             "message": "登录成功"
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[用户登录错误] {str(e)}")
+        logger.error(f"[用户登录错误] {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"登录失败: {str(e)}")
@@ -201,35 +200,44 @@ async def login_user(req: LoginRequest, db: Session = Depends(get_db)):
 # ======================
 
 @router.get("/user/{user_id}")
-async def get_user_info(user_id: str, db: Session = Depends(get_db)):
+async def get_user_info(
+    user_id: str,
+    db: Session = Depends(get_db),
+    token: Optional[dict] = Depends(get_token_payload)
+):
     """
     获取用户信息
     
-    返回用户的基本信息，不包含密码
+    返回用户的基本信息，不包含密码（使用主体缓存，积分变动时缓存失效）
     """
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        ensure_same_user(token, user_id)
+        principal = auth_service.get_principal(user_id, db)
+        if not principal:
             raise HTTPException(status_code=404, detail="用户不存在")
         
         return {
-            "id": user.id,
-            "email": user.email,
-            "username": user.username,
-            "credits": user.credits,
-            "role": user.role,
-            "isActive": user.is_active,
-            "createdAt": user.created_at.timestamp() * 1000 if user.created_at else None
+            "id": principal["id"],
+            "email": principal["email"],
+            "username": principal["username"],
+            "credits": principal["credits"],
+            "role": principal["role"],
+            "isActive": principal["isActive"],
+            "createdAt": principal["createdAt"]
         }
     except HTTPException:
         raise
     except Exception as e:
-        print(f"获取用户信息失败: {e}")
+        logger.error(f"获取用户信息失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/user/{user_id}/stats")
-async def get_user_stats(user_id: str, db: Session = Depends(get_db)):
+async def get_user_stats(
+    user_id: str,
+    db: Session = Depends(get_db),
+    token: Optional[dict] = Depends(get_token_payload)
+):
     """
     获取用户统计数据
     
@@ -242,8 +250,8 @@ async def get_user_stats(user_id: str, db: Session = Depends(get_db)):
         from database import Video, Product
         
         # 检查用户是否存在
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        ensure_same_user(token, user_id)
+        if not auth_service.get_principal(user_id, db):
             raise HTTPException(status_code=404, detail="用户不存在")
         
         # 统计用户视频数
@@ -268,7 +276,7 @@ async def get_user_stats(user_id: str, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"获取用户统计数据失败: {e}")
+        logger.error(f"获取用户统计数据失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -279,34 +287,47 @@ async def get_user_stats(user_id: str, db: Session = Depends(get_db)):
 # ======================
 
 @router.get("/credits/{user_id}")
-async def get_user_credits(user_id: str, db: Session = Depends(get_db)):
+async def get_user_credits(
+    user_id: str,
+    db: Session = Depends(get_db),
+    token: Optional[dict] = Depends(get_token_payload)
+):
     """
     获取用户积分余额
+    
+    creditsVersion 与令牌中的 cv 不同时，说明登录后积分已变动
     """
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        ensure_same_user(token, user_id)
+        principal = auth_service.get_principal(user_id, db)
+        if not principal:
             raise HTTPException(status_code=404, detail="用户不存在")
         
         return {
             "userId": user_id,
-            "credits": user.credits
+            "credits": principal["credits"],
+            "creditsVersion": principal["cv"]
         }
     except HTTPException:
         raise
     except Exception as e:
-        print(f"获取积分余额失败: {e}")
+        logger.error(f"获取积分余额失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/credits/history/{user_id}")
-async def get_credit_history(user_id: str, db: Session = Depends(get_db)):
+async def get_credit_history(
+    user_id: str,
+    db: Session = Depends(get_db),
+    token: Optional[dict] = Depends(get_token_payload)
+):
     """
     获取积分历史记录
     
     按时间倒序返回所有积分变动记录
     """
     try:
+        ensure_same_user(token, user_id)
         history = db.query(CreditHistory).filter(
             CreditHistory.user_id == user_id
         ).order_by(CreditHistory.created_at.desc()).all()
@@ -324,6 +345,8 @@ async def get_credit_history(user_id: str, db: Session = Depends(get_db)):
                 for h in history
             ]
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"获取积分历史失败: {e}")
+        logger.error(f"获取积分历史失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -9,17 +9,34 @@
 """
 from typing import Optional, List
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 
-from database import get_db, Video
+from database import get_db, get_read_db, Video
+from services.blob_service import blob_service
+from services.video_persist_service import video_persist_service
+from utils.helpers import image_variant_fields
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 router = APIRouter(prefix="/api", tags=["Video Management"])
 
+# 视频卡片封面显示宽度（CSS像素）
+CARD_THUMBNAIL_WIDTH = 240
+
+
+def _thumbnail_fields(url: Optional[str], widths: dict) -> dict:
+    """封面是带衍生图的上传图片时，返回适合卡片的衍生图和 srcset"""
+    if not url or url not in widths:
+        return {"thumbnailSmall": url, "thumbnailSrcset": None}
+    fields = image_variant_fields(url, widths[url], CARD_THUMBNAIL_WIDTH)
+    return {"thumbnailSmall": fields["thumbnail"], "thumbnailSrcset": fields["srcset"]}
+
 
 # ======================
 # Pydantic 数据模型
@@ -45,7 +62,11 @@ class SaveVideoRequest(BaseModel):
 # ======================
 
 @router.post("/videos")
-async def save_video(req: SaveVideoRequest, db: Session = Depends(get_db)):
+async def save_video(
+    req: SaveVideoRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
+):
     """
     保存视频记录
     
@@ -57,6 +78,8 @@ async def save_video(req: SaveVideoRequest, db: Session = Depends(get_db)):
             - task_id: 任务ID（用于轮询查询）
             - progress: 进度（0-100）
     
+    已完成的视频会在后台转存到TOS（云雾URL 3天后失效）
+    
     返回：
         - success: 是否成功
         - video: 视频信息
@@ -79,11 +102,17 @@ async def save_video(req: SaveVideoRequest, db: Session = Depends(get_db)):
             task_id=req.task_id,
             progress=req.progress or 0
         )
+        if new_video.status == 'completed' and new_video.video_url \
+                and not video_persist_service.is_persisted(new_video.video_url):
+            new_video.url_expires_at = datetime.utcnow() + timedelta(days=3)
         db.add(new_video)
         db.commit()
         db.refresh(new_video)
         
-        print(f"[视频保存] 用户 {req.user_id} 保存视频: {video_id} (状态: {req.status})")
+        logger.info(f"[视频保存] 用户 {req.user_id} 保存视频: {video_id} (状态: {req.status})")
+        
+        if new_video.url_expires_at:
+            background_tasks.add_task(video_persist_service.persist, new_video.id)
         
         return {
             "success": True,
@@ -102,7 +131,7 @@ async def save_video(req: SaveVideoRequest, db: Session = Depends(get_db)):
         }
     except Exception as e:
         db.rollback()
-        print(f"[视频保存] 保存视频失败: {e}")
+        logger.error(f"[视频保存] 保存视频失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -122,9 +151,10 @@ async def get_user_videos(user_id: str, db: Session = Depends(get_db)):
     **前端对应**: UserCenter.tsx 我的视频列表
     """
     try:
-        videos = db.query(Video).filter(
+        videos = db.query(Video).options(undefer(Video.script)).filter(
             Video.user_id == user_id
         ).order_by(Video.created_at.desc()).all()
+        widths = blob_service.derivative_widths((v.thumbnail_url for v in videos), db)
         
         return {
             "videos": [
@@ -132,6 +162,8 @@ async def get_user_videos(user_id: str, db: Session = Depends(get_db)):
                     "id": v.id,
                     "url": v.video_url,
                     "thumbnail": v.thumbnail_url,
+                    **_thumbnail_fields(v.thumbnail_url, widths),
+                    "preview": v.preview_url,
                     "script": v.script,
                     "productName": v.product_name,
                     "status": v.status,
@@ -145,7 +177,7 @@ async def get_user_videos(user_id: str, db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[视频列表] 获取用户 {user_id} 视频列表失败: {e}")
+        logger.error(f"[视频列表] 获取用户 {user_id} 视频列表失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -155,6 +187,7 @@ async def get_user_videos(user_id: str, db: Session = Depends(get_db)):
 async def update_video(
     video_id: str, 
     req: SaveVideoRequest, 
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -166,6 +199,8 @@ async def update_video(
     - 更新进度
     - 更新缩略图
     
+    视频变为已完成时会在后台转存到TOS
+    
     Args:
         video_id: 视频ID
         req: 更新内容（仅更新非None字段）
@@ -191,10 +226,22 @@ async def update_video(
         if req.product_name is not None:
             video.product_name = req.product_name
         
+        # 新的云雾URL：记录过期时间并安排转存
+        needs_persist = (
+            video.status == 'completed'
+            and req.video_url is not None
+            and not video_persist_service.is_persisted(video.video_url)
+        )
+        if needs_persist:
+            video.url_expires_at = datetime.utcnow() + timedelta(days=3)
+        
         db.commit()
         db.refresh(video)
         
-        print(f"[视频更新] 视频 {video_id} 更新: 状态={req.status}, 进度={req.progress}")
+        logger.info(f"[视频更新] 视频 {video_id} 更新: 状态={req.status}, 进度={req.progress}")
+        
+        if needs_persist:
+            background_tasks.add_task(video_persist_service.persist, video.id)
         
         return {
             "success": True,
@@ -215,7 +262,7 @@ async def update_video(
         raise
     except Exception as e:
         db.rollback()
-        print(f"[视频更新] 更新视频 {video_id} 失败: {e}")
+        logger.error(f"[视频更新] 更新视频 {video_id} 失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -244,14 +291,14 @@ async def delete_user_video(video_id: str, db: Session = Depends(get_db)):
         db.delete(video)
         db.commit()
         
-        print(f"[视频删除] 删除视频: {video_id} ({video_title})")
+        logger.info(f"[视频删除] 删除视频: {video_id} ({video_title})")
         
         return {"success": True}
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        print(f"[视频删除] 删除视频 {video_id} 失败: {e}")
+        logger.error(f"[视频删除] 删除视频 {video_id} 失败: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -262,7 +309,7 @@ async def delete_user_video(video_id: str, db: Session = Depends(get_db)):
 # ======================
 
 @router.get("/public-videos")
-async def get_public_videos(db: Session = Depends(get_db)):
+async def get_public_videos(db: Session = Depends(get_read_db)):
     """
     获取所有公开的视频（内容广场）
     
@@ -275,6 +322,7 @@ async def get_public_videos(db: Session = Depends(get_db)):
         public_videos = db.query(Video).filter(
             Video.is_public == True
         ).order_by(Video.created_at.desc()).all()
+        widths = blob_service.derivative_widths((v.thumbnail_url for v in public_videos), db)
         
         return {
             "videos": [
@@ -282,7 +330,8 @@ async def get_public_videos(db: Session = Depends(get_db)):
                     "id": v.id,
                     "url": v.video_url,
                     "thumbnail": v.thumbnail_url,
-                    "script": v.script,
+                    **_thumbnail_fields(v.thumbnail_url, widths),
+                    "preview": v.preview_url,
                     "productName": v.product_name,
                     "category": v.product_category,
                     "createdAt": v.created_at.timestamp() * 1000 if v.created_at else None,
@@ -293,7 +342,7 @@ async def get_public_videos(db: Session = Depends(get_db)):
             ]
         }
     except Exception as e:
-        print(f"[公开视频] 获取公开视频列表失败: {e}")
+        logger.error(f"[公开视频] 获取公开视频列表失败: {e}")
         import traceback
         traceback.print_exc()
         return {"videos": []}
@@ -6,9 +6,35 @@
 from .tos_service import tos_service
 from .ai_service import ai_service
 from .credit_service import credit_service
+from .script_batch_service import script_batch_service
+from .campaign_service import campaign_service
+from .thumbnail_service import thumbnail_service
+from .video_persist_service import video_persist_service
+from .image_derivative_service import image_derivative_service
+from .blob_service import blob_service
+from .password_service import password_service
+from .auth_service import auth_service
+from .mail_service import mail_service
+from .verification_service import verification_service
+from .order_service import order_service
+from .profiler_service import profiler_service
+from .partition_service import partition_service
 
 __all__ = [
     "tos_service",
     "ai_service",
     "credit_service",
+    "script_batch_service",
+    "campaign_service",
+    "thumbnail_service",
+    "video_persist_service",
+    "image_derivative_service",
+    "blob_service",
+    "password_service",
+    "auth_service",
+    "mail_service",
+    "verification_service",
+    "order_service",
+    "profiler_service",
+    "partition_service",
 ]
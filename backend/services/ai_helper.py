@@ -13,6 +13,10 @@ import requests
 from typing import List, Optional, Dict, Any
 from openai import OpenAI
 from dotenv import load_dotenv
+from utils.logger import get_logger
+from utils.metrics import track_upstream
+
+logger = get_logger(__name__)
 
 load_dotenv()
 
@@ -36,14 +40,15 @@ if LLM_API_KEY:
 def url_to_base64(image_url: str) -> Optional[str]:
     """将图片URL转换为base64编码"""
     try:
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
+        with track_upstream("image_fetch", "download"):
+            response = requests.get(image_url, timeout=10)
+            response.raise_for_status()
         image_data = response.content
         base64_str = base64.b64encode(image_data).decode('utf-8')
         content_type = response.headers.get('Content-Type', 'image/jpeg')
         return f"data:{content_type};base64,{base64_str}"
     except Exception as e:
-        print(f"[ERROR] 图片转换base64失败: {e}")
+        logger.error(f"[ERROR] 图片转换base64失败: {e}")
         return None
 
 
@@ -83,7 +88,8 @@ async def chat_with_ai(
             if image_url.startswith('data:image'):
                 base64_image = image_url
             else:
-                base64_image = url_to_base64(image_url)
+                # 图片下载是阻塞IO，放到线程池避免阻塞事件循环
+                base64_image = await asyncio.to_thread(url_to_base64, image_url)
                 if not base64_image:
                     messages.append({"role": "user", "content": prompt})
                     base64_image = None
@@ -101,12 +107,15 @@ async def chat_with_ai(
         else:
             messages.append({"role": "user", "content": prompt})
         
-        response = ai_client.chat.completions.create(
-            model=LLM_MODEL_NAME,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=2000
-        )
+        # OpenAI SDK是同步客户端，放到线程池执行，使多个对话可以并发
+        with track_upstream("llm", "chat", key=LLM_API_KEY):
+            response = await asyncio.to_thread(
+                ai_client.chat.completions.create,
+                model=LLM_MODEL_NAME,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=2000
+            )
         
         if hasattr(response, 'choices') and len(response.choices) > 0:
             content = response.choices[0].message.content
@@ -115,7 +124,7 @@ async def chat_with_ai(
             return "收到。正在分析您的请求..."
             
     except Exception as e:
-        print(f"[ERROR] AI对话错误: {e}")
+        logger.error(f"[ERROR] AI对话错误: {e}")
         import traceback
         traceback.print_exc()
         return "抱歉，AI服务暂时不可用。请稍后再试。"
@@ -131,7 +140,8 @@ async def generate_video_with_ai(
     private: bool = True,
     character_id: Optional[str] = None,
     product_attributes: Optional[Dict[str, Any]] = None,
-    negative_prompts: Optional[List[str]] = None
+    negative_prompts: Optional[List[str]] = None,
+    api_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     使用Sora API生成视频
@@ -147,10 +157,13 @@ async def generate_video_with_ai(
         character_id: 角色ID
         product_attributes: 产品属性
         negative_prompts: 负面提示词
+        api_key: 指定使用的API Key（批量提交时按Key池分配），默认使用 VIDEO_API_KEY
     
     返回:
         包含task_id的响应字典
     """
+    api_key = api_key or VIDEO_API_KEY
+    
     # 优化Prompt
     enhanced_prompt = prompt
     
@@ -171,7 +184,7 @@ async def generate_video_with_ai(
     if negative_prompts and len(negative_prompts) > 0:
         enhanced_prompt = f"{enhanced_prompt}\n\nAvoid: {', '.join(negative_prompts)}"
     
-    if not VIDEO_API_KEY:
+    if not api_key:
         # 模拟响应
         await asyncio.sleep(1)
         return {
@@ -197,16 +210,18 @@ async def generate_video_with_ai(
         
         # 调用云雾API
         headers = {
-            "Authorization": f"Bearer {VIDEO_API_KEY}",
+            "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
-        response = requests.post(
-            f"{VIDEO_BASE_URL}/v1/video/generations",
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        with track_upstream("yunwu_video", "submit", key=api_key):
+            response = await asyncio.to_thread(
+                requests.post,
+                f"{VIDEO_BASE_URL}/v1/video/generations",
+                headers=headers,
+                json=payload,
+                timeout=30
+            )
         
         if response.status_code != 200:
             return {
@@ -218,8 +233,76 @@ async def generate_video_with_ai(
         return result
         
     except Exception as e:
-        print(f"[ERROR] 视频生成错误: {e}")
+        logger.error(f"[ERROR] 视频生成错误: {e}")
         return {
             "error": True,
             "message": f"视频生成失败: {str(e)}"
         }
+
+
+def query_video_task(task_id: str, api_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    查询云雾视频生成任务状态（同步函数，异步代码中请用 asyncio.to_thread 调用）
+    
+    参数:
+        task_id: 任务ID
+        api_key: 提交该任务时使用的API Key，默认使用 VIDEO_API_KEY
+    
+    返回:
+        任务状态字典，补充了标准化的 status/progress 字段；
+        查询失败时返回 status=processing 以便调用方继续轮询
+    """
+    api_key = api_key or VIDEO_API_KEY
+    
+    try:
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        
+        with track_upstream("yunwu_video", "query", key=api_key):
+            response = requests.get(
+                f"{VIDEO_BASE_URL}/v1/video/query",
+                params={"id": task_id},
+                headers=headers,
+                timeout=10
+            )
+        
+        if response.status_code != 200:
+            return {
+                "id": task_id,
+                "status": "processing",
+                "progress": 10,
+                "message": f"查询错误: {response.status_code}"
+            }
+        
+        try:
+            result = response.json()
+        except Exception as json_error:
+            logger.error(f"[查询任务] JSON解析失败: {json_error}")
+            return {
+                "id": task_id,
+                "status": "processing",
+                "progress": 15,
+                "message": "JSON解析失败"
+            }
+        
+        if result.get('video_url'):
+            result['status'] = 'completed'
+            result['progress'] = 100
+        elif result.get('status') == 'failed':
+            result['progress'] = 0
+        elif result.get('status') in ['processing', 'queued']:
+            result['progress'] = 5 if result.get('status') == 'queued' else 50
+        
+        return result
+        
+    except requests.RequestException as e:
+        logger.error(f"[查询任务] 请求异常: {str(e)}")
+        return {
+            "id": task_id,
+            "status": "processing",
+            "progress": 20,
+            "message": f"网络错误: {str(e)}"
+        }
@@ -8,6 +8,10 @@ from openai import OpenAI
 
 from config import settings
 from utils.api_key_pool import APIKeyPool
+from utils.logger import get_logger
+from utils.metrics import track_upstream
+
+logger = get_logger(__name__)
 
 
 class AIService:
@@ -21,10 +25,10 @@ class AIService:
                 api_key=settings.LLM_API_KEY,
                 base_url=f"{settings.LLM_BASE_URL}/v1"
             )
-            print(f"[AI Service] LLM客户端初始化成功")
+            logger.info(f"[AI Service] LLM客户端初始化成功")
         else:
             self.llm_client = None
-            print(f"[AI Service] ⚠️ LLM_API_KEY未配置，聊天功能将不可用")
+            logger.warning(f"[AI Service] ⚠️ LLM_API_KEY未配置，聊天功能将不可用")
         
         # 初始化视频生成API Key池
         api_keys = settings.get_api_key_pool()
@@ -33,7 +37,7 @@ class AIService:
             fallback_key=settings.VIDEO_API_KEY
         )
         
-        print(f"[AI Service] 视频API Key池初始化: {self.video_api_pool.size()} 个密钥")
+        logger.info(f"[AI Service] 视频API Key池初始化: {self.video_api_pool.size()} 个密钥")
     
     def chat_completion(
         self,
@@ -62,17 +66,18 @@ class AIService:
             raise ValueError("LLM客户端未初始化，请检查LLM_API_KEY配置")
         
         try:
-            response = self.llm_client.chat.completions.create(
-                model=model or settings.LLM_MODEL_NAME,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            with track_upstream("llm", "chat", key=settings.LLM_API_KEY):
+                response = self.llm_client.chat.completions.create(
+                    model=model or settings.LLM_MODEL_NAME,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
             
             return response.choices[0].message.content
             
         except Exception as e:
-            print(f"[AI Service] ❌ LLM调用失败: {str(e)}")
+            logger.error(f"[AI Service] ❌ LLM调用失败: {str(e)}")
             raise
     
     def get_next_video_api_key(self) -> str:
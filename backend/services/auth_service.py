@@ -0,0 +1,189 @@
+"""
+认证服务
+- 签发和校验 JWT 访问令牌（HS256，标准库实现，校验时不访问数据库）
+- 用户主体信息的 LRU + TTL 缓存，替代大多数按 user_id 查询 users 表的请求
+"""
+
+import hmac
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from fastapi import Header, HTTPException, Depends
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import User
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def credits_version(user: User) -> int:
+    """积分快照版本：用户记录最后更新时间（毫秒），积分变动时随之变化"""
+    return int(user.updated_at.timestamp() * 1000) if user.updated_at else 0
+
+
+class AuthService:
+    """认证服务类"""
+
+    def __init__(self):
+        """初始化主体缓存"""
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def _secret(self) -> bytes:
+        """签名密钥；JWT_SECRET_KEY 不安全时抛出 RuntimeError，拒绝签发和校验令牌"""
+        return settings.get_jwt_secret()
+
+    # ======================
+    # 访问令牌
+    # ======================
+
+    def create_access_token(self, user: User) -> str:
+        """
+        签发访问令牌
+
+        载荷：sub（用户ID）、role、cv（积分快照版本）、iat、exp
+        """
+        now = int(time.time())
+        header = {"alg": "HS256", "typ": "JWT"}
+        payload = {
+            "sub": user.id,
+            "role": user.role or "user",
+            "cv": credits_version(user),
+            "iat": now,
+            "exp": now + settings.JWT_EXPIRE_MINUTES * 60,
+        }
+        signing_input = ".".join(
+            _b64encode(json.dumps(part, separators=(",", ":")).encode("utf-8"))
+            for part in (header, payload)
+        )
+        signature = hmac.new(self._secret, signing_input.encode("ascii"), hashlib.sha256).digest()
+        return f"{signing_input}.{_b64encode(signature)}"
+
+    def decode_token(self, token: str) -> Dict[str, Any]:
+        """
+        校验令牌签名和有效期
+
+        Raises:
+            HTTPException: 令牌无效或已过期（401）
+        """
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            expected = hmac.new(
+                self._secret, f"{header_b64}.{payload_b64}".encode("ascii"), hashlib.sha256
+            ).digest()
+            if header.get("alg") != "HS256" or not hmac.compare_digest(expected, _b64decode(signature_b64)):
+                raise ValueError("签名无效")
+            payload = json.loads(_b64decode(payload_b64))
+        except (ValueError, TypeError, json.JSONDecodeError):
+            raise HTTPException(status_code=401, detail="登录凭证无效，请重新登录")
+
+        if payload.get("exp", 0) < time.time():
+            raise HTTPException(status_code=401, detail="登录已过期，请重新登录")
+        return payload
+
+    # ======================
+    # 用户主体缓存
+    # ======================
+
+    @staticmethod
+    def build_principal(user: User) -> Dict[str, Any]:
+        """从用户记录构建主体信息（不含密码）"""
+        return {
+            "id": user.id,
+            "email": user.email,
+            "username": user.username,
+            "credits": user.credits,
+            "role": user.role,
+            "isActive": user.is_active,
+            "createdAt": user.created_at.timestamp() * 1000 if user.created_at else None,
+            "cv": credits_version(user),
+        }
+
+    def get_principal(self, user_id: str, db: Session) -> Optional[Dict[str, Any]]:
+        """
+        获取用户主体信息，优先使用缓存
+
+        Returns:
+            主体信息字典；用户不存在时返回None
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry and entry[0] > now:
+                self._cache.move_to_end(user_id)
+                return entry[1]
+
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+
+        principal = self.build_principal(user)
+        self.remember(principal)
+        return principal
+
+    def remember(self, principal: Dict[str, Any]) -> None:
+        """写入缓存（登录、注册时顺带预热）"""
+        with self._lock:
+            self._cache[principal["id"]] = (time.monotonic() + settings.AUTH_PRINCIPAL_CACHE_TTL, principal)
+            self._cache.move_to_end(principal["id"])
+            while len(self._cache) > settings.AUTH_PRINCIPAL_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        """积分、角色等变动后清除缓存"""
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+
+# 创建全局认证服务实例
+auth_service = AuthService()
+
+
+# ======================
+# 依赖注入
+# ======================
+
+async def get_token_payload(authorization: Optional[str] = Header(None)) -> Optional[Dict[str, Any]]:
+    """
+    解析 Authorization: Bearer <token>
+
+    未携带令牌时：AUTH_REQUIRE_TOKEN=false 返回None（兼容旧前端），否则返回401
+    """
+    if not authorization:
+        if settings.AUTH_REQUIRE_TOKEN:
+            raise HTTPException(status_code=401, detail="请先登录")
+        return None
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="登录凭证格式错误")
+    return auth_service.decode_token(token)
+
+
+def ensure_same_user(payload: Optional[Dict[str, Any]], user_id: str) -> None:
+    """令牌中的用户与请求的 user_id 不一致时拒绝（管理员除外）"""
+    if payload and payload.get("sub") != user_id and payload.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="无权访问其他用户的数据")
+
+
+async def require_admin(payload: Optional[Dict[str, Any]] = Depends(get_token_payload)) -> Dict[str, Any]:
+    """管理员接口：无论 AUTH_REQUIRE_TOKEN 如何设置，都必须携带管理员角色的有效令牌"""
+    if not payload:
+        raise HTTPException(status_code=401, detail="请先登录")
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+    return payload
@@ -0,0 +1,196 @@
+"""
+上传文件去重服务
+按内容SHA-256存储上传文件（blobs/{哈希前2位}/{哈希}{扩展名}），相同内容只上传一次；
+删除时减少引用计数，归零后才删除TOS对象
+"""
+
+import uuid
+import hashlib
+from typing import Optional, Tuple, Dict, List, Iterable
+
+from fastapi import UploadFile, HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import Blob
+from services.tos_service import tos_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 读取上传文件时每次读取的字节数
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobService:
+    """上传文件去重服务类"""
+
+    @staticmethod
+    def build_key(digest: str, ext: str = "") -> str:
+        """按内容哈希构建对象键"""
+        return f"blobs/{digest[:2]}/{digest}{ext.lower()}"
+
+    @staticmethod
+    async def read_upload(file: UploadFile, max_size: Optional[int] = None) -> Tuple[bytes, str]:
+        """
+        分块读取上传文件并同时计算SHA-256
+
+        Args:
+            file: 上传的文件
+            max_size: 最大字节数，超出时返回413
+
+        Returns:
+            (文件内容, 十六进制哈希)
+        """
+        hasher = hashlib.sha256()
+        buffer = bytearray()
+
+        while True:
+            chunk = await file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            buffer.extend(chunk)
+            if max_size and len(buffer) > max_size:
+                raise HTTPException(status_code=413, detail=f"文件过大，最大 {max_size // 1024 // 1024} MB")
+
+        return bytes(buffer), hasher.hexdigest()
+
+    @staticmethod
+    def _acquire(digest: str, db: Session) -> Optional[Blob]:
+        """已有相同内容时引用计数+1并返回"""
+        updated = db.query(Blob).filter(Blob.sha256 == digest).update(
+            {Blob.ref_count: Blob.ref_count + 1},
+            synchronize_session=False
+        )
+        if not updated:
+            return None
+        db.commit()
+        return db.query(Blob).filter(Blob.sha256 == digest).first()
+
+    def store(
+        self,
+        content: bytes,
+        digest: str,
+        content_type: str,
+        ext: str,
+        db: Session
+    ) -> Tuple[Blob, bool]:
+        """
+        保存文件内容（已存在时不重复上传）
+
+        Args:
+            content: 文件内容
+            digest: 内容SHA-256
+            content_type: MIME类型
+            ext: 扩展名（含点号，仅首次上传时使用）
+            db: 数据库会话
+
+        Returns:
+            (Blob记录, 是否新上传)
+
+        Raises:
+            HTTPException: 上传失败
+        """
+        blob = self._acquire(digest, db)
+        if blob:
+            logger.info(f"[BLOB] 内容已存在，跳过上传: {blob.object_key} (引用 {blob.ref_count})")
+            return blob, False
+
+        if tos_service is None:
+            raise HTTPException(status_code=500, detail="TOS服务未初始化")
+
+        key = self.build_key(digest, ext)
+        url = tos_service.upload_file(key, content, content_type)
+
+        blob = Blob(
+            id=str(uuid.uuid4()),
+            sha256=digest,
+            object_key=key,
+            url=url,
+            size=len(content),
+            content_type=content_type,
+            ref_count=1
+        )
+        try:
+            db.add(blob)
+            db.commit()
+            return blob, True
+        except IntegrityError:
+            # 并发上传了相同内容：对象键相同，改为增加引用
+            db.rollback()
+            return self._acquire(digest, db), False
+
+    @staticmethod
+    def set_derivatives(blob: Blob, derivatives: Dict, db: Session) -> None:
+        """记录衍生图URL，重复上传时直接返回"""
+        if not derivatives:
+            return
+        try:
+            blob.derivatives = derivatives
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"[BLOB] ⚠️ 保存衍生图信息失败: {e}")
+
+    @staticmethod
+    def derivative_widths(urls: Iterable[str], db: Session) -> Dict[str, List[int]]:
+        """
+        批量查询已生成WebP衍生图的宽度（一次查询，列表接口用）
+
+        Returns:
+            {原图URL: [宽度, ...]}；没有衍生图的URL不在结果中
+        """
+        urls = {url for url in urls if url}
+        if not urls:
+            return {}
+        rows = db.query(Blob.url, Blob.derivatives).filter(Blob.url.in_(urls)).all()
+        return {
+            url: sorted(int(width) for width in derivatives["webp"])
+            for url, derivatives in rows
+            if derivatives and derivatives.get("webp")
+        }
+
+    @staticmethod
+    def release(url: str, db: Session) -> Optional[bool]:
+        """
+        释放一次引用，引用归零时删除TOS对象（含衍生图）和记录
+
+        Args:
+            url: 文件URL
+            db: 数据库会话
+
+        Returns:
+            None: 不是去重存储的文件（调用方自行处理）
+            False: 仍有其他引用，未删除对象
+            True: 已删除对象
+        """
+        blob = db.query(Blob).filter(Blob.url == url).with_for_update().first()
+        if not blob:
+            return None
+
+        blob.ref_count = (blob.ref_count or 1) - 1
+        if blob.ref_count > 0:
+            db.commit()
+            logger.info(f"[BLOB] 释放引用: {blob.object_key} (剩余 {blob.ref_count})")
+            return False
+
+        derivative_urls = [
+            derivative_url
+            for by_width in (blob.derivatives or {}).values()
+            for derivative_url in by_width.values()
+        ]
+        # 持有行锁时删除对象，再删记录提交：并发 store() 的引用+1会等待行锁，
+        # 提交后发现记录已不存在才重新上传，不会被这里删掉新对象
+        if tos_service is not None:
+            for object_url in [url, *derivative_urls]:
+                tos_service.delete_file(object_url)
+        db.delete(blob)
+        db.commit()
+        logger.info(f"[BLOB] 引用归零，已删除: {url}")
+        return True
+
+
+# 创建全局上传文件去重服务实例
+blob_service = BlobService()
@@ -0,0 +1,609 @@
+"""
+批量视频生成活动服务
+一次提交多个视频任务（商品 × 方向 × 时长），由后台调度器分散到API Key池提交、
+轮询任务状态，并汇总进度和积分成本
+"""
+
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session, undefer
+
+from config import settings
+from database import SessionLocal, Video, VideoCampaign
+from services.ai_service import ai_service
+from services.ai_helper import generate_video_with_ai, query_video_task
+from services.credit_service import credit_service
+from services.script_batch_service import ScriptBatchService
+from services.video_persist_service import video_persist_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 默认视频提示词模板，可用占位符：{name} {usage} {selling_points}
+DEFAULT_PROMPT_TEMPLATE = (
+    "A UGC style product showcase video for {name}. "
+    "Show how it is used: {usage}. "
+    "Highlight: {selling_points}."
+)
+
+# 云雾视频URL有效期
+UPSTREAM_URL_TTL = timedelta(days=3)
+
+# 仍在进行中的视频状态（submitting：已被某个worker认领并扣费，正在提交到上游）
+PENDING_STATUSES = ('queued', 'submitting', 'processing')
+
+# 认领后超过该时间仍未拿到任务ID的视频（提交过程中worker退出），标记失败并退还积分
+SUBMIT_STALE_AFTER = timedelta(minutes=10)
+
+
+class CampaignService:
+    """批量视频生成活动服务类（包含后台调度器）"""
+
+    def __init__(self):
+        """初始化调度器状态"""
+        self.key_pool = ai_service.video_api_pool
+        self._key_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._key_load: Dict[str, int] = {}
+        self._task_keys: Dict[str, str] = {}  # 上游任务ID -> 提交时使用的API Key
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    # ======================
+    # 活动管理
+    # ======================
+
+    def create_campaign(
+        self,
+        user_id: str,
+        product_ids: List[str],
+        orientations: List[str],
+        durations: List[int],
+        db: Session,
+        name: Optional[str] = None,
+        prompt_template: Optional[str] = None,
+        prompts: Optional[Dict[str, str]] = None
+    ) -> VideoCampaign:
+        """
+        创建活动并为每个 商品 × 方向 × 时长 组合生成一条排队中的视频记录
+
+        Raises:
+            HTTPException: 参数无效、任务数超限或积分不足
+        """
+        orientations = list(dict.fromkeys(orientations))
+        durations = list(dict.fromkeys(durations))
+        if not orientations or not durations:
+            raise HTTPException(status_code=400, detail="方向和时长不能为空")
+
+        invalid = [o for o in orientations if o not in ('portrait', 'landscape')]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"无效的视频方向: {', '.join(invalid)}")
+
+        products = ScriptBatchService.load_products(user_id, product_ids, db)
+
+        total = len(products) * len(orientations) * len(durations)
+        if total > settings.CAMPAIGN_MAX_TASKS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"单个活动最多 {settings.CAMPAIGN_MAX_TASKS} 个视频，当前组合共 {total} 个"
+            )
+
+        credits_per_video = settings.CREDITS_PER_VIDEO
+        total_cost = total * credits_per_video
+        if not credit_service.check_sufficient_credits(user_id, total_cost, db):
+            raise HTTPException(status_code=400, detail=f"积分不足，本次活动预计消耗 {total_cost} 积分")
+
+        template = prompt_template or DEFAULT_PROMPT_TEMPLATE
+        prompts = prompts or {}
+
+        campaign_id = str(uuid.uuid4())
+        product_config = {}
+        video_products = {}
+        videos = []
+
+        for product in products:
+            prompt = prompts.get(product["id"]) or template.format(
+                name=product["name"],
+                usage=product["usage"] or product["name"],
+                selling_points=', '.join(product["sellingPoints"]) or product["name"]
+            )
+            product_config[product["id"]] = {
+                "name": product["name"],
+                "images": product["images"][:1],
+            }
+
+            for orientation in orientations:
+                for duration in durations:
+                    video_id = str(uuid.uuid4())
+                    video_products[video_id] = product["id"]
+                    videos.append(Video(
+                        id=video_id,
+                        user_id=user_id,
+                        campaign_id=campaign_id,
+                        prompt=prompt,
+                        product_name=product["name"],
+                        orientation=orientation,
+                        duration=duration,
+                        status='queued',
+                        progress=0
+                    ))
+
+        campaign = VideoCampaign(
+            id=campaign_id,
+            user_id=user_id,
+            name=name or f"批量活动 {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+            status='running',
+            total_tasks=total,
+            credits_per_video=credits_per_video,
+            config={
+                "orientations": orientations,
+                "durations": durations,
+                "products": product_config,
+                "videoProducts": video_products,
+            }
+        )
+
+        try:
+            db.add(campaign)
+            db.add_all(videos)
+            db.commit()
+            db.refresh(campaign)
+        except Exception:
+            db.rollback()
+            raise
+
+        logger.info(f"[批量视频] 用户 {user_id} 创建活动 {campaign_id}: {total} 个视频")
+        self.notify()
+        return campaign
+
+    def cancel_campaign(self, campaign_id: str, db: Session) -> VideoCampaign:
+        """取消活动：排队中的视频不再提交，已提交的视频继续完成"""
+        campaign = db.query(VideoCampaign).filter(VideoCampaign.id == campaign_id).first()
+        if not campaign:
+            raise HTTPException(status_code=404, detail="活动不存在")
+
+        if campaign.status == 'running':
+            db.query(Video).filter(
+                Video.campaign_id == campaign_id,
+                Video.status == 'queued'
+            ).update({Video.status: 'cancelled'}, synchronize_session=False)
+            campaign.status = 'cancelled'
+            db.commit()
+            logger.info(f"[批量视频] 活动 {campaign_id} 已取消")
+
+        return campaign
+
+    @staticmethod
+    def get_summary(campaign: VideoCampaign, db: Session, include_videos: bool = True) -> Dict[str, Any]:
+        """汇总活动进度、状态分布和成本"""
+        rows = db.query(Video.status, func.count(Video.id), func.sum(Video.progress)).filter(
+            Video.campaign_id == campaign.id
+        ).group_by(Video.status).all()
+
+        status_counts = {status: count for status, count, _ in rows}
+        progress_sum = sum(
+            100 * count if status == 'completed' else (progress or 0)
+            for status, count, progress in rows
+        )
+        total = campaign.total_tasks or sum(status_counts.values())
+
+        summary = {
+            "id": campaign.id,
+            "name": campaign.name,
+            "status": campaign.status,
+            "totalTasks": total,
+            "submittedTasks": campaign.submitted_tasks or 0,
+            "completedTasks": status_counts.get('completed', 0),
+            "failedTasks": status_counts.get('failed', 0),
+            "statusCounts": status_counts,
+            "progress": round(progress_sum / total) if total else 0,
+            "creditsPerVideo": campaign.credits_per_video,
+            "creditsSpent": campaign.credits_spent or 0,
+            "estimatedCost": total * (campaign.credits_per_video or 0),
+            "createdAt": campaign.created_at.timestamp() * 1000 if campaign.created_at else None,
+            "completedAt": campaign.completed_at.timestamp() * 1000 if campaign.completed_at else None,
+        }
+
+        if include_videos:
+            videos = db.query(Video).filter(
+                Video.campaign_id == campaign.id
+            ).order_by(Video.created_at.asc()).all()
+            video_products = (campaign.config or {}).get("videoProducts", {})
+            summary["videos"] = [
+                {
+                    "id": v.id,
+                    "productId": video_products.get(v.id),
+                    "productName": v.product_name,
+                    "orientation": v.orientation,
+                    "duration": v.duration,
+                    "status": v.status,
+                    "progress": v.progress or 0,
+                    "taskId": v.task_id,
+                    "url": v.video_url,
+                    "thumbnail": v.thumbnail_url,
+                    "error": v.error,
+                }
+                for v in videos
+            ]
+
+        return summary
+
+    # ======================
+    # 后台调度器
+    # ======================
+
+    def start(self) -> None:
+        """启动后台调度器（在应用启动时调用）"""
+        if self._runner and not self._runner.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+        logger.info(f"[批量视频] 调度器已启动，API Key数: {len(self._keys())}")
+
+    async def stop(self) -> None:
+        """停止后台调度器（在应用关闭时调用）"""
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def notify(self) -> None:
+        """唤醒调度器立即处理新提交的任务"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        """调度主循环：提交排队任务 → 轮询进行中任务 → 汇总活动状态"""
+        while True:
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[批量视频] 调度出错: {e}")
+                import traceback
+                traceback.print_exc()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.CAMPAIGN_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _tick(self) -> None:
+        await asyncio.to_thread(self._recover_stale)
+
+        queued = await asyncio.to_thread(self._load_queued, settings.CAMPAIGN_SUBMIT_BATCH)
+        if queued:
+            await asyncio.gather(*(self._submit(item) for item in queued))
+
+        processing = await asyncio.to_thread(self._load_processing)
+        if processing:
+            await asyncio.gather(*(self._poll(item) for item in processing))
+
+        await asyncio.to_thread(self._refresh_campaigns)
+
+    # ---------- API Key 分配 ----------
+
+    def _keys(self) -> List[str]:
+        if self.key_pool.api_keys:
+            return self.key_pool.api_keys
+        return [self.key_pool.fallback_key or ""]
+
+    def _checkout_key(self, preferred: Optional[str] = None) -> str:
+        """选择当前负载最低的Key（优先使用任务提交时的Key）"""
+        keys = self._keys()
+        key = preferred if preferred in keys else min(keys, key=lambda k: self._key_load.get(k, 0))
+        self._key_load[key] = self._key_load.get(key, 0) + 1
+        if key not in self._key_semaphores:
+            self._key_semaphores[key] = asyncio.Semaphore(max(1, settings.CAMPAIGN_PER_KEY_CONCURRENCY))
+        return key
+
+    def _release_key(self, key: str) -> None:
+        self._key_load[key] = max(0, self._key_load.get(key, 0) - 1)
+
+    # ---------- 任务提交 ----------
+
+    @staticmethod
+    def _load_queued(limit: int) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(Video, VideoCampaign).options(undefer(Video.prompt)).join(
+                VideoCampaign, Video.campaign_id == VideoCampaign.id
+            ).filter(
+                VideoCampaign.status == 'running',
+                Video.status == 'queued'
+            ).order_by(Video.created_at.asc()).limit(limit).all()
+
+            items = []
+            for video, campaign in rows:
+                config = campaign.config or {}
+                product_id = config.get("videoProducts", {}).get(video.id)
+                product = config.get("products", {}).get(product_id, {})
+                items.append({
+                    "videoId": video.id,
+                    "campaignId": campaign.id,
+                    "campaignName": campaign.name,
+                    "userId": video.user_id,
+                    "prompt": video.prompt,
+                    "images": product.get("images", []),
+                    "orientation": video.orientation,
+                    "duration": video.duration,
+                    "credits": campaign.credits_per_video or 0,
+                })
+            return items
+        finally:
+            db.close()
+
+    @staticmethod
+    def _charge(item: Dict[str, Any]) -> bool:
+        """
+        认领排队中的视频并扣除积分，计入活动成本
+
+        每个worker都有自己的调度器：先用带 status='queued' 条件的 UPDATE 认领，
+        认领和扣费在同一事务中提交，同一视频只会被一个worker提交和扣费
+
+        Returns:
+            False 表示已被其他worker认领
+        """
+        db = SessionLocal()
+        try:
+            claimed = db.query(Video).filter(
+                Video.id == item["videoId"],
+                Video.status == 'queued'
+            ).update({
+                Video.status: 'submitting',
+                Video.submitted_at: datetime.utcnow(),
+            }, synchronize_session=False)
+            if not claimed:
+                db.rollback()
+                return False
+
+            if item["credits"]:
+                credit_service.deduct_credits(
+                    user_id=item["userId"],
+                    amount=item["credits"],
+                    action="批量视频生成",
+                    description=f"{item['campaignName']} - 视频 {item['videoId']}",
+                    db=db
+                )
+            db.query(VideoCampaign).filter(VideoCampaign.id == item["campaignId"]).update({
+                VideoCampaign.credits_spent: func.coalesce(VideoCampaign.credits_spent, 0) + item["credits"],
+                VideoCampaign.submitted_tasks: func.coalesce(VideoCampaign.submitted_tasks, 0) + 1,
+            }, synchronize_session=False)
+            db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _finish(item: Dict[str, Any], from_status: str, fields: Dict[str, Any],
+                refund_reason: Optional[str] = None) -> bool:
+        """
+        带状态条件切换视频状态，需要时在同一事务中退还积分
+
+        每个worker都会轮询同一批视频：只有 status 仍为 from_status 的那次 UPDATE 生效，
+        状态切换和退款一起提交，同一视频只退款/转存一次
+
+        Returns:
+            False 表示状态已被其他worker切换
+        """
+        db = SessionLocal()
+        try:
+            updated = db.query(Video).filter(
+                Video.id == item["videoId"],
+                Video.status == from_status
+            ).update(
+                {getattr(Video, name): value for name, value in fields.items()},
+                synchronize_session=False
+            )
+            if not updated:
+                db.rollback()
+                return False
+
+            if refund_reason and item["credits"]:
+                db.query(VideoCampaign).filter(VideoCampaign.id == item["campaignId"]).update({
+                    VideoCampaign.credits_spent: func.coalesce(VideoCampaign.credits_spent, 0) - item["credits"],
+                }, synchronize_session=False)
+                # add_credits 内部提交，状态切换随之一起提交
+                credit_service.add_credits(
+                    user_id=item["userId"],
+                    amount=item["credits"],
+                    action="批量视频退款",
+                    description=f"视频 {item['videoId']} {refund_reason}，退还积分",
+                    db=db
+                )
+            else:
+                db.commit()
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _update_video(video_id: str, **fields) -> None:
+        db = SessionLocal()
+        try:
+            db.query(Video).filter(Video.id == video_id).update(
+                {getattr(Video, name): value for name, value in fields.items()},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _submit(self, item: Dict[str, Any]) -> None:
+        key = self._checkout_key()
+        try:
+            async with self._key_semaphores[key]:
+                try:
+                    if not await asyncio.to_thread(self._charge, item):
+                        return
+                except HTTPException as e:
+                    await asyncio.to_thread(self._update_video, item["videoId"], status='failed', error=str(e.detail))
+                    return
+
+                result = await generate_video_with_ai(
+                    prompt=item["prompt"],
+                    images=item["images"],
+                    orientation=item["orientation"] or "portrait",
+                    duration=item["duration"] or 10,
+                    api_key=key or None
+                )
+
+            task_id = result.get("task_id") or result.get("id")
+            if result.get("error") or not task_id:
+                error = result.get("message") or "未返回任务ID"
+                logger.error(f"[批量视频] 视频 {item['videoId']} 提交失败: {error}")
+                await asyncio.to_thread(
+                    self._finish, item, 'submitting', {"status": 'failed', "error": error}, "提交失败"
+                )
+                return
+
+            self._task_keys[task_id] = key
+            await asyncio.to_thread(
+                self._finish, item, 'submitting', {"status": 'processing', "task_id": task_id, "progress": 5}
+            )
+        finally:
+            self._release_key(key)
+
+    @staticmethod
+    def _recover_stale() -> int:
+        """认领超时仍未提交成功的视频标记为失败并退还积分，返回处理的视频数"""
+        db = SessionLocal()
+        try:
+            rows = db.query(Video, VideoCampaign.credits_per_video).join(
+                VideoCampaign, Video.campaign_id == VideoCampaign.id
+            ).filter(
+                Video.status == 'submitting',
+                Video.submitted_at < datetime.utcnow() - SUBMIT_STALE_AFTER
+            ).all()
+            items = [
+                {
+                    "videoId": video.id,
+                    "campaignId": video.campaign_id,
+                    "userId": video.user_id,
+                    "credits": credits or 0,
+                }
+                for video, credits in rows
+            ]
+        finally:
+            db.close()
+
+        recovered = 0
+        for item in items:
+            # 多个worker同时恢复时只有一个会切换状态并退款
+            if CampaignService._finish(item, 'submitting', {"status": 'failed', "error": '提交中断'}, "提交中断"):
+                logger.warning(f"[批量视频] 视频 {item['videoId']} 提交中断，标记失败")
+                recovered += 1
+        return recovered
+
+    # ---------- 状态轮询 ----------
+
+    @staticmethod
+    def _load_processing() -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            rows = db.query(Video, VideoCampaign.credits_per_video).join(
+                VideoCampaign, Video.campaign_id == VideoCampaign.id
+            ).filter(
+                Video.status == 'processing',
+                Video.task_id.isnot(None)
+            ).all()
+            return [
+                {
+                    "videoId": video.id,
+                    "campaignId": video.campaign_id,
+                    "userId": video.user_id,
+                    "taskId": video.task_id,
+                    "credits": credits or 0,
+                }
+                for video, credits in rows
+            ]
+        finally:
+            db.close()
+
+    async def _poll(self, item: Dict[str, Any]) -> None:
+        key = self._checkout_key(self._task_keys.get(item["taskId"]))
+        try:
+            async with self._key_semaphores[key]:
+                result = await asyncio.to_thread(query_video_task, item["taskId"], key or None)
+        finally:
+            self._release_key(key)
+
+        status = result.get("status")
+        if status == 'completed' and result.get("video_url"):
+            now = datetime.utcnow()
+            finished = await asyncio.to_thread(self._finish, item, 'processing', {
+                "status": 'completed',
+                "progress": 100,
+                "video_url": result["video_url"],
+                "thumbnail_url": result.get("thumbnail_url") or result.get("thumbnail"),
+                "completed_at": now,
+                "url_expires_at": now + UPSTREAM_URL_TTL,
+            })
+            self._task_keys.pop(item["taskId"], None)
+            if finished:
+                video_persist_service.schedule(item["videoId"])
+        elif status == 'failed':
+            error = result.get("fail_reason") or result.get("error") or result.get("message") or "视频生成失败"
+            await asyncio.to_thread(
+                self._finish, item, 'processing', {"status": 'failed', "progress": 0, "error": str(error)}, "生成失败"
+            )
+            self._task_keys.pop(item["taskId"], None)
+        elif result.get("progress"):
+            await asyncio.to_thread(self._finish, item, 'processing', {"progress": int(result["progress"])})
+
+    # ---------- 活动汇总 ----------
+
+    @staticmethod
+    def _refresh_campaigns() -> None:
+        """根据视频状态更新进行中活动的统计，全部结束时标记活动完成"""
+        db = SessionLocal()
+        try:
+            campaigns = db.query(VideoCampaign).filter(VideoCampaign.status == 'running').all()
+            for campaign in campaigns:
+                counts = dict(db.query(Video.status, func.count(Video.id)).filter(
+                    Video.campaign_id == campaign.id
+                ).group_by(Video.status).all())
+
+                campaign.completed_tasks = counts.get('completed', 0)
+                campaign.failed_tasks = counts.get('failed', 0)
+
+                if not any(counts.get(s, 0) for s in PENDING_STATUSES):
+                    if campaign.failed_tasks == 0:
+                        campaign.status = 'completed'
+                    elif campaign.completed_tasks == 0:
+                        campaign.status = 'failed'
+                    else:
+                        campaign.status = 'partial'
+                    campaign.completed_at = datetime.utcnow()
+                    logger.info(f"[批量视频] 活动 {campaign.id} 结束: {campaign.status} "
+                          f"(成功 {campaign.completed_tasks}, 失败 {campaign.failed_tasks}, "
+                          f"消耗 {campaign.credits_spent} 积分)")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+# 创建全局批量视频活动服务实例
+campaign_service = CampaignService()
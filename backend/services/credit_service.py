@@ -9,6 +9,10 @@ from fastapi import HTTPException
 
 from config import settings
 from database import User, CreditHistory
+from services.auth_service import auth_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 class CreditService:
@@ -83,8 +87,9 @@ class CreditService:
         )
         db.add(credit_history)
         db.commit()
+        auth_service.invalidate(user_id)
         
-        print(f"[Credit] 用户 {user_id} 扣除 {amount} 积分: {old_credits} -> {user.credits}")
+        logger.info(f"[Credit] 用户 {user_id} 扣除 {amount} 积分: {old_credits} -> {user.credits}")
         
         return {
             "success": True,
@@ -136,8 +141,9 @@ class CreditService:
         )
         db.add(credit_history)
         db.commit()
+        auth_service.invalidate(user_id)
         
-        print(f"[Credit] 用户 {user_id} 增加 {amount} 积分: {old_credits} -> {user.credits}")
+        logger.info(f"[Credit] 用户 {user_id} 增加 {amount} 积分: {old_credits} -> {user.credits}")
         
         return {
             "success": True,
@@ -0,0 +1,186 @@
+"""
+图片衍生图服务
+为上传的商品图和拼接后的宫格图生成固定宽度的 WebP（以及可用时的 AVIF）版本，
+与原图存放在同一目录：{原图key}@{宽度}w.{格式}
+
+缩放和编码在进程池中执行；相同内容（SHA-256）的图片只生成一次
+"""
+
+import io
+import asyncio
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Dict
+
+from PIL import Image, ImageOps
+
+from config import settings
+from services.tos_service import tos_service
+from utils.helpers import build_derivative_key
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# AVIF 需要可选的 pillow-avif-plugin，未安装时只生成 WebP
+try:
+    import pillow_avif  # noqa: F401
+    AVIF_AVAILABLE = True
+except ImportError:
+    AVIF_AVAILABLE = False
+
+
+CONTENT_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+# 内容哈希 → 衍生图URL 的缓存条数上限
+DEDUP_CACHE_SIZE = 2048
+
+
+def render_derivatives(content: bytes, widths: List[int], formats: List[str], quality: int = 75) -> Dict[str, Dict[int, bytes]]:
+    """
+    生成各宽度、各格式的衍生图（模块级函数，可在进程池中执行）
+
+    比原图宽的尺寸不会放大，而是按原图宽度输出，保证每个宽度的key都存在
+
+    Args:
+        content: 原图字节
+        widths: 目标宽度列表
+        formats: 输出格式列表（webp / avif）
+        quality: 编码质量
+
+    Returns:
+        {格式: {宽度: 字节}}
+    """
+    with Image.open(io.BytesIO(content)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    results: Dict[str, Dict[int, bytes]] = {fmt: {} for fmt in formats}
+    for width in sorted(set(widths)):
+        if width >= image.width:
+            resized = image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        for fmt in formats:
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=quality)
+            results[fmt][width] = buffer.getvalue()
+
+    return results
+
+
+class ImageDerivativeService:
+    """图片衍生图服务类"""
+
+    def __init__(self):
+        """进程池在第一次使用时创建"""
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._done: "OrderedDict[str, Dict[str, Dict[int, str]]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.IMAGE_DERIVATIVES_ENABLED and tos_service is not None
+
+    @property
+    def widths(self) -> List[int]:
+        return [int(w) for w in settings.IMAGE_DERIVATIVE_WIDTHS.split(",") if w.strip()]
+
+    @property
+    def formats(self) -> List[str]:
+        return ["webp", "avif"] if AVIF_AVAILABLE else ["webp"]
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=max(1, settings.IMAGE_DERIVATIVE_WORKERS))
+            logger.info(f"[衍生图] 进程池已启动: {settings.IMAGE_DERIVATIVE_WORKERS} 个进程, 格式: {', '.join(self.formats)}")
+        return self._executor
+
+    def shutdown(self) -> None:
+        """关闭进程池（在应用关闭时调用）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _remember(self, digest: str, variants: Dict[str, Dict[int, str]]) -> None:
+        self._done[digest] = variants
+        self._done.move_to_end(digest)
+        while len(self._done) > DEDUP_CACHE_SIZE:
+            self._done.popitem(last=False)
+
+    async def _render_and_upload(self, key: str, content: bytes) -> Dict[str, Dict[int, str]]:
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(
+            self._get_executor(),
+            render_derivatives,
+            content,
+            self.widths,
+            self.formats,
+            settings.IMAGE_DERIVATIVE_QUALITY
+        )
+
+        uploads = [
+            asyncio.to_thread(
+                tos_service.upload_file,
+                build_derivative_key(key, width, fmt),
+                data,
+                CONTENT_TYPES[fmt]
+            )
+            for fmt, by_width in rendered.items()
+            for width, data in by_width.items()
+        ]
+        urls = iter(await asyncio.gather(*uploads))
+
+        return {
+            fmt: {width: next(urls) for width in by_width}
+            for fmt, by_width in rendered.items()
+        }
+
+    async def generate(self, key: str, content: bytes, digest: Optional[str] = None) -> Dict[str, Dict[int, str]]:
+        """
+        为已上传的图片生成衍生图
+
+        Args:
+            key: 原图对象键
+            content: 原图字节
+            digest: 内容的SHA-256（已计算过时传入）
+
+        Returns:
+            {格式: {宽度: URL}}；未启用或生成失败时返回空字典
+        """
+        if not self.enabled:
+            return {}
+
+        digest = digest or hashlib.sha256(content).hexdigest()
+
+        # 相同内容已经生成过（或正在生成）时直接复用
+        if digest in self._done:
+            self._done.move_to_end(digest)
+            logger.info(f"[衍生图] 内容重复，复用已有衍生图: {digest[:12]}")
+            return self._done[digest]
+        if digest in self._pending:
+            return await asyncio.shield(self._pending[digest])
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[digest] = future
+        variants: Dict[str, Dict[int, str]] = {}
+        try:
+            variants = await self._render_and_upload(key, content)
+            self._remember(digest, variants)
+            logger.info(f"[衍生图] ✅ {key}: {sum(len(v) for v in variants.values())} 个衍生图")
+        except Exception as e:
+            logger.error(f"[衍生图] ❌ {key} 生成失败: {getattr(e, 'detail', None) or e}")
+        finally:
+            self._pending.pop(digest, None)
+            future.set_result(variants)
+
+        return variants
+
+
+# 创建全局衍生图服务实例
+image_derivative_service = ImageDerivativeService()
@@ -0,0 +1,434 @@
+"""
+邮件发送服务
+- 请求只把邮件放入队列（memory 进程内队列，或 database 的 mail_outbox 表，多worker共享且重启不丢）
+- 后台worker按批取出邮件交给发送端，失败按指数退避重试
+- 发送端（MAIL_SINK）：smtp（复用一条已登录的连接，空闲超时或出错时重建）、file（追加JSON行，测试用）、stdout
+"""
+
+import re
+import json
+import time
+import uuid
+import asyncio
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Optional, List, Dict, Any
+
+from config import settings
+from database import SessionLocal, MailOutbox
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 发送中的数据库记录超过该时间仍未完成（worker崩溃）时重新发送（秒）
+STALE_LOCK_SECONDS = 300
+
+# 控制台输出时打码的数字串（验证码）
+DIGITS_PATTERN = re.compile(r"\d{4,}")
+
+
+# ======================
+# 发送端
+# ======================
+
+class SmtpSink:
+    """SMTP发送端：复用一条已登录的连接（只在发送线程中使用）"""
+
+    name = "smtp"
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    @staticmethod
+    def build_message(mail: Dict[str, Any]) -> MIMEMultipart:
+        """构建HTML邮件"""
+        message = MIMEMultipart()
+        message['From'] = f"{settings.SENDER_NAME} <{settings.SENDER_EMAIL}>"
+        message['To'] = mail["to"]
+        message['Subject'] = mail["subject"]
+        message.attach(MIMEText(mail["html"], 'html', 'utf-8'))
+        return message
+
+    def _connect(self) -> smtplib.SMTP:
+        if settings.SMTP_PORT == 465:
+            server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+            server.starttls()
+        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        logger.info(f"[邮件] SMTP连接已建立: {settings.SMTP_HOST}:{settings.SMTP_PORT}")
+        return server
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def _get_server(self) -> smtplib.SMTP:
+        # 服务器通常会断开空闲连接，超过空闲时间直接重建，省去一次失败的发送
+        if self._server is not None and time.monotonic() - self._last_used > settings.SMTP_IDLE_SECONDS:
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        return self._server
+
+    def _send_one(self, message: MIMEMultipart) -> None:
+        # 连接被服务器断开时重连并重试一次
+        for attempt in range(2):
+            try:
+                self._get_server().send_message(message)
+                self._last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.close()
+                if attempt:
+                    raise
+
+    def send_batch(self, mails: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """通过同一条连接依次发送，返回每封邮件的错误信息（成功为None）"""
+        errors: List[Optional[str]] = []
+        for mail in mails:
+            try:
+                self._send_one(self.build_message(mail))
+                errors.append(None)
+            except OSError as e:  # SMTPException 也是 OSError 的子类
+                # 连接状态未知，下一封重新建立连接
+                self.close()
+                errors.append(str(e) or e.__class__.__name__)
+        return errors
+
+
+class FileSink:
+    """文件发送端：每封邮件追加一行JSON（测试和本地开发用）"""
+
+    name = "file"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.MAIL_FILE_PATH
+
+    def send_batch(self, mails: List[Dict[str, Any]]) -> List[Optional[str]]:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for mail in mails:
+                record = {key: mail[key] for key in ("id", "to", "subject", "html")}
+                record["sentAt"] = int(time.time() * 1000)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return [None] * len(mails)
+
+    def close(self) -> None:
+        pass
+
+
+def redact_digits(text: str) -> str:
+    """把4位及以上的连续数字（验证码等）替换为 ******"""
+    return DIGITS_PATTERN.sub("******", text)
+
+
+class StdoutSink:
+    """控制台发送端：未配置SMTP时使用（正文中的验证码等数字串打码后输出，避免进入日志）"""
+
+    name = "stdout"
+
+    def send_batch(self, mails: List[Dict[str, Any]]) -> List[Optional[str]]:
+        for mail in mails:
+            print(f"[邮件] (stdout) {mail['to']} - {mail['subject']}")
+            print(redact_digits(mail["html"]))
+        return [None] * len(mails)
+
+    def close(self) -> None:
+        pass
+
+
+def create_sink(name: str):
+    """根据 MAIL_SINK 创建发送端；auto 时已配置SMTP用 smtp，否则用 stdout"""
+    name = (name or "auto").lower()
+    if name == "auto":
+        name = "smtp" if settings.SMTP_USER and settings.SMTP_PASSWORD else "stdout"
+    if name == "smtp":
+        return SmtpSink()
+    if name == "file":
+        return FileSink()
+    return StdoutSink()
+
+
+# ======================
+# 队列
+# ======================
+
+class MemoryMailQueue:
+    """进程内队列（重启会丢失未发送的邮件）"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        # 在事件循环中第一次使用时创建
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def size(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def put(self, mail: Dict[str, Any]) -> None:
+        self.queue.put_nowait(mail)
+
+    async def get_batch(self, limit: int, timeout: float) -> List[Dict[str, Any]]:
+        if not self.queue.empty():
+            batch = [self.queue.get_nowait()]
+        elif timeout <= 0:
+            return []
+        else:
+            try:
+                batch = [await asyncio.wait_for(self.queue.get(), timeout)]
+            except asyncio.TimeoutError:
+                return []
+
+        while len(batch) < limit and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def ack(self, mail: Dict[str, Any]) -> None:
+        pass
+
+    async def retry(self, mail: Dict[str, Any], delay: float, error: str) -> None:
+        asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, mail)
+
+    async def fail(self, mail: Dict[str, Any], error: str) -> None:
+        pass
+
+
+class DatabaseMailQueue:
+    """数据库队列（mail_outbox 表）：多个worker用 SKIP LOCKED 各取不同的邮件"""
+
+    def __init__(self):
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def wakeup(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def size(self) -> int:
+        db = SessionLocal()
+        try:
+            return db.query(MailOutbox).filter(MailOutbox.status.in_(["pending", "sending"])).count()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _insert(mail: Dict[str, Any]) -> None:
+        db = SessionLocal()
+        try:
+            db.add(MailOutbox(
+                id=mail["id"],
+                to_email=mail["to"],
+                subject=mail["subject"],
+                html=mail["html"],
+                status="pending",
+                attempts=0,
+                next_attempt_at=datetime.utcnow()
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def _claim(limit: int) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            rows = db.query(MailOutbox).filter(
+                ((MailOutbox.status == "pending") & (MailOutbox.next_attempt_at <= now)) |
+                ((MailOutbox.status == "sending") & (MailOutbox.locked_at < now - timedelta(seconds=STALE_LOCK_SECONDS)))
+            ).order_by(MailOutbox.next_attempt_at).limit(limit).with_for_update(skip_locked=True).all()
+
+            mails = []
+            for row in rows:
+                row.status = "sending"
+                row.locked_at = now
+                mails.append({
+                    "id": row.id,
+                    "to": row.to_email,
+                    "subject": row.subject,
+                    "html": row.html,
+                    "attempts": row.attempts or 0,
+                })
+            db.commit()
+            return mails
+        finally:
+            db.close()
+
+    @staticmethod
+    def _update(mail_id: str, values: Dict[str, Any]) -> None:
+        db = SessionLocal()
+        try:
+            db.query(MailOutbox).filter(MailOutbox.id == mail_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def put(self, mail: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._insert, mail)
+        self.wakeup.set()
+
+    async def get_batch(self, limit: int, timeout: float) -> List[Dict[str, Any]]:
+        batch = await asyncio.to_thread(self._claim, limit)
+        if batch or timeout <= 0:
+            return batch
+        # 没有待发邮件：等到本进程有新邮件入队或轮询间隔到期（其他worker入队的邮件靠轮询发现）
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.wakeup.clear()
+        return []
+
+    async def ack(self, mail: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._update, mail["id"], {
+            MailOutbox.status: "sent",
+            MailOutbox.attempts: mail["attempts"] + 1,
+            MailOutbox.sent_at: datetime.utcnow(),
+            # 正文含验证码，发送后不再保留
+            MailOutbox.html: "",
+        })
+
+    async def retry(self, mail: Dict[str, Any], delay: float, error: str) -> None:
+        await asyncio.to_thread(self._update, mail["id"], {
+            MailOutbox.status: "pending",
+            MailOutbox.attempts: mail["attempts"],
+            MailOutbox.next_attempt_at: datetime.utcnow() + timedelta(seconds=delay),
+            MailOutbox.last_error: error[:500],
+        })
+
+    async def fail(self, mail: Dict[str, Any], error: str) -> None:
+        await asyncio.to_thread(self._update, mail["id"], {
+            MailOutbox.status: "failed",
+            MailOutbox.attempts: mail["attempts"],
+            MailOutbox.last_error: error[:500],
+            MailOutbox.html: "",
+        })
+
+
+QUEUES = {
+    "memory": MemoryMailQueue,
+    "database": DatabaseMailQueue,
+}
+
+
+# ======================
+# 邮件服务
+# ======================
+
+class MailService:
+    """邮件发送服务类"""
+
+    def __init__(self, queue=None, sink=None):
+        """队列和发送端默认按配置创建（测试时可传入）"""
+        self.queue = queue or QUEUES.get(settings.MAIL_QUEUE_BACKEND.lower(), MemoryMailQueue)()
+        self.sink = sink or create_sink(settings.MAIL_SINK)
+        # 单线程：发送端（SMTP连接）只在这个线程中使用
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mail")
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.failed = 0
+
+    async def enqueue(self, to: str, subject: str, html: str) -> str:
+        """
+        邮件入队后立即返回，由后台worker发送
+
+        Returns:
+            邮件ID
+        """
+        mail = {"id": str(uuid.uuid4()), "to": to, "subject": subject, "html": html, "attempts": 0}
+        await self.queue.put(mail)
+        return mail["id"]
+
+    # ---------- 后台worker ----------
+
+    def start(self) -> None:
+        """启动发送worker（在应用启动时调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"[邮件] 发送worker已启动: 队列={settings.MAIL_QUEUE_BACKEND}, 发送端={self.sink.name}")
+
+    async def stop(self) -> None:
+        """停止worker；进程内队列中剩余的邮件在超时前尽量发完"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if isinstance(self.queue, MemoryMailQueue) and self.queue.size():
+            try:
+                await asyncio.wait_for(self.flush(), settings.MAIL_SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"[邮件] ⚠️ 关闭时仍有 {self.queue.size()} 封邮件未发送")
+
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.sink.close)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.process_batch(settings.MAIL_POLL_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[邮件] ❌ worker异常: {e}")
+                await asyncio.sleep(settings.MAIL_POLL_INTERVAL)
+
+    async def process_batch(self, timeout: float = 0) -> int:
+        """
+        取出一批邮件并发送
+
+        Args:
+            timeout: 队列为空时最多等待的秒数
+
+        Returns:
+            本批处理的邮件数
+        """
+        batch = await self.queue.get_batch(max(1, settings.MAIL_BATCH_SIZE), timeout)
+        if not batch:
+            return 0
+
+        errors = await asyncio.get_running_loop().run_in_executor(self._executor, self.sink.send_batch, batch)
+        for mail, error in zip(batch, errors):
+            if error is None:
+                self.sent += 1
+                await self.queue.ack(mail)
+                continue
+
+            mail["attempts"] += 1
+            if mail["attempts"] >= settings.MAIL_MAX_RETRIES:
+                self.failed += 1
+                logger.error(f"[邮件] ❌ 发送失败（已尝试{mail['attempts']}次）{mail['to']}: {error}")
+                await self.queue.fail(mail, error)
+            else:
+                delay = settings.MAIL_RETRY_BASE_SECONDS * (2 ** (mail["attempts"] - 1))
+                logger.warning(f"[邮件] ⚠️ 发送失败，{delay}秒后重试 {mail['to']}: {error}")
+                await self.queue.retry(mail, delay, error)
+
+        logger.info(f"[邮件] 本批 {len(batch)} 封，成功 {errors.count(None)} 封")
+        return len(batch)
+
+    async def flush(self) -> None:
+        """发送队列中当前可发送的全部邮件（关闭和测试时使用）"""
+        while await self.process_batch():
+            pass
+
+
+# 创建全局邮件发送服务实例
+mail_service = MailService()
@@ -0,0 +1,346 @@
+"""
+充值订单服务
+- 下单时写入 orders 表（order_no 唯一）
+- 支付成功通知按订单号做一次原子 upsert：只有尚未到账的订单会被更新并返回，
+  同一事务内给用户加积分，微信重复通知或并发通知不会重复到账
+- 后台对账：未收到回调的订单按指数退避主动查询，支付成功则到账，超时未支付则关闭；
+  前端轮询只读本地订单状态
+"""
+
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal, Order, User, CreditHistory
+from services.auth_service import auth_service
+from wechat_pay import query_order, close_order
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 充值套餐配置（按照 1元=100积分 的规则）
+PACKAGES = {
+    'small': {'amount': 10, 'credits': 1000, 'name': '尝鲜包'},  # 10元 = 1000积分
+    'medium': {'amount': 49, 'credits': 4900, 'name': '标准包'},  # 49元 = 4900积分
+    'large': {'amount': 99, 'credits': 9900, 'name': '旗舰包'},  # 99元 = 9900积分
+    'super': {'amount': 499, 'credits': 49900, 'name': '企业包'},  # 499元 = 49900积分
+}
+
+# 金额（分）→ (套餐ID, 套餐)，回调中按支付金额查找套餐
+PACKAGES_BY_AMOUNT_FEN = {
+    int(package['amount'] * 100): (package_id, package)
+    for package_id, package in PACKAGES.items()
+}
+
+
+# 微信交易状态 → 本地订单的终态（SUCCESS 单独处理）
+CLOSED_TRADE_STATES = {"CLOSED", "REVOKED", "PAYERROR"}
+
+
+class OrderService:
+    """充值订单服务类"""
+
+    def __init__(self):
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def create_order(order_no: str, user_id: str, package_id: str, db: Session) -> Order:
+        """
+        记录新订单（状态 created）
+
+        Args:
+            order_no: 商户订单号
+            user_id: 用户ID
+            package_id: 套餐ID
+            db: 数据库会话
+        """
+        package = PACKAGES[package_id]
+        order = Order(
+            id=str(uuid.uuid4()),
+            order_no=order_no,
+            user_id=user_id,
+            package_id=package_id,
+            amount_fen=int(package['amount'] * 100),
+            credits=package['credits'],
+            status="created",
+            check_count=0,
+            next_check_at=datetime.utcnow() + timedelta(seconds=settings.ORDER_RECONCILE_BACKOFF_BASE)
+        )
+        db.add(order)
+        db.commit()
+        return order
+
+    @staticmethod
+    def credit_paid_order(
+        order_no: str,
+        transaction_id: Optional[str],
+        total_fee: int,
+        user_id: Optional[str],
+        db: Session
+    ) -> Optional[Dict[str, Any]]:
+        """
+        处理支付成功：订单置为已到账并给用户加积分（同一事务）
+
+        订单不存在时（上线前创建的订单）按支付金额和附加数据中的 user_id 补建；
+        订单金额与支付金额不一致时不处理
+
+        Args:
+            order_no: 商户订单号
+            transaction_id: 微信支付订单号
+            total_fee: 实际支付金额（分）
+            user_id: 附加数据中的用户ID（仅补建订单时使用）
+            db: 数据库会话
+
+        Returns:
+            本次到账信息；已经到账过、金额不符或无法识别套餐时返回None
+        """
+        package_id, package = PACKAGES_BY_AMOUNT_FEN.get(total_fee, (None, None))
+        if package is None and not db.query(Order.id).filter(Order.order_no == order_no).first():
+            logger.warning(f"[订单] ⚠️ 未知订单且金额不匹配任何套餐: {order_no}, {total_fee}分")
+            return None
+
+        now = datetime.utcnow()
+        stmt = pg_insert(Order).values(
+            id=str(uuid.uuid4()),
+            order_no=order_no,
+            user_id=user_id or "",
+            package_id=package_id,
+            amount_fen=total_fee,
+            credits=package['credits'] if package else 0,
+            status="credited",
+            transaction_id=transaction_id,
+            created_at=now,
+            updated_at=now,
+            paid_at=now,
+            credited_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Order.order_no],
+            set_={
+                "status": "credited",
+                "transaction_id": transaction_id,
+                "paid_at": func.coalesce(Order.paid_at, now),
+                "credited_at": now,
+                "updated_at": now,
+            },
+            where=(Order.status != "credited") & (Order.amount_fen == total_fee)
+        ).returning(Order.user_id, Order.credits)
+
+        try:
+            row = db.execute(stmt).first()
+            if row is None:
+                db.rollback()
+                logger.info(f"[订单] 订单已到账或金额不符，跳过: {order_no}")
+                return None
+
+            order_user_id, credits = row
+            balance = db.execute(
+                update(User)
+                .where(User.id == order_user_id)
+                .values(credits=User.credits + credits)
+                .returning(User.credits)
+            ).scalar()
+
+            if balance is None:
+                # 用户不存在：保留为已支付，等待人工处理
+                db.execute(
+                    update(Order).where(Order.order_no == order_no).values(status="paid", credited_at=None)
+                )
+                db.commit()
+                logger.warning(f"[订单] ⚠️ 用户不存在，订单保持已支付状态: {order_no}, 用户: {order_user_id}")
+                return None
+
+            db.add(CreditHistory(
+                id=str(uuid.uuid4()),
+                user_id=order_user_id,
+                action='recharge',
+                amount=credits,
+                balance_after=balance,
+                description=f"微信支付充值￥{total_fee / 100:g}",
+                related_id=order_no
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        auth_service.invalidate(order_user_id)
+        logger.info(f"[订单] ✅ 积分到账: {order_no}, 用户: {order_user_id}, +{credits} -> {balance}")
+        return {"userId": order_user_id, "credits": credits, "balance": balance}
+
+    @staticmethod
+    def get_order(order_no: str, db: Session) -> Optional[Order]:
+        """按订单号查询订单"""
+        return db.query(Order).filter(Order.order_no == order_no).first()
+
+    @staticmethod
+    def to_status(order: Order) -> Dict[str, Any]:
+        """订单状态响应（兼容原先透传的微信交易状态）"""
+        trade_state = {
+            "paid": "SUCCESS",
+            "credited": "SUCCESS",
+            "closed": "CLOSED",
+        }.get(order.status, "NOTPAY")
+        return {
+            "success": True,
+            "order_no": order.order_no,
+            "status": trade_state,
+            "paid": order.status in ("paid", "credited"),
+            "credited": order.status == "credited",
+            "credits": order.credits,
+        }
+
+    # ======================
+    # 后台对账
+    # ======================
+
+    def start(self) -> None:
+        """启动后台对账（在应用启动时调用）"""
+        if not settings.ORDER_RECONCILE_ENABLED:
+            return
+        if self._runner and not self._runner.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+        logger.info(f"[订单对账] 已启动，间隔 {settings.ORDER_RECONCILE_INTERVAL} 秒")
+
+    async def stop(self) -> None:
+        """停止后台对账（在应用关闭时调用）"""
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def notify(self) -> None:
+        """唤醒对账立即处理到期订单"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[订单对账] 出错: {e}")
+                import traceback
+                traceback.print_exc()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.ORDER_RECONCILE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def reconcile_once(self) -> int:
+        """
+        查询一批到期的未支付订单
+
+        Returns:
+            本轮查询的订单数
+        """
+        due = await asyncio.to_thread(self._load_due, settings.ORDER_RECONCILE_BATCH)
+        if not due:
+            return 0
+
+        semaphore = asyncio.Semaphore(max(1, settings.ORDER_RECONCILE_CONCURRENCY))
+
+        async def check(item: Dict[str, Any]) -> None:
+            async with semaphore:
+                await self._check(item)
+
+        await asyncio.gather(*(check(item) for item in due))
+        logger.info(f"[订单对账] 本轮查询 {len(due)} 个订单")
+        return len(due)
+
+    @staticmethod
+    def _load_due(limit: int) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            orders = db.query(Order).filter(
+                Order.status == "created",
+                Order.next_check_at <= datetime.utcnow()
+            ).order_by(Order.next_check_at).limit(limit).all()
+            return [
+                {
+                    "orderNo": o.order_no,
+                    "checkCount": o.check_count or 0,
+                    "createdAt": o.created_at,
+                }
+                for o in orders
+            ]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _update_order(order_no: str, **fields) -> None:
+        db = SessionLocal()
+        try:
+            db.query(Order).filter(
+                Order.order_no == order_no,
+                Order.status == "created"
+            ).update(fields, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _backoff(self, order_no: str, check_count: int) -> None:
+        delay = min(
+            settings.ORDER_RECONCILE_BACKOFF_BASE * (2 ** check_count),
+            settings.ORDER_RECONCILE_BACKOFF_MAX
+        )
+        self._update_order(
+            order_no,
+            check_count=check_count + 1,
+            next_check_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+
+    def _credit(self, order_no: str, result: Dict[str, Any]) -> None:
+        db = SessionLocal()
+        try:
+            self.credit_paid_order(order_no, result.get("transaction_id"), result.get("total_fee", 0), None, db)
+        finally:
+            db.close()
+
+    async def _check(self, item: Dict[str, Any]) -> None:
+        order_no = item["orderNo"]
+        expired = item["createdAt"] and item["createdAt"] < datetime.utcnow() - timedelta(minutes=settings.ORDER_EXPIRE_MINUTES)
+
+        result = await asyncio.to_thread(query_order, order_no)
+        if not result["success"]:
+            logger.error(f"[订单对账] 查询失败 {order_no}: {result.get('error')}")
+            await asyncio.to_thread(self._backoff, order_no, item["checkCount"])
+            return
+
+        trade_state = result["trade_state"]
+        if trade_state == "SUCCESS":
+            logger.info(f"[订单对账] 发现已支付但未到账的订单: {order_no}")
+            await asyncio.to_thread(self._credit, order_no, result)
+        elif trade_state in CLOSED_TRADE_STATES:
+            await asyncio.to_thread(self._update_order, order_no, status="closed", next_check_at=None)
+        elif expired:
+            # 超时未支付：先在微信侧关闭，避免关闭后用户仍能扫码支付
+            closed = await asyncio.to_thread(close_order, order_no)
+            if closed["success"]:
+                await asyncio.to_thread(self._update_order, order_no, status="closed", next_check_at=None)
+                logger.info(f"[订单对账] 超时未支付，已关闭: {order_no}")
+            else:
+                await asyncio.to_thread(self._backoff, order_no, item["checkCount"])
+        else:
+            await asyncio.to_thread(self._backoff, order_no, item["checkCount"])
+
+
+# 创建全局订单服务实例
+order_service = OrderService()
@@ -0,0 +1,322 @@
+"""
+按月分区维护服务（credit_history / videos）
+- 两张表由 alembic 迁移 0002 改为按 created_at 的月度范围分区，热点查询只扫描最近几个分区，
+  每个分区的索引大小和 VACUUM 开销不随总数据量增长
+- 后台定期提前创建未来月份的分区（未建分区的数据会落到 DEFAULT 分区）
+- 可选归档：超过保留月数的分区先 DETACH，再导出为 gzip 压缩的 CSV 以私有权限上传TOS，上传成功后删除
+- 多个 worker 通过事务级 advisory lock 保证同一时刻只有一个在建分区（兼容 PgBouncer 事务模式）；
+  同一分区只有一个 worker 能 DETACH 成功，归档不会重复；非 PostgreSQL 或未分区时不做任何事
+"""
+
+import asyncio
+import gzip
+import os
+import tempfile
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from sqlalchemy import text
+
+from config import settings
+from database import engine
+from services.tos_service import tos_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 按月分区的表
+PARTITIONED_TABLES = ("credit_history", "videos")
+
+# pg_try_advisory_xact_lock 的键（任意固定值，避免多个 worker 同时建分区）
+ADVISORY_LOCK_KEY = 20261019
+
+
+def month_start(value: datetime) -> datetime:
+    """所在月份的第一天 00:00"""
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """月初日期加减若干个月"""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    """分区表名，如 videos_p2026_10"""
+    return f"{table}_p{month:%Y_%m}"
+
+
+def partition_bound(lower: datetime) -> str:
+    """月度分区的范围子句"""
+    return f"FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{add_months(lower, 1):%Y-%m-%d}')"
+
+
+def parse_archive_months(value: str) -> Dict[str, int]:
+    """解析 PARTITION_ARCHIVE_AFTER_MONTHS（表=保留月数，逗号分隔）"""
+    result = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        table, months = item.split("=", 1)
+        table = table.strip()
+        if table in PARTITIONED_TABLES and months.strip().isdigit():
+            result[table] = int(months.strip())
+    return result
+
+
+class PartitionService:
+    """按月分区维护服务类"""
+
+    def __init__(self):
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    # ======================
+    # 查询
+    # ======================
+
+    @staticmethod
+    def _partitioned_tables(conn) -> List[str]:
+        rows = conn.execute(text(
+            "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = ANY(:tables)"
+        ), {"tables": list(PARTITIONED_TABLES)})
+        return sorted(row[0] for row in rows)
+
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """
+        列出各分区的范围、行数估计和大小（含索引）
+
+        Returns:
+            分区信息列表，按表名和分区名排序
+        """
+        if engine.dialect.name != "postgresql":
+            return []
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT parent.relname AS table_name, child.relname AS partition_name, "
+                "       pg_get_expr(child.relpartbound, child.oid) AS bound, "
+                "       child.reltuples::bigint AS row_estimate, "
+                "       pg_total_relation_size(child.oid) AS size_bytes, "
+                "       pg_indexes_size(child.oid) AS index_bytes "
+                "FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = ANY(:tables) "
+                "ORDER BY parent.relname, child.relname"
+            ), {"tables": list(PARTITIONED_TABLES)}).mappings().all()
+        return [
+            {
+                "table": row["table_name"],
+                "partition": row["partition_name"],
+                "bound": row["bound"],
+                "rows": max(row["row_estimate"], 0),
+                "sizeBytes": row["size_bytes"],
+                "indexBytes": row["index_bytes"],
+            }
+            for row in rows
+        ]
+
+    # ======================
+    # 维护
+    # ======================
+
+    @staticmethod
+    def _existing_partitions(conn, table: str) -> List[str]:
+        rows = conn.execute(text(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = :table"
+        ), {"table": table})
+        return [row[0] for row in rows]
+
+    def ensure_partitions(self, conn, table: str, now: Optional[datetime] = None) -> List[str]:
+        """
+        创建当前月份到未来 PARTITION_PREMAKE_MONTHS 个月中缺少的分区
+
+        Returns:
+            新建的分区名列表
+        """
+        existing = set(self._existing_partitions(conn, table))
+        month = month_start(now or datetime.utcnow())
+        created = []
+        for offset in range(max(0, settings.PARTITION_PREMAKE_MONTHS) + 1):
+            lower = add_months(month, offset)
+            name = partition_name(table, lower)
+            if name in existing:
+                continue
+            # DEFAULT 分区中已有该月数据时无法直接建分区，需要人工把数据移出 DEFAULT 分区
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {partition_bound(lower)}"))
+            created.append(name)
+        return created
+
+    def cold_partitions(self, conn, table: str, keep_months: int, now: Optional[datetime] = None) -> List[str]:
+        """上界早于保留期起点的月度分区（不含 DEFAULT 分区），按时间升序"""
+        cutoff = add_months(month_start(now or datetime.utcnow()), -keep_months)
+        prefix = f"{table}_p"
+        cold = []
+        for name in self._existing_partitions(conn, table):
+            if not name.startswith(prefix):
+                continue
+            try:
+                lower = datetime.strptime(name[len(prefix):], "%Y_%m")
+            except ValueError:
+                continue
+            if add_months(lower, 1) <= cutoff:
+                cold.append(name)
+        return sorted(cold)
+
+    @staticmethod
+    def _export_partition(name: str, path: str) -> int:
+        """把分区导出为 gzip 压缩的 CSV（带表头），返回压缩后字节数"""
+        raw = engine.raw_connection()
+        try:
+            with gzip.open(path, "wb") as output:
+                cursor = raw.cursor()
+                cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER true)", output)
+                cursor.close()
+            raw.commit()
+        finally:
+            raw.close()
+        return os.path.getsize(path)
+
+    @staticmethod
+    def archive_key(table: str, name: str) -> str:
+        """归档对象键：<PARTITION_ARCHIVE_PREFIX>/<表>/<分区>.csv.gz"""
+        prefix = settings.PARTITION_ARCHIVE_PREFIX.strip("/")
+        return f"{prefix}/{table}/{name}.csv.gz" if prefix else f"{table}/{name}.csv.gz"
+
+    def archive_partition(self, table: str, name: str) -> Dict[str, Any]:
+        """
+        归档一个冷分区：先 DETACH（之后的更新不会再落到该分区），从分离出的表导出并以私有权限
+        上传到 PARTITION_ARCHIVE_BUCKET，上传成功后才删除；导出或上传失败时重新挂回分区
+
+        Returns:
+            {"partition", "bucket", "key", "sizeBytes"}
+        """
+        if tos_service is None:
+            raise RuntimeError("TOS 未配置，无法归档分区")
+
+        lower = datetime.strptime(name[len(table) + 2:], "%Y_%m")
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+
+        fd, path = tempfile.mkstemp(suffix=".csv.gz")
+        os.close(fd)
+        try:
+            size = self._export_partition(name, path)
+
+            def chunks():
+                with open(path, "rb") as f:
+                    while True:
+                        chunk = f.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        yield chunk
+
+            bucket = settings.PARTITION_ARCHIVE_BUCKET or tos_service.bucket
+            key = self.archive_key(table, name)
+            tos_service.upload_stream(key, chunks(), "application/gzip", bucket=bucket, private=True)
+        except Exception:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {partition_bound(lower)}"))
+            except Exception as e:
+                logger.error(f"[分区维护] ⚠️ {name} 归档失败且无法重新挂载，已保留为独立的表，请人工处理: {e}")
+            raise
+        finally:
+            os.remove(path)
+
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {name}"))
+
+        logger.info(f"[分区维护] 已归档 {name} → {bucket}/{key}（{size} 字节）")
+        return {"partition": name, "bucket": bucket, "key": key, "sizeBytes": size}
+
+    def maintain_once(self) -> Dict[str, Any]:
+        """
+        执行一轮维护：补建分区，开启归档时导出并删除冷分区
+
+        Returns:
+            {"created": [...], "archived": [...]}；其他 worker 正在维护时返回 {"skipped": True}
+        """
+        result = {"created": [], "archived": []}
+        if engine.dialect.name != "postgresql":
+            return result
+
+        # 事务级锁随事务结束自动释放，PgBouncer 事务模式下也不会残留在服务端连接上
+        cold = []
+        with engine.begin() as conn:
+            if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar():
+                return {"skipped": True}
+            tables = self._partitioned_tables(conn)
+            for table in tables:
+                result["created"].extend(self.ensure_partitions(conn, table))
+            if settings.PARTITION_ARCHIVE_ENABLED:
+                for table, keep_months in parse_archive_months(settings.PARTITION_ARCHIVE_AFTER_MONTHS).items():
+                    if table in tables:
+                        cold.extend((table, name) for name in self.cold_partitions(conn, table, keep_months))
+
+        # 归档跨多个事务，不持有上面的锁：其他 worker 已 DETACH 的分区在这里 DETACH 失败并跳过
+        for table, name in cold:
+            try:
+                result["archived"].append(self.archive_partition(table, name))
+            except Exception as e:
+                logger.error(f"[分区维护] 归档 {name} 失败: {e}")
+
+        if result["created"]:
+            logger.info(f"[分区维护] 新建分区: {', '.join(result['created'])}")
+        return result
+
+    # ======================
+    # 后台任务
+    # ======================
+
+    def start(self) -> None:
+        """启动后台分区维护（在应用启动时调用）"""
+        if not settings.PARTITION_MAINTENANCE_ENABLED or engine.dialect.name != "postgresql":
+            return
+        if self._runner and not self._runner.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+        logger.info(f"[分区维护] 已启动，间隔 {settings.PARTITION_MAINTENANCE_INTERVAL} 秒")
+
+    async def stop(self) -> None:
+        """停止后台分区维护（在应用关闭时调用）"""
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def notify(self) -> None:
+        """唤醒后台任务立即维护一次"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.maintain_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[分区维护] 出错: {e}")
+                import traceback
+                traceback.print_exc()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.PARTITION_MAINTENANCE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+# 创建全局分区维护服务实例
+partition_service = PartitionService()
@@ -0,0 +1,111 @@
+"""
+密码加密服务
+bcrypt 计算在专用的有界线程池中执行，不阻塞事件循环；
+cost 因子可配置，登录时发现旧 cost 的哈希会自动用新 cost 重新加密
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import User
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PasswordService:
+    """密码加密服务类"""
+
+    def __init__(self):
+        """初始化bcrypt线程池"""
+        self.rounds = settings.BCRYPT_ROUNDS
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.PASSWORD_HASH_WORKERS),
+            thread_name_prefix="bcrypt"
+        )
+        # 排队中 + 计算中的任务上限，超出时直接拒绝，避免登录风暴积压
+        self._slots = threading.BoundedSemaphore(max(1, settings.PASSWORD_HASH_MAX_PENDING))
+
+    # ---------- 同步实现（在线程池中执行） ----------
+
+    def hash_sync(self, password: str) -> str:
+        """加密密码"""
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+    @staticmethod
+    def verify_sync(plain_password: str, hashed_password: str) -> bool:
+        """验证密码"""
+        try:
+            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+        except Exception as e:
+            logger.error(f"[密码验证错误] {str(e)}")
+            return False
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """哈希的 cost 与当前配置不同时需要重新加密（格式：$2b$12$...）"""
+        try:
+            return int(hashed_password.split('$')[2]) != self.rounds
+        except (IndexError, ValueError, AttributeError):
+            return False
+
+    # ---------- 异步接口 ----------
+
+    async def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        """在线程池中加密密码"""
+        return await self._run(self.hash_sync, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """在线程池中验证密码"""
+        if not hashed_password:
+            return False
+        return await self._run(self.verify_sync, plain_password, hashed_password)
+
+    async def verify_user(self, user: User, plain_password: str, db: Session) -> bool:
+        """
+        验证用户密码，成功且 cost 已变更时透明地重新加密
+
+        Args:
+            user: 用户
+            plain_password: 明文密码
+            db: 数据库会话
+
+        Returns:
+            密码是否正确
+        """
+        if not await self.verify(plain_password, user.password_hash):
+            return False
+
+        if self.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = await self.hash(plain_password)
+                db.commit()
+                logger.info(f"[密码] 用户 {user.id} 的密码已按 cost={self.rounds} 重新加密")
+            except Exception as e:
+                # 重新加密失败不影响本次登录
+                db.rollback()
+                logger.warning(f"[密码] ⚠️ 重新加密失败: {getattr(e, 'detail', None) or e}")
+
+        return True
+
+    def shutdown(self) -> None:
+        """关闭线程池（在应用关闭时调用）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 创建全局密码服务实例
+password_service = PasswordService()
@@ -0,0 +1,143 @@
+"""
+在线 CPU 分析服务
+- 管理员接口按需对当前worker采样 N 秒，返回 collapsed stacks 或 speedscope 文件
+- 携带 X-Profile 请求头（值为 PROFILER_REQUEST_TOKEN）的请求单独采样，响应头 X-Profile-Id 返回结果ID
+- 同一时间只运行一个采样；最近的结果保存在内存中（PROFILER_KEEP 个）
+
+采样覆盖进程内所有线程，单请求采样期间的其他并发请求也会被计入
+"""
+
+import hmac
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Dict
+
+from fastapi import HTTPException
+
+from config import settings
+from utils.logger import get_logger
+from utils.sampling_profiler import SamplingProfiler, Profile
+
+logger = get_logger(__name__)
+
+
+class ProfilerService:
+    """在线分析服务类"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+
+    def try_start(self, name: str) -> Optional[SamplingProfiler]:
+        """开始采样；已有采样在运行时返回None"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            profiler = SamplingProfiler(interval=max(1, settings.PROFILER_INTERVAL_MS) / 1000)
+            profiler.start(name)
+            return profiler
+        except Exception:
+            self._lock.release()
+            raise
+
+    def finish(self, profiler: SamplingProfiler) -> str:
+        """结束采样并保存结果，返回结果ID"""
+        try:
+            profile = profiler.stop()
+        finally:
+            self._lock.release()
+
+        profile_id = uuid.uuid4().hex[:12]
+        self._profiles[profile_id] = profile
+        while len(self._profiles) > max(1, settings.PROFILER_KEEP):
+            self._profiles.popitem(last=False)
+        logger.info(f"[分析器] {profile.name} 采样完成 {profile_id}: {profile.samples} 次采样，{len(profile.stacks)} 个调用栈")
+        return profile_id
+
+    async def capture(self, seconds: float) -> str:
+        """
+        对整个worker采样指定秒数
+
+        Returns:
+            结果ID
+
+        Raises:
+            HTTPException: 未启用（404）、参数错误（400）、已有采样在运行（409）
+        """
+        if not settings.PROFILER_ENABLED:
+            raise HTTPException(status_code=404, detail="在线分析未启用")
+        if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+            raise HTTPException(status_code=400, detail=f"采样时长需在 0~{settings.PROFILER_MAX_SECONDS} 秒之间")
+        profiler = self.try_start(f"worker {seconds:g}s")
+        if profiler is None:
+            raise HTTPException(status_code=409, detail="已有采样正在进行")
+
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile_id = self.finish(profiler)
+        return profile_id
+
+    def get(self, profile_id: str) -> Profile:
+        profile = self._profiles.get(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="采样结果不存在或已过期")
+        return profile
+
+    def list(self) -> List[Dict]:
+        return [{"id": profile_id, **profile.summary()} for profile_id, profile in reversed(self._profiles.items())]
+
+    def request_enabled(self, header_value: Optional[str]) -> bool:
+        """请求头 X-Profile 是否与 PROFILER_REQUEST_TOKEN 一致"""
+        token = settings.PROFILER_REQUEST_TOKEN
+        return bool(settings.PROFILER_ENABLED and token and header_value
+                    and hmac.compare_digest(header_value, token))
+
+
+# 创建全局在线分析服务实例
+profiler_service = ProfilerService()
+
+
+class RequestProfilerMiddleware:
+    """ASGI中间件：对携带 X-Profile 请求头的单个请求采样"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = dict(scope.get("headers") or []).get(b"x-profile")
+        if not header or not profiler_service.request_enabled(header.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = profiler_service.try_start(f"{scope.get('method')} {scope.get('path')}")
+        if profiler is None:
+            # 已有采样在运行，正常处理请求
+            await self.app(scope, receive, send)
+            return
+
+        state = {"stopped": False}
+
+        def finish() -> Optional[str]:
+            if state["stopped"]:
+                return None
+            state["stopped"] = True
+            return profiler_service.finish(profiler)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile_id = finish()
+                if profile_id:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
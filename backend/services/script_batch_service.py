@@ -0,0 +1,274 @@
+"""
+批量脚本生成服务
+为商品目录并发生成视频脚本，并将结果保存为提示词和项目
+"""
+
+import re
+import json
+import uuid
+import asyncio
+from typing import List, Optional, Dict, Any, AsyncIterator
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, undefer
+
+from config import settings
+from database import SessionLocal, Product, Project, SavedPrompt
+from services.ai_helper import chat_with_ai
+from utils.rate_limiter import AsyncRateLimiter
+from prompts import IMAGE_BASED_SCRIPT_SYSTEM_PROMPT, get_image_based_script_prompt
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 前端语言代码 → 提示词中的语言名称
+LANGUAGE_MAP = {
+    'zh-CN': '中文',
+    'en-US': '英文',
+    'id-ID': '印尼语',
+    'vi-VN': '越南语',
+}
+
+
+async def generate_product_script(
+    product_name: str,
+    usage_method: str,
+    selling_points: List[str],
+    language: str,
+    duration: int,
+    product_images: List[str]
+) -> List[dict]:
+    """
+    根据商品信息和图片生成分镜脚本
+
+    Args:
+        product_name: 商品名称
+        usage_method: 使用方式
+        selling_points: 核心卖点列表
+        language: 前端语言代码（如 zh-CN）
+        duration: 视频时长（秒）
+        product_images: 商品图片URL列表（第一张作为视觉参考）
+
+    Returns:
+        镜头列表
+
+    Raises:
+        HTTPException: AI返回格式错误或脚本为空
+        json.JSONDecodeError: AI返回的JSON无法解析
+    """
+    target_language = LANGUAGE_MAP.get(language, '中文')
+    num_images = len(product_images) or 1
+
+    prompt = get_image_based_script_prompt(
+        product_name=product_name,
+        usage_method=usage_method,
+        selling_points=selling_points,
+        language=target_language,
+        duration=duration,
+        num_images=num_images
+    )
+
+    ai_response = await chat_with_ai(
+        prompt,
+        IMAGE_BASED_SCRIPT_SYSTEM_PROMPT,
+        image_url=product_images[0] if product_images else None
+    )
+
+    json_match = re.search(r'\{[\s\S]*\}', ai_response)
+    if not json_match:
+        raise HTTPException(status_code=500, detail="AI生成脚本失败，格式错误")
+
+    result = json.loads(json_match.group())
+    shots = result.get('shots', [])
+
+    if not shots:
+        raise HTTPException(status_code=500, detail="生成的脚本为空")
+
+    for i, shot in enumerate(shots):
+        if 'imageIndex' not in shot:
+            shot['imageIndex'] = i % num_images
+
+    return shots
+
+
+class ScriptBatchService:
+    """批量脚本生成服务类"""
+
+    def __init__(self):
+        """初始化全局限流器（所有批量任务共享LLM配额）"""
+        self.limiter = AsyncRateLimiter(
+            max_concurrency=settings.SCRIPT_BATCH_CONCURRENCY,
+            requests_per_minute=settings.SCRIPT_BATCH_RPM or None
+        )
+
+    @staticmethod
+    def load_products(user_id: str, product_ids: List[str], db: Session) -> List[Dict[str, Any]]:
+        """
+        加载用户的商品（保持请求中的顺序，去重）
+
+        Args:
+            user_id: 用户ID
+            product_ids: 商品ID列表
+            db: 数据库会话
+
+        Returns:
+            商品信息字典列表（脱离会话，可在流式响应中安全使用）
+
+        Raises:
+            HTTPException: 数量超限或商品不存在
+        """
+        unique_ids = list(dict.fromkeys(product_ids))
+        if not unique_ids:
+            raise HTTPException(status_code=400, detail="商品ID列表不能为空")
+        if len(unique_ids) > settings.SCRIPT_BATCH_MAX_PRODUCTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"单次最多批量生成 {settings.SCRIPT_BATCH_MAX_PRODUCTS} 个商品的脚本"
+            )
+
+        products = db.query(Product).options(undefer(Product.image_urls)).filter(
+            Product.user_id == user_id,
+            Product.id.in_(unique_ids)
+        ).all()
+        found = {p.id: p for p in products}
+
+        missing = [pid for pid in unique_ids if pid not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"商品不存在: {', '.join(missing)}")
+
+        return [
+            {
+                "id": found[pid].id,
+                "name": found[pid].name,
+                "usage": found[pid].usage or "",
+                "sellingPoints": [
+                    point for point in (found[pid].selling_points or "").split(', ') if point
+                ],
+                "images": list(found[pid].image_urls or []),
+            }
+            for pid in unique_ids
+        ]
+
+    @staticmethod
+    def save_result(user_id: str, product: Dict[str, Any], shots: List[dict]) -> Dict[str, str]:
+        """
+        将生成的脚本保存为提示词和项目草稿
+
+        使用独立的数据库会话：流式响应期间请求级会话可能已关闭
+
+        Returns:
+            {"promptId": ..., "projectId": ...}
+        """
+        db = SessionLocal()
+        try:
+            prompt_id = str(uuid.uuid4())
+            project_id = str(uuid.uuid4())
+
+            db.add(SavedPrompt(
+                id=prompt_id,
+                user_id=user_id,
+                content=json.dumps(shots, ensure_ascii=False),
+                product_name=product["name"]
+            ))
+            db.add(Project(
+                id=project_id,
+                user_id=user_id,
+                product_id=product["id"],
+                project_name=product["name"],
+                status='draft',
+                script_json=shots
+            ))
+            db.commit()
+
+            return {"promptId": prompt_id, "projectId": project_id}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _generate_one(
+        self,
+        user_id: str,
+        product: Dict[str, Any],
+        language: str,
+        duration: int
+    ) -> Dict[str, Any]:
+        """在限流器内为单个商品生成并保存脚本，失败时返回错误信息而不是抛出"""
+        try:
+            async with self.limiter:
+                shots = await generate_product_script(
+                    product_name=product["name"],
+                    usage_method=product["usage"],
+                    selling_points=product["sellingPoints"] or [product["name"]],
+                    language=language,
+                    duration=duration,
+                    product_images=product["images"]
+                )
+
+            saved = await asyncio.to_thread(self.save_result, user_id, product, shots)
+
+            logger.info(f"[批量脚本] 商品 {product['id']} 生成 {len(shots)} 个镜头")
+            return {
+                "productId": product["id"],
+                "productName": product["name"],
+                "success": True,
+                "shots": shots,
+                **saved
+            }
+        except HTTPException as e:
+            error = e.detail
+        except json.JSONDecodeError as e:
+            error = f"AI返回数据解析失败: {str(e)}"
+        except Exception as e:
+            error = f"生成脚本失败: {str(e)}"
+
+        logger.error(f"[批量脚本] 商品 {product['id']} 生成失败: {error}")
+        return {
+            "productId": product["id"],
+            "productName": product["name"],
+            "success": False,
+            "error": error
+        }
+
+    async def stream_scripts(
+        self,
+        user_id: str,
+        products: List[Dict[str, Any]],
+        language: str,
+        duration: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        并发生成脚本，按完成顺序逐个产出结果
+
+        最后产出一条汇总记录 {"done": true, ...}
+        """
+        tasks = [
+            asyncio.create_task(self._generate_one(user_id, product, language, duration))
+            for product in products
+        ]
+        succeeded = 0
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result["success"]:
+                    succeeded += 1
+                yield result
+        finally:
+            # 客户端断开时取消尚未完成的任务
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        yield {
+            "done": True,
+            "total": len(products),
+            "succeeded": succeeded,
+            "failed": len(products) - succeeded
+        }
+
+
+# 创建全局批量脚本服务实例
+script_batch_service = ScriptBatchService()
@@ -0,0 +1,326 @@
+"""
+视频封面和动态预览生成服务
+为已完成的视频截取封面帧（JPEG）和几秒的动态预览（动画WebP），上传到TOS，
+列表页只需加载几十KB的图片而不是整段视频
+
+解码在进程池中执行；默认使用本地 ffmpeg，测试时可用纯Python的 stub 解码器
+"""
+
+import io
+import os
+import shutil
+import asyncio
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Dict, Any
+
+from PIL import Image
+from sqlalchemy import or_
+
+from config import settings
+from database import SessionLocal, Video
+from services.tos_service import tos_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# ======================
+# 解码器（在子进程中运行）
+# ======================
+
+class FFmpegDecoder:
+    """使用本地 ffmpeg 抽帧（支持本地路径和HTTP URL）"""
+
+    name = "ffmpeg"
+
+    @staticmethod
+    def available() -> bool:
+        return shutil.which(settings.FFMPEG_PATH) is not None
+
+    @staticmethod
+    def _run(args: List[str]) -> None:
+        subprocess.run(
+            [settings.FFMPEG_PATH, "-v", "error", "-y", *args],
+            check=True,
+            capture_output=True,
+            timeout=120
+        )
+
+    def extract(self, source: str, width: int, frame_count: int, seconds: float, poster_at: float):
+        """
+        抽取封面帧和预览帧
+
+        Returns:
+            (封面帧, 预览帧列表)
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            preview_pattern = os.path.join(tmp, "f%03d.png")
+            self._run([
+                "-i", source,
+                "-t", str(seconds),
+                "-vf", f"fps={frame_count / seconds},scale={width}:-2",
+                "-frames:v", str(frame_count),
+                preview_pattern
+            ])
+            frames = [
+                Image.open(os.path.join(tmp, name)).convert("RGB")
+                for name in sorted(os.listdir(tmp)) if name.startswith("f")
+            ]
+            if not frames:
+                raise RuntimeError("ffmpeg 未输出任何帧")
+
+            poster_path = os.path.join(tmp, "poster.png")
+            try:
+                self._run([
+                    "-ss", str(poster_at),
+                    "-i", source,
+                    "-frames:v", "1",
+                    "-vf", f"scale={settings.THUMBNAIL_POSTER_WIDTH}:-2",
+                    poster_path
+                ])
+                poster = Image.open(poster_path).convert("RGB")
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                # 视频比截取位置短时使用第一帧
+                poster = frames[0]
+
+            return poster, frames
+
+
+class StubDecoder:
+    """不依赖 ffmpeg 的纯Python解码器，生成渐变色的假帧（用于测试和无 ffmpeg 的环境）"""
+
+    name = "stub"
+
+    @staticmethod
+    def available() -> bool:
+        return True
+
+    def extract(self, source: str, width: int, frame_count: int, seconds: float, poster_at: float):
+        height = width * 16 // 9
+
+        def frame(index: int, frame_width: int, frame_height: int) -> Image.Image:
+            shade = int(255 * index / max(1, frame_count - 1))
+            return Image.new("RGB", (frame_width, frame_height), (shade, 64, 255 - shade))
+
+        frames = [frame(i, width, height) for i in range(frame_count)]
+        poster_width = settings.THUMBNAIL_POSTER_WIDTH
+        poster = frame(0, poster_width, poster_width * 16 // 9)
+        return poster, frames
+
+
+DECODERS = {
+    FFmpegDecoder.name: FFmpegDecoder,
+    StubDecoder.name: StubDecoder,
+}
+
+
+def render_previews(
+    source: str,
+    decoder: str = "ffmpeg",
+    width: int = 320,
+    frame_count: int = 12,
+    seconds: float = 3.0,
+    poster_at: float = 1.0
+) -> Dict[str, bytes]:
+    """
+    从视频生成封面JPEG和动画WebP（模块级函数，可在进程池中执行）
+
+    Args:
+        source: 视频地址（本地路径或URL）
+        decoder: 解码器名称（ffmpeg / stub）
+        width: 预览宽度（像素）
+        frame_count: 预览帧数
+        seconds: 预览覆盖的视频时长（秒）
+        poster_at: 封面截取位置（秒）
+
+    Returns:
+        {"poster": JPEG字节, "preview": WebP字节}
+    """
+    poster, frames = DECODERS[decoder]().extract(source, width, frame_count, seconds, poster_at)
+
+    poster_buffer = io.BytesIO()
+    poster.save(poster_buffer, format="JPEG", quality=82, optimize=True, progressive=True)
+
+    preview_buffer = io.BytesIO()
+    frames[0].save(
+        preview_buffer,
+        format="WEBP",
+        save_all=True,
+        append_images=frames[1:],
+        duration=int(seconds * 1000 / len(frames)),
+        loop=0,
+        quality=60,
+        method=4
+    )
+
+    return {"poster": poster_buffer.getvalue(), "preview": preview_buffer.getvalue()}
+
+
+# ======================
+# 服务
+# ======================
+
+class ThumbnailService:
+    """视频封面和动态预览服务类"""
+
+    def __init__(self):
+        """进程池在第一次使用时创建"""
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_progress = set()
+
+    @property
+    def enabled(self) -> bool:
+        decoder = DECODERS.get(settings.THUMBNAIL_DECODER)
+        return (
+            settings.THUMBNAIL_ENABLED
+            and tos_service is not None
+            and decoder is not None
+            and decoder.available()
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=max(1, settings.THUMBNAIL_WORKERS))
+            logger.info(f"[缩略图] 进程池已启动: {settings.THUMBNAIL_WORKERS} 个进程, 解码器: {settings.THUMBNAIL_DECODER}")
+        return self._executor
+
+    def shutdown(self) -> None:
+        """关闭进程池（在应用关闭时调用）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def _load_video(video_id: str) -> Optional[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            video = db.query(Video).filter(Video.id == video_id).first()
+            if not video:
+                return None
+            return {
+                "userId": video.user_id,
+                "status": video.status,
+                "url": video.video_url,
+                "thumbnail": video.thumbnail_url,
+                "preview": video.preview_url,
+            }
+        finally:
+            db.close()
+
+    @staticmethod
+    def _save_urls(video_id: str, poster_url: str, preview_url: str, keep_thumbnail: bool) -> None:
+        db = SessionLocal()
+        try:
+            fields = {Video.preview_url: preview_url}
+            if not keep_thumbnail:
+                fields[Video.thumbnail_url] = poster_url
+            db.query(Video).filter(Video.id == video_id).update(fields, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def generate(self, video_id: str, force: bool = False) -> Dict[str, Any]:
+        """
+        为视频生成封面和动态预览并上传到TOS
+
+        Args:
+            video_id: 视频ID
+            force: 已有预览时是否重新生成
+
+        Returns:
+            {"videoId": ..., "success": bool, "thumbnail"/"preview"/"skipped"/"error": ...}
+        """
+        if not self.enabled:
+            return {"videoId": video_id, "success": False, "skipped": "缩略图生成未启用"}
+        if video_id in self._in_progress:
+            return {"videoId": video_id, "success": False, "skipped": "正在生成"}
+
+        video = await asyncio.to_thread(self._load_video, video_id)
+        if not video:
+            return {"videoId": video_id, "success": False, "error": "视频不存在"}
+        if video["status"] != 'completed' or not video["url"]:
+            return {"videoId": video_id, "success": False, "skipped": "视频未完成"}
+        if video["preview"] and not force:
+            return {"videoId": video_id, "success": True, "skipped": "已生成"}
+
+        self._in_progress.add(video_id)
+        try:
+            loop = asyncio.get_running_loop()
+            images = await loop.run_in_executor(
+                self._get_executor(),
+                render_previews,
+                video["url"],
+                settings.THUMBNAIL_DECODER,
+                settings.THUMBNAIL_WIDTH,
+                settings.THUMBNAIL_PREVIEW_FRAMES,
+                settings.THUMBNAIL_PREVIEW_SECONDS,
+                settings.THUMBNAIL_POSTER_AT
+            )
+
+            base_key = f"videos/{video['userId']}/{video_id}"
+            poster_url = await asyncio.to_thread(
+                tos_service.upload_file, f"{base_key}_poster.jpg", images["poster"], "image/jpeg"
+            )
+            preview_url = await asyncio.to_thread(
+                tos_service.upload_file, f"{base_key}_preview.webp", images["preview"], "image/webp"
+            )
+
+            # 已转存到TOS的上游封面保留，否则使用截取的封面帧
+            keep_thumbnail = bool(video["thumbnail"]) and tos_service.is_own_url(video["thumbnail"])
+            await asyncio.to_thread(self._save_urls, video_id, poster_url, preview_url, keep_thumbnail)
+
+            logger.info(f"[缩略图] ✅ 视频 {video_id}: 封面 {len(images['poster'])} bytes, "
+                  f"预览 {len(images['preview'])} bytes")
+            return {
+                "videoId": video_id,
+                "success": True,
+                "thumbnail": video["thumbnail"] if keep_thumbnail else poster_url,
+                "preview": preview_url
+            }
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            logger.error(f"[缩略图] ❌ 视频 {video_id} 生成失败: {error}")
+            return {"videoId": video_id, "success": False, "error": error}
+        finally:
+            self._in_progress.discard(video_id)
+
+    async def backfill(self, limit: int = 100) -> Dict[str, Any]:
+        """为还没有动态预览的已完成视频生成封面和预览"""
+        def load_ids():
+            db = SessionLocal()
+            try:
+                rows = db.query(Video.id).filter(
+                    Video.status == 'completed',
+                    Video.video_url.isnot(None),
+                    or_(Video.preview_url.is_(None), Video.preview_url == '')
+                ).order_by(Video.created_at.desc()).limit(limit).all()
+                return [row[0] for row in rows]
+            finally:
+                db.close()
+
+        if not self.enabled:
+            return {"total": 0, "succeeded": 0, "failed": 0, "results": []}
+
+        video_ids = await asyncio.to_thread(load_ids)
+        logger.info(f"[缩略图] 回填开始: {len(video_ids)} 个视频")
+
+        # 进程池本身限制了并发解码数，这里按批提交避免一次性排队过多
+        results = []
+        batch = max(1, settings.THUMBNAIL_WORKERS) * 2
+        for i in range(0, len(video_ids), batch):
+            results.extend(await asyncio.gather(*(self.generate(v) for v in video_ids[i:i + batch])))
+
+        succeeded = sum(1 for r in results if r.get("success") and not r.get("skipped"))
+        failed = sum(1 for r in results if not r.get("success") and not r.get("skipped"))
+        log = logger.warning if failed else logger.info
+        log(f"[缩略图] 回填结束: 成功 {succeeded}, 失败 {failed}")
+        return {"total": len(video_ids), "succeeded": succeeded, "failed": failed, "results": results}
+
+
+# 创建全局缩略图服务实例
+thumbnail_service = ThumbnailService()
@@ -4,12 +4,17 @@
 """
 
 import tos
+from tos.models2 import UploadedPart
 from io import BytesIO
-from typing import Optional
+from typing import Optional, Iterable
 from fastapi import HTTPException
 
 from config import settings
 from utils.helpers import build_public_url
+from utils.logger import get_logger
+from utils.metrics import track_tos
+
+logger = get_logger(__name__)
 
 
 class TOSService:
@@ -25,15 +30,17 @@ class TOSService:
             sk=settings.TOS_SECRET_KEY,
             endpoint=settings.TOS_ENDPOINT,
             region=settings.TOS_REGION,
-            enable_crc=False
+            enable_crc=False,
+            # 自定义域名（含压测用的本地模拟服务）：请求不拼接 bucket 子域名
+            **({"is_custom_domain": True} if settings.TOS_CUSTOM_DOMAIN else {})
         )
         
         self.bucket = settings.TOS_BUCKET
         self.endpoint = settings.TOS_ENDPOINT.replace("https://", "")
         
-        print(f"[TOS Service] 初始化成功")
-        print(f"[TOS Service] Bucket: {self.bucket}")
-        print(f"[TOS Service] Region: {settings.TOS_REGION}")
+        logger.info(f"[TOS Service] 初始化成功")
+        logger.info(f"[TOS Service] Bucket: {self.bucket}")
+        logger.info(f"[TOS Service] Region: {settings.TOS_REGION}")
     
     def upload_file(
         self, 
@@ -65,38 +72,131 @@ class TOSService:
             else:
                 file_size = content_length or len(content.getvalue())
             
-            print(f"[TOS] 上传文件: {key} ({file_size} bytes)")
+            logger.info(f"[TOS] 上传文件: {key} ({file_size} bytes)")
             
             # 调用TOS SDK上传
-            result = self.client.put_object(
-                bucket=self.bucket,
-                key=key,
-                content=content,
-                content_length=file_size,
-                content_type=content_type
-            )
+            with track_tos("put_object"):
+                result = self.client.put_object(
+                    bucket=self.bucket,
+                    key=key,
+                    content=content,
+                    content_length=file_size,
+                    content_type=content_type
+                )
             
-            print(f"[TOS] ✅ 上传成功 RequestID: {result.request_id}")
+            logger.info(f"[TOS] ✅ 上传成功 RequestID: {result.request_id}")
             
             # 构建公开访问URL
             url = build_public_url(self.bucket, key, self.endpoint)
             return url
             
         except tos.exceptions.TosServerError as e:
-            print(f"[TOS] ❌ 服务器错误")
-            print(f"  Status: {e.status_code}")
-            print(f"  Code: {e.code}")
-            print(f"  Message: {e.message}")
+            logger.error(f"[TOS] ❌ 服务器错误")
+            logger.error(f"  Status: {e.status_code}")
+            logger.error(f"  Code: {e.code}")
+            logger.error(f"  Message: {e.message}")
             raise HTTPException(status_code=500, detail=f"上传失败: {e.message}")
             
         except tos.exceptions.TosClientError as e:
-            print(f"[TOS] ❌ 客户端错误: {e.message}")
+            logger.error(f"[TOS] ❌ 客户端错误: {e.message}")
             raise HTTPException(status_code=500, detail=f"上传失败: {e.message}")
             
         except Exception as e:
-            print(f"[TOS] ❌ 未知错误: {type(e).__name__}: {str(e)}")
+            logger.error(f"[TOS] ❌ 未知错误: {type(e).__name__}: {str(e)}")
             raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
     
+    def upload_stream(
+        self,
+        key: str,
+        chunks: Iterable[bytes],
+        content_type: str,
+        part_size: int = 8 * 1024 * 1024,
+        bucket: Optional[str] = None,
+        private: bool = False
+    ) -> str:
+        """
+        分片上传流式数据到TOS（内存中最多缓存一个分片）
+        
+        Args:
+            key: 对象键（文件路径）
+            chunks: 字节块迭代器（如 requests 的 iter_content）
+            content_type: 文件MIME类型
+            part_size: 分片大小（字节），除最后一片外不能小于5MB
+            bucket: 目标桶，默认 TOS_BUCKET
+            private: 对象设为私有读写（不能通过公开URL访问）
+        
+        Returns:
+            文件的公开访问URL（private=True 时该URL不可匿名访问）
+        
+        Raises:
+            HTTPException: 上传失败时抛出（已上传的分片会被清理）
+        """
+        bucket = bucket or self.bucket
+        upload_id = None
+        try:
+            with track_tos("create_multipart_upload"):
+                upload = self.client.create_multipart_upload(
+                    bucket=bucket,
+                    key=key,
+                    content_type=content_type,
+                    **({"acl": tos.ACLType.ACL_Private} if private else {})
+                )
+            upload_id = upload.upload_id
+            
+            parts = []
+            buffer = bytearray()
+            total_size = 0
+            
+            def flush():
+                part_number = len(parts) + 1
+                with track_tos("upload_part"):
+                    result = self.client.upload_part(
+                        bucket=bucket,
+                        key=key,
+                        upload_id=upload_id,
+                        part_number=part_number,
+                        content=bytes(buffer)
+                    )
+                parts.append(UploadedPart(part_number, result.etag))
+                buffer.clear()
+            
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                buffer.extend(chunk)
+                total_size += len(chunk)
+                if len(buffer) >= part_size:
+                    flush()
+            
+            if buffer or not parts:
+                flush()
+            
+            with track_tos("complete_multipart_upload"):
+                self.client.complete_multipart_upload(
+                    bucket=bucket,
+                    key=key,
+                    upload_id=upload_id,
+                    parts=parts
+                )
+            
+            logger.info(f"[TOS] ✅ 分片上传成功: {key} ({total_size} bytes, {len(parts)} 片)")
+            return build_public_url(bucket, key, self.endpoint)
+            
+        except Exception as e:
+            if upload_id:
+                try:
+                    self.client.abort_multipart_upload(bucket=bucket, key=key, upload_id=upload_id)
+                except Exception as abort_error:
+                    logger.warning(f"[TOS] ⚠️ 取消分片上传失败: {abort_error}")
+            
+            message = getattr(e, "message", None) or str(e)
+            logger.error(f"[TOS] ❌ 分片上传失败: {type(e).__name__}: {message}")
+            raise HTTPException(status_code=500, detail=f"上传失败: {message}")
+    
+    def is_own_url(self, url: Optional[str]) -> bool:
+        """判断URL是否已经指向本存储桶"""
+        return bool(url) and url.startswith(build_public_url(self.bucket, "", self.endpoint))
+    
     def delete_file(self, url: str) -> bool:
         """
         从TOS删除文件
@@ -111,18 +211,19 @@ class TOSService:
             # 从URL提取对象键
             parts = url.split('.com/')
             if len(parts) < 2:
-                print(f"[TOS] ⚠️ 无效的URL格式: {url}")
+                logger.warning(f"[TOS] ⚠️ 无效的URL格式: {url}")
                 return False
             
             object_key = parts[1]
             
-            print(f"[TOS] 删除文件: {object_key}")
-            self.client.delete_object(bucket=self.bucket, key=object_key)
-            print(f"[TOS] ✅ 删除成功")
+            logger.info(f"[TOS] 删除文件: {object_key}")
+            with track_tos("delete_object"):
+                self.client.delete_object(bucket=self.bucket, key=object_key)
+            logger.info(f"[TOS] ✅ 删除成功")
             return True
             
         except Exception as e:
-            print(f"[TOS] ❌ 删除失败: {str(e)}")
+            logger.error(f"[TOS] ❌ 删除失败: {str(e)}")
             return False
     
     def get_file_url(self, key: str) -> str:
@@ -142,5 +243,5 @@ class TOSService:
 try:
     tos_service = TOSService()
 except Exception as e:
-    print(f"⚠️ TOS服务初始化失败: {e}")
+    logger.warning(f"⚠️ TOS服务初始化失败: {e}")
     tos_service = None
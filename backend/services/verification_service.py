@@ -0,0 +1,302 @@
+"""
+邮箱验证码服务
+- 验证码存储可切换：memory（进程内，定期清理过期项）或 database（verification_codes 表，多个worker共享）
+- 按邮箱和IP限制发送频率（固定窗口计数）
+- 只保存验证码的HMAC，验证成功或输错次数过多后立即作废
+"""
+
+import hmac
+import time
+import asyncio
+import hashlib
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Dict
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from database import SessionLocal, VerificationCode, RateLimitCounter
+from services.mail_service import mail_service
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 清理过期验证码和计数的最小间隔（秒）
+SWEEP_INTERVAL = 60
+
+# 校验结果 → 错误提示
+VERIFY_ERRORS = {
+    "missing": "验证码已过期或未发送",
+    "expired": "验证码已过期",
+    "wrong": "验证码错误",
+    "locked": "验证码错误次数过多，请重新获取",
+}
+
+
+class MemoryCodeBackend:
+    """进程内存储（只适用于单worker），访问时按间隔清理过期项"""
+
+    blocking = False
+
+    def __init__(self):
+        self._codes: Dict[str, Dict] = {}     # email -> {code_hash, attempts, expires_at}
+        self._counters: Dict[str, Dict] = {}  # key -> {count, expires_at}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def _sweep(self, now: float) -> None:
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        for store in (self._codes, self._counters):
+            for key in [k for k, v in store.items() if v["expires_at"] <= now]:
+                del store[key]
+
+    def save(self, email: str, code_hash: str, ttl: int) -> None:
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            self._codes[email] = {"code_hash": code_hash, "attempts": 0, "expires_at": now + ttl}
+
+    def check(self, email: str, code_hash: str, max_attempts: int) -> str:
+        with self._lock:
+            entry = self._codes.get(email)
+            if not entry:
+                return "missing"
+            if entry["expires_at"] <= time.time():
+                del self._codes[email]
+                return "expired"
+            if hmac.compare_digest(entry["code_hash"], code_hash):
+                del self._codes[email]
+                return "ok"
+            entry["attempts"] += 1
+            if entry["attempts"] >= max_attempts:
+                del self._codes[email]
+                return "locked"
+            return "wrong"
+
+    def hit(self, key: str, window: int) -> int:
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            counter = self._counters.get(key)
+            if not counter or counter["expires_at"] <= now:
+                counter = self._counters[key] = {"count": 0, "expires_at": now + window}
+            counter["count"] += 1
+            return counter["count"]
+
+
+class DatabaseCodeBackend:
+    """数据库存储（verification_codes、rate_limit_counters 表），多个worker共享"""
+
+    blocking = True
+
+    def __init__(self):
+        self._next_sweep = 0.0
+
+    def _sweep(self, db) -> None:
+        now = time.time()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + SWEEP_INTERVAL
+        utcnow = datetime.utcnow()
+        db.query(VerificationCode).filter(VerificationCode.expires_at <= utcnow).delete(synchronize_session=False)
+        db.query(RateLimitCounter).filter(RateLimitCounter.expires_at <= utcnow).delete(synchronize_session=False)
+
+    def save(self, email: str, code_hash: str, ttl: int) -> None:
+        for attempt in range(2):
+            db = SessionLocal()
+            try:
+                self._sweep(db)
+                db.merge(VerificationCode(
+                    email=email,
+                    code_hash=code_hash,
+                    attempts=0,
+                    expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+                    created_at=datetime.utcnow()
+                ))
+                db.commit()
+                return
+            except IntegrityError:
+                # 同一邮箱并发发送，另一个worker刚插入：重新读取后覆盖为本次的验证码（邮件只发本次的）
+                db.rollback()
+                if attempt:
+                    raise
+            finally:
+                db.close()
+
+    def check(self, email: str, code_hash: str, max_attempts: int) -> str:
+        db = SessionLocal()
+        try:
+            row = db.query(VerificationCode).filter(
+                VerificationCode.email == email
+            ).with_for_update().first()
+            if not row:
+                return "missing"
+
+            if row.expires_at <= datetime.utcnow():
+                result = "expired"
+                db.delete(row)
+            elif hmac.compare_digest(row.code_hash, code_hash):
+                result = "ok"
+                db.delete(row)
+            else:
+                row.attempts = (row.attempts or 0) + 1
+                result = "wrong"
+                if row.attempts >= max_attempts:
+                    result = "locked"
+                    db.delete(row)
+            db.commit()
+            return result
+        finally:
+            db.close()
+
+    def hit(self, key: str, window: int) -> int:
+        for attempt in range(2):
+            db = SessionLocal()
+            try:
+                now = datetime.utcnow()
+                expires_at = now + timedelta(seconds=window)
+                row = db.query(RateLimitCounter).filter(
+                    RateLimitCounter.key == key
+                ).with_for_update().first()
+                if row is None:
+                    db.add(RateLimitCounter(key=key, count=1, window_start=now, expires_at=expires_at))
+                    db.commit()
+                    return 1
+
+                if row.expires_at <= now:
+                    row.count, row.window_start, row.expires_at = 1, now, expires_at
+                else:
+                    row.count = (row.count or 0) + 1
+                count = row.count
+                db.commit()
+                return count
+            except IntegrityError:
+                # 另一个worker刚插入了同一个key，重新读取后累加
+                db.rollback()
+                if attempt:
+                    raise
+            finally:
+                db.close()
+
+
+BACKENDS = {
+    "memory": MemoryCodeBackend,
+    "database": DatabaseCodeBackend,
+}
+
+
+def build_verification_email(code: str) -> str:
+    """验证码邮件内容"""
+    return f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; padding: 20px;">
+            <h2 style="color: #7c3aed;">SemoPic AI视频平台</h2>
+            <p>您好！</p>
+            <p>您的邮箱验证码是：</p>
+            <h1 style="color: #7c3aed; font-size: 32px; letter-spacing: 5px;">{code}</h1>
+            <p style="color: #666;">验证码有效期为{settings.VERIFICATION_CODE_TTL // 60}分钟，请及时使用。</p>
+            <p style="color: #999; font-size: 12px; margin-top: 30px;">
+                如果这不是您的操作，请忽略此邮件。
+            </p>
+        </body>
+        </html>
+        """
+
+
+class VerificationService:
+    """邮箱验证码服务类"""
+
+    def __init__(self):
+        """根据 VERIFICATION_CODE_BACKEND 选择存储后端"""
+        backend_cls = BACKENDS.get(settings.VERIFICATION_CODE_BACKEND.lower())
+        if backend_cls is None:
+            logger.warning(f"[验证码] ⚠️ 未知的存储后端 {settings.VERIFICATION_CODE_BACKEND}，使用 memory")
+            backend_cls = MemoryCodeBackend
+        self.backend = backend_cls()
+
+    @property
+    def _secret(self) -> bytes:
+        """验证码摘要密钥（与访问令牌共用 JWT_SECRET_KEY，不安全时抛出 RuntimeError）"""
+        return settings.get_jwt_secret()
+
+    @staticmethod
+    def normalize_email(email: str) -> str:
+        return email.strip().lower()
+
+    def _hash(self, email: str, code: str) -> str:
+        return hmac.new(self._secret, f"{email}:{code.strip()}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    async def _call(self, func, *args):
+        """数据库后端在线程中执行，内存后端直接调用"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    async def _throttle(self, email: str, ip: Optional[str]) -> None:
+        """
+        发送限流
+
+        Raises:
+            HTTPException: 超出频率限制（429）
+        """
+        rules = [
+            (f"cooldown:{email}", settings.VERIFICATION_SEND_COOLDOWN, 1,
+             f"发送过于频繁，请{settings.VERIFICATION_SEND_COOLDOWN}秒后再试"),
+            (f"email:{email}", 3600, settings.VERIFICATION_SEND_PER_EMAIL_HOURLY,
+             "该邮箱发送次数过多，请1小时后再试"),
+        ]
+        if ip:
+            rules.append((f"ip:{ip}", 3600, settings.VERIFICATION_SEND_PER_IP_HOURLY, "请求过于频繁，请稍后再试"))
+
+        for key, window, limit, message in rules:
+            if window <= 0 or limit <= 0:
+                continue
+            if await self._call(self.backend.hit, key, window) > limit:
+                logger.info(f"[验证码] 触发限流: {key}")
+                raise HTTPException(status_code=429, detail=message)
+
+    async def issue(self, email: str, ip: Optional[str] = None) -> str:
+        """
+        生成验证码、保存并放入邮件队列（不等待SMTP发送）
+
+        Args:
+            email: 收件邮箱
+            ip: 客户端IP（用于限流）
+
+        Returns:
+            邮件ID
+
+        Raises:
+            HTTPException: 超出频率限制（429）
+        """
+        email = self.normalize_email(email)
+        await self._throttle(email, ip)
+
+        code = ''.join(secrets.choice("0123456789") for _ in range(6))
+        await self._call(self.backend.save, email, self._hash(email, code), settings.VERIFICATION_CODE_TTL)
+
+        return await mail_service.enqueue(email, "【SemoPic】邮箱验证码", build_verification_email(code))
+
+    async def verify(self, email: str, code: str) -> None:
+        """
+        校验验证码，成功后作废
+
+        Raises:
+            HTTPException: 验证码缺失、过期、错误或错误次数过多（400）
+        """
+        email = self.normalize_email(email)
+        result = await self._call(
+            self.backend.check, email, self._hash(email, code or ""), max(1, settings.VERIFICATION_CODE_MAX_ATTEMPTS)
+        )
+        if result != "ok":
+            raise HTTPException(status_code=400, detail=VERIFY_ERRORS[result])
+
+
+# 创建全局邮箱验证码服务实例
+verification_service = VerificationService()
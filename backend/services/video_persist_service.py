@@ -0,0 +1,209 @@
+"""
+视频转存服务
+在云雾URL过期（3天）之前，把生成的视频流式转存到TOS，并改写视频和封面URL
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, Any, Set
+
+import requests
+from sqlalchemy import or_
+
+from config import settings
+from database import SessionLocal, Video
+from services.tos_service import tos_service
+from services.thumbnail_service import thumbnail_service
+from utils.logger import get_logger
+from utils.metrics import track_upstream
+
+logger = get_logger(__name__)
+
+
+# 下载时每次读取的字节数（分片上传时会攒够一个分片再上传）
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class VideoPersistService:
+    """视频转存服务类"""
+
+    def __init__(self):
+        """初始化并发控制"""
+        self._semaphore = asyncio.Semaphore(max(1, settings.VIDEO_PERSIST_CONCURRENCY))
+        self._in_progress: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.VIDEO_PERSIST_ENABLED and tos_service is not None
+
+    @staticmethod
+    def is_persisted(url: Optional[str]) -> bool:
+        """视频URL是否已经在本TOS存储桶中"""
+        return tos_service is not None and tos_service.is_own_url(url)
+
+    @staticmethod
+    def _download_to_tos(url: str, key: str, content_type: str) -> str:
+        """边下载边分片上传，不在内存中缓存完整文件"""
+        with track_upstream("video_fetch", "stream_to_tos"), requests.get(url, stream=True, timeout=(10, 60)) as response:
+            response.raise_for_status()
+            return tos_service.upload_stream(
+                key=key,
+                chunks=response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE),
+                content_type=response.headers.get("Content-Type") or content_type,
+                part_size=settings.VIDEO_PERSIST_PART_SIZE_MB * 1024 * 1024
+            )
+
+    @staticmethod
+    def _copy_thumbnail(url: str, key: str) -> Optional[str]:
+        """转存封面图（封面较小，直接整体上传）；失败时返回None"""
+        try:
+            with track_upstream("video_fetch", "thumbnail"):
+                response = requests.get(url, timeout=30)
+                response.raise_for_status()
+            return tos_service.upload_file(
+                key=key,
+                content=response.content,
+                content_type=response.headers.get("Content-Type") or "image/jpeg"
+            )
+        except Exception as e:
+            logger.warning(f"[视频转存] ⚠️ 封面转存失败 {url}: {e}")
+            return None
+
+    def persist_video(self, video_id: str) -> Dict[str, Any]:
+        """
+        把单个视频转存到TOS（同步函数，异步代码中请用 persist 调用）
+
+        Args:
+            video_id: 视频ID
+
+        Returns:
+            {"videoId": ..., "success": bool, "url"/"skipped"/"error": ...}
+        """
+        db = SessionLocal()
+        try:
+            video = db.query(Video).filter(Video.id == video_id).first()
+            if not video:
+                return {"videoId": video_id, "success": False, "error": "视频不存在"}
+            if video.status != 'completed' or not video.video_url:
+                return {"videoId": video_id, "success": False, "skipped": "视频未完成"}
+            if tos_service.is_own_url(video.video_url):
+                return {"videoId": video_id, "success": True, "skipped": "已转存", "url": video.video_url}
+
+            source_url = video.video_url
+            source_thumbnail = video.thumbnail_url
+            base_key = f"videos/{video.user_id}/{video.id}"
+        finally:
+            db.close()
+
+        logger.info(f"[视频转存] 开始转存视频 {video_id}")
+        try:
+            new_url = self._download_to_tos(source_url, f"{base_key}.mp4", "video/mp4")
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            logger.error(f"[视频转存] ❌ 视频 {video_id} 转存失败: {error}")
+            return {"videoId": video_id, "success": False, "error": error}
+
+        new_thumbnail = source_thumbnail
+        if source_thumbnail and not tos_service.is_own_url(source_thumbnail):
+            new_thumbnail = self._copy_thumbnail(source_thumbnail, f"{base_key}.jpg")
+
+        db = SessionLocal()
+        try:
+            updated = db.query(Video).filter(
+                Video.id == video_id,
+                Video.video_url == source_url  # 转存期间URL被改写过则放弃本次结果
+            ).update({
+                Video.video_url: new_url,
+                Video.thumbnail_url: new_thumbnail,
+                Video.url_expires_at: None,
+                Video.last_url_check: datetime.utcnow(),
+            }, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[视频转存] ❌ 更新视频 {video_id} 失败: {e}")
+            return {"videoId": video_id, "success": False, "error": str(e)}
+        finally:
+            db.close()
+
+        if not updated:
+            return {"videoId": video_id, "success": False, "skipped": "视频URL已变更"}
+
+        logger.info(f"[视频转存] ✅ 视频 {video_id} 已转存: {new_url}")
+        return {"videoId": video_id, "success": True, "url": new_url}
+
+    async def persist(self, video_id: str) -> Dict[str, Any]:
+        """
+        视频完成后的后台处理：在并发限制内转存到TOS，再生成封面和动态预览
+
+        同一视频同时只会处理一次
+        """
+        if video_id in self._in_progress:
+            return {"videoId": video_id, "success": False, "skipped": "正在转存"}
+
+        self._in_progress.add(video_id)
+        try:
+            if self.enabled:
+                async with self._semaphore:
+                    result = await asyncio.to_thread(self.persist_video, video_id)
+            else:
+                result = {"videoId": video_id, "success": False, "skipped": "转存未启用"}
+
+            # 封面从TOS副本截取；未启用转存时直接读取原视频
+            if result.get("success") or not self.enabled:
+                result["thumbnails"] = await thumbnail_service.generate(video_id)
+
+            return result
+        finally:
+            self._in_progress.discard(video_id)
+
+    def schedule(self, video_id: str) -> None:
+        """在后台处理视频（不等待结果）"""
+        if not self.enabled and not thumbnail_service.enabled:
+            return
+        task = asyncio.create_task(self.persist(video_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def backfill(self, limit: int = 100) -> Dict[str, Any]:
+        """
+        转存尚未过期的历史视频
+
+        Args:
+            limit: 本次最多处理的视频数
+
+        Returns:
+            {"total": N, "succeeded": M, "failed": K, "results": [...]}
+        """
+        def load_ids():
+            db = SessionLocal()
+            try:
+                own_prefix = tos_service.get_file_url("")
+                rows = db.query(Video.id).filter(
+                    Video.status == 'completed',
+                    Video.video_url.isnot(None),
+                    ~Video.video_url.startswith(own_prefix),
+                    or_(Video.url_expires_at.is_(None), Video.url_expires_at > datetime.utcnow())
+                ).order_by(Video.url_expires_at.asc()).limit(limit).all()
+                return [row[0] for row in rows]
+            finally:
+                db.close()
+
+        if not self.enabled:
+            return {"total": 0, "succeeded": 0, "failed": 0, "results": []}
+
+        video_ids = await asyncio.to_thread(load_ids)
+        logger.info(f"[视频转存] 回填开始: {len(video_ids)} 个视频")
+
+        results = await asyncio.gather(*(self.persist(video_id) for video_id in video_ids))
+        succeeded = sum(1 for r in results if r.get("success") and not r.get("skipped"))
+        failed = sum(1 for r in results if not r.get("success") and not r.get("skipped"))
+
+        log = logger.warning if failed else logger.info
+        log(f"[视频转存] 回填结束: 成功 {succeeded}, 失败 {failed}")
+        return {"total": len(video_ids), "succeeded": succeeded, "failed": failed, "results": results}
+
+
+# 创建全局视频转存服务实例
+video_persist_service = VideoPersistService()
@@ -0,0 +1,121 @@
+"""
+测试邮件发送队列
+- 进程内队列 + file 发送端（不需要SMTP）
+- 发送失败时按退避重试，超过次数后放弃
+- 控制台发送端不输出验证码
+"""
+import io
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import settings
+from services.mail_service import MailService, MemoryMailQueue, FileSink, StdoutSink
+
+
+class FlakySink:
+    """前 fail_times 次发送失败的发送端"""
+
+    name = "flaky"
+
+    def __init__(self, fail_times):
+        self.fail_times = fail_times
+        self.calls = 0
+
+    def send_batch(self, mails):
+        self.calls += 1
+        return ["连接超时" if self.calls <= self.fail_times else None for _ in mails]
+
+    def close(self):
+        pass
+
+
+def test_file_sink_batches():
+    """入队立即返回，worker按批写入文件"""
+    path = os.path.join(tempfile.mkdtemp(), "mail.jsonl")
+    service = MailService(queue=MemoryMailQueue(), sink=FileSink(path))
+
+    async def run():
+        ids = [await service.enqueue(f"user{i}@example.com", "验证码", f"<h1>{i}</h1>") for i in range(45)]
+        assert service.queue.size() == 45
+
+        batches = 0
+        while await service.process_batch():
+            batches += 1
+        return ids, batches
+
+    ids, batches = asyncio.run(run())
+    assert batches == -(-45 // settings.MAIL_BATCH_SIZE), batches
+
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["id"] for r in records] == ids
+    assert service.sent == 45
+    print(f"  45 封邮件分 {batches} 批写入 {path}")
+
+
+def test_retry_then_give_up():
+    """失败后退避重试；一直失败时超过 MAIL_MAX_RETRIES 放弃"""
+    saved = settings.MAIL_RETRY_BASE_SECONDS, settings.MAIL_MAX_RETRIES
+    settings.MAIL_RETRY_BASE_SECONDS = 0.01
+    settings.MAIL_MAX_RETRIES = 3
+    try:
+        async def run_flaky():
+            service = MailService(queue=MemoryMailQueue(), sink=FlakySink(fail_times=1))
+            await service.enqueue("retry@example.com", "验证码", "<h1>1</h1>")
+            await service.process_batch()
+            assert service.sent == 0
+            await service.process_batch(timeout=1)
+            return service
+
+        service = asyncio.run(run_flaky())
+        assert service.sent == 1, service.sent
+        print("  第1次失败，重试后发送成功")
+
+        async def run_broken():
+            service = MailService(queue=MemoryMailQueue(), sink=FlakySink(fail_times=100))
+            await service.enqueue("fail@example.com", "验证码", "<h1>2</h1>")
+            for _ in range(settings.MAIL_MAX_RETRIES):
+                await service.process_batch(timeout=1)
+            return service
+
+        service = asyncio.run(run_broken())
+        assert service.failed == 1 and service.sink.calls == settings.MAIL_MAX_RETRIES
+        print(f"  连续失败 {settings.MAIL_MAX_RETRIES} 次后放弃")
+    finally:
+        settings.MAIL_RETRY_BASE_SECONDS, settings.MAIL_MAX_RETRIES = saved
+
+
+def test_stdout_sink_redacts_code():
+    """控制台发送端不输出验证码"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        StdoutSink().send_batch([
+            {"id": "1", "to": "code@example.com", "subject": "验证码", "html": "<h1>483920</h1>"}
+        ])
+    assert "483920" not in output.getvalue()
+    assert "code@example.com" in output.getvalue()
+    print("  验证码已打码")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("邮件发送队列测试")
+    print("=" * 80)
+
+    print("\n[file 发送端]")
+    test_file_sink_batches()
+
+    print("\n[重试]")
+    test_retry_then_give_up()
+
+    print("\n[stdout 发送端]")
+    test_stdout_sink_redacts_code()
+
+    print("\n✅ 邮件发送队列正常！")
+    print("=" * 80)
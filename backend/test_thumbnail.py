@@ -0,0 +1,53 @@
+"""
+测试视频封面和动态预览生成
+- 默认使用 stub 解码器（不需要 ffmpeg）
+- 传入视频路径时使用本地 ffmpeg：python test_thumbnail.py sample.mp4
+"""
+import io
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from services.thumbnail_service import render_previews, FFmpegDecoder
+
+
+def check_previews(images, frame_count):
+    """校验封面是JPEG、预览是多帧WebP"""
+    poster = Image.open(io.BytesIO(images["poster"]))
+    assert poster.format == "JPEG", poster.format
+
+    preview = Image.open(io.BytesIO(images["preview"]))
+    assert preview.format == "WEBP", preview.format
+    assert getattr(preview, "n_frames", 1) == frame_count, preview.n_frames
+
+    print(f"  封面: {poster.size} {len(images['poster'])} bytes")
+    print(f"  预览: {preview.size} {preview.n_frames} 帧 {len(images['preview'])} bytes")
+
+
+def test_stub_decoder_in_process_pool():
+    """stub 解码器在进程池中生成封面和预览"""
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        images = pool.submit(render_previews, "unused.mp4", "stub", 160, 6, 2.0, 0.5).result()
+    check_previews(images, 6)
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("视频封面和动态预览测试")
+    print("=" * 80)
+
+    print("\n[stub 解码器]")
+    test_stub_decoder_in_process_pool()
+
+    if len(sys.argv) > 1:
+        if not FFmpegDecoder.available():
+            print("\n⚠️ 未找到 ffmpeg，跳过真实视频测试")
+        else:
+            print(f"\n[ffmpeg 解码器] {sys.argv[1]}")
+            check_previews(render_previews(sys.argv[1], "ffmpeg", 320, 12, 3.0, 1.0), 12)
+
+    print("\n✅ 封面和动态预览生成正常！")
+    print("=" * 80)
@@ -0,0 +1,90 @@
+"""
+测试微信支付回调验签和平台证书缓存
+使用 test_fixtures/ 中的自签名证书模拟微信支付平台证书（不访问网络）
+"""
+import os
+import sys
+import time
+import base64
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from wechat_pay import PlatformCertificateManager
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures")
+FIXTURE_SERIAL = "5157F09EFDC096DE15EBE81A47057A7232F4B2B1"
+TEST_API_V3_KEY = "0123456789abcdef0123456789abcdef"
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def sign_callback(timestamp, nonce, body):
+    """用测试证书的私钥模拟微信对回调签名"""
+    private_key = serialization.load_pem_private_key(read_fixture("wechat_platform_key.pem").encode(), password=None)
+    message = f"{timestamp}\n{nonce}\n{body}\n".encode("utf-8")
+    return base64.b64encode(private_key.sign(message, padding.PKCS1v15(), hashes.SHA256())).decode()
+
+
+def test_verify_callback():
+    """有效签名通过；篡改、过期、未知序列号都被拒绝"""
+    manager = PlatformCertificateManager(cert_dir=tempfile.mkdtemp())
+    assert manager.add_certificate(read_fixture("wechat_platform_cert.pem")) == FIXTURE_SERIAL
+
+    body = '{"id":"EV-2018022511223320873","event_type":"TRANSACTION.SUCCESS"}'
+    timestamp, nonce = str(int(time.time())), "fdasflkja484w"
+    signature = sign_callback(timestamp, nonce, body)
+
+    assert manager.verify(timestamp, nonce, body, signature, FIXTURE_SERIAL)
+    assert manager.verify(timestamp, nonce, body, signature, FIXTURE_SERIAL.lower())
+    assert not manager.verify(timestamp, nonce, body.replace("SUCCESS", "FAILED"), signature, FIXTURE_SERIAL)
+    assert not manager.verify(timestamp, nonce, body, signature, "0000")
+
+    stale = str(int(time.time()) - 3600)
+    assert not manager.verify(stale, nonce, body, sign_callback(stale, nonce, body), FIXTURE_SERIAL)
+    print("  有效签名通过，篡改/过期/未知证书被拒绝")
+
+
+def test_disk_cache_and_decrypt():
+    """下载的加密证书解密后写入本地目录，新实例可直接从磁盘加载"""
+    cert_dir = tempfile.mkdtemp()
+    nonce, associated_data = "43a1b5c9d8e7", "certificate"
+    ciphertext = AESGCM(TEST_API_V3_KEY.encode()).encrypt(
+        nonce.encode(), read_fixture("wechat_platform_cert.pem").encode(), associated_data.encode()
+    )
+
+    manager = PlatformCertificateManager(cert_dir=cert_dir)
+    serial = manager.add_encrypted_certificate({
+        "algorithm": "AEAD_AES_256_GCM",
+        "nonce": nonce,
+        "associated_data": associated_data,
+        "ciphertext": base64.b64encode(ciphertext).decode(),
+    }, api_v3_key=TEST_API_V3_KEY)
+    assert os.path.exists(os.path.join(cert_dir, f"{serial}.pem"))
+
+    reloaded = PlatformCertificateManager(cert_dir=cert_dir)
+    assert reloaded.load_from_disk() == 1
+    assert reloaded.get_public_key(FIXTURE_SERIAL) is not None
+    print(f"  证书 {serial} 解密并缓存到 {cert_dir}")
+
+
+if __name__ == "__main__":
+    print("=" * 80)
+    print("微信支付回调验签测试")
+    print("=" * 80)
+
+    print("\n[回调验签]")
+    test_verify_callback()
+
+    print("\n[平台证书缓存]")
+    test_disk_cache_and_decrypt()
+
+    print("\n✅ 回调验签和平台证书缓存正常！")
+    print("=" * 80)
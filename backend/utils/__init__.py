@@ -3,10 +3,36 @@
 """
 
 from .api_key_pool import APIKeyPool
-from .helpers import build_public_url, format_timestamp
+from .helpers import (
+    build_public_url,
+    format_timestamp,
+    build_derivative_key,
+    build_derivative_url,
+    pick_derivative_url,
+    build_srcset,
+    image_variant_fields,
+    get_client_ip,
+)
+from .rate_limiter import AsyncRateLimiter
+from .logger import get_logger, setup_logging, shutdown_logging, truncate_payload
+from .metrics import track_upstream, track_tos, render_metrics
 
 __all__ = [
     "APIKeyPool",
+    "AsyncRateLimiter",
     "build_public_url",
     "format_timestamp",
+    "build_derivative_key",
+    "build_derivative_url",
+    "pick_derivative_url",
+    "build_srcset",
+    "image_variant_fields",
+    "get_client_ip",
+    "get_logger",
+    "setup_logging",
+    "shutdown_logging",
+    "truncate_payload",
+    "track_upstream",
+    "track_tos",
+    "render_metrics",
 ]
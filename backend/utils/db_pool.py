@@ -0,0 +1,162 @@
+"""
+数据库连接池配置与监控
+- InstrumentedQueuePool：记录取连接的等待时间和超时（db_pool_* 指标），超时时打印告警
+- 空闲探活：只对闲置超过阈值的连接执行 SELECT 1，代替每次借出都探活的 pool_pre_ping
+- PgBouncer 事务模式：不在应用侧做连接池（NullPool），由 PgBouncer 复用服务端连接
+
+相关环境变量见 .env.example 的「数据库连接池配置」
+"""
+
+import os
+import time
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+from utils.logger import get_logger
+from utils.metrics import (
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_PINGS,
+    add_collector,
+)
+
+logger = get_logger(__name__)
+
+# 探活方式：always（SQLAlchemy 自带，每次借出都探活）/ idle（只探闲置连接）/ off
+PRE_PING_MODES = ("always", "idle", "off")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录取连接等待时间和超时的 QueuePool"""
+
+    pool_name = "primary"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            waited = time.perf_counter() - start
+            DB_POOL_TIMEOUTS.inc(self.pool_name)
+            DB_POOL_CHECKOUT_WAIT.observe(self.pool_name, value=waited)
+            logger.warning(
+                f"[DATABASE] 连接池 {self.pool_name} 已耗尽，等待 {waited:.1f}s 超时"
+                f"（size={self.size()}, checked_out={self.checkedout()}, overflow={self.overflow()}）"
+            )
+            raise
+        DB_POOL_CHECKOUT_WAIT.observe(self.pool_name, value=time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，保留指标标签
+        pool = super().recreate()
+        pool.pool_name = self.pool_name
+        return pool
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+def create_pooled_engine(url: str, name: str = "primary", prefix: str = "DB_", **kwargs):
+    """
+    按环境变量配置连接池并创建引擎
+
+    Args:
+        url: 数据库连接串
+        name: 指标中的 pool 标签
+        prefix: 环境变量前缀，只读副本等其他库可以用单独的一组配置
+        **kwargs: 其他 create_engine 参数
+
+    Returns:
+        已挂上监控的 SQLAlchemy 引擎
+    """
+    options = dict(kwargs)
+    if url.startswith("sqlite"):
+        # SQLite 连接会在线程池的不同线程中使用
+        options["connect_args"] = {"check_same_thread": False}
+
+    if _env_bool(f"{prefix}PGBOUNCER", False):
+        # 事务模式下同一会话的语句可能落在不同服务端连接上，应用侧不保留连接，也无需探活
+        engine = create_engine(url, poolclass=NullPool, **options)
+        instrument_pool(engine, name)
+        return engine
+
+    pre_ping = os.getenv(f"{prefix}POOL_PRE_PING", "idle").lower()
+    if pre_ping not in PRE_PING_MODES:
+        raise ValueError(f"{prefix}POOL_PRE_PING 只能是 {' / '.join(PRE_PING_MODES)}，当前为 {pre_ping}")
+
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=int(os.getenv(f"{prefix}POOL_SIZE", 5)),
+        max_overflow=int(os.getenv(f"{prefix}MAX_OVERFLOW", 10)),
+        pool_timeout=float(os.getenv(f"{prefix}POOL_TIMEOUT", 30)),
+        pool_recycle=int(os.getenv(f"{prefix}POOL_RECYCLE", 1800)),
+        pool_use_lifo=_env_bool(f"{prefix}POOL_USE_LIFO", True),
+        pool_pre_ping=pre_ping == "always",
+        **options
+    )
+    pre_ping_idle = float(os.getenv(f"{prefix}POOL_PRE_PING_IDLE", 30)) if pre_ping == "idle" else -1
+    instrument_pool(engine, name, pre_ping_idle)
+    return engine
+
+
+def instrument_pool(engine, name: str, pre_ping_idle: float = -1) -> None:
+    """
+    为引擎的连接池挂上监控和空闲探活
+
+    Args:
+        engine: SQLAlchemy 引擎
+        name: 指标中的 pool 标签
+        pre_ping_idle: 连接闲置超过该秒数时借出前探活，负数表示不探活
+    """
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.pool_name = name
+
+    def update_gauges() -> None:
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            DB_POOL_CHECKED_OUT.set(name, value=pool.checkedout())
+            DB_POOL_OVERFLOW.set(name, value=max(0, pool.overflow()))
+
+    add_collector(update_gauges)
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, record):
+        DB_POOL_CONNECTIONS.inc(name, "connect")
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_connection, record, exception):
+        DB_POOL_CONNECTIONS.inc(name, "invalidate")
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, record):
+        record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, record, proxy):
+        checked_in_at = record.info.get("checked_in_at")
+        if pre_ping_idle >= 0 and checked_in_at is not None and time.monotonic() - checked_in_at > pre_ping_idle:
+            _ping(dbapi_connection, name)
+
+
+def _ping(dbapi_connection, name: str) -> None:
+    """探活失败时抛出 DisconnectionError，连接池会丢弃该连接并换一个重试"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("SELECT 1")
+    except Exception as e:
+        DB_POOL_PINGS.inc(name, "failed")
+        logger.warning(f"[DATABASE] 闲置连接已失效，重新连接: {e}")
+        raise exc.DisconnectionError() from e
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+    DB_POOL_PINGS.inc(name, "ok")
@@ -2,6 +2,7 @@
 辅助工具函数
 """
 
+import ipaddress
 from datetime import datetime
 from typing import Optional
 
@@ -129,3 +130,137 @@ def generate_unique_key(prefix: str = "uploads", extension: str = "") -> str:
     unique_id = uuid.uuid4().hex[:8]
     
     return f"{prefix}/{date_str}/{timestamp}-{unique_id}{extension}"
+
+
+def build_derivative_key(key: str, width: int, fmt: str = "webp") -> str:
+    """
+    构建衍生图（缩放版本）的对象键，与原图放在同一目录
+    
+    Args:
+        key: 原图对象键
+        width: 衍生图宽度（像素）
+        fmt: 衍生图格式（webp / avif）
+    
+    Returns:
+        衍生图对象键
+    
+    Example:
+        >>> build_derivative_key("uploads/20240101/a.jpg", 640)
+        'uploads/20240101/a.jpg@640w.webp'
+    """
+    return f"{key}@{width}w.{fmt}"
+
+
+def build_derivative_url(url: str, width: int, fmt: str = "webp") -> str:
+    """
+    根据原图URL构建衍生图URL
+    
+    Example:
+        >>> build_derivative_url("https://b.tos-cn-beijing.volces.com/uploads/a.jpg", 320)
+        'https://b.tos-cn-beijing.volces.com/uploads/a.jpg@320w.webp'
+    """
+    return build_derivative_key(url, width, fmt)
+
+
+def pick_derivative_url(
+    url: str,
+    display_width: int,
+    widths: list[int],
+    fmt: str = "webp",
+    pixel_ratio: float = 1.0
+) -> str:
+    """
+    选择能覆盖显示宽度的最小衍生图
+    
+    Args:
+        url: 原图URL
+        display_width: 显示宽度（CSS像素）
+        widths: 已生成的衍生图宽度列表
+        fmt: 衍生图格式
+        pixel_ratio: 设备像素比
+    
+    Returns:
+        衍生图URL；没有可用宽度时返回原图URL
+    
+    Example:
+        >>> pick_derivative_url("https://x/a.jpg", 200, [320, 640, 1280], pixel_ratio=2)
+        'https://x/a.jpg@640w.webp'
+    """
+    if not widths:
+        return url
+    
+    needed = display_width * pixel_ratio
+    candidates = sorted(widths)
+    width = next((w for w in candidates if w >= needed), candidates[-1])
+    return build_derivative_url(url, width, fmt)
+
+
+def build_srcset(url: str, widths: list[int], fmt: str = "webp") -> str:
+    """
+    构建 <img srcset> 属性值
+    
+    Example:
+        >>> build_srcset("https://x/a.jpg", [320, 640])
+        'https://x/a.jpg@320w.webp 320w, https://x/a.jpg@640w.webp 640w'
+    """
+    return ", ".join(f"{build_derivative_url(url, w, fmt)} {w}w" for w in sorted(widths))
+
+
+def image_variant_fields(url: str, widths: list[int], display_width: int, pixel_ratio: float = 2.0) -> dict:
+    """
+    列表/详情接口中图片的衍生图字段
+    
+    Args:
+        url: 原图URL
+        widths: 已生成的衍生图宽度（没有衍生图时为空，thumbnail 返回原图）
+        display_width: 前端显示宽度（CSS像素）
+        pixel_ratio: 按该设备像素比挑选 thumbnail
+    
+    Example:
+        >>> image_variant_fields("https://x/a.jpg", [320, 640], 160)
+        {'url': 'https://x/a.jpg', 'thumbnail': 'https://x/a.jpg@320w.webp', 'srcset': 'https://x/a.jpg@320w.webp 320w, https://x/a.jpg@640w.webp 640w'}
+    """
+    return {
+        "url": url,
+        "thumbnail": pick_derivative_url(url, display_width, widths, pixel_ratio=pixel_ratio),
+        "srcset": build_srcset(url, widths) if widths else None,
+    }
+
+
+def _is_trusted(address: str, trusted_proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def get_client_ip(headers, peer: Optional[str] = None, trusted_proxies=()) -> Optional[str]:
+    """
+    获取客户端IP
+    
+    只有直连地址是受信任的反向代理时才读取 X-Forwarded-For / X-Real-IP，
+    并从右往左取第一个不受信任的地址（左边的地址由客户端自己填写，可以伪造）
+    
+    Args:
+        headers: 请求头（如 request.headers）
+        peer: 直连地址（如 request.client.host）
+        trusted_proxies: 受信任代理的网段列表（ipaddress.ip_network）
+    
+    Example:
+        >>> proxies = [ipaddress.ip_network("10.0.0.0/8")]
+        >>> get_client_ip({"x-forwarded-for": "6.6.6.6, 1.2.3.4, 10.0.0.2"}, "10.0.0.1", proxies)
+        '1.2.3.4'
+        >>> get_client_ip({"x-forwarded-for": "6.6.6.6"}, "1.2.3.4", proxies)
+        '1.2.3.4'
+    """
+    if not peer or not _is_trusted(peer, trusted_proxies):
+        return peer
+
+    hops = [hop.strip() for hop in (headers.get("x-forwarded-for") or "").split(",") if hop.strip()]
+    if not hops:
+        return (headers.get("x-real-ip") or "").strip() or peer
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted_proxies):
+            return hop
+    return hops[0]
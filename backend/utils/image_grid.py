@@ -0,0 +1,67 @@
+"""
+宫格图拼接（纯函数，不涉及网络和存储）
+- 2-4张 → 2x2，5-9张 → 3x3
+- 每张图按比例缩放后居中裁剪填满单元格，白色背景，输出JPEG
+"""
+
+import io
+from typing import List, Tuple
+
+from PIL import Image
+
+# 单元格边长（像素）
+CELL_SIZE = 400
+
+
+def grid_size_for(count: int) -> int:
+    """图片数量对应的宫格边长（2或3）"""
+    return 2 if count <= 4 else 3
+
+
+def compose_grid(
+    contents: List[bytes],
+    cell_size: int = CELL_SIZE,
+    quality: int = 85,
+    resample: int = Image.Resampling.LANCZOS,
+    draft: bool = False,
+) -> Tuple[bytes, int]:
+    """
+    把多张图片拼接成宫格JPEG
+
+    Args:
+        contents: 各图片的原始字节（2-9张，超出宫格容量的部分忽略）
+        cell_size: 单元格边长
+        quality: JPEG质量
+        resample: 缩放滤镜
+        draft: JPEG按接近目标尺寸的缩小比例解码（更快、更省内存，画质略有差异）
+
+    Returns:
+        (JPEG字节, 宫格边长)
+    """
+    grid_size = grid_size_for(len(contents))
+    canvas = Image.new("RGB", (cell_size * grid_size, cell_size * grid_size), (255, 255, 255))
+
+    for i, content in enumerate(contents[:grid_size * grid_size]):
+        row, col = divmod(i, grid_size)
+        with Image.open(io.BytesIO(content)) as img:
+            canvas.paste(_fit_cell(img, cell_size, resample, draft), (col * cell_size, row * cell_size))
+
+    output = io.BytesIO()
+    canvas.save(output, format="JPEG", quality=quality)
+    return output.getvalue(), grid_size
+
+
+def _fit_cell(img: Image.Image, cell_size: int, resample: int, draft: bool) -> Image.Image:
+    """保持比例缩放到覆盖单元格，再居中裁剪"""
+    if draft and img.format == "JPEG":
+        # draft 只会缩小到不小于请求尺寸的 1/2、1/4、1/8，之后仍按原逻辑精确缩放
+        scale = max(cell_size / img.width, cell_size / img.height)
+        img.draft("RGB", (int(img.width * scale) + 1, int(img.height * scale) + 1))
+
+    scale = max(cell_size / img.width, cell_size / img.height)
+    scaled = (int(img.width * scale), int(img.height * scale))
+    resized = img.resize(scaled, resample)
+
+    offset_x = (scaled[0] - cell_size) // 2
+    offset_y = (scaled[1] - cell_size) // 2
+    return resized.crop((offset_x, offset_y, offset_x + cell_size, offset_y + cell_size))
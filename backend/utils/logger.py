@@ -0,0 +1,201 @@
+"""
+日志工具
+- 日志记录经 QueueHandler 放入内存队列，由后台线程（QueueListener）格式化并写出，请求路径上没有IO；
+  大对象用 logger.debug("...: %s", obj) 传参，截断和序列化同样在后台线程完成
+- 级别：全局 LOG_LEVEL，LOG_LEVELS 按模块覆盖（如 "routers.video=WARNING"）
+- 格式：LOG_FORMAT=text 或 json（一行一条，extra 字段一并输出）
+- 采样：LOG_SAMPLE_RATES 对高频模块的 INFO 及以下日志按比例保留，警告和错误全部保留
+- 截断：超长消息和字段按 LOG_MAX_FIELD_LENGTH 截断，base64 / data URI 只保留长度
+"""
+
+import re
+import sys
+import json
+import queue
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from config import settings
+
+
+# LogRecord 自带的属性，其余属性视为 extra 字段
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# 疑似 base64 的长串（图片数据等）
+_BASE64_RE = re.compile(r"^[A-Za-z0-9+/=\s]{200,}$")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _parse_mapping(value: str) -> Dict[str, str]:
+    """解析 "a=1,b=2" 格式的配置"""
+    result = {}
+    for item in (value or "").split(","):
+        name, sep, setting = item.partition("=")
+        if sep and name.strip() and setting.strip():
+            result[name.strip()] = setting.strip()
+    return result
+
+
+def truncate_payload(value: Any, max_length: Optional[int] = None, _depth: int = 0) -> Any:
+    """
+    截断日志中的大字段（递归处理 dict / list）
+
+    Args:
+        value: 任意可JSON序列化的值
+        max_length: 字符串最大长度，默认 LOG_MAX_FIELD_LENGTH
+
+    Example:
+        >>> truncate_payload({"data": "data:image/png;base64,iVBORw0KGgo"})
+        {'data': '<data:image/png;base64 33 chars>'}
+    """
+    max_length = max_length or settings.LOG_MAX_FIELD_LENGTH
+    if _depth > 10:
+        return "<...>"
+
+    if isinstance(value, str):
+        if value.startswith("data:") and ";base64," in value[:100]:
+            return f"<{value.split(',', 1)[0]} {len(value)} chars>"
+        if len(value) > max_length:
+            sample = value[:1000]
+            if _BASE64_RE.match(sample) and len(set(sample)) > 16:
+                return f"<base64 {len(value)} chars>"
+            return f"{value[:max_length]}...<{len(value) - max_length} more chars>"
+        return value
+    if isinstance(value, dict):
+        return {k: truncate_payload(v, max_length, _depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [truncate_payload(v, max_length, _depth + 1) for v in value[:20]]
+        if len(value) > 20:
+            items.append(f"<{len(value) - 20} more items>")
+        return items
+    return value
+
+
+def _truncate_args(record: logging.LogRecord) -> None:
+    """截断 %s 参数（如 logger.debug("响应: %s", result)），大对象不会被完整转成字符串"""
+    if isinstance(record.args, tuple):
+        record.args = tuple(truncate_payload(arg) for arg in record.args)
+    elif isinstance(record.args, dict):
+        record.args = truncate_payload(record.args)
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化日志：一行一个JSON对象"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        _truncate_args(record)
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate_payload(record.getMessage()),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = truncate_payload(value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """文本日志：时间 级别 模块 消息（消息超长时截断）"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        _truncate_args(record)
+        return super().format(record)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = truncate_payload(record.message)
+        return super().formatMessage(record)
+
+
+class SamplingFilter(logging.Filter):
+    """按模块前缀对 INFO 及以下的日志采样"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # 长前缀优先匹配
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    只入队不格式化的 QueueHandler
+
+    标准 QueueHandler.prepare() 会在调用线程里拼好消息，这里把消息拼接、截断和JSON序列化
+    都留给 QueueListener 线程；队列在进程内，记录不需要能被pickle
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging() -> None:
+    """
+    配置根日志（在应用启动时调用一次）
+
+    根 logger 只挂一个 QueueHandler，格式化和写 stdout 在 QueueListener 线程中完成
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT.lower() == "json" else TextFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = DeferredQueueHandler(log_queue)
+
+    sample_rates = {}
+    for name, rate in _parse_mapping(settings.LOG_SAMPLE_RATES).items():
+        try:
+            sample_rates[name] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            pass
+    if sample_rates:
+        # 在入队前丢弃，被采样掉的日志不占队列
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    for name, level in _parse_mapping(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    # uvicorn 的访问日志也走同一个队列
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """写出队列中剩余的日志并停止后台线程（在应用关闭时调用）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取模块 logger（一般传 __name__）"""
+    return logging.getLogger(name)
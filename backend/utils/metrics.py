@@ -0,0 +1,358 @@
+"""
+请求级指标（Prometheus 文本格式，GET /metrics 导出）
+- 按路由模板统计请求数、耗时直方图、进行中的请求数
+- 每个请求执行的SQL条数和耗时（SQLAlchemy 游标事件）
+- 上游调用耗时：按 provider / 操作 / API Key（脱敏）统计
+- TOS 操作耗时
+- 数据库连接池：取连接等待时间、占用/溢出连接数、超时、空闲连接探活
+- 只读副本：复制延迟、只读会话去向
+
+指标保存在进程内存中，多worker部署时每个worker各自导出
+"""
+
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 上游调用一般更慢
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# 每个请求的SQL条数
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """指标基类：按标签值分组保存"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in sorted(items):
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def _render_sample(self, labels, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """只增计数器"""
+
+    type_name = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    type_name = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels: str, value: float) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数..., 总和, 总数]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _render_sample(self, labels, state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state):
+            cumulative += count
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', _format_value(bound)))} {cumulative}"
+            )
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', '+Inf'))} {state[-1]}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-2])}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {state[-1]}")
+        return lines
+
+
+# ======================
+# 指标定义
+# ======================
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP请求数", ("method", "route", "status"))
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP请求耗时（秒）", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "正在处理的HTTP请求数", ("method",))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "http_request_db_queries", "每个请求执行的SQL条数", ("method", "route"), buckets=QUERY_COUNT_BUCKETS)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL执行耗时（秒）", ())
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "上游调用耗时（秒）",
+    ("provider", "operation", "key", "outcome"), buckets=UPSTREAM_BUCKETS)
+TOS_LATENCY = Histogram(
+    "tos_operation_duration_seconds", "TOS操作耗时（秒）", ("operation", "outcome"), buckets=UPSTREAM_BUCKETS)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "从连接池取连接的等待时间（秒，含新建连接）", ("pool",))
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "等待连接池超时次数", ("pool",))
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "已借出的连接数", ("pool",))
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "超出 pool_size 的溢出连接数", ("pool",))
+DB_POOL_CONNECTIONS = Counter(
+    "db_pool_connection_events_total", "连接新建/失效次数", ("pool", "event"))
+DB_POOL_PINGS = Counter(
+    "db_pool_idle_pings_total", "空闲连接探活次数", ("pool", "outcome"))
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "只读副本复制延迟（秒，最近一次检测）", ("replica",))
+DB_READ_ROUTES = Counter(
+    "db_read_routes_total", "只读会话的去向（副本名或 primary_fallback）", ("target",))
+
+REGISTRY: List[_Metric] = [
+    HTTP_REQUESTS,
+    HTTP_LATENCY,
+    HTTP_IN_FLIGHT,
+    DB_QUERIES_PER_REQUEST,
+    DB_QUERY_LATENCY,
+    UPSTREAM_LATENCY,
+    TOS_LATENCY,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_OVERFLOW,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_PINGS,
+    DB_REPLICA_LAG,
+    DB_READ_ROUTES,
+]
+
+
+# 导出前调用的采集函数（连接池占用数等按需读取的当前值）
+_COLLECTORS: List[Callable[[], None]] = []
+
+
+def add_collector(collector: Callable[[], None]) -> None:
+    """注册导出前执行的采集函数，用来刷新 Gauge"""
+    _COLLECTORS.append(collector)
+
+
+def render_metrics() -> str:
+    """导出所有指标（Prometheus 文本格式 0.0.4）"""
+    for collector in _COLLECTORS:
+        collector()
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ======================
+# 请求上下文
+# ======================
+
+class RequestStats:
+    """当前请求的统计（SQL条数和耗时），在中间件中创建"""
+
+    __slots__ = ("db_queries", "db_time")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+
+
+# 同步接口和 asyncio.to_thread 都会复制上下文，线程中的SQL也记到同一个请求上
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """当前请求的统计，不在请求中时返回None"""
+    return _request_stats.get()
+
+
+def mask_key(key: Optional[str]) -> str:
+    """API Key 只保留末4位作为标签"""
+    if not key:
+        return "none"
+    return f"...{key[-4:]}"
+
+
+class track_upstream:
+    """
+    记录一次上游调用的耗时（同步或异步代码中都用 with）
+
+    Example:
+        with track_upstream("llm", "chat", key=api_key):
+            response = await asyncio.to_thread(client.chat.completions.create, ...)
+    """
+
+    __slots__ = ("provider", "operation", "key", "_start")
+
+    def __init__(self, provider: str, operation: str, key: Optional[str] = None):
+        self.provider = provider
+        self.operation = operation
+        self.key = mask_key(key) if key is not None else "-"
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        UPSTREAM_LATENCY.observe(
+            self.provider, self.operation, self.key, "error" if exc_type else "ok",
+            value=time.perf_counter() - self._start
+        )
+        return False
+
+
+class track_tos:
+    """记录一次TOS操作的耗时"""
+
+    __slots__ = ("operation", "_start")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        TOS_LATENCY.observe(self.operation, "error" if exc_type else "ok", value=time.perf_counter() - self._start)
+        return False
+
+
+def instrument_engine(engine) -> None:
+    """在数据库引擎上统计SQL条数和耗时（只需调用一次）"""
+    from sqlalchemy import event
+
+    if getattr(engine, "_metrics_instrumented", False):
+        return
+    engine._metrics_instrumented = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_metrics_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        DB_QUERY_LATENCY.observe(value=elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_time += elapsed
+
+
+class MetricsMiddleware:
+    """
+    ASGI中间件：按路由模板（如 /api/videos/{video_id}）记录请求数、耗时和SQL条数
+
+    路由模板在路由匹配后才写入 scope，所以在请求结束时读取；未匹配的请求记为 "<unmatched>"，
+    避免按原始路径产生大量标签
+    """
+
+    def __init__(self, app, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        HTTP_IN_FLIGHT.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method)
+            _request_stats.reset(token)
+
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "<unmatched>"
+            HTTP_REQUESTS.inc(method, route_path, str(status["code"]))
+            HTTP_LATENCY.observe(method, route_path, value=elapsed)
+            DB_QUERIES_PER_REQUEST.observe(method, route_path, value=stats.db_queries)
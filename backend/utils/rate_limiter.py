@@ -0,0 +1,53 @@
+"""
+异步限流工具
+用于控制对上游AI接口的并发数和请求速率
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+
+class AsyncRateLimiter:
+    """异步限流器（并发数 + 每分钟请求数）"""
+
+    def __init__(self, max_concurrency: int = 4, requests_per_minute: Optional[int] = None):
+        """
+        初始化限流器
+
+        Args:
+            max_concurrency: 最大并发数
+            requests_per_minute: 每分钟最多发起的请求数，None表示不限制
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _wait_for_slot(self) -> None:
+        """按固定间隔发放请求配额，平滑突发流量"""
+        if not self._interval:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._interval
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            await self._wait_for_slot()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        return False
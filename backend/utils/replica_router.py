@@ -0,0 +1,125 @@
+"""
+只读副本路由
+- 只读接口（内容广场、管理后台统计和列表）的会话轮流发往各只读副本
+- 定期查询副本的复制延迟，超过阈值或连接失败的副本暂时摘除，全部不可用时回退到主库
+- 写操作和"写后立即读"的接口继续使用主库（get_db）
+
+延迟检测只支持 PostgreSQL 流复制副本，其他数据库视为无延迟
+"""
+
+import time
+import threading
+from typing import List, Optional
+
+from sqlalchemy import event, text
+
+from utils.logger import get_logger
+from utils.metrics import DB_REPLICA_LAG, DB_READ_ROUTES
+
+logger = get_logger(__name__)
+
+# WAL 已全部回放时延迟为 0（主库空闲时 pg_last_xact_replay_timestamp 不会更新）
+_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class _Replica:
+    """一个只读副本的状态"""
+
+    def __init__(self, engine, name: str):
+        self.engine = engine
+        self.name = name
+        self.lag: Optional[float] = None
+        self.healthy = True
+        self.checked_at = 0.0
+
+
+class ReplicaRouter:
+    """
+    只读副本选择器
+
+    Example:
+        router = ReplicaRouter(primary, [replica1, replica2], max_lag=5)
+        engine = router.pick()  # 没有可用副本时返回主库
+    """
+
+    def __init__(self, primary, replicas: List, max_lag: float = 5.0, check_interval: float = 5.0):
+        self.primary = primary
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._replicas = [_Replica(engine, f"replica{i + 1}") for i, engine in enumerate(replicas)]
+        self._next = 0
+        self._lock = threading.Lock()
+
+        for replica in self._replicas:
+            self._watch_disconnects(replica)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._replicas)
+
+    def pick(self):
+        """轮询选择一个可用副本，没有时返回主库"""
+        if not self._replicas:
+            return self.primary
+
+        self._refresh_stale()
+        with self._lock:
+            for _ in range(len(self._replicas)):
+                replica = self._replicas[self._next % len(self._replicas)]
+                self._next += 1
+                if replica.healthy:
+                    DB_READ_ROUTES.inc(replica.name)
+                    return replica.engine
+
+        DB_READ_ROUTES.inc("primary_fallback")
+        return self.primary
+
+    def _refresh_stale(self) -> None:
+        """检测间隔已到的副本重新查询延迟（同一时间只有一个线程去查）"""
+        now = time.monotonic()
+        for replica in self._replicas:
+            if now - replica.checked_at < self.check_interval:
+                continue
+            with self._lock:
+                if now - replica.checked_at < self.check_interval:
+                    continue
+                replica.checked_at = now
+            self._check(replica)
+
+    def _check(self, replica: _Replica) -> None:
+        healthy = replica.healthy
+        try:
+            if replica.engine.dialect.name == "postgresql":
+                with replica.engine.connect() as conn:
+                    replica.lag = float(conn.execute(_LAG_SQL).scalar() or 0)
+            else:
+                replica.lag = 0.0
+            replica.healthy = replica.lag <= self.max_lag
+            DB_REPLICA_LAG.set(replica.name, value=replica.lag)
+        except Exception as e:
+            replica.healthy = False
+            logger.warning(f"[DATABASE] 只读副本 {replica.name} 检测失败: {e}")
+
+        if healthy and not replica.healthy and replica.lag is not None and replica.lag > self.max_lag:
+            logger.warning(f"[DATABASE] 只读副本 {replica.name} 延迟 {replica.lag:.1f}s，暂时摘除")
+        elif not healthy and replica.healthy:
+            logger.info(f"[DATABASE] 只读副本 {replica.name} 已恢复（延迟 {replica.lag:.1f}s）")
+
+    def _watch_disconnects(self, replica: _Replica) -> None:
+        """查询中发现连接断开时立即摘除，等下次检测再恢复"""
+
+        @event.listens_for(replica.engine, "handle_error")
+        def _handle_error(context):
+            if context.is_disconnect and replica.healthy:
+                replica.healthy = False
+                replica.checked_at = time.monotonic()
+                logger.warning(f"[DATABASE] 只读副本 {replica.name} 连接断开，暂时摘除")
+
+    def status(self) -> List[dict]:
+        return [
+            {"name": r.name, "healthy": r.healthy, "lag": r.lag}
+            for r in self._replicas
+        ]
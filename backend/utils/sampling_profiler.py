@@ -0,0 +1,184 @@
+"""
+采样式 CPU 分析器（纯Python，无需额外依赖）
+- 后台线程按固定间隔读取所有线程的当前调用栈（sys._current_frames）
+- 相同调用栈合并计数，可导出为 collapsed stacks（flamegraph.pl / speedscope 均可打开）或 speedscope JSON
+- 开销与采样间隔和线程数成正比，10ms 间隔时通常在 1~3% 以内
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# 调用栈中的一帧：(函数名, 文件, 函数起始行)
+Frame = Tuple[str, str, int]
+
+# 空闲等待（事件循环 select、线程池取任务、锁等待等）的叶子帧，默认不计入
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+    ("socket.py", "readinto"),
+    ("ssl.py", "read"),
+    ("ssl.py", "recv_into"),
+}
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _short_path(filename: str) -> str:
+    """项目内文件显示相对路径，第三方库从 site-packages 之后开始"""
+    if filename.startswith(_BACKEND_DIR):
+        return os.path.relpath(filename, _BACKEND_DIR)
+    marker = "site-packages" + os.sep
+    index = filename.rfind(marker)
+    if index >= 0:
+        return filename[index + len(marker):]
+    return os.path.basename(filename)
+
+
+def _label(frame: Frame) -> str:
+    name, filename, line = frame
+    if not filename:
+        return name  # 线程名
+    return f"{name} ({_short_path(filename)}:{line})"
+
+
+class Profile:
+    """一次采样的结果"""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()  # (根 → 叶子的帧元组) -> 次数
+
+    def to_collapsed(self) -> str:
+        """collapsed stacks：每行 "帧;帧;帧 次数"，可直接生成火焰图"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = ";".join(_label(frame) for frame in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self) -> Dict:
+        """speedscope 文件格式（sampled 类型，权重为秒）"""
+        frame_index: Dict[Frame, int] = {}
+        frames: List[Dict] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+
+        for stack, count in self.stacks.most_common():
+            indices = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    frames.append({"name": _label(frame), "file": _short_path(frame[1]), "line": frame[2]})
+                indices.append(index)
+            samples.append(indices)
+            weights.append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": self.name,
+            "exporter": "soradirector-backend",
+        }
+
+    def summary(self) -> Dict:
+        return {
+            "name": self.name,
+            "startedAt": int(self.started_at * 1000),
+            "duration": round(self.duration, 3),
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+        }
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+
+    Example:
+        profiler = SamplingProfiler(interval=0.01)
+        profiler.start("capture")
+        ...
+        profile = profiler.stop()
+        print(profile.to_collapsed())
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False, max_depth: int = 128):
+        self.interval = max(0.001, interval)
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self._profile: Optional[Profile] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, name: str = "profile") -> None:
+        if self.running:
+            raise RuntimeError("分析器已在运行")
+        self._profile = Profile(name, self.interval)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        profile = self._profile
+        profile.duration = time.time() - profile.started_at
+        return profile
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if len(thread_names) != len(frames):
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = self._walk(frame)
+                if not stack:
+                    continue
+                thread_name = thread_names.get(thread_id, str(thread_id))
+                self._profile.stacks[((thread_name, "", 0),) + stack] += 1
+            self._profile.samples += 1
+
+    def _walk(self, frame) -> Optional[Tuple[Frame, ...]]:
+        code = frame.f_code
+        if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+            return None
+
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
@@ -0,0 +1,154 @@
+"""
+SQL 性能分析（调试/压测时开启，SQL_PROFILE_ENABLED=true）
+- 在数据库引擎的 before/after_cursor_execute 事件中记录每个请求执行的语句和耗时
+- 同一形状的语句（参数不同）在一个请求内重复执行达到阈值时视为疑似 N+1，打印警告
+- 响应头 X-Query-Count / X-Query-Time-Ms 返回本请求的SQL条数和总耗时
+"""
+
+import re
+import time
+import contextvars
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 单个请求最多记录的不同语句数（超出后只计数）
+MAX_SHAPES_PER_REQUEST = 200
+
+# IN 列表展开后的占位符（%(id_1_1)s, %(id_1_2)s, ...）合并为一个
+_PARAM_LIST_RE = re.compile(r"\((?:\s*%\([^)]+\)s\s*,)*\s*%\([^)]+\)s\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    语句形状：合并空白和 IN 列表占位符，参数不同的同一查询得到相同结果
+
+    Example:
+        >>> normalize_statement("SELECT * FROM users WHERE id IN (%(id_1_1)s, %(id_1_2)s)")
+        'SELECT * FROM users WHERE id IN (?)'
+    """
+    statement = _PARAM_LIST_RE.sub("(?)", statement)
+    return _WHITESPACE_RE.sub(" ", statement).strip()
+
+
+class QueryProfile:
+    """一个请求内的SQL统计"""
+
+    __slots__ = ("count", "total_time", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes: Dict[str, List] = {}  # 形状 -> [次数, 总耗时]
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total_time += elapsed
+        shape = normalize_statement(statement)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            if len(self.shapes) >= MAX_SHAPES_PER_REQUEST:
+                return
+            entry = self.shapes[shape] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int, float]]:
+        """重复执行达到阈值的语句（疑似 N+1），按次数降序"""
+        items = [(shape, n, t) for shape, (n, t) in self.shapes.items() if n >= threshold]
+        return sorted(items, key=lambda item: item[1], reverse=True)
+
+    def slowest(self, limit: int = 3) -> List[Tuple[str, int, float]]:
+        """总耗时最多的语句"""
+        items = [(shape, n, t) for shape, (n, t) in self.shapes.items()]
+        return sorted(items, key=lambda item: item[2], reverse=True)[:limit]
+
+
+_profile: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar("query_profile", default=None)
+
+
+def current_query_profile() -> Optional[QueryProfile]:
+    """当前请求的SQL统计（未开启或不在请求中时返回None）"""
+    return _profile.get()
+
+
+def install_query_profiler(engine) -> None:
+    """在数据库引擎上注册游标事件（只需调用一次）"""
+    from sqlalchemy import event
+
+    if getattr(engine, "_query_profiler_installed", False):
+        return
+    engine._query_profiler_installed = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _profile.get() is not None:
+            conn.info.setdefault("_profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _profile.get()
+        starts = conn.info.get("_profile_start")
+        if profile is None or not starts:
+            return
+        profile.record(statement, time.perf_counter() - starts.pop())
+
+
+def _shorten(statement: str, length: int = 200) -> str:
+    return statement if len(statement) <= length else statement[:length] + "..."
+
+
+class QueryProfilerMiddleware:
+    """ASGI中间件：为每个请求创建 QueryProfile，写入响应头并报告 N+1 和慢请求"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(profile.count).encode()))
+                headers.append((b"x-query-time-ms", f"{profile.total_time * 1000:.1f}".encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _profile.reset(token)
+            self._report(scope, profile)
+
+    @staticmethod
+    def _report(scope, profile: QueryProfile) -> None:
+        if not profile.count:
+            return
+
+        route = getattr(scope.get("route"), "path", None) or scope.get("path")
+        request = f"{scope.get('method')} {route}"
+
+        repeated = profile.repeated(max(2, settings.SQL_PROFILE_REPEAT_THRESHOLD))
+        for shape, count, elapsed in repeated[:3]:
+            logger.warning(
+                f"[SQL] ⚠️ 疑似N+1 {request}: 同一语句执行 {count} 次，共 {elapsed * 1000:.1f}ms: {_shorten(shape)}"
+            )
+
+        if repeated or profile.total_time * 1000 >= settings.SQL_PROFILE_SLOW_MS:
+            worst = "; ".join(
+                f"{count}次/{elapsed * 1000:.1f}ms {_shorten(shape, 120)}"
+                for shape, count, elapsed in profile.slowest()
+            )
+            logger.warning(
+                f"[SQL] {request}: {profile.count} 条语句，共 {profile.total_time * 1000:.1f}ms；最耗时: {worst}"
+            )
@@ -9,6 +9,8 @@ import time
 import uuid
 import base64
 import hashlib
+import asyncio
+import threading
 import requests
 from datetime import datetime, timedelta
 from typing import Dict, Optional
@@ -20,8 +22,12 @@ from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.backends import default_backend
 from cryptography.x509 import load_pem_x509_certificate
 
+from utils.logger import get_logger
+
 load_dotenv()
 
+logger = get_logger(__name__)
+
 # 微信支付V3配置
 WECHAT_APP_ID = os.getenv("WECHAT_APP_ID")
 WECHAT_MCH_ID = os.getenv("WECHAT_MCH_ID")
@@ -30,27 +36,141 @@ WECHAT_CERT_SERIAL_NO = os.getenv("WECHAT_CERT_SERIAL_NO")
 WECHAT_PRIVATE_KEY_PATH = os.getenv("WECHAT_PRIVATE_KEY_PATH", "./apiclient_key.pem")
 WECHAT_NOTIFY_URL = os.getenv("WECHAT_NOTIFY_URL", "https://www.semopic.com/api/wechat/callback")
 WECHAT_BODY = os.getenv("WECHAT_BODY", "Semopic积分充值")
+WECHAT_KEY_CHECK_INTERVAL = float(os.getenv("WECHAT_KEY_CHECK_INTERVAL", "5"))  # 检查私钥文件是否更新的间隔（秒）
+WECHAT_PLATFORM_CERT_DIR = os.getenv("WECHAT_PLATFORM_CERT_DIR", "./wechat_certs")  # 平台证书本地缓存目录
+WECHAT_CERT_REFRESH_INTERVAL = int(os.getenv("WECHAT_CERT_REFRESH_INTERVAL", "43200"))  # 平台证书刷新间隔（秒）
+WECHAT_CALLBACK_MAX_SKEW = int(os.getenv("WECHAT_CALLBACK_MAX_SKEW", "300"))  # 回调时间戳允许的误差（秒）
 
 # 微信支付V3 API地址
-WECHAT_PAY_BASE_URL = "https://api.mch.weixin.qq.com"
+WECHAT_PAY_BASE_URL = os.getenv("WECHAT_PAY_BASE_URL", "https://api.mch.weixin.qq.com")  # 压测时指向本地模拟服务
 WECHAT_PAY_NATIVE_URL = f"{WECHAT_PAY_BASE_URL}/v3/pay/transactions/native"
+WECHAT_PAY_CERTS_PATH = "/v3/certificates"
 
 
-def load_private_key():
+class MerchantSigner:
     """
-    加载商户私钥
+    商户私钥签名器
+    
+    私钥只在第一次使用和文件更新（mtime变化）时读取解析，签名热路径不再有磁盘IO和PEM解析；
+    同时统计签名/验签次数和耗时
     """
-    try:
-        with open(WECHAT_PRIVATE_KEY_PATH, 'rb') as f:
-            private_key = serialization.load_pem_private_key(
-                f.read(),
-                password=None,
-                backend=default_backend()
+    
+    def __init__(self, key_path: str, check_interval: float = WECHAT_KEY_CHECK_INTERVAL):
+        self.key_path = key_path
+        self.check_interval = check_interval
+        self._key = None
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._stats = {
+            "sign_count": 0,
+            "sign_seconds": 0.0,
+            "verify_count": 0,
+            "verify_seconds": 0.0,
+            "verify_failed": 0,
+            "reloads": 0,
+        }
+    
+    def _reload_if_changed(self) -> None:
+        """按间隔检查私钥文件mtime，变化时重新加载（加载失败时继续使用旧私钥）"""
+        now = time.monotonic()
+        if self._key is not None and now < self._next_check:
+            return
+        
+        with self._lock:
+            if self._key is not None and now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.stat(self.key_path).st_mtime
+                if self._key is not None and mtime == self._mtime:
+                    return
+                with open(self.key_path, 'rb') as f:
+                    self._key = serialization.load_pem_private_key(
+                        f.read(),
+                        password=None,
+                        backend=default_backend()
+                    )
+                self._mtime = mtime
+                self._stats["reloads"] += 1
+                logger.info(f"[微信支付V3] 商户私钥已加载: {self.key_path}")
+            except Exception as e:
+                logger.error(f"[微信支付V3] 加载私钥失败: {e}")
+    
+    def private_key(self):
+        """获取缓存的商户私钥（未能加载时返回None）"""
+        self._reload_if_changed()
+        return self._key
+    
+    def sign(self, message: str) -> str:
+        """
+        SHA256 with RSA 签名，返回Base64编码的签名
+        
+        Raises:
+            Exception: 无法加载商户私钥
+        """
+        private_key = self.private_key()
+        if not private_key:
+            raise Exception("无法加载商户私钥")
+        
+        started = time.perf_counter()
+        signature = private_key.sign(
+            message.encode('utf-8'),
+            padding.PKCS1v15(),
+            hashes.SHA256()
+        )
+        self._stats["sign_count"] += 1
+        self._stats["sign_seconds"] += time.perf_counter() - started
+        return base64.b64encode(signature).decode('utf-8')
+    
+    def verify(self, public_key, message: str, signature: str) -> bool:
+        """
+        用对方公钥验证 SHA256 with RSA 签名
+        
+        Args:
+            public_key: RSA公钥
+            message: 签名串
+            signature: Base64编码的签名
+        """
+        started = time.perf_counter()
+        try:
+            public_key.verify(
+                base64.b64decode(signature),
+                message.encode('utf-8'),
+                padding.PKCS1v15(),
+                hashes.SHA256()
             )
-        return private_key
-    except Exception as e:
-        print(f"[微信支付V3] 加载私钥失败: {e}")
-        return None
+            return True
+        except Exception:
+            self._stats["verify_failed"] += 1
+            return False
+        finally:
+            self._stats["verify_count"] += 1
+            self._stats["verify_seconds"] += time.perf_counter() - started
+    
+    def metrics(self) -> Dict:
+        """签名/验签次数、平均耗时（毫秒）和启动以来的平均吞吐（次/秒）"""
+        stats = dict(self._stats)
+        uptime = max(time.time() - self._started_at, 1e-9)
+        for op in ("sign", "verify"):
+            count = stats[f"{op}_count"]
+            stats[f"{op}_avg_ms"] = round(stats[f"{op}_seconds"] / count * 1000, 3) if count else 0.0
+            stats[f"{op}_per_second"] = round(count / uptime, 3)
+            stats[f"{op}_seconds"] = round(stats[f"{op}_seconds"], 6)
+        stats["key_loaded"] = self._key is not None
+        return stats
+
+
+# 全局商户签名器
+merchant_signer = MerchantSigner(WECHAT_PRIVATE_KEY_PATH)
+
+
+def load_private_key():
+    """
+    加载商户私钥（返回签名器缓存的私钥）
+    """
+    return merchant_signer.private_key()
 
 
 def generate_signature(method: str, url_path: str, timestamp: str, nonce_str: str, body: str) -> str:
@@ -59,25 +179,13 @@ def generate_signature(method: str, url_path: str, timestamp: str, nonce_str: st
     
     签名算法：
     1. 构造签名串
-    2. 使用商户私钥对签名串进行SHA256 with RSA签名
+    2. 使用商户私钥对签名串进行SHA256 with RSA签名（私钥由签名器缓存）
     3. 对签名结果进行Base64编码
     """
-    private_key = load_private_key()
-    if not private_key:
-        raise Exception("无法加载商户私钥")
-    
     # 构造签名串
     sign_str = f"{method}\n{url_path}\n{timestamp}\n{nonce_str}\n{body}\n"
     
-    # 使用私钥签名
-    signature = private_key.sign(
-        sign_str.encode('utf-8'),
-        padding.PKCS1v15(),
-        hashes.SHA256()
-    )
-    
-    # Base64编码
-    return base64.b64encode(signature).decode('utf-8')
+    return merchant_signer.sign(sign_str)
 
 
 def build_authorization_header(method: str, url_path: str, body: str = "") -> str:
@@ -153,7 +261,7 @@ def create_native_order(
         "User-Agent": "Semopic/1.0"
     }
     
-    print(f"[微信支付V3] 创建订单请求: {order_no}, 金额: {total_fee}分")
+    logger.info(f"[微信支付V3] 创建订单请求: {order_no}, 金额: {total_fee}分")
     
     try:
         # 发送请求
@@ -164,8 +272,8 @@ def create_native_order(
             timeout=10
         )
         
-        print(f"[微信支付V3] 响应状态码: {response.status_code}")
-        print(f"[微信支付V3] 响应内容: {response.text}")
+        logger.info(f"[微信支付V3] 响应状态码: {response.status_code}")
+        logger.debug(f"[微信支付V3] 响应内容: {response.text}")
         
         # 检查HTTP状态码
         if response.status_code == 200:
@@ -189,13 +297,232 @@ def create_native_order(
             }
     
     except Exception as e:
-        print(f"[微信支付V3] 创建订单失败: {e}")
+        logger.error(f"[微信支付V3] 创建订单失败: {e}")
         return {
             'success': False,
             'error': str(e)
         }
 
 
+def aes_gcm_decrypt(ciphertext: str, nonce: str, associated_data: str, api_v3_key: Optional[str] = None) -> bytes:
+    """
+    AES-256-GCM 解密（回调通知的resource、平台证书都使用APIv3密钥加密）
+    
+    Args:
+        ciphertext: 密文（Base64编码）
+        nonce: 随机串
+        associated_data: 附加数据
+        api_v3_key: APIv3密钥（默认使用配置）
+    
+    Returns:
+        明文字节
+    """
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    
+    aesgcm = AESGCM((api_v3_key or WECHAT_API_V3_KEY).encode('utf-8'))
+    return aesgcm.decrypt(
+        nonce.encode('utf-8'),
+        base64.b64decode(ciphertext),
+        (associated_data or "").encode('utf-8')
+    )
+
+
+class PlatformCertificateManager:
+    """
+    微信支付平台证书管理
+    
+    - 从 /v3/certificates 下载平台证书并用APIv3密钥解密（AES-GCM认证，保证证书来自微信）
+    - 按序列号缓存在内存和本地目录，重启后直接从磁盘加载
+    - 后台定期刷新；回调验签只读内存，不发起网络请求
+    """
+    
+    def __init__(self, cert_dir: str = WECHAT_PLATFORM_CERT_DIR):
+        self.cert_dir = cert_dir
+        self._certs: Dict[str, Dict] = {}  # 序列号 -> {"public_key", "expire_time"}
+        self._lock = threading.Lock()
+        self._refresh_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_refresh: Optional[float] = None
+    
+    # ---------- 证书缓存 ----------
+    
+    def add_certificate(self, pem: str, persist: bool = True) -> str:
+        """
+        加入一张平台证书
+        
+        Args:
+            pem: PEM格式证书
+            persist: 是否写入本地缓存目录
+        
+        Returns:
+            证书序列号（大写十六进制）
+        """
+        cert = load_pem_x509_certificate(pem.encode('utf-8'), default_backend())
+        serial = format(cert.serial_number, 'X')
+        expire_time = getattr(cert, "not_valid_after_utc", None) or cert.not_valid_after
+        
+        with self._lock:
+            self._certs[serial] = {
+                "public_key": cert.public_key(),
+                "expire_time": expire_time.replace(tzinfo=None),
+            }
+        
+        if persist:
+            os.makedirs(self.cert_dir, exist_ok=True)
+            path = os.path.join(self.cert_dir, f"{serial}.pem")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(pem)
+            os.replace(tmp_path, path)
+        return serial
+    
+    def load_from_disk(self) -> int:
+        """从本地缓存目录加载平台证书，返回加载的数量"""
+        if not os.path.isdir(self.cert_dir):
+            return 0
+        
+        loaded = 0
+        for name in os.listdir(self.cert_dir):
+            if not name.endswith(".pem"):
+                continue
+            try:
+                with open(os.path.join(self.cert_dir, name), 'r', encoding='utf-8') as f:
+                    self.add_certificate(f.read(), persist=False)
+                loaded += 1
+            except Exception as e:
+                logger.warning(f"[微信支付V3] ⚠️ 平台证书 {name} 加载失败: {e}")
+        
+        self.drop_expired()
+        if loaded:
+            logger.info(f"[微信支付V3] 已从本地加载 {loaded} 张平台证书")
+        return loaded
+    
+    def drop_expired(self) -> None:
+        """移除已过期的证书"""
+        now = datetime.utcnow()
+        with self._lock:
+            for serial in [s for s, c in self._certs.items() if c["expire_time"] <= now]:
+                del self._certs[serial]
+    
+    def get_public_key(self, serial: str):
+        """按序列号获取平台证书公钥（不存在或已过期时返回None）"""
+        cert = self._certs.get((serial or "").upper())
+        if not cert or cert["expire_time"] <= datetime.utcnow():
+            return None
+        return cert["public_key"]
+    
+    def serials(self) -> list:
+        return sorted(self._certs)
+    
+    # ---------- 下载和刷新 ----------
+    
+    def add_encrypted_certificate(self, encrypt_certificate: Dict, api_v3_key: Optional[str] = None) -> str:
+        """解密 /v3/certificates 返回的 encrypt_certificate 并加入缓存"""
+        pem = aes_gcm_decrypt(
+            encrypt_certificate["ciphertext"],
+            encrypt_certificate["nonce"],
+            encrypt_certificate.get("associated_data", ""),
+            api_v3_key
+        ).decode('utf-8')
+        return self.add_certificate(pem)
+    
+    def refresh(self) -> int:
+        """
+        下载并解密平台证书（同步，在线程中执行）
+        
+        Returns:
+            下载的证书数量
+        
+        Raises:
+            Exception: 请求或解密失败
+        """
+        headers = {
+            "Accept": "application/json",
+            "Authorization": build_authorization_header("GET", WECHAT_PAY_CERTS_PATH),
+            "User-Agent": "Semopic/1.0"
+        }
+        response = requests.get(f"{WECHAT_PAY_BASE_URL}{WECHAT_PAY_CERTS_PATH}", headers=headers, timeout=10)
+        if response.status_code != 200:
+            raise Exception(f"下载平台证书失败: HTTP {response.status_code} {response.text[:200]}")
+        
+        serials = [
+            self.add_encrypted_certificate(item["encrypt_certificate"])
+            for item in response.json().get("data", [])
+        ]
+        self.drop_expired()
+        self.last_refresh = time.time()
+        logger.info(f"[微信支付V3] ✅ 平台证书已刷新: {', '.join(serials) or '无'}")
+        return len(serials)
+    
+    def request_refresh(self) -> None:
+        """遇到未知序列号时提前触发后台刷新（不阻塞调用方）"""
+        if self._refresh_event is not None:
+            self._refresh_event.set()
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+                interval = WECHAT_CERT_REFRESH_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[微信支付V3] ❌ {e}")
+                interval = 60  # 失败后一分钟重试
+            
+            try:
+                await asyncio.wait_for(self._refresh_event.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_event.clear()
+    
+    def start(self) -> None:
+        """加载本地缓存并启动后台刷新（在应用启动时调用；未配置商户信息时只加载本地缓存）"""
+        self.load_from_disk()
+        if not (WECHAT_MCH_ID and WECHAT_API_V3_KEY):
+            logger.info("[微信支付V3] 未配置商户号或APIv3密钥，跳过平台证书刷新")
+            return
+        if self._task is None or self._task.done():
+            self._refresh_event = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        """停止后台刷新"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    # ---------- 回调验签 ----------
+    
+    def verify(self, timestamp: str, nonce: str, body: str, signature: str, serial: str) -> bool:
+        """
+        验证回调签名：时间戳在允许误差内，且签名能被对应序列号的平台证书公钥验证
+        """
+        try:
+            if abs(time.time() - int(timestamp)) > WECHAT_CALLBACK_MAX_SKEW:
+                logger.warning(f"[微信支付V3] 回调时间戳超出允许误差: {timestamp}")
+                return False
+        except (TypeError, ValueError):
+            return False
+        
+        public_key = self.get_public_key(serial)
+        if public_key is None:
+            logger.warning(f"[微信支付V3] 未知的平台证书序列号: {serial}")
+            self.request_refresh()
+            return False
+        
+        message = f"{timestamp}\n{nonce}\n{body}\n"
+        return merchant_signer.verify(public_key, message, signature)
+
+
+# 全局平台证书管理器
+platform_certificates = PlatformCertificateManager()
+
+
 def verify_callback_signature(timestamp: str, nonce: str, body: str, signature: str, serial: str) -> bool:
     """
     验证微信支付回调签名（V3版本）
@@ -208,12 +535,9 @@ def verify_callback_signature(timestamp: str, nonce: str, body: str, signature:
         serial: 证书序列号
     
     Returns:
-        签名是否有效
+        签名是否有效（使用缓存的平台证书，不发起网络请求）
     """
-    # TODO: 实现V3版本的回调签名验证
-    # 需要从微信获取平台证书公钥
-    # 这里暂时返回True，实际使用时需要完善
-    return True
+    return platform_certificates.verify(timestamp, nonce, body, signature, serial)
 
 
 def decrypt_callback_resource(ciphertext: str, nonce: str, associated_data: str) -> Dict:
@@ -228,22 +552,7 @@ def decrypt_callback_resource(ciphertext: str, nonce: str, associated_data: str)
     Returns:
         解密后的数据
     """
-    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-    
-    # APIv3密钥
-    key = WECHAT_API_V3_KEY.encode('utf-8')
-    
-    # 解码密文
-    ciphertext_bytes = base64.b64decode(ciphertext)
-    
-    # AES-GCM解密
-    aesgcm = AESGCM(key)
-    plaintext = aesgcm.decrypt(
-        nonce.encode('utf-8'),
-        ciphertext_bytes,
-        associated_data.encode('utf-8')
-    )
-    
+    plaintext = aes_gcm_decrypt(ciphertext, nonce, associated_data)
     return json.loads(plaintext.decode('utf-8'))
 
 
@@ -292,7 +601,51 @@ def query_order(order_no: str) -> Dict:
             }
     
     except Exception as e:
-        print(f"[微信支付V3] 查询订单失败: {e}")
+        logger.error(f"[微信支付V3] 查询订单失败: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def close_order(order_no: str) -> Dict:
+    """
+    关闭未支付的订单（V3版本）
+    
+    Args:
+        order_no: 商户订单号
+    
+    Returns:
+        {'success': True/False, 'error': '错误信息'}
+    """
+    url_path = f"/v3/pay/transactions/out-trade-no/{order_no}/close"
+    body_json = json.dumps({"mchid": WECHAT_MCH_ID})
+    
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Authorization": build_authorization_header("POST", url_path, body_json),
+        "User-Agent": "Semopic/1.0"
+    }
+    
+    try:
+        response = requests.post(f"{WECHAT_PAY_BASE_URL}{url_path}", data=body_json, headers=headers, timeout=10)
+        
+        # 成功时返回 204 No Content
+        if response.status_code in (200, 204):
+            return {'success': True}
+        
+        try:
+            error_msg = response.json().get('message', '关闭失败')
+        except:
+            error_msg = f"HTTP {response.status_code}"
+        return {
+            'success': False,
+            'error': error_msg
+        }
+    
+    except Exception as e:
+        logger.error(f"[微信支付V3] 关闭订单失败: {e}")
         return {
             'success': False,
             'error': str(e)
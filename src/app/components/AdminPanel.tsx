@@ -8,6 +8,7 @@ import {
 } from 'lucide-react';
 import { cn } from '../lib/utils';
 import { toast } from '../../lib/toast';
+import { authHeaders } from '../../lib/api';
 
 const API_BASE_URL = 'https://semopic.com';
 
@@ -57,7 +58,7 @@ function FeaturedVideoModal({ video, onClose, onSuccess }: {
       
       const response = await fetch(url, {
         method: video ? 'PUT' : 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify(payload)
       });
 
@@ -346,7 +347,8 @@ export function AdminPanel() {
     setLoading(true);
     try {
       const response = await fetch(
-        `${API_BASE_URL}/api/admin/prompts?page=${currentPage}&page_size=${pageSize}`
+        `${API_BASE_URL}/api/admin/prompts?page=${currentPage}&page_size=${pageSize}`,
+        { headers: authHeaders() }
       );
       const data = await response.json();
       setPrompts(data.prompts || []);
@@ -362,19 +364,19 @@ export function AdminPanel() {
     setLoading(true);
     try {
       if (activeTab === 'users') {
-        const response = await fetch(`${API_BASE_URL}/api/admin/users`);
+        const response = await fetch(`${API_BASE_URL}/api/admin/users`, { headers: authHeaders() });
         const data = await response.json();
         setUsers(data.users || []);
       } else if (activeTab === 'videos') {
-        const response = await fetch(`${API_BASE_URL}/api/admin/videos`);
+        const response = await fetch(`${API_BASE_URL}/api/admin/videos`, { headers: authHeaders() });
         const data = await response.json();
         setVideos(data.videos || []);
       } else if (activeTab === 'prompts') {
-        const response = await fetch(`${API_BASE_URL}/api/admin/prompts`);
+        const response = await fetch(`${API_BASE_URL}/api/admin/prompts`, { headers: authHeaders() });
         const data = await response.json();
         setPrompts(data.prompts || []);
       } else if (activeTab === 'stats') {
-        const response = await fetch(`${API_BASE_URL}/api/admin/stats`);
+        const response = await fetch(`${API_BASE_URL}/api/admin/stats`, { headers: authHeaders() });
         const data = await response.json();
         setStats(data);
       } else if (activeTab === 'featured') {
@@ -395,7 +397,7 @@ export function AdminPanel() {
     try {
       await fetch(`${API_BASE_URL}/api/admin/video/${videoId}/public`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({ isPublic: !isPublic })
       });
       fetchAdminData();
@@ -408,7 +410,8 @@ export function AdminPanel() {
     if (!confirm('确定要删除这个视频吗？')) return;
     try {
       await fetch(`${API_BASE_URL}/api/admin/video/${videoId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: authHeaders()
       });
       fetchAdminData();
     } catch (error) {
@@ -429,7 +432,7 @@ export function AdminPanel() {
     try {
       const response = await fetch(`${API_BASE_URL}/api/admin/user/${userId}/credits`, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders({ 'Content-Type': 'application/json' }),
         body: JSON.stringify({ credits: parsedCredits })
       });
       
@@ -822,7 +825,8 @@ export function AdminPanel() {
                               if (!confirm('确定要删除这个精选视频吗？')) return;
                               try {
                                 await fetch(`${API_BASE_URL}/api/admin/featured-videos/${video.id}`, {
-                                  method: 'DELETE'
+                                  method: 'DELETE',
+                                  headers: authHeaders()
                                 });
                                 fetchAdminData();
                               } catch (error) {
@@ -4,6 +4,26 @@ import { Message, ScriptItem } from './store';
 // 修复：统一使用www前缀，避免CORS跨域问题
 export const API_BASE_URL = 'https://www.semopic.com';
 
+// 登录/注册返回的访问令牌（管理员接口必须携带）
+const AUTH_TOKEN_KEY = 'authToken';
+
+export function saveAuthToken(token?: string | null) {
+  if (typeof window === 'undefined') return;
+  if (token) {
+    localStorage.setItem(AUTH_TOKEN_KEY, token);
+  } else {
+    localStorage.removeItem(AUTH_TOKEN_KEY);
+  }
+}
+
+/**
+ * 带上 Authorization: Bearer <token> 的请求头（未登录时不带）
+ */
+export function authHeaders(headers: Record<string, string> = {}): Record<string, string> {
+  const token = typeof window !== 'undefined' ? localStorage.getItem(AUTH_TOKEN_KEY) : null;
+  return token ? { ...headers, Authorization: `Bearer ${token}` } : headers;
+}
+
 // 定义与后端交互的数据类型
 export interface ApiResponse<T> {
   success: boolean;
@@ -378,6 +398,7 @@ export const api = {
       role: 'user' | 'admin';  // 修复类型
       createdAt: number;
     };
+    token: string;
     message: string;
   }> {
     console.log('[API] 用户注册...');
@@ -395,7 +416,9 @@ export const api = {
         throw new Error(error.detail || '注册失败');
       }
 
-      return await response.json();
+      const result = await response.json();
+      saveAuthToken(result.token);
+      return result;
     } catch (error) {
       console.error('注册失败:', error);
       throw error;
@@ -418,6 +441,7 @@ export const api = {
       role: 'user' | 'admin';  // 修复类型
       createdAt: number;
     };
+    token: string;
     message: string;
   }> {
     console.log('[API] 用户登录...');
@@ -435,7 +459,9 @@ export const api = {
         throw new Error(error.detail || '登录失败');
       }
 
-      return await response.json();
+      const result = await response.json();
+      saveAuthToken(result.token);
+      return result;
     } catch (error) {
       console.error('登录失败:', error);
       throw error;
@@ -1024,6 +1050,7 @@ export const api = {
     try {
       const response = await fetch(`${API_BASE_URL}/api/admin/video/${videoId}/public?isPublic=${isPublic}`, {
         method: 'PUT',
+        headers: authHeaders(),
       });
       if (!response.ok) {
         const error = await response.json();
@@ -171,9 +171,10 @@ export const useAuthStore = create<AuthState>((set) => ({
   
   logout: () => {
     set({ currentUser: null, isLoggedIn: false });
-    // 清除 localStorage
+    // 清除 localStorage（包括访问令牌）
     if (typeof window !== 'undefined') {
       localStorage.removeItem('currentUser');
+      localStorage.removeItem('authToken');
     }
   },
   